@@ -4,15 +4,38 @@ Module des agents IA pour le traitement des produits.
 
 import json
 import logging
-from typing import Dict, Any, Optional, List, Callable
+from typing import Dict, Any, Optional, List, Callable, Tuple, Iterator
 from abc import ABC, abstractmethod
 
+from apps.ai_editor.json_stream import IncrementalProductsParser
+from apps.ai_editor.prompt_compaction import (
+    DEFAULT_FIELD, compact_products, html_to_text, truncate_text
+)
+from apps.ai_editor.response_schemas import (
+    SEO_RESPONSE_SCHEMA, SEO_BATCH_RESPONSE_SCHEMA, GOOGLE_CATEGORY_BATCH_RESPONSE_SCHEMA
+)
+from utils.llm_telemetry import llm_call_context
+
 logger = logging.getLogger(__name__)
 
+# Limite de tokens en sortie pour une requête batch
+BATCH_MAX_OUTPUT_TOKENS = 8000
+
 
 class BaseAIAgent(ABC):
     """Classe de base pour les agents IA."""
     
+    # Longueur max (caractères) de chaque champ produit dans le prompt, après compaction
+    FIELD_LIMITS: Dict[str, int] = {
+        'Body (HTML)': 500,
+        'SEO Description': 320,
+        DEFAULT_FIELD: 200
+    }
+    
+    # Schémas JSON imposés aux réponses (None = réponse texte libre)
+    RESPONSE_SCHEMA: Optional[Dict[str, Any]] = None
+    BATCH_RESPONSE_SCHEMA: Optional[Dict[str, Any]] = None
+    
     def __init__(self, ai_provider, system_prompt: str, specific_prompt: str):
         """
         Initialise l'agent IA.
@@ -26,6 +49,8 @@ class BaseAIAgent(ABC):
         self.system_prompt = system_prompt
         self.specific_prompt = specific_prompt
         self.tools: List[Callable] = []  # Liste de fonctions/tools disponibles
+        self.last_batch_stats: Optional[Dict[str, Any]] = None  # Statistiques du dernier batch streamé
+        self.last_compaction_stats: Optional[Dict[str, int]] = None  # Tokens d'entrée avant/après compaction
     
     def add_tool(self, tool_function: Callable):
         """
@@ -59,7 +84,9 @@ class BaseAIAgent(ABC):
         if 'Tags' in product_data:
             context['tags'] = product_data['Tags']
         if 'Body (HTML)' in product_data:
-            context['body_html'] = product_data['Body (HTML)']
+            context['body_html'] = truncate_text(
+                html_to_text(product_data['Body (HTML)']), self.FIELD_LIMITS.get('Body (HTML)', 0)
+            )
         if 'Handle' in product_data:
             context['handle'] = product_data['Handle']
         
@@ -73,15 +100,33 @@ class BaseAIAgent(ABC):
         
         return context
     
-    def _build_full_prompt(self, product_data: Dict[str, Any]) -> str:
+    def _build_static_prefix(self) -> str:
         """
-        Construit le prompt complet avec TOUTES les données CSV du produit.
+        Construit la partie fixe du prompt, identique pour tous les produits.
+        
+        Elle est envoyée en tête de chaque requête pour que les providers puissent
+        la mettre en cache (cache_control Anthropic, cached content Gemini, cache
+        automatique de préfixe OpenAI).
+        
+        Returns:
+            Prompt système + instructions de l'agent
+        """
+        prefix = f"{self.system_prompt}\n\n"
+        prefix += f"{self.specific_prompt}\n\n"
+        prefix += "IMPORTANT : Tu as accès à TOUTES les données CSV du produit fournies plus bas. Utilise-les pour générer du contenu riche.\n"
+        prefix += "Si les champs Body (HTML) ou Tags existent déjà, tu DOIS les réutiliser/améliorer, JAMAIS les ignorer !\n"
+        return prefix
+    
+    def _build_product_section(self, product_data: Dict[str, Any]) -> str:
+        """
+        Construit la partie variable du prompt avec TOUTES les données CSV du produit.
         
         Args:
-            product_data: Données du produit (tous les champs CSV)
+            product_data: Données du produit (tous les champs CSV), déjà compactées
+                          (voir prompt_compaction)
             
         Returns:
-            Prompt complet
+            Bloc de données du produit
         """
         # Envoyer TOUS les champs CSV disponibles
         context_str = "===== LIGNE CSV COMPLÈTE DU PRODUIT =====\n\n"
@@ -99,11 +144,7 @@ class BaseAIAgent(ABC):
             if field in product_data:
                 value = product_data[field]
                 if value:  # Afficher seulement si non vide
-                    # Tronquer le Body HTML s'il est trop long
-                    if field == 'Body (HTML)' and len(str(value)) > 500:
-                        context_str += f"{field}: {str(value)[:500]}... (tronqué)\n"
-                    else:
-                        context_str += f"{field}: {value}\n"
+                    context_str += f"{field}: {value}\n"
         
         # Afficher les autres champs (sauf ceux déjà affichés)
         context_str += "\n--- Autres champs disponibles ---\n"
@@ -111,14 +152,88 @@ class BaseAIAgent(ABC):
             if field not in important_fields and value:
                 context_str += f"{field}: {value}\n"
         
-        # Construire le prompt complet
-        full_prompt = f"{self.system_prompt}\n\n"
-        full_prompt += context_str + "\n"
-        full_prompt += "IMPORTANT : Tu as accès à TOUTES les données ci-dessus. Utilise-les pour générer du contenu riche.\n"
-        full_prompt += "Si les champs Body (HTML) ou Tags existent déjà, tu DOIS les réutiliser/améliorer, JAMAIS les ignorer !\n\n"
-        full_prompt += self.specific_prompt
+        return context_str
+    
+    def _build_prompt_parts(self, product_data: Dict[str, Any]) -> Tuple[str, str]:
+        """
+        Construit le prompt d'un produit en deux parties : préfixe fixe et données produit.
+        
+        Args:
+            product_data: Données du produit
+            
+        Returns:
+            Tuple (préfixe cacheable, partie variable)
+        """
+        compacted, _, stats = compact_products([product_data], self.FIELD_LIMITS)
+        self.last_compaction_stats = stats
+        return self._build_static_prefix(), self._build_product_section(compacted[0])
+    
+    def _build_full_prompt(self, product_data: Dict[str, Any]) -> str:
+        """
+        Construit le prompt complet avec TOUTES les données CSV du produit.
+        Les données du produit sont toujours placées en dernier.
+        
+        Args:
+            product_data: Données du produit (tous les champs CSV)
+            
+        Returns:
+            Prompt complet
+        """
+        prefix, product_section = self._build_prompt_parts(product_data)
+        return f"{prefix}\n{product_section}"
+    
+    def _call_provider(self, prompt: str, cache_prefix: str = "",
+                       response_schema: Optional[Dict[str, Any]] = None, batch_size: int = 1, **kwargs) -> str:
+        """
+        Appelle le provider IA en lui transmettant la partie fixe du prompt comme préfixe cacheable.
+        
+        Les providers qui ne gèrent pas cache_prefix reçoivent le prompt concaténé,
+        dans le même ordre (préfixe fixe puis données produit).
+        
+        Args:
+            prompt: Partie variable du prompt
+            cache_prefix: Partie fixe du prompt
+            response_schema: Schéma JSON de la réponse, transmis si le provider gère la sortie structurée
+            batch_size: Nombre de produits dans la requête (télémétrie)
+            **kwargs: Arguments transmis à generate() (context, max_tokens)
+            
+        Returns:
+            Réponse brute du provider
+        """
+        if response_schema and getattr(self.ai_provider, 'supports_response_schema', False):
+            kwargs['response_schema'] = response_schema
+        
+        with llm_call_context(type(self).__name__, batch_size):
+            if cache_prefix and getattr(self.ai_provider, 'supports_prompt_cache', False):
+                return self.ai_provider.generate(prompt, cache_prefix=cache_prefix, **kwargs)
+            
+            full_prompt = f"{cache_prefix}\n{prompt}" if cache_prefix else prompt
+            return self.ai_provider.generate(full_prompt, **kwargs)
+    
+    def _call_provider_stream(self, prompt: str, cache_prefix: str = "",
+                              response_schema: Optional[Dict[str, Any]] = None, batch_size: int = 1,
+                              **kwargs) -> Iterator[str]:
+        """
+        Variante streaming de _call_provider().
+        
+        Les providers sans generate_stream() retournent la réponse complète en un seul fragment.
+        
+        Yields:
+            Fragments de la réponse du provider
+        """
+        if not hasattr(self.ai_provider, 'generate_stream'):
+            yield self._call_provider(prompt, cache_prefix, response_schema, batch_size, **kwargs)
+            return
+        
+        if response_schema and getattr(self.ai_provider, 'supports_response_schema', False):
+            kwargs['response_schema'] = response_schema
         
-        return full_prompt
+        with llm_call_context(type(self).__name__, batch_size):
+            if cache_prefix and getattr(self.ai_provider, 'supports_prompt_cache', False):
+                yield from self.ai_provider.generate_stream(prompt, cache_prefix=cache_prefix, **kwargs)
+            else:
+                full_prompt = f"{cache_prefix}\n{prompt}" if cache_prefix else prompt
+                yield from self.ai_provider.generate_stream(full_prompt, **kwargs)
     
     @abstractmethod
     def generate(self, product_data: Dict[str, Any], **kwargs) -> Any:
@@ -152,13 +267,131 @@ class BaseAIAgent(ABC):
         if not products_data:
             return []
         
-        # Construire le prompt pour le batch
-        batch_prompt = self._build_batch_prompt(products_data, **kwargs)
+        # Construire le prompt pour le batch (préfixe fixe + produits)
+        cache_prefix, batch_prompt = self._build_batch_prompt_parts(products_data, **kwargs)
         
         # Appeler l'IA avec plus de tokens pour les batch
         logger.info(f"Traitement batch de {len(products_data)} produits...")
         # Augmenter max_tokens pour les batch: 8000 pour avoir assez d'espace pour tous les produits
-        response = self.ai_provider.generate(batch_prompt, max_tokens=8000)
+        response = self._call_provider(batch_prompt, cache_prefix, self.BATCH_RESPONSE_SCHEMA,
+                                       batch_size=len(products_data), max_tokens=BATCH_MAX_OUTPUT_TOKENS)
+        
+        products = self._parse_batch_response(response)
+        
+        logger.info(f"Batch traité: {len(products)}/{len(products_data)} produits retournés")
+        return products
+    
+    def generate_batch_stream(self, products_data: List[Dict[str, Any]], **kwargs) -> Iterator[Dict[str, Any]]:
+        """
+        Génère les résultats d'un batch en streaming : chaque produit est retourné
+        dès que son objet JSON est complet dans la réponse.
+        
+        Les produits mal formés ou tronqués ne sont pas retournés ; l'appelant
+        les détecte comme manquants et peut les redemander.
+        
+        Args:
+            products_data: Liste de dictionnaires contenant les données des produits
+            **kwargs: Arguments supplémentaires
+            
+        Yields:
+            Dictionnaires {handle: str, ...champs générés...}
+            
+        Raises:
+            ValueError: Si aucun produit n'a pu être extrait de la réponse
+            Exception: Si l'API échoue
+        """
+        if not products_data:
+            return
+        
+        cache_prefix, batch_prompt = self._build_batch_prompt_parts(products_data, **kwargs)
+        
+        logger.info(f"Traitement batch (streaming) de {len(products_data)} produits...")
+        parser = IncrementalProductsParser()
+        self.last_batch_stats = None
+        
+        for chunk in self._call_provider_stream(batch_prompt, cache_prefix, self.BATCH_RESPONSE_SCHEMA,
+                                                batch_size=len(products_data),
+                                                max_tokens=BATCH_MAX_OUTPUT_TOKENS):
+            for product in parser.feed(chunk):
+                yield product
+        
+        if parser.parsed_count == 0:
+            # Aucun objet isolé pendant le stream : parsing classique de la réponse complète
+            logger.warning("Aucun produit extrait en streaming, parsing de la réponse complète")
+            products = self._parse_batch_response(parser.text)
+            self.last_batch_stats = {
+                'requested': len(products_data),
+                'returned': len(products),
+                'truncated': False,
+                'output_chars': len(parser.text)
+            }
+            for product in products:
+                yield product
+            return
+        
+        # Statistiques utilisées pour ajuster la taille des batches suivants
+        self.last_batch_stats = {
+            'requested': len(products_data),
+            'returned': parser.parsed_count,
+            'truncated': not parser.is_complete,
+            'output_chars': len(parser.text)
+        }
+        
+        failed = parser.failed_handles()
+        if failed:
+            logger.warning(f"Produits mal formés ou tronqués dans la réponse: {', '.join(failed)}")
+        if not parser.is_complete:
+            logger.warning("Réponse batch incomplète (tableau 'products' non fermé, probablement tronquée)")
+        
+        logger.info(f"Batch traité (streaming): {parser.parsed_count}/{len(products_data)} produits retournés")
+    
+    def build_batch_request(self, products_data: List[Dict[str, Any]], **kwargs) -> Dict[str, Any]:
+        """
+        Construit la requête d'un batch sans l'envoyer (mode différé, API batch du fournisseur).
+        
+        Même prompt, schéma et limite de tokens que generate_batch_stream() ; la réponse
+        se parse avec _parse_batch_response().
+        
+        Args:
+            products_data: Liste des données de produits
+            **kwargs: Arguments supplémentaires (voir _build_batch_prompt_parts)
+        
+        Returns:
+            Dict {prompt, cache_prefix, max_tokens, response_schema}
+        """
+        cache_prefix, batch_prompt = self._build_batch_prompt_parts(products_data, **kwargs)
+        if not getattr(self.ai_provider, 'supports_prompt_cache', False):
+            batch_prompt, cache_prefix = f"{cache_prefix}\n{batch_prompt}", None
+        
+        response_schema = None
+        if self.BATCH_RESPONSE_SCHEMA and getattr(self.ai_provider, 'supports_response_schema', False):
+            response_schema = self.BATCH_RESPONSE_SCHEMA
+        
+        return {
+            'prompt': batch_prompt,
+            'cache_prefix': cache_prefix,
+            'max_tokens': BATCH_MAX_OUTPUT_TOKENS,
+            'response_schema': response_schema
+        }
+    
+    def _parse_batch_response(self, response: str) -> List[Dict[str, Any]]:
+        """
+        Parse une réponse batch complète {"products": [...]}.
+        
+        Args:
+            response: Réponse brute de l'IA
+            
+        Returns:
+            Liste des produits retournés
+            
+        Raises:
+            ValueError: Si la réponse JSON est invalide
+        """
+        # Sortie structurée : la réponse est déjà un JSON valide, sans nettoyage ni réparation
+        try:
+            return self._extract_products(json.loads(response))
+        except json.JSONDecodeError:
+            pass
         
         # Parser la réponse JSON avec json-repair pour réparer automatiquement
         response_clean = self._clean_json_response(response)
@@ -199,7 +432,15 @@ class BaseAIAgent(ABC):
                 
                 raise ValueError(f"Réponse JSON invalide et impossible à réparer: {parse_error}")
         
-        # Valider la structure
+        return self._extract_products(result)
+    
+    def _extract_products(self, result: Any) -> List[Dict[str, Any]]:
+        """
+        Valide la structure d'une réponse batch décodée et retourne ses produits.
+        
+        Raises:
+            ValueError: Si la clé 'products' est absente ou n'est pas une liste
+        """
         if not isinstance(result, dict) or 'products' not in result:
             raise ValueError("Format JSON invalide: clé 'products' manquante")
         
@@ -207,7 +448,6 @@ class BaseAIAgent(ABC):
         if not isinstance(products, list):
             raise ValueError("Format JSON invalide: 'products' n'est pas une liste")
         
-        logger.info(f"Batch traité: {len(products)}/{len(products_data)} produits retournés")
         return products
     
     def _clean_json_response(self, response: str) -> str:
@@ -269,21 +509,30 @@ class BaseAIAgent(ABC):
         
         return response_clean
     
-    def _build_batch_prompt(self, products_data: List[Dict[str, Any]], **kwargs) -> str:
+    def _build_batch_prompt_parts(self, products_data: List[Dict[str, Any]], **kwargs) -> Tuple[str, str]:
         """
-        Construit le prompt pour un batch de produits.
+        Construit le prompt d'un batch en deux parties.
+        
+        Le préfixe (prompt système, instructions de l'agent, règles de format JSON) est
+        identique d'un batch à l'autre et peut être mis en cache par le provider.
+        La partie variable (produits, handles attendus) est toujours placée en dernier.
         
         Args:
             products_data: Liste des données de produits
             **kwargs: Arguments supplémentaires
+                retry_issues: Dict {handle: [problèmes]} des produits redemandés
+                              après un résultat invalide
             
         Returns:
-            Prompt complet pour le batch
+            Tuple (préfixe cacheable, partie variable)
         """
-        # Header du prompt
+        retry_issues = kwargs.get('retry_issues') or {}
+        prefix = self._build_static_prefix()
+        prefix += self._get_batch_output_rules()
+        
+        # Header de la partie variable
         batch_count = len(products_data)
-        prompt = f"{self.system_prompt}\n\n{self.specific_prompt}\n\n"
-        prompt += f"""
+        prompt = f"""
 ⚠️ INSTRUCTION CRITIQUE ⚠️
 Tu dois traiter EXACTEMENT {batch_count} produits ci-dessous.
 Tu DOIS retourner les {batch_count} produits dans ta réponse JSON.
@@ -294,31 +543,83 @@ Compte des produits que tu DOIS retourner: {batch_count}
 
 """
         
+        # Données compactées (HTML → texte, paragraphes communs envoyés une seule fois)
+        compacted, common_texts, stats = compact_products(products_data, self.FIELD_LIMITS)
+        self.last_compaction_stats = stats
+        if stats['tokens_before']:
+            logger.info(f"🗜️ Compaction des données produit: {stats['tokens_before']} → {stats['tokens_after']} tokens "
+                        f"(-{1 - stats['tokens_after'] / stats['tokens_before']:.0%})")
+        
+        if common_texts:
+            body_limit = self.FIELD_LIMITS.get('Body (HTML)', 0)
+            prompt += "TEXTES COMMUNS (repris dans la description de plusieurs produits):\n"
+            for idx, text in enumerate(common_texts, 1):
+                prompt += f"[texte commun {idx}] {truncate_text(text, body_limit)}\n"
+            prompt += "\n"
+        
         # Ajouter chaque produit
-        for idx, product_data in enumerate(products_data, 1):
+        for idx, product_data in enumerate(compacted, 1):
             handle = product_data.get('Handle', f'produit-{idx}')
             prompt += f"{'='*60}\n"
             prompt += f"PRODUIT {idx}/{batch_count}\n"
             prompt += f"Handle: {handle}\n"
             prompt += f"{'='*60}\n\n"
-            prompt += self._build_full_prompt(product_data)
+            prompt += self._build_product_section(product_data)
+            if retry_issues.get(handle):
+                prompt += "\n\n⚠️ CORRECTION REQUISE - ta réponse précédente pour ce produit était invalide:\n"
+                prompt += "\n".join(f"- {issue}" for issue in retry_issues[handle])
+                prompt += "\nCorrige ces points et retourne TOUS les champs demandés."
             prompt += "\n\n"
         
-        # Instructions de format de sortie (à surcharger dans les classes filles)
+        # Rappel des handles et du nombre attendu (à surcharger dans les classes filles)
         prompt += self._get_batch_output_format(products_data)
         
-        return prompt
+        return prefix, prompt
+    
+    def _build_batch_prompt(self, products_data: List[Dict[str, Any]], **kwargs) -> str:
+        """
+        Construit le prompt pour un batch de produits.
+        
+        Args:
+            products_data: Liste des données de produits
+            **kwargs: Arguments supplémentaires
+            
+        Returns:
+            Prompt complet pour le batch
+        """
+        prefix, prompt = self._build_batch_prompt_parts(products_data, **kwargs)
+        return f"{prefix}\n{prompt}"
+    
+    def _get_batch_output_rules(self) -> str:
+        """
+        Retourne les règles de format de sortie du batch, indépendantes des produits.
+        Elles font partie du préfixe cacheable. À surcharger dans les classes filles.
+        
+        Returns:
+            Instructions de format JSON
+        """
+        return """
+FORMAT DE SORTIE:
+- Retourne un JSON valide avec ce format EXACT:
+
+{
+  "products": [
+    {"handle": "handle-du-produit", ...champs...},
+    ...
+  ]
+}
+"""
     
     def _get_batch_output_format(self, products_data: List[Dict[str, Any]]) -> str:
         """
-        Retourne les instructions de format de sortie pour le batch.
+        Retourne le rappel des produits attendus pour le batch (partie variable).
         À surcharger dans les classes filles.
         
         Args:
             products_data: Liste des données de produits
             
         Returns:
-            Instructions de format JSON
+            Instructions sur les handles à retourner
         """
         handles = [p.get('Handle', '') for p in products_data]
         return f"""
@@ -326,24 +627,26 @@ IMPORTANT:
 - Tu DOIS retourner les {len(products_data)} produits
 - Utilise les handles EXACTS fournis: {', '.join(handles)}
 - Si des données manquent, génère quand même du contenu
-- Retourne un JSON valide avec ce format EXACT:
-
-{{
-  "products": [
-    {{"handle": "{handles[0]}", ...champs...}},
-    ...
-  ]
-}}
 """
 
 
 class GoogleShoppingAgent(BaseAIAgent):
     """Agent pour optimiser les champs Google Shopping (principalement Google Product Category)."""
     
+    # La catégorie se déduit du titre et du type : la description est très réduite
+    FIELD_LIMITS: Dict[str, int] = {
+        'Body (HTML)': 300,
+        DEFAULT_FIELD: 150
+    }
+    
+    # La catégorie d'un produit seul est retournée en texte, le batch en JSON
+    BATCH_RESPONSE_SCHEMA = GOOGLE_CATEGORY_BATCH_RESPONSE_SCHEMA
+    
     def __init__(self, ai_provider, system_prompt: str, specific_prompt: str):
         """Initialise l'agent Google Shopping."""
         super().__init__(ai_provider, system_prompt, specific_prompt)
         self.db = None  # Référence à la base de données (pour taxonomie)
+        self.fast_provider = None  # Modèle rapide du mode cascade (None = désactivé)
     
     def set_database(self, db):
         """
@@ -387,30 +690,41 @@ class GoogleShoppingAgent(BaseAIAgent):
         
         return ""
     
-    def _build_full_prompt(self, product_data: Dict[str, Any]) -> str:
+    def _build_static_prefix(self) -> str:
         """
-        Construit le prompt complet avec les catégories disponibles.
+        Partie fixe du prompt Google Shopping, avec les règles de choix de catégorie.
+        
+        Returns:
+            Préfixe cacheable
+        """
+        prefix = super()._build_static_prefix()
+        prefix += "\n⚠️ RÈGLE ABSOLUE: Tu DOIS choisir UNIQUEMENT une catégorie de la liste de CATÉGORIES VALIDES fournie avec le produit.\n"
+        prefix += "N'invente JAMAIS de nouvelle catégorie. Si aucune ne correspond parfaitement, choisis la plus proche.\n"
+        prefix += "Si aucune liste n'est fournie, choisis une catégorie générale valide.\n"
+        return prefix
+    
+    def _build_product_section(self, product_data: Dict[str, Any]) -> str:
+        """
+        Construit les données du produit suivies des catégories candidates.
+        Les candidates dépendent du produit : elles restent dans la partie variable.
         
         Args:
             product_data: Données du produit
             
         Returns:
-            Prompt enrichi avec la taxonomie
+            Bloc produit enrichi avec la taxonomie
         """
-        # Prompt de base
-        base_prompt = super()._build_full_prompt(product_data)
+        section = super()._build_product_section(product_data)
         
         # Ajouter un échantillon de catégories pertinentes
         taxonomy_sample = self._get_taxonomy_sample(product_data)
         
         if taxonomy_sample:
-            base_prompt += taxonomy_sample
-            base_prompt += "\n\n⚠️ RÈGLE ABSOLUE: Tu DOIS choisir UNIQUEMENT une catégorie de la liste ci-dessus.\n"
-            base_prompt += "N'invente JAMAIS de nouvelle catégorie. Si aucune ne correspond parfaitement, choisis la plus proche.\n"
+            section += taxonomy_sample + "\n"
         else:
-            base_prompt += "\n\n⚠️ ATTENTION: Aucune catégorie candidate trouvée. Choisis une catégorie générale valide.\n"
+            section += "\n⚠️ ATTENTION: Aucune catégorie candidate trouvée. Choisis une catégorie générale valide.\n"
         
-        return base_prompt
+        return section
     
     def generate(self, product_data: Dict[str, Any], **kwargs) -> str:
         """
@@ -422,12 +736,12 @@ class GoogleShoppingAgent(BaseAIAgent):
         Returns:
             Catégorie Google Shopping (ex: "Apparel & Accessories > Clothing > Shirts & Tops")
         """
-        prompt = self._build_full_prompt(product_data)
+        cache_prefix, prompt = self._build_prompt_parts(product_data)
         
         try:
             # Appeler l'IA avec le prompt ET toutes les données CSV comme contexte
             # Note: enable_search est déjà à False pour cet agent (configuré dans processor.py)
-            response = self.ai_provider.generate(prompt, context=product_data)
+            response = self._call_provider(prompt, cache_prefix, context=product_data)
             
             # Nettoyer la réponse
             response = response.strip()
@@ -445,21 +759,20 @@ class GoogleShoppingAgent(BaseAIAgent):
             logger.error(f"Erreur lors de la génération de la catégorie Google Shopping: {e}")
             raise
     
-    def _get_batch_output_format(self, products_data: List[Dict[str, Any]]) -> str:
-        """Format de sortie JSON pour le batch Google Shopping."""
-        handles = [p.get('Handle', '') for p in products_data]
-        return f"""
+    def _get_batch_output_rules(self) -> str:
+        """Format de sortie JSON pour le batch Google Shopping (partie fixe)."""
+        return """
 RETOURNE un JSON valide avec ce format EXACT:
 
-{{
+{
   "products": [
-    {{
-      "handle": "{handles[0] if handles else 'exemple'}",
+    {
+      "handle": "nappe-coton-bio",
       "google_category": "Chemin complet de la catégorie (ex: Home & Garden > Kitchen & Dining > Table Linens)"
-    }},
-    ... (pour TOUS les {len(products_data)} produits)
+    },
+    ... (pour TOUS les produits)
   ]
-}}
+}
 
 RÈGLES JSON STRICTES:
 - Utilise UNIQUEMENT des guillemets doubles " pour les clés et valeurs (JAMAIS de guillemets simples ')
@@ -469,17 +782,34 @@ RÈGLES JSON STRICTES:
 - Retourne UNIQUEMENT le JSON, sans texte avant ou après
 
 CONTENU:
-- Tu DOIS retourner les {len(products_data)} produits
-- Utilise les handles EXACTS: {', '.join(handles[:5])}{'...' if len(handles) > 5 else ''}
 - Chaque produit doit avoir le champ google_category
 - Retourne UNIQUEMENT le chemin textuel de la catégorie (ex: "Home & Garden > Linens > Table Linens")
 - Si tu es incertain, choisis la catégorie la plus pertinente
 """
+    
+    def _get_batch_output_format(self, products_data: List[Dict[str, Any]]) -> str:
+        """Rappel des produits attendus pour le batch Google Shopping."""
+        handles = [p.get('Handle', '') for p in products_data]
+        return f"""
+RAPPEL:
+- Tu DOIS retourner les {len(products_data)} produits
+- Utilise les handles EXACTS: {', '.join(handles[:5])}{'...' if len(handles) > 5 else ''}
+"""
 
 
 class SEOAgent(BaseAIAgent):
     """Agent pour optimiser tous les champs SEO Shopify."""
     
+    # La description existante est réécrite : elle est conservée plus longuement
+    FIELD_LIMITS: Dict[str, int] = {
+        'Body (HTML)': 600,
+        'SEO Description': 320,
+        DEFAULT_FIELD: 200
+    }
+    
+    RESPONSE_SCHEMA = SEO_RESPONSE_SCHEMA
+    BATCH_RESPONSE_SCHEMA = SEO_BATCH_RESPONSE_SCHEMA
+    
     def generate(self, product_data: Dict[str, Any], **kwargs) -> Dict[str, Any]:
         """
         Génère tous les champs SEO pour le produit.
@@ -499,7 +829,8 @@ class SEOAgent(BaseAIAgent):
             
         Note: Le champ 'type' est utilisé à la fois pour le CSV Shopify ET pour la concordance interne (csv_type).
         """
-        prompt = self._build_full_prompt(product_data)
+        cache_prefix, product_prompt = self._build_prompt_parts(product_data)
+        prompt = f"{cache_prefix}\n{product_prompt}"
         
         # LOG: Afficher le prompt COMPLET envoyé à l'agent
         logger.info(f"📤 PROMPT COMPLET envoyé à l'agent SEO pour {product_data.get('Handle', 'unknown')}:")
@@ -509,7 +840,7 @@ class SEOAgent(BaseAIAgent):
         
         try:
             # Appeler l'IA avec le prompt ET toutes les données CSV comme contexte
-            response = self.ai_provider.generate(prompt, context=product_data)
+            response = self._call_provider(product_prompt, cache_prefix, self.RESPONSE_SCHEMA, context=product_data)
             
             # Parser la réponse (peut être JSON ou format texte)
             response = response.strip()
@@ -636,16 +967,15 @@ class SEOAgent(BaseAIAgent):
             logger.error(f"Erreur lors de la génération SEO: {e}")
             raise
     
-    def _get_batch_output_format(self, products_data: List[Dict[str, Any]]) -> str:
-        """Format de sortie JSON pour le batch SEO."""
-        handles = [p.get('Handle', '') for p in products_data]
-        return f"""
+    def _get_batch_output_rules(self) -> str:
+        """Format de sortie JSON pour le batch SEO (partie fixe)."""
+        return """
 RETOURNE un JSON valide avec ce format EXACT:
 
-{{
+{
   "products": [
-    {{
-      "handle": "{handles[0] if handles else 'exemple'}",
+    {
+      "handle": "exemple-nappe",
       "seo_title": "Titre SEO optimisé (50-60 caractères)",
       "seo_description": "Meta description SEO (150-160 caractères)",
       "title": "Titre Shopify du produit",
@@ -653,8 +983,8 @@ RETOURNE un JSON valide avec ce format EXACT:
       "tags": "tag1, tag2, tag3",
       "image_alt_text": "Description de l'image pour SEO",
       "type": "NAPPES"
-    }},
-    {{
+    },
+    {
       "handle": "exemple-torchon",
       "seo_title": "...",
       "seo_description": "...",
@@ -663,16 +993,16 @@ RETOURNE un JSON valide avec ce format EXACT:
       "tags": "...",
       "image_alt_text": "...",
       "type": "TORCHONS"
-    }},
-    ... (pour TOUS les {len(products_data)} produits)
+    },
+    ... (pour TOUS les produits)
   ]
-}}
+}
 
 RÈGLES JSON STRICTES:
 - Utilise UNIQUEMENT des guillemets doubles " pour les clés et valeurs (JAMAIS de guillemets simples ')
 - Toutes les clés doivent être entre guillemets doubles: "handle", "seo_title", etc.
 - Pas de virgule après le dernier élément d'un objet ou tableau
-- Échappe les caractères spéciaux: \" pour guillemets, \\n pour retour à la ligne, \\t pour tabulation
+- Échappe les caractères spéciaux: \\" pour guillemets, \\n pour retour à la ligne, \\t pour tabulation
 - JAMAIS de vrais retours à la ligne dans les valeurs de chaînes (utilise \\n à la place)
 - Pour le HTML dans body_html, mets tout sur une seule ligne ou utilise des \\n
 - Retourne UNIQUEMENT le JSON, sans texte avant ou après
@@ -691,14 +1021,20 @@ INSTRUCTIONS CSV_TYPE (TRÈS IMPORTANT):
 - Si incertain, mets une confiance plus faible (0.6-0.7) mais propose quand même un csv_type
 
 CONTENU:
-⚠️ OBLIGATOIRE: Tu DOIS retourner EXACTEMENT {len(products_data)} produits dans le tableau "products"
-- Liste des handles à retourner: {', '.join(handles[:5])}{'...' if len(handles) > 5 else ''}
-- Compte de produits attendus: {len(products_data)}
 - Chaque produit DOIT avoir les 7 champs: seo_title, seo_description, title, body_html, tags, image_alt_text, type
 - type: Type de produit au PLURIEL, en MAJUSCULES, SANS ACCENTS (ex: "NAPPES", "TORCHONS", "PLAIDS", "SERVIETTES DE TABLE", "CHEMINS DE TABLE")
 - IMPORTANT: Analyser sémantiquement le Title (nom du produit) pour déterminer le type (ex: "Nappe Coton" → "NAPPES", "Torchon Éponge" → "TORCHONS")
 - Si des données manquent, génère quand même du contenu de qualité basé sur ce qui est disponible
 - NE SAUTE AUCUN PRODUIT, même si les données sont limitées
+"""
+    
+    def _get_batch_output_format(self, products_data: List[Dict[str, Any]]) -> str:
+        """Rappel des produits attendus pour le batch SEO (partie variable)."""
+        handles = [p.get('Handle', '') for p in products_data]
+        return f"""
+⚠️ OBLIGATOIRE: Tu DOIS retourner EXACTEMENT {len(products_data)} produits dans le tableau "products"
+- Liste des handles à retourner: {', '.join(handles[:5])}{'...' if len(handles) > 5 else ''}
+- Compte de produits attendus: {len(products_data)}
 
 VÉRIFICATION FINALE:
 Avant de retourner ta réponse, compte le nombre d'objets dans ton tableau "products".
@@ -0,0 +1,145 @@
+"""
+Réutilisation du contenu généré par code-barres (EAN/GTIN).
+
+Un même article (même gencode dans 'Variant Barcode') revient dans plusieurs
+imports : réexports, autres boutiques Shopify, autre fournisseur. Le contenu
+accepté (SEO, catégorie Google) est conservé par code-barres dans la table
+barcode_content et réappliqué sans appel IA quand la politique le permet :
+- réutilisation activée (config barcode_reuse_enabled, défaut: oui) ;
+- tous les champs demandés sont connus pour ce code-barres ;
+- chaque champ a moins de barcode_reuse_max_age_days jours (0 = sans limite) ;
+- si barcode_reuse_same_prompts est activé, les champs ont été générés avec
+  le même ensemble de prompts.
+
+Seuls les produits au statut 'completed' (contrôle qualité passé) alimentent
+la table : un contenu en erreur ou à revoir n'est jamais réutilisé.
+"""
+
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Any
+
+logger = logging.getLogger(__name__)
+
+BARCODE_FIELD = 'Variant Barcode'
+CATEGORY_FIELD = 'Google Shopping / Google Product Category'
+
+# Longueurs GTIN acceptées (EAN-8, UPC-A, EAN-13, GTIN-14)
+GTIN_MIN_LENGTH = 8
+GTIN_LENGTH = 14
+
+DEFAULT_MAX_AGE_DAYS = 180
+
+
+def normalize_barcode(value: Any) -> Optional[str]:
+    """
+    Normalise un code-barres en GTIN-14 (zéros à gauche), après contrôle de la clé.
+
+    Les zéros de tête perdus à l'import CSV (code lu comme nombre) sont
+    restaurés par le remplissage, qui ne change pas la clé de contrôle.
+
+    Args:
+        value: Valeur de 'Variant Barcode' (str, int ou float lu par pandas)
+
+    Returns:
+        GTIN-14, ou None si la valeur n'est pas un code-barres valide
+    """
+    if value is None:
+        return None
+    if isinstance(value, float):
+        if value != value or not value.is_integer():  # NaN ou décimal
+            return None
+        value = int(value)
+
+    text = str(value).strip()
+    if text.endswith('.0'):
+        text = text[:-2]
+    if not text.isdigit() or not GTIN_MIN_LENGTH <= len(text) <= GTIN_LENGTH:
+        return None
+
+    gtin = text.zfill(GTIN_LENGTH)
+    if int(gtin) == 0 or not _check_digit_ok(gtin):
+        return None
+    return gtin
+
+
+def _check_digit_ok(gtin: str) -> bool:
+    """Vérifie la clé de contrôle GTIN (modulo 10, poids 3/1 depuis la droite)."""
+    digits = [int(c) for c in gtin]
+    total = sum(d * (3 if i % 2 == 0 else 1) for i, d in enumerate(reversed(digits[:-1])))
+    return (10 - total % 10) % 10 == digits[-1]
+
+
+def product_barcodes(rows: List[Dict]) -> List[str]:
+    """
+    Codes-barres valides d'un produit (un par variante, sans doublon).
+
+    Args:
+        rows: Lignes CSV du produit
+
+    Returns:
+        GTIN-14 dans l'ordre des lignes
+    """
+    barcodes = (normalize_barcode(row['data'].get(BARCODE_FIELD)) for row in rows)
+    return list(dict.fromkeys(b for b in barcodes if b))
+
+
+def requested_fields(selected_fields: Dict[str, Any], seo_field_mapping: Dict[str, str]) -> List[str]:
+    """
+    Champs CSV produits par les agents sélectionnés.
+
+    Args:
+        selected_fields: Champs sélectionnés (format process_csv)
+        seo_field_mapping: Correspondance clé JSON SEO → champ CSV
+
+    Returns:
+        Liste des champs CSV
+    """
+    fields = []
+    seo = selected_fields.get('seo')
+    if isinstance(seo, dict):
+        if seo.get('enabled', True):
+            fields.extend(seo_field_mapping[key] for key in seo.get('fields', []) if key in seo_field_mapping)
+    elif seo:
+        fields.extend(seo_field_mapping.values())
+    if selected_fields.get('google_category'):
+        fields.append(CATEGORY_FIELD)
+    return fields
+
+
+def reusable_values(entry: Optional[Dict[str, Dict]], fields: List[str], prompt_set_id: int,
+                    max_age_days: int, same_prompts: bool,
+                    now: Optional[datetime] = None) -> Optional[Dict[str, str]]:
+    """
+    Applique la politique de réutilisation à une entrée de barcode_content.
+
+    Args:
+        entry: Champs connus {champ: {'value', 'prompt_set_id', 'updated_at'}}
+        fields: Champs demandés
+        prompt_set_id: Ensemble de prompts du traitement
+        max_age_days: Âge maximum d'un champ (0 = sans limite)
+        same_prompts: Exiger le même ensemble de prompts
+        now: Date de référence (tests)
+
+    Returns:
+        Valeurs {champ: valeur} à réappliquer, ou None s'il faut régénérer
+    """
+    if not entry or not fields:
+        return None
+    now = now or datetime.now()
+    values = {}
+    for field in fields:
+        stored = entry.get(field)
+        if not stored or not stored.get('value'):
+            return None
+        if same_prompts and stored.get('prompt_set_id') != prompt_set_id:
+            return None
+        if max_age_days > 0:
+            try:
+                updated_at = datetime.fromisoformat(stored['updated_at'])
+            except (KeyError, TypeError, ValueError):
+                return None
+            if now - updated_at > timedelta(days=max_age_days):
+                return None
+        values[field] = stored['value']
+    return values
@@ -0,0 +1,235 @@
+"""
+Constitution des batches de produits selon un budget de tokens.
+
+Au lieu d'un nombre fixe de produits par batch, chaque batch est rempli tant que
+l'estimation des tokens d'entrée et de sortie reste dans le budget du modèle.
+Le budget de sortie est ajusté automatiquement (par provider et modèle) à partir
+des réponses observées : réduit en cas de troncature ou de produits manquants,
+augmenté progressivement quand les batches pleins passent sans erreur.
+"""
+
+import json
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+
+from apps.ai_editor.agents import BATCH_MAX_OUTPUT_TOKENS, SEOAgent
+from apps.ai_editor.prompt_compaction import CHARS_PER_TOKEN, compact_product
+
+logger = logging.getLogger(__name__)
+
+# Caractères de prompt ajoutés par produit (séparateurs, libellés des champs)
+PRODUCT_PROMPT_OVERHEAD_CHARS = 400
+
+# Estimation de la sortie SEO d'un produit : champs courts + JSON, puis body_html
+SEO_FIXED_OUTPUT_CHARS = 700
+BODY_OUTPUT_MIN_CHARS = 1200
+BODY_OUTPUT_MAX_CHARS = 4000
+
+# Marge de sécurité sous la limite de sortie de la requête
+OUTPUT_SAFETY_RATIO = 0.85
+
+# Ajustement du budget (augmentation additive, diminution multiplicative)
+MIN_OUTPUT_BUDGET = 1000
+DECREASE_FACTOR = 0.7
+INCREASE_STEP_RATIO = 0.05
+MISSING_RATE_THRESHOLD = 0.1
+
+
+class BatchPacker:
+    """Découpe une liste de produits en batches selon un budget de tokens appris par modèle."""
+
+    def __init__(self, db, provider_name: str, model_name: Optional[str], max_batch_size: int,
+                 max_output_tokens: int = BATCH_MAX_OUTPUT_TOKENS,
+                 field_limits: Optional[Dict[str, int]] = None):
+        """
+        Initialise le packer.
+
+        Args:
+            db: Instance de AIPromptsDB (budget persisté dans app_config)
+            provider_name: Nom du provider (openai, claude, gemini)
+            model_name: Nom du modèle
+            max_batch_size: Nombre maximum de produits par batch (batch_size configuré)
+            max_output_tokens: Limite de tokens en sortie d'une requête batch
+            field_limits: Longueurs max des champs dans le prompt (défaut: celles de l'agent SEO)
+        """
+        self.db = db
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_output_budget = int(max_output_tokens * OUTPUT_SAFETY_RATIO)
+        self.input_budget = db.get_config_int('batch_input_token_budget', default=60000)
+        self.config_key = f"batch_budget_{provider_name}_{model_name or 'default'}"
+        self.field_limits = field_limits if field_limits is not None else SEOAgent.FIELD_LIMITS
+        self.state = self._load_state()
+
+        self._last_batch_full = False
+        self._raw_estimates: Dict[str, Tuple[int, int]] = {}
+
+    def _load_state(self) -> Dict[str, Any]:
+        """Charge le budget appris pour ce provider/modèle (ou les valeurs initiales)."""
+        state = {
+            'output_budget': self.max_output_budget,
+            'output_scale': 1.0,
+            'batches': 0,
+            'truncated': 0,
+            'missing': 0
+        }
+        raw = self.db.get_config(self.config_key)
+        if raw:
+            try:
+                state.update(json.loads(raw))
+            except (ValueError, TypeError):
+                logger.warning(f"Budget de batch illisible pour {self.config_key}, réinitialisation")
+
+        state['output_budget'] = max(MIN_OUTPUT_BUDGET, min(int(state['output_budget']), self.max_output_budget))
+        return state
+
+    def _save_state(self):
+        """Persiste le budget appris dans app_config."""
+        self.db.save_config(self.config_key, json.dumps(self.state))
+
+    @property
+    def output_budget(self) -> int:
+        """Budget de tokens de sortie actuel pour un batch."""
+        return self.state['output_budget']
+
+    def _raw_estimate(self, product_data: Dict[str, Any]) -> Tuple[int, int]:
+        """
+        Estime les caractères du prompt et de la réponse d'un produit (avant calibration).
+
+        Args:
+            product_data: Données CSV du produit
+
+        Returns:
+            Tuple (tokens d'entrée, caractères de sortie)
+        """
+        # Le prompt contient les données compactées (HTML → texte, champs limités)
+        input_chars = PRODUCT_PROMPT_OVERHEAD_CHARS
+        for field, value in compact_product(product_data, self.field_limits).items():
+            input_chars += len(field) + len(str(value)) + 3
+
+        body_len = len(str(product_data.get('Body (HTML)', '') or ''))
+        body_output = min(max(body_len, BODY_OUTPUT_MIN_CHARS), BODY_OUTPUT_MAX_CHARS)
+        return input_chars // CHARS_PER_TOKEN, SEO_FIXED_OUTPUT_CHARS + body_output
+
+    def estimate_product(self, product_data: Dict[str, Any], handle: Optional[str] = None) -> Tuple[int, int]:
+        """
+        Estime les tokens d'entrée et de sortie d'un produit.
+
+        Args:
+            product_data: Données CSV du produit
+            handle: Handle du produit (mémorise l'estimation brute)
+
+        Returns:
+            Tuple (tokens d'entrée, tokens de sortie)
+        """
+        if handle is not None and handle in self._raw_estimates:
+            input_tokens, output_chars = self._raw_estimates[handle]
+        else:
+            input_tokens, output_chars = self._raw_estimate(product_data)
+            if handle is not None:
+                self._raw_estimates[handle] = (input_tokens, output_chars)
+
+        output_tokens = int(output_chars / CHARS_PER_TOKEN * self.state['output_scale'])
+        return input_tokens, max(1, output_tokens)
+
+    def _take(self, handles: List[str], start: int, products: Dict[str, Dict[str, Any]]) -> Tuple[int, bool]:
+        """
+        Détermine la fin du batch commençant à l'index start.
+
+        Returns:
+            Tuple (index de fin exclu, True si le batch est limité par le budget)
+        """
+        input_total = 0
+        output_total = 0
+        end = start
+
+        while end < len(handles) and end - start < self.max_batch_size:
+            handle = handles[end]
+            input_tokens, output_tokens = self.estimate_product(products.get(handle, {}), handle)
+            if end > start and (output_total + output_tokens > self.output_budget
+                                or input_total + input_tokens > self.input_budget):
+                return end, True
+
+            input_total += input_tokens
+            output_total += output_tokens
+            end += 1
+
+        return end, False
+
+    def next_batch(self, handles: List[str], products: Dict[str, Dict[str, Any]]) -> List[str]:
+        """
+        Prend en tête de liste les produits qui tiennent dans le budget.
+
+        Un batch contient toujours au moins un produit, même si celui-ci dépasse le budget.
+
+        Args:
+            handles: Handles restant à traiter (dans l'ordre)
+            products: Données CSV par handle
+
+        Returns:
+            Handles du prochain batch
+        """
+        end, self._last_batch_full = self._take(handles, 0, products)
+        return handles[:end]
+
+    def plan(self, handles: List[str], products: Dict[str, Dict[str, Any]]) -> List[List[str]]:
+        """
+        Découpe tous les handles avec le budget actuel (pour estimer le nombre de batches).
+
+        Args:
+            handles: Handles à traiter
+            products: Données CSV par handle
+
+        Returns:
+            Liste des batches prévus
+        """
+        batches = []
+        start = 0
+        while start < len(handles):
+            end, _ = self._take(handles, start, products)
+            batches.append(handles[start:end])
+            start = end
+        return batches
+
+    def record_batch(self, stats: Optional[Dict[str, Any]], estimated_output_tokens: int = 0):
+        """
+        Ajuste le budget à partir du résultat d'un batch.
+
+        Args:
+            stats: Statistiques du batch (requested, returned, truncated, output_chars),
+                   voir BaseAIAgent.last_batch_stats
+            estimated_output_tokens: Tokens de sortie estimés pour ce batch
+        """
+        if not stats or not stats.get('requested'):
+            return
+
+        requested = stats['requested']
+        returned = stats.get('returned', 0)
+        truncated = bool(stats.get('truncated'))
+        missing_rate = max(0, requested - returned) / requested
+        previous_budget = self.output_budget
+
+        self.state['batches'] += 1
+        if truncated:
+            self.state['truncated'] += 1
+        if returned < requested:
+            self.state['missing'] += 1
+
+        # Calibrer l'estimation par produit sur la taille réelle des réponses complètes
+        output_chars = stats.get('output_chars', 0)
+        if not truncated and returned and estimated_output_tokens and output_chars:
+            observed_ratio = (output_chars / CHARS_PER_TOKEN) / estimated_output_tokens * (requested / returned)
+            scale = self.state['output_scale'] * observed_ratio
+            self.state['output_scale'] = round(0.7 * self.state['output_scale'] + 0.3 * scale, 3)
+            self.state['output_scale'] = min(max(self.state['output_scale'], 0.3), 3.0)
+
+        if truncated or missing_rate > MISSING_RATE_THRESHOLD:
+            self.state['output_budget'] = max(MIN_OUTPUT_BUDGET, int(previous_budget * DECREASE_FACTOR))
+        elif self._last_batch_full and returned == requested:
+            step = int(self.max_output_budget * INCREASE_STEP_RATIO)
+            self.state['output_budget'] = min(self.max_output_budget, previous_budget + step)
+
+        if self.state['output_budget'] != previous_budget:
+            logger.info(f"📦 Budget batch {self.config_key}: {previous_budget} → {self.state['output_budget']} tokens "
+                        f"(retournés {returned}/{requested}, tronqué: {truncated})")
+
+        self._save_state()
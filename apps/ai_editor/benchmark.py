@@ -0,0 +1,319 @@
+"""
+Benchmark hors ligne du traitement CSV (débit de process_csv de bout en bout).
+
+Les appels LLM passent par le transport de utils.llm_transport :
+    # 1. Enregistrer une cassette avec les vraies clés de la base ai_prompts
+    python -m apps.ai_editor.benchmark fixture.csv --mode record --cassette bench.jsonl --model gpt-4o-mini
+    # 2. Rejouer sans réseau (latence enregistrée, ou --latency 0 pour mesurer le pipeline seul)
+    python -m apps.ai_editor.benchmark fixture.csv --mode replay --cassette bench.jsonl --model gpt-4o-mini --repeat 5
+    # Sans cassette : réponses synthétiques conformes aux schémas
+    python -m apps.ai_editor.benchmark fixture.csv --mode synthetic --generate 500 --model gpt-4o-mini
+
+Chaque exécution travaille sur une copie temporaire de la base (prompts, taxonomie,
+configuration) : la base de production n'est jamais modifiée. Le résultat (médiane
+des exécutions) est écrit sur la sortie standard, en texte ou en JSON avec --json.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import sqlite3
+import logging
+import argparse
+import statistics
+import tempfile
+from typing import Dict, List, Optional, Any
+
+import pandas as pd
+
+from apps.ai_editor.db import AIPromptsDB, DEFAULT_DB_PATH
+from apps.ai_editor.processor import CSVAIProcessor, SEO_FIELD_MAPPING
+from apps.ai_editor.cli import FIELD_CHOICES, EXIT_OK, EXIT_FAILED, EXIT_USAGE, build_selected_fields, _configure_logging
+from utils import llm_telemetry, llm_transport
+
+logger = logging.getLogger(__name__)
+
+# Clé factice des fournisseurs en replay/synthetic (aucun appel réseau)
+BENCHMARK_API_KEY = 'benchmark'
+
+# Métriques dont la médiane est rapportée
+METRICS = ('seconds', 'products_per_second', 'llm_calls', 'llm_seconds', 'overhead_seconds',
+           'prompt_tokens', 'completion_tokens')
+
+
+def generate_fixture_csv(csv_path: str, count: int):
+    """
+    Écrit un CSV Shopify de démonstration.
+
+    Args:
+        csv_path: Chemin du CSV à créer
+        count: Nombre de produits
+    """
+    kinds = ['Nappe', 'Serviette', 'Plaid', 'Coussin', 'Torchon']
+    pd.DataFrame([
+        {
+            'Handle': f"{kinds[i % len(kinds)].lower()}-benchmark-{i + 1}",
+            'Title': f"{kinds[i % len(kinds)]} benchmark {i + 1}",
+            'Type': kinds[i % len(kinds)],
+            'Vendor': 'Garnier',
+            'Body (HTML)': '',
+            'Tags': ''
+        }
+        for i in range(count)
+    ]).to_csv(csv_path, index=False)
+
+
+def _copy_database(source_path: Optional[str], target_path: str):
+    """Copie la base source (sauvegarde SQLite, cohérente même si la base est ouverte ailleurs)."""
+    if not source_path or not os.path.isfile(source_path):
+        return
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(target_path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+def _run_once(
+    csv_path: str,
+    source_db: Optional[str],
+    provider: str,
+    model: str,
+    selected_fields: Dict[str, Any],
+    prompt_set_id: Optional[int],
+    batch_size: Optional[int],
+    fake_credentials: bool,
+    log_callback=None
+) -> Dict[str, Any]:
+    """Exécute process_csv sur une copie de la base et mesure le traitement."""
+    tmp_dir = tempfile.mkdtemp(prefix='ai_benchmark_')
+    try:
+        db_path = os.path.join(tmp_dir, 'ai_prompts.db')
+        _copy_database(source_db, db_path)
+        with AIPromptsDB(db_path) as db:
+            if fake_credentials:
+                db.save_ai_credentials(provider, BENCHMARK_API_KEY, model)
+                if selected_fields.get('google_category'):
+                    db.save_ai_credentials('gemini', BENCHMARK_API_KEY, db.get_ai_model('gemini'))
+            if prompt_set_id is None:
+                prompt_set = db.get_default_prompt_set()
+                prompt_set_id = prompt_set['id'] if prompt_set else db.create_prompt_set(
+                    "Benchmark", "Tu es un expert e-commerce.",
+                    "Génère le SEO du produit.", "Choisis la catégorie Google Shopping du produit."
+                )
+            if batch_size:
+                db.save_config('batch_size', batch_size)
+            db.save_config('llm_telemetry_enabled', True)
+
+            processor = CSVAIProcessor(db)
+            csv_import_id = processor.csv_storage.import_csv(csv_path)
+            products = len(processor.csv_storage.get_unique_handles(csv_import_id))
+
+            started_at = time.time()
+            started = time.monotonic()
+            success, error, changes, _ = processor.process_csv(
+                csv_path, prompt_set_id, provider, model, selected_fields,
+                log_callback=log_callback, csv_import_id=csv_import_id
+            )
+            seconds = time.monotonic() - started
+
+            llm_telemetry.flush()
+            store = llm_telemetry.LLMCallStore(db_path)
+            try:
+                calls = store.get_calls(since=started_at - 1)
+            finally:
+                store.close()
+            llm_telemetry.configure(None)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    llm_seconds = sum(call['latency_ms'] or 0 for call in calls) / 1000
+    return {
+        'success': success,
+        'error': error,
+        'products': products,
+        'changed': len(changes),
+        'seconds': seconds,
+        'products_per_second': products / seconds if seconds else 0.0,
+        'llm_calls': len(calls),
+        'llm_seconds': llm_seconds,
+        'overhead_seconds': max(0.0, seconds - llm_seconds),
+        'prompt_tokens': sum(call['prompt_tokens'] or 0 for call in calls),
+        'completion_tokens': sum(call['completion_tokens'] or 0 for call in calls)
+    }
+
+
+def run_benchmark(
+    csv_path: str,
+    mode: str,
+    provider: str,
+    model: str,
+    selected_fields: Dict[str, Any],
+    cassette_path: Optional[str] = None,
+    latency_scale: float = 1.0,
+    synthetic_latency_ms: int = 0,
+    source_db: Optional[str] = None,
+    prompt_set_id: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    repeat: int = 1,
+    log_callback=None
+) -> Dict[str, Any]:
+    """
+    Mesure le débit de process_csv avec le transport LLM demandé.
+
+    Args:
+        csv_path: CSV à traiter
+        mode: Mode du transport (record, replay, synthetic)
+        provider: Fournisseur IA pour le SEO
+        model: Modèle IA
+        selected_fields: Champs sélectionnés (voir cli.build_selected_fields)
+        cassette_path: Cassette (record, replay)
+        latency_scale: Multiplicateur de la latence enregistrée (replay)
+        synthetic_latency_ms: Latence de chaque appel synthétique
+        source_db: Base copiée pour chaque exécution (None = base vierge)
+        prompt_set_id: Ensemble de prompts (None = défaut, ou ensemble minimal)
+        batch_size: Taille des batches (None = configuration de la base)
+        repeat: Nombre d'exécutions (1 en record)
+        log_callback: Callback pour les logs du traitement
+
+    Returns:
+        Dict {'mode', 'runs': [mesures], 'median': {métrique: médiane}, 'transport': compteurs}
+    """
+    if mode == llm_transport.MODE_RECORD:
+        repeat = 1
+        if cassette_path and os.path.exists(cassette_path):
+            os.remove(cassette_path)
+
+    transport = llm_transport.configure(mode, cassette_path, latency_scale, synthetic_latency_ms)
+    runs = []
+    try:
+        for index in range(max(1, repeat)):
+            if mode == llm_transport.MODE_REPLAY and index:
+                # Chaque exécution rejoue la cassette depuis le début
+                transport = llm_transport.configure(mode, cassette_path, latency_scale)
+            run = _run_once(csv_path, source_db, provider, model, selected_fields, prompt_set_id,
+                            batch_size, fake_credentials=mode != llm_transport.MODE_RECORD,
+                            log_callback=log_callback)
+            logger.info(f"⏱️ Exécution {index + 1}: {run['products']} produit(s) en {run['seconds']:.2f}s")
+            runs.append(run)
+    finally:
+        llm_transport.configure(None)
+
+    return {
+        'mode': mode,
+        'runs': runs,
+        'median': {metric: statistics.median(run[metric] for run in runs) for metric in METRICS},
+        'transport': dict(transport.stats)
+    }
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    """Résumé lisible d'un benchmark."""
+    median = report['median']
+    last = report['runs'][-1]
+    lines = [
+        f"Mode {report['mode']}: {len(report['runs'])} exécution(s), {last['products']} produit(s), "
+        f"{last['changed']} modifié(s)",
+        f"  Durée médiane: {median['seconds']:.2f}s ({median['products_per_second']:.2f} produits/s)",
+        f"  Appels LLM: {median['llm_calls']:.0f} ({median['llm_seconds']:.2f}s), "
+        f"hors LLM: {median['overhead_seconds']:.2f}s",
+        f"  Tokens: {median['prompt_tokens']:.0f} en entrée, {median['completion_tokens']:.0f} en sortie"
+    ]
+    if not all(run['success'] for run in report['runs']):
+        lines.append(f"  ⚠️ Échec: {next(run['error'] for run in report['runs'] if not run['success'])}")
+    return '\n'.join(lines)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Construit le parser des arguments de la ligne de commande."""
+    parser = argparse.ArgumentParser(
+        prog='python -m apps.ai_editor.benchmark',
+        description='Mesure le débit du traitement CSV avec des appels LLM enregistrés, rejoués ou synthétiques'
+    )
+    parser.add_argument('csv_path', help='CSV de référence (créé avec --generate)')
+    parser.add_argument('--mode', default=llm_transport.MODE_SYNTHETIC, choices=llm_transport.MODES,
+                        help='Transport des appels LLM (défaut: synthetic)')
+    parser.add_argument('--cassette', help='Cassette des appels (requise en record et replay)')
+    parser.add_argument('--latency', type=float, default=1.0,
+                        help='Multiplicateur de la latence enregistrée en replay (défaut: 1.0, 0 = aucune)')
+    parser.add_argument('--synthetic-latency-ms', type=int, default=0,
+                        help='Latence simulée de chaque appel synthétique (défaut: 0)')
+    parser.add_argument('--generate', type=int, metavar='N', help='Écrit d\'abord un CSV de N produits')
+    parser.add_argument('--provider', default='openai', choices=['openai', 'claude', 'gemini'],
+                        help='Fournisseur IA pour le SEO (défaut: openai)')
+    parser.add_argument('--model', help='Modèle IA (défaut: modèle sauvegardé pour le fournisseur)')
+    parser.add_argument('--fields', default='seo',
+                        help=f'Agents à exécuter ({", ".join(FIELD_CHOICES)}; défaut: seo)')
+    parser.add_argument('--seo-fields', help=f'Champs SEO à générer ({", ".join(SEO_FIELD_MAPPING)}; défaut: tous)')
+    parser.add_argument('--prompt-set', type=int, help='ID de l\'ensemble de prompts (défaut: ensemble par défaut)')
+    parser.add_argument('--batch-size', type=int, help='Taille des batches (défaut: configuration de la base)')
+    parser.add_argument('--repeat', type=int, default=1, help='Nombre d\'exécutions (médiane rapportée)')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH,
+                        help=f'Base copiée pour chaque exécution (défaut: {DEFAULT_DB_PATH})')
+    parser.add_argument('--json', action='store_true', help='Résultat en JSON')
+    parser.add_argument('--verbose', '-v', action='store_true', help='Logs détaillés sur la sortie d\'erreur')
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Point d'entrée de la ligne de commande.
+
+    Args:
+        argv: Arguments (défaut: sys.argv[1:])
+
+    Returns:
+        Code de sortie
+    """
+    parser = build_parser()
+    try:
+        args = parser.parse_args(argv)
+    except SystemExit as e:
+        return EXIT_USAGE if e.code else EXIT_OK
+
+    _configure_logging(args.verbose)
+
+    if args.mode != llm_transport.MODE_SYNTHETIC and not args.cassette:
+        print(f"--cassette est requis en mode {args.mode}", file=sys.stderr)
+        return EXIT_USAGE
+    if args.generate:
+        generate_fixture_csv(args.csv_path, args.generate)
+    if not os.path.isfile(args.csv_path):
+        print(f"Fichier introuvable: {args.csv_path}", file=sys.stderr)
+        return EXIT_USAGE
+    try:
+        selected_fields = build_selected_fields(args.fields, args.seo_fields)
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return EXIT_USAGE
+
+    source_db = args.db if os.path.isfile(args.db) else None
+    model = args.model
+    if not model and source_db:
+        with AIPromptsDB(source_db) as db:
+            model = db.get_ai_model(args.provider)
+    if not model:
+        print(f"Aucun modèle pour {args.provider}: utilisez --model", file=sys.stderr)
+        return EXIT_USAGE
+
+    try:
+        report = run_benchmark(
+            os.path.abspath(args.csv_path), args.mode, args.provider, model, selected_fields,
+            cassette_path=args.cassette, latency_scale=args.latency,
+            synthetic_latency_ms=args.synthetic_latency_ms, source_db=source_db,
+            prompt_set_id=args.prompt_set, batch_size=args.batch_size, repeat=args.repeat
+        )
+    except (FileNotFoundError, llm_transport.CassetteMissError) as e:
+        print(str(e), file=sys.stderr)
+        return EXIT_FAILED
+
+    print(json.dumps(report, ensure_ascii=False, indent=2) if args.json else format_report(report))
+    return EXIT_OK if all(run['success'] for run in report['runs']) else EXIT_FAILED
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,345 @@
+"""
+Traitement IA d'un CSV en ligne de commande (serveur sans interface graphique, cron).
+
+Exemples :
+    python -m apps.ai_editor.cli produits.csv --provider openai --model gpt-4o-mini --fields seo
+    python -m apps.ai_editor.cli produits.csv --fields seo,google_category --workers 4 --resume
+
+La progression est écrite sur la sortie standard en JSON lines (un événement par ligne :
+start, log, progress, done, error), les logs techniques sur la sortie d'erreur.
+
+Avec --workers N, les produits sont répartis entre N processus qui écrivent dans la
+même base ai_prompts (chaque worker a son propre run, repris avec --resume si
+le nombre de workers est inchangé).
+
+Codes de sortie : 0 succès, 1 échec, 2 arguments invalides, 130 interruption.
+"""
+
+import os
+import sys
+import json
+import queue
+import signal
+import logging
+import argparse
+import threading
+import multiprocessing
+from typing import Dict, List, Optional, Any, Callable
+
+from apps.ai_editor.db import AIPromptsDB, DEFAULT_DB_PATH
+from apps.ai_editor.processor import CSVAIProcessor, SEO_FIELD_MAPPING
+
+logger = logging.getLogger(__name__)
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_INTERRUPTED = 130
+
+FIELD_CHOICES = ('seo', 'google_category')
+
+
+def emit(event: str, stream=None, **data):
+    """
+    Écrit un événement de progression en JSON (une ligne).
+
+    Args:
+        event: Type d'événement (start, log, progress, done, error)
+        stream: Flux de sortie (sortie standard par défaut)
+        **data: Données de l'événement
+    """
+    stream = stream or sys.stdout
+    stream.write(json.dumps({'event': event, **data}, ensure_ascii=False) + '\n')
+    stream.flush()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Construit le parser des arguments de la ligne de commande."""
+    parser = argparse.ArgumentParser(
+        prog='python -m apps.ai_editor.cli',
+        description='Traite un CSV Shopify avec les agents IA (sans interface graphique)'
+    )
+    parser.add_argument('csv_path', help='Chemin du CSV à traiter')
+    parser.add_argument(
+        '--prompt-set', type=int,
+        help='ID de l\'ensemble de prompts (défaut: ensemble par défaut)'
+    )
+    parser.add_argument(
+        '--provider', default='openai', choices=['openai', 'claude', 'gemini'],
+        help='Fournisseur IA pour le SEO (défaut: openai)'
+    )
+    parser.add_argument('--model', help='Modèle IA (défaut: modèle sauvegardé pour le fournisseur)')
+    parser.add_argument(
+        '--fields', default='seo',
+        help=f'Agents à exécuter, séparés par des virgules ({", ".join(FIELD_CHOICES)}; défaut: seo)'
+    )
+    parser.add_argument(
+        '--seo-fields',
+        help=f'Champs SEO à générer ({", ".join(SEO_FIELD_MAPPING)}; défaut: tous)'
+    )
+    parser.add_argument('--handles', help='Handles à traiter, séparés par des virgules (défaut: tous)')
+    parser.add_argument(
+        '--workers', type=int, default=1,
+        help='Nombre de processus de traitement en parallèle (défaut: 1)'
+    )
+    parser.add_argument('--resume', action='store_true', help='Reprendre le dernier traitement interrompu')
+    parser.add_argument(
+        '--deferred', action='store_true',
+        help='SEO via l\'API batch du fournisseur (résultats en différé, coût réduit)'
+    )
+    parser.add_argument('--enable-search', action='store_true', help='Activer la recherche Internet (Perplexity)')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help=f'Base ai_prompts (défaut: {DEFAULT_DB_PATH})')
+    parser.add_argument('--verbose', '-v', action='store_true', help='Logs détaillés sur la sortie d\'erreur')
+    return parser
+
+
+def build_selected_fields(fields: str, seo_fields: Optional[str]) -> Dict[str, Any]:
+    """
+    Construit les champs sélectionnés au format de la fenêtre IA.
+
+    Args:
+        fields: Agents séparés par des virgules
+        seo_fields: Champs SEO séparés par des virgules (None = tous)
+
+    Returns:
+        Dict {'seo': {'enabled', 'fields'}, 'google_category': bool}
+
+    Raises:
+        ValueError: Si un agent ou un champ est inconnu
+    """
+    agents = _split(fields)
+    unknown = [f for f in agents if f not in FIELD_CHOICES]
+    if unknown or not agents:
+        raise ValueError(f"Agents invalides: {', '.join(unknown) or '(aucun)'}")
+
+    seo_field_keys = _split(seo_fields) if seo_fields else list(SEO_FIELD_MAPPING)
+    unknown = [f for f in seo_field_keys if f not in SEO_FIELD_MAPPING]
+    if unknown:
+        raise ValueError(f"Champs SEO invalides: {', '.join(unknown)}")
+
+    return {
+        'seo': {'enabled': 'seo' in agents, 'fields': seo_field_keys if 'seo' in agents else []},
+        'google_category': 'google_category' in agents
+    }
+
+
+def partition_handles(handles: List[str], workers: int) -> List[List[str]]:
+    """
+    Répartit les handles entre les workers (stable pour un même nombre de workers,
+    ce qui permet de reprendre chaque run).
+
+    Args:
+        handles: Handles à traiter
+        workers: Nombre de workers
+
+    Returns:
+        Liste des handles de chaque worker (parts vides retirées)
+    """
+    ordered = sorted(handles)
+    return [part for part in (ordered[i::workers] for i in range(workers)) if part]
+
+
+def run_job(job: Dict[str, Any], send: Callable[..., None], cancel_event) -> Dict[str, Any]:
+    """
+    Exécute process_csv pour une part des produits.
+
+    Args:
+        job: Paramètres du traitement (voir main)
+        send: Fonction d'émission des événements (event, **data)
+        cancel_event: Événement d'annulation (threading ou multiprocessing)
+
+    Returns:
+        Résumé {'worker', 'success', 'cancelled', 'processed', 'processing_result_id'}
+    """
+    worker = job['worker']
+    db = AIPromptsDB(job['db_path'])
+    try:
+        processor = CSVAIProcessor(db)
+        success, _, changes, processing_result_id = processor.process_csv(
+            job['csv_path'],
+            job['prompt_set_id'],
+            job['provider'],
+            job['model'],
+            job['selected_fields'],
+            set(job['handles']) if job['handles'] else None,
+            progress_callback=lambda message, current, total: send(
+                'progress', worker=worker, message=message, current=current, total=total
+            ),
+            log_callback=lambda message: send('log', worker=worker, message=message),
+            cancel_check=cancel_event.is_set,
+            enable_search=job['enable_search'],
+            csv_import_id=job['csv_import_id'],
+            resume=job['resume'],
+            deferred=job['deferred']
+        )
+    finally:
+        db.close()
+
+    summary = {
+        'worker': worker,
+        'success': success,
+        'cancelled': cancel_event.is_set(),
+        'processed': len(changes),
+        'processing_result_id': processing_result_id
+    }
+    send('done', **summary)
+    return summary
+
+
+def _worker_main(job: Dict[str, Any], events, cancel_event):
+    """Point d'entrée d'un processus worker : événements transmis au processus principal."""
+    # L'interruption (Ctrl+C) est gérée par le processus principal via cancel_event
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _configure_logging(job['verbose'])
+    try:
+        run_job(job, lambda event, **data: events.put((event, data)), cancel_event)
+    except Exception as e:
+        logger.error(f"Worker {job['worker']}: {e}", exc_info=True)
+        events.put(('done', {'worker': job['worker'], 'success': False, 'cancelled': False,
+                             'processed': 0, 'processing_result_id': None, 'error': str(e)}))
+
+
+def _run_workers(jobs: List[Dict[str, Any]], cancel_event) -> List[Dict[str, Any]]:
+    """Lance un processus par job et relaie leurs événements sur la sortie standard."""
+    context = multiprocessing.get_context('spawn')
+    events = context.Queue()
+    worker_cancel = context.Event()
+    processes = [context.Process(target=_worker_main, args=(job, events, worker_cancel)) for job in jobs]
+    for process in processes:
+        process.start()
+
+    summaries = []
+    while len(summaries) < len(processes):
+        try:
+            event, data = events.get(timeout=0.5)
+        except queue.Empty:
+            if cancel_event.is_set():
+                worker_cancel.set()
+            if not any(p.is_alive() for p in processes) and events.empty():
+                break
+            continue
+        emit(event, **data)
+        if event == 'done':
+            summaries.append(data)
+
+    for process in processes:
+        process.join()
+    return summaries
+
+
+def _configure_logging(verbose: bool):
+    """Logs techniques sur la sortie d'erreur (la sortie standard est réservée au JSON)."""
+    logging.basicConfig(
+        level=logging.INFO if verbose else logging.WARNING,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        stream=sys.stderr
+    )
+
+
+def _split(value: Optional[str]) -> List[str]:
+    """Découpe une liste séparée par des virgules."""
+    return [item.strip() for item in (value or '').split(',') if item.strip()]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Point d'entrée de la ligne de commande.
+
+    Args:
+        argv: Arguments (défaut: sys.argv[1:])
+
+    Returns:
+        Code de sortie
+    """
+    parser = build_parser()
+    try:
+        args = parser.parse_args(argv)
+    except SystemExit as e:
+        return EXIT_USAGE if e.code else EXIT_OK
+
+    _configure_logging(args.verbose)
+
+    csv_path = os.path.abspath(args.csv_path)
+    if not os.path.isfile(csv_path):
+        emit('error', message=f"Fichier introuvable: {csv_path}")
+        return EXIT_USAGE
+    if args.workers < 1:
+        emit('error', message="--workers doit être supérieur ou égal à 1")
+        return EXIT_USAGE
+    try:
+        selected_fields = build_selected_fields(args.fields, args.seo_fields)
+    except ValueError as e:
+        emit('error', message=str(e))
+        return EXIT_USAGE
+
+    # Préparation dans le processus principal : prompts, modèle, import du CSV
+    with AIPromptsDB(args.db) as db:
+        if args.prompt_set is not None:
+            prompt_set = db.get_prompt_set(args.prompt_set)
+        else:
+            prompt_set = db.get_default_prompt_set()
+        if not prompt_set:
+            emit('error', message="Ensemble de prompts introuvable")
+            return EXIT_USAGE
+
+        model = args.model or db.get_ai_model(args.provider)
+        if not model:
+            emit('error', message=f"Aucun modèle pour {args.provider}: utilisez --model")
+            return EXIT_USAGE
+
+        processor = CSVAIProcessor(db)
+        existing = db.conn.execute(
+            'SELECT id FROM csv_imports WHERE original_file_path = ?', (csv_path,)
+        ).fetchone()
+        if args.resume and existing:
+            # Pas de réimport : les lignes gardent les résultats du traitement interrompu
+            csv_import_id = existing['id']
+        else:
+            csv_import_id = processor.csv_storage.import_csv(csv_path)
+
+        handles = _split(args.handles) or None
+        if args.workers > 1:
+            handles = handles or processor.csv_storage.get_unique_handles(csv_import_id)
+            parts = partition_handles(handles, args.workers)
+        else:
+            parts = [handles]
+
+    jobs = [{
+        'worker': worker,
+        'db_path': args.db,
+        'csv_path': csv_path,
+        'csv_import_id': csv_import_id,
+        'prompt_set_id': prompt_set['id'],
+        'provider': args.provider,
+        'model': model,
+        'selected_fields': selected_fields,
+        'handles': part,
+        'resume': args.resume,
+        'deferred': args.deferred,
+        'enable_search': args.enable_search,
+        'verbose': args.verbose
+    } for worker, part in enumerate(parts)]
+
+    emit('start', csv_path=csv_path, csv_import_id=csv_import_id, prompt_set_id=prompt_set['id'],
+         provider=args.provider, model=model, fields=selected_fields, workers=len(jobs), resume=args.resume)
+
+    # Ctrl+C : annulation propre (runs marqués 'cancelled', repris avec --resume)
+    cancel_event = threading.Event()
+    previous_handler = signal.signal(signal.SIGINT, lambda signum, frame: cancel_event.set())
+    try:
+        if len(jobs) == 1:
+            summaries = [run_job(jobs[0], emit, cancel_event)]
+        else:
+            summaries = _run_workers(jobs, cancel_event)
+    finally:
+        signal.signal(signal.SIGINT, previous_handler)
+
+    if cancel_event.is_set() or any(s.get('cancelled') for s in summaries):
+        return EXIT_INTERRUPTED
+    if len(summaries) == len(jobs) and all(s.get('success') for s in summaries):
+        return EXIT_OK
+    return EXIT_FAILED
+
+
+if __name__ == '__main__':
+    sys.exit(main())
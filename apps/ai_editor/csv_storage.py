@@ -183,6 +183,9 @@ class CSVStorage:
             row_dict = dict(row)
             # Décoder le JSON
             row_dict['data'] = json.loads(row_dict['data_json'])
+            # Écritures en attente dans l'unité de travail du batch
+            if self.db.uow is not None:
+                self.db.uow.overlay_row(row_dict)
             rows.append(row_dict)
         
         return rows
@@ -214,6 +217,11 @@ class CSVStorage:
             csv_row_id: ID de la ligne à mettre à jour
             field_updates: Dictionnaire {field_name: new_value}
         """
+        if self.db.uow is not None:
+            # Fusionné avec les autres mises à jour de la ligne, écrit au flush du batch
+            self.db.uow.update_row(csv_row_id, field_updates)
+            return
+        
         cursor = self.db.conn.cursor()
         
         # Récupérer la ligne actuelle
@@ -250,6 +258,10 @@ class CSVStorage:
             error_message: Message d'erreur court (optionnel)
             ai_explanation: Explication complète de l'IA (optionnel)
         """
+        if self.db.uow is not None:
+            self.db.uow.set_row_status(csv_row_id, status, error_message, ai_explanation)
+            return
+        
         cursor = self.db.conn.cursor()
         
         cursor.execute('''
@@ -283,6 +295,8 @@ class CSVStorage:
         
         row_dict = dict(row)
         row_dict['data'] = json.loads(row_dict['data_json'])
+        if self.db.uow is not None:
+            self.db.uow.overlay_row(row_dict)
         return row_dict
     
     def get_row_id_by_handle(self, csv_import_id: int, handle: str) -> Optional[int]:
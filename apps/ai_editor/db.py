@@ -6,10 +6,15 @@ import sqlite3
 import json
 import logging
 import sys
+from contextlib import contextmanager
 from typing import List, Dict, Optional, Any, Tuple
 from datetime import datetime
 from pathlib import Path
 
+from apps.ai_editor.rule_engine import get_rule_engine, invalidate_rule_engine, RULES_VERSION_KEY
+from apps.ai_editor.unit_of_work import BatchUnitOfWork
+from apps.ai_editor.taxonomy_tree import TaxonomyTree, DEFAULT_MAX_BRANCHES
+
 logger = logging.getLogger(__name__)
 
 # Chemin par défaut de la base de données
@@ -28,6 +33,9 @@ def get_default_db_path():
 
 DEFAULT_DB_PATH = get_default_db_path()
 
+# Délai d'attente (secondes) quand la base est verrouillée par un autre processus
+SQLITE_BUSY_TIMEOUT = 30
+
 
 class AIPromptsDB:
     """Gestionnaire de base de données pour les prompts IA et les imports CSV."""
@@ -36,15 +44,21 @@ class AIPromptsDB:
         """Initialise la connexion à la base de données."""
         self.db_path = db_path
         self.conn = None
+        self.uow: Optional[BatchUnitOfWork] = None  # Unité de travail active (écritures différées)
+        self._taxonomy_tree: Optional[TaxonomyTree] = None  # Index de la taxonomie (sélection hiérarchique)
         self._init_db()
     
     def _init_db(self):
         """Initialise les tables de la base de données."""
-        self.conn = sqlite3.connect(self.db_path)
+        # Attente sur verrou : plusieurs processus (GUI, workers CLI) peuvent écrire dans la même base
+        self.conn = sqlite3.connect(self.db_path, timeout=SQLITE_BUSY_TIMEOUT)
         self.conn.row_factory = sqlite3.Row  # Permet d'accéder aux colonnes par nom
-        
+
         # IMPORTANT: Activer les foreign keys (désactivées par défaut dans SQLite)
         self.conn.execute('PRAGMA foreign_keys = ON')
+
+        # WAL : les lectures ne bloquent pas l'écriture d'un autre processus
+        self.conn.execute('PRAGMA journal_mode = WAL')
         
         cursor = self.conn.cursor()
         
@@ -197,6 +211,99 @@ class AIPromptsDB:
             )
         ''')
         
+        # Journal du routage en cascade (modèle rapide → modèle fort) de la catégorisation
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS category_routing_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                handle TEXT,
+                product_key TEXT,
+                fast_model TEXT,
+                strong_model TEXT,
+                fast_category_path TEXT,
+                fast_confidence REAL,
+                fast_is_valid BOOLEAN,
+                escalated BOOLEAN NOT NULL,
+                reason TEXT,
+                final_model TEXT,
+                final_category_path TEXT,
+                final_confidence REAL,
+                fast_duration_ms INTEGER,
+                strong_duration_ms INTEGER,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # Cache des définitions produit de l'Agent Produit (LangGraph), par contenu produit
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS product_definition_cache (
+                product_key TEXT PRIMARY KEY,
+                definition_json TEXT NOT NULL,
+                hit_count INTEGER DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        # Manifeste des traitements CSV (reprise après annulation ou plantage)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS processing_runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                csv_import_id INTEGER NOT NULL,
+                prompt_set_id INTEGER NOT NULL,
+                provider_name TEXT NOT NULL,
+                model_name TEXT NOT NULL,
+                fields_json TEXT NOT NULL,
+                handles_json TEXT,
+                status TEXT NOT NULL DEFAULT 'running',
+                processing_result_id INTEGER,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (csv_import_id) REFERENCES csv_imports(id) ON DELETE CASCADE
+            )
+        ''')
+
+        # Produits traités d'un run, avec leurs changements (pour terminer l'export sans retraiter)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS processing_run_items (
+                run_id INTEGER NOT NULL,
+                handle TEXT NOT NULL,
+                status TEXT NOT NULL,
+                changes_json TEXT,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (run_id, handle),
+                FOREIGN KEY (run_id) REFERENCES processing_runs(id) ON DELETE CASCADE
+            )
+        ''')
+
+        # Jobs batch différés d'un run (API batch du fournisseur, repris après interruption)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS deferred_batch_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                run_id INTEGER NOT NULL,
+                provider_name TEXT NOT NULL,
+                remote_job_id TEXT NOT NULL,
+                batches_json TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'submitted',
+                error TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (run_id) REFERENCES processing_runs(id) ON DELETE CASCADE
+            )
+        ''')
+
+        # Contenu accepté par code-barres (GTIN-14), réutilisé entre imports et fournisseurs
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS barcode_content (
+                barcode TEXT PRIMARY KEY,
+                fields_json TEXT NOT NULL,
+                source_handle TEXT,
+                use_count INTEGER DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_used_at TIMESTAMP
+            )
+        ''')
+
         # Index pour améliorer les performances
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_csv_rows_handle ON csv_rows(handle)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_csv_rows_import ON csv_rows(csv_import_id)')
@@ -208,6 +315,8 @@ class AIPromptsDB:
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_product_category_cache_key ON product_category_cache(product_key)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_type_mapping_type ON type_category_mapping(product_type)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_type_mapping_active ON type_category_mapping(is_active)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_routing_log_created ON category_routing_log(created_at)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_processing_runs_import ON processing_runs(csv_import_id, status)')
         
         # Migration: Ajouter la colonne model_name si elle n'existe pas
         cursor.execute("PRAGMA table_info(ai_credentials)")
@@ -279,6 +388,9 @@ class AIPromptsDB:
         if 'csv_type' in mapping_columns_after:
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_type_mapping_csv_type ON type_category_mapping(csv_type)')
         
+        # Index d'expression pour les recherches insensibles à la casse (WHERE UPPER(csv_type) = ?)
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_type_mapping_csv_type_upper ON type_category_mapping(UPPER(csv_type))')
+        
         # Migration: Ajouter les nouvelles colonnes à product_category_cache si elles n'existent pas
         cursor.execute("PRAGMA table_info(product_category_cache)")
         cache_columns = [column[1] for column in cursor.fetchall()]
@@ -552,6 +664,11 @@ class AIPromptsDB:
             logger.info(f"Suppression de tous les imports CSV ({count} imports)...")
             
             # IMPORTANT: Supprimer dans l'ordre inverse des dépendances pour éviter les erreurs de foreign key
+            # 0. Supprimer les runs de traitement (dépendent de csv_imports)
+            cursor.execute('DELETE FROM deferred_batch_jobs')
+            cursor.execute('DELETE FROM processing_run_items')
+            cursor.execute('DELETE FROM processing_runs')
+
             # 1. Supprimer les changements de champs (dépend de csv_processing_results)
             cursor.execute('DELETE FROM product_field_changes')
             
@@ -574,14 +691,14 @@ class AIPromptsDB:
     def save_processing_result(self, csv_import_id: int, output_path: str, prompt_set_id: int,
                                provider_name: str, model_name: str, handles: List[str],
                                fields: List[str]) -> int:
-        """Sauvegarde un résultat de traitement."""
+        """Sauvegarde un résultat de traitement (output_path None : CSV généré plus tard)."""
         cursor = self.conn.cursor()
         cursor.execute('''
-            INSERT INTO csv_processing_results 
-            (csv_import_id, output_csv_path, prompt_set_id, provider_name, model_name, 
+            INSERT INTO csv_processing_results
+            (csv_import_id, output_csv_path, prompt_set_id, provider_name, model_name,
              processed_handles, fields_processed)
             VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (csv_import_id, output_path, prompt_set_id, provider_name, model_name,
+        ''', (csv_import_id, output_path or '', prompt_set_id, provider_name, model_name,
               json.dumps(handles), json.dumps(fields)))
         
         self.conn.commit()
@@ -592,12 +709,18 @@ class AIPromptsDB:
     def save_field_changes(self, processing_result_id: int, csv_row_id: int, handle: str,
                           field_name: str, original_value: str, new_value: str):
         """Sauvegarde un changement de champ."""
-        cursor = self.conn.cursor()
-        cursor.execute('''
+        sql = '''
             INSERT INTO product_field_changes 
             (processing_result_id, csv_row_id, handle, field_name, original_value, new_value)
             VALUES (?, ?, ?, ?, ?, ?)
-        ''', (processing_result_id, csv_row_id, handle, field_name, original_value, new_value))
+        '''
+        params = (processing_result_id, csv_row_id, handle, field_name, original_value, new_value)
+        if self.uow is not None:
+            self.uow.add_statement(sql, params)
+            return
+        
+        cursor = self.conn.cursor()
+        cursor.execute(sql, params)
         self.conn.commit()
     
     def get_product_changes(self, handle: str, processing_result_id: Optional[int] = None) -> List[Dict]:
@@ -618,7 +741,280 @@ class AIPromptsDB:
             ''', (handle,))
         
         return [dict(row) for row in cursor.fetchall()]
-    
+
+    # ========== Runs de traitement (reprise) ==========
+
+    @staticmethod
+    def _run_key(csv_import_id: int, prompt_set_id: int, provider_name: str, model_name: str,
+                 selected_fields: Dict[str, Any], handles: Optional[List[str]]) -> Tuple:
+        """Paramètres identifiant un run (JSON triés pour une comparaison stable)."""
+        return (
+            csv_import_id, prompt_set_id, provider_name, model_name,
+            json.dumps(selected_fields, sort_keys=True, ensure_ascii=False),
+            json.dumps(sorted(handles), ensure_ascii=False) if handles else None
+        )
+
+    def create_processing_run(self, csv_import_id: int, prompt_set_id: int, provider_name: str,
+                              model_name: str, selected_fields: Dict[str, Any],
+                              handles: Optional[List[str]] = None) -> int:
+        """
+        Crée le manifeste d'un run de traitement CSV.
+
+        Args:
+            csv_import_id: ID de l'import CSV
+            prompt_set_id: ID de l'ensemble de prompts
+            provider_name: Nom du fournisseur IA
+            model_name: Nom du modèle
+            selected_fields: Champs sélectionnés (tels que passés à process_csv)
+            handles: Handles sélectionnés (None = tous les produits)
+
+        Returns:
+            ID du run
+        """
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            INSERT INTO processing_runs
+            (csv_import_id, prompt_set_id, provider_name, model_name, fields_json, handles_json)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', self._run_key(csv_import_id, prompt_set_id, provider_name, model_name, selected_fields, handles))
+        self.conn.commit()
+        return cursor.lastrowid
+
+    def find_resumable_run(self, csv_import_id: int, prompt_set_id: int, provider_name: str,
+                           model_name: str, selected_fields: Dict[str, Any],
+                           handles: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Recherche le dernier run non terminé ayant les mêmes paramètres.
+
+        Args:
+            Voir create_processing_run
+
+        Returns:
+            Run (avec 'done_count' : produits déjà traités) ou None
+        """
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT pr.*,
+                   (SELECT COUNT(*) FROM processing_run_items pri
+                    WHERE pri.run_id = pr.id AND pri.status = 'done') AS done_count
+            FROM processing_runs pr
+            WHERE pr.csv_import_id = ? AND pr.prompt_set_id = ? AND pr.provider_name = ?
+              AND pr.model_name = ? AND pr.fields_json = ? AND pr.handles_json IS ?
+              AND pr.status != 'completed'
+            ORDER BY pr.id DESC
+            LIMIT 1
+        ''', self._run_key(csv_import_id, prompt_set_id, provider_name, model_name, selected_fields, handles))
+        row = cursor.fetchone()
+        return dict(row) if row else None
+
+    def save_run_items(self, run_id: int, handles: List[str], changes: Dict[str, Dict]):
+        """
+        Enregistre les produits d'un batch terminé.
+
+        Le statut suit celui des lignes CSV du produit : un produit dont toutes les
+        lignes sont 'completed' ou 'warning' est 'done' (ignoré à la reprise), les
+        autres (en erreur, même avec des changements partiels) sont 'error' et
+        seront retraités.
+
+        Args:
+            run_id: ID du run
+            handles: Handles du batch
+            changes: Changements du batch {handle: {champ: {'original', 'new'}}}
+        """
+        cursor = self.conn.cursor()
+        done_handles = set()
+        if handles:
+            placeholders = ','.join(['?'] * len(handles))
+            cursor.execute(f'''
+                SELECT cr.handle FROM csv_rows cr
+                JOIN processing_runs pr ON pr.csv_import_id = cr.csv_import_id
+                WHERE pr.id = ? AND cr.handle IN ({placeholders})
+                GROUP BY cr.handle
+                HAVING SUM(CASE WHEN cr.status IN ('completed', 'warning') THEN 0 ELSE 1 END) = 0
+            ''', (run_id, *handles))
+            done_handles = {row['handle'] for row in cursor.fetchall()}
+        cursor.executemany('''
+            INSERT INTO processing_run_items (run_id, handle, status, changes_json)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(run_id, handle) DO UPDATE SET
+                status = excluded.status,
+                changes_json = excluded.changes_json,
+                updated_at = CURRENT_TIMESTAMP
+        ''', [
+            (run_id, handle, 'done' if handle in done_handles else 'error',
+             json.dumps(changes.get(handle, {}), ensure_ascii=False))
+            for handle in handles
+        ])
+        cursor.execute('UPDATE processing_runs SET updated_at = CURRENT_TIMESTAMP WHERE id = ?', (run_id,))
+        self.conn.commit()
+
+    def get_run_changes(self, run_id: int) -> Dict[str, Dict]:
+        """
+        Récupère les changements des produits déjà traités d'un run.
+
+        Args:
+            run_id: ID du run
+
+        Returns:
+            Dict {handle: {champ: {'original', 'new'}}}
+        """
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT handle, changes_json FROM processing_run_items
+            WHERE run_id = ? AND status = 'done'
+        ''', (run_id,))
+        return {row['handle']: json.loads(row['changes_json'] or '{}') for row in cursor.fetchall()}
+
+    def finish_processing_run(self, run_id: int, status: str, processing_result_id: Optional[int] = None):
+        """
+        Met à jour le statut d'un run ('completed', 'cancelled' ou 'failed').
+
+        Args:
+            run_id: ID du run
+            status: Nouveau statut
+            processing_result_id: ID du résultat de traitement (run terminé)
+        """
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            UPDATE processing_runs
+            SET status = ?, processing_result_id = COALESCE(?, processing_result_id),
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (status, processing_result_id, run_id))
+        self.conn.commit()
+
+    def create_deferred_batch_job(self, run_id: int, provider_name: str, remote_job_id: str,
+                                  batches: Dict[str, List[str]]) -> int:
+        """
+        Enregistre un job batch différé envoyé au fournisseur.
+
+        Args:
+            run_id: ID du run
+            provider_name: Nom du fournisseur IA
+            remote_job_id: ID du job chez le fournisseur
+            batches: Handles de chaque requête {custom_id: [handles]}
+
+        Returns:
+            ID du job
+        """
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            INSERT INTO deferred_batch_jobs (run_id, provider_name, remote_job_id, batches_json)
+            VALUES (?, ?, ?, ?)
+        ''', (run_id, provider_name, remote_job_id, json.dumps(batches, ensure_ascii=False)))
+        self.conn.commit()
+        return cursor.lastrowid
+
+    def get_deferred_batch_job(self, run_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Récupère le dernier job batch différé non échoué d'un run (reprise sans renvoi).
+
+        Args:
+            run_id: ID du run
+
+        Returns:
+            Job (avec 'batches' décodé) ou None
+        """
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT * FROM deferred_batch_jobs
+            WHERE run_id = ? AND status != 'failed'
+            ORDER BY id DESC
+            LIMIT 1
+        ''', (run_id,))
+        row = cursor.fetchone()
+        if not row:
+            return None
+        job = dict(row)
+        job['batches'] = json.loads(job.pop('batches_json'))
+        return job
+
+    def update_deferred_batch_job(self, job_id: int, status: str, error: Optional[str] = None):
+        """
+        Met à jour le statut d'un job batch différé ('completed' ou 'failed').
+
+        Args:
+            job_id: ID du job
+            status: Nouveau statut
+            error: Message d'erreur (job échoué)
+        """
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            UPDATE deferred_batch_jobs
+            SET status = ?, error = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (status, error, job_id))
+        self.conn.commit()
+
+    # ========== Contenu par code-barres ==========
+
+    def get_barcode_contents(self, barcodes: List[str]) -> Dict[str, Dict[str, Dict]]:
+        """
+        Récupère en une requête le contenu connu de plusieurs codes-barres.
+
+        Args:
+            barcodes: Codes-barres normalisés (GTIN-14)
+
+        Returns:
+            Dict {barcode: {champ: {'value', 'prompt_set_id', 'updated_at'}}} (inconnus omis)
+        """
+        keys = list(dict.fromkeys(barcodes))
+        result = {}
+        cursor = self.conn.cursor()
+        # Par paquets pour rester sous la limite de paramètres SQLite
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            cursor.execute(f'''
+                SELECT barcode, fields_json FROM barcode_content
+                WHERE barcode IN ({', '.join('?' for _ in chunk)})
+            ''', chunk)
+            for row in cursor.fetchall():
+                result[row['barcode']] = json.loads(row['fields_json'])
+        return result
+
+    def save_barcode_content(self, barcodes: List[str], field_values: Dict[str, str],
+                             prompt_set_id: int, source_handle: str):
+        """
+        Enregistre les champs acceptés d'un produit pour chacun de ses codes-barres
+        (fusionnés avec les champs déjà connus).
+
+        Args:
+            barcodes: Codes-barres normalisés du produit
+            field_values: Valeurs acceptées {champ CSV: valeur}
+            prompt_set_id: Ensemble de prompts ayant généré les valeurs
+            source_handle: Handle du produit d'origine
+        """
+        if not barcodes or not field_values:
+            return
+        now = datetime.now().isoformat(timespec='seconds')
+        existing = self.get_barcode_contents(barcodes)
+        cursor = self.conn.cursor()
+        for barcode in dict.fromkeys(barcodes):
+            fields = existing.get(barcode, {})
+            for field, value in field_values.items():
+                fields[field] = {'value': value, 'prompt_set_id': prompt_set_id, 'updated_at': now}
+            cursor.execute('''
+                INSERT INTO barcode_content (barcode, fields_json, source_handle)
+                VALUES (?, ?, ?)
+                ON CONFLICT(barcode) DO UPDATE SET
+                    fields_json = excluded.fields_json,
+                    source_handle = excluded.source_handle,
+                    updated_at = CURRENT_TIMESTAMP
+            ''', (barcode, json.dumps(fields, ensure_ascii=False), source_handle))
+        self.conn.commit()
+
+    def mark_barcode_content_used(self, barcodes: List[str]):
+        """Met à jour use_count et last_used_at des codes-barres réutilisés."""
+        if not barcodes:
+            return
+        cursor = self.conn.cursor()
+        cursor.executemany('''
+            UPDATE barcode_content
+            SET use_count = use_count + 1, last_used_at = CURRENT_TIMESTAMP
+            WHERE barcode = ?
+        ''', [(barcode,) for barcode in dict.fromkeys(barcodes)])
+        self.conn.commit()
+
     # ========== Gestion des credentials AI ==========
     
     def save_ai_credentials(self, provider_name: str, api_key: str, model_name: str = None):
@@ -775,6 +1171,7 @@ class AIPromptsDB:
                     count += 1
         
         self.conn.commit()
+        self._taxonomy_tree = None
         logger.info(f"Taxonomie Google Shopping importée: {count} catégories")
         return count
     
@@ -900,8 +1297,13 @@ class AIPromptsDB:
         """
         Extrait des catégories candidates de la taxonomie basées sur les mots-clés du produit.
         
+        En mode hiérarchique (config taxonomy_hierarchical_selection, activé par défaut),
+        les candidates sont prises uniquement sous les branches les plus probables
+        (voir taxonomy_tree) ; la recherche à plat par LIKE sert de repli.
+        
         Args:
-            product_data: Données du produit (Title, Type, Vendor, etc.)
+            product_data: Données du produit (Title, Type, Vendor, etc.), avec
+                '_taxonomy_retry' pour élargir le nombre de branches au retry
             max_results: Nombre maximum de catégories à retourner
             
         Returns:
@@ -943,6 +1345,13 @@ class AIPromptsDB:
             logger.warning("Aucun mot-clé extrait du produit pour recherche de catégories")
             return []
         
+        if self.get_config_bool('taxonomy_hierarchical_selection', default=True):
+            max_branches = DEFAULT_MAX_BRANCHES + int(product_data.get('_taxonomy_retry', 0))
+            candidates = self.get_taxonomy_tree().candidates(keywords, max_results, max_branches)
+            if candidates:
+                return candidates
+            logger.info("🌳 Aucune branche de taxonomie trouvée, repli sur la recherche à plat")
+        
         cursor = self.conn.cursor()
         
         # Requête pour trouver les catégories contenant ces mots-clés
@@ -987,6 +1396,14 @@ class AIPromptsDB:
         logger.debug(f"Catégories candidates (top 5): {[path for _, path in candidates[:5]]}")
         return candidates
     
+    def get_taxonomy_tree(self) -> TaxonomyTree:
+        """Index hiérarchique de la taxonomie, construit au premier usage."""
+        if self._taxonomy_tree is None:
+            cursor = self.conn.cursor()
+            cursor.execute('SELECT code, path FROM google_taxonomy')
+            self._taxonomy_tree = TaxonomyTree([(row[0], row[1]) for row in cursor.fetchall()])
+        return self._taxonomy_tree
+    
     def get_taxonomy_count(self) -> int:
         """Retourne le nombre de catégories dans la taxonomie."""
         cursor = self.conn.cursor()
@@ -1100,6 +1517,36 @@ class AIPromptsDB:
         # Hasher pour avoir une clé courte et unique
         return hashlib.md5(key_string.encode('utf-8')).hexdigest()
     
+    def get_cached_types(self, product_keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Récupère en une requête product_type et csv_type du cache pour plusieurs produits.
+        
+        Args:
+            product_keys: Clés produits (voir _generate_product_key)
+            
+        Returns:
+            Dict {product_key: {'product_type', 'csv_type'}} (clés absentes du cache omises)
+        """
+        keys = list(dict.fromkeys(product_keys))
+        result = {}
+        cursor = self.conn.cursor()
+        # Par paquets pour rester sous la limite de paramètres SQLite
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            cursor.execute(f'''
+                SELECT product_key, product_type, csv_type FROM product_category_cache
+                WHERE product_key IN ({', '.join('?' for _ in chunk)})
+            ''', chunk)
+            for row in cursor.fetchall():
+                result[row['product_key']] = {'product_type': row['product_type'], 'csv_type': row['csv_type']}
+        
+        if self.uow is not None:
+            for key in keys:
+                pending = self.uow.get_cache_types(key)
+                if pending is not None:
+                    result[key] = pending
+        return result
+    
     def get_cached_category(self, product_data: dict) -> Optional[Dict[str, Any]]:
         """
         Récupère la catégorie depuis le cache si elle existe.
@@ -1123,13 +1570,17 @@ class AIPromptsDB:
         
         if result:
             # Mettre à jour last_used_at et use_count
-            cursor.execute('''
+            sql = '''
                 UPDATE product_category_cache
                 SET last_used_at = CURRENT_TIMESTAMP,
                     use_count = use_count + 1
                 WHERE product_key = ?
-            ''', (product_key,))
-            self.conn.commit()
+            '''
+            if self.uow is not None:
+                self.uow.add_statement(sql, (product_key,))
+            else:
+                cursor.execute(sql, (product_key,))
+                self.conn.commit()
             
             logger.info(f"✅ Cache HIT: {product_data.get('Title', 'N/A')[:50]} → {result['category_path']}")
             
@@ -1187,11 +1638,8 @@ class AIPromptsDB:
         else:
             csv_type = csv_type.strip()
         
-        cursor = self.conn.cursor()
-        
-        # Vérifier si le produit existe déjà dans le cache
-        cursor.execute('SELECT product_type, csv_type FROM product_category_cache WHERE product_key = ?', (product_key,))
-        existing = cursor.fetchone()
+        # Vérifier si le produit existe déjà dans le cache (écritures en attente comprises)
+        existing = self._get_cache_types(product_key)
         
         # IMPORTANT: product_type doit TOUJOURS rester le type original du CSV
         # Si une entrée existe déjà, préserver son product_type original
@@ -1206,16 +1654,22 @@ class AIPromptsDB:
             # alors on garde l'existant (csv_type généré par SEO)
             csv_type = existing['csv_type']
         
+        sql = '''
+            INSERT OR REPLACE INTO product_category_cache 
+            (product_key, title, product_type, vendor, category_code, category_path, 
+             original_category_code, original_category_path, confidence, rationale, csv_type, source)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        '''
+        params = (product_key, title, product_type, vendor, category_code, category_path, 
+                  original_category_code, original_category_path, confidence, rationale, csv_type, source)
+        
         try:
-            cursor.execute('''
-                INSERT OR REPLACE INTO product_category_cache 
-                (product_key, title, product_type, vendor, category_code, category_path, 
-                 original_category_code, original_category_path, confidence, rationale, csv_type, source)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (product_key, title, product_type, vendor, category_code, category_path, 
-                  original_category_code, original_category_path, confidence, rationale, csv_type, source))
-            
-            self.conn.commit()
+            if self.uow is not None:
+                self.uow.add_statement(sql, params)
+                self.uow.set_cache_types(product_key, product_type, csv_type)
+            else:
+                self.conn.execute(sql, params)
+                self.conn.commit()
             logger.info(f"💾 Taxonomie SAVED: {title[:50]} → {category_path} (conf: {confidence:.2f}, csv_type: {csv_type})")
             return True
             
@@ -1223,6 +1677,67 @@ class AIPromptsDB:
             logger.error(f"Erreur lors de la sauvegarde dans le cache: {e}")
             return False
     
+    def _get_cache_types(self, product_key: str) -> Optional[Dict[str, Any]]:
+        """
+        Récupère product_type et csv_type d'une entrée du cache (écritures en attente comprises).
+        
+        Args:
+            product_key: Clé produit
+            
+        Returns:
+            Dict {'product_type', 'csv_type'} ou None si le produit n'est pas en cache
+        """
+        if self.uow is not None:
+            pending = self.uow.get_cache_types(product_key)
+            if pending is not None:
+                return pending
+        
+        row = self.conn.execute(
+            'SELECT product_type, csv_type FROM product_category_cache WHERE product_key = ?',
+            (product_key,)
+        ).fetchone()
+        return {'product_type': row['product_type'], 'csv_type': row['csv_type']} if row else None
+    
+    def set_cache_csv_type(self, product_data: dict, csv_type: str) -> bool:
+        """
+        Enregistre le type suggéré par SEO (csv_type) dans le cache de catégorisation.
+        
+        Crée une entrée minimale (catégorie vide) si le produit n'est pas encore en cache.
+        
+        Args:
+            product_data: Données du produit
+            csv_type: Type suggéré par SEO (déjà normalisé)
+            
+        Returns:
+            True si sauvegardé
+        """
+        product_key = self._generate_product_key(product_data)
+        existing = self._get_cache_types(product_key)
+        
+        if existing is None:
+            return self.save_to_cache(
+                product_data,
+                '',  # category_code vide pour l'instant
+                '',  # category_path vide pour l'instant
+                0.0,  # confidence vide pour l'instant
+                f'Type SEO copié dans csv_type: {csv_type}',
+                source='seo',
+                csv_type=csv_type
+            )
+        
+        sql = '''
+            UPDATE product_category_cache
+            SET csv_type = ?, last_used_at = CURRENT_TIMESTAMP
+            WHERE product_key = ?
+        '''
+        if self.uow is not None:
+            self.uow.add_statement(sql, (csv_type, product_key))
+            self.uow.set_cache_types(product_key, existing['product_type'], csv_type)
+        else:
+            self.conn.execute(sql, (csv_type, product_key))
+            self.conn.commit()
+        return True
+    
     def get_parent_category(self, category_path: str) -> Optional[Tuple[str, str]]:
         """
         Obtient la catégorie parente (niveau supérieur) d'une catégorie.
@@ -1285,6 +1800,132 @@ class AIPromptsDB:
             'max_uses': result['max_uses'] or 0
         }
     
+    def get_categorization_cache_rows(self) -> List[Dict[str, Any]]:
+        """
+        Catégorisations en cache ayant un csv_type (source du minage de règles).
+        
+        Returns:
+            Liste de dicts (csv_type, product_type, category_code, category_path, confidence, use_count)
+        """
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT csv_type, product_type, category_code, category_path, confidence, use_count
+            FROM product_category_cache
+            WHERE csv_type IS NOT NULL AND TRIM(csv_type) != ''
+        ''')
+        return [dict(row) for row in cursor.fetchall()]
+    
+    def save_routing_decision(self, decision: Dict[str, Any]):
+        """
+        Enregistre une décision de routage de la catégorisation en cascade.
+        
+        Args:
+            decision: Dict avec handle, product_key, fast_model, strong_model,
+                      fast_category_path, fast_confidence, fast_is_valid, escalated,
+                      reason, final_model, final_category_path, final_confidence,
+                      fast_duration_ms, strong_duration_ms
+        """
+        columns = [
+            'handle', 'product_key', 'fast_model', 'strong_model',
+            'fast_category_path', 'fast_confidence', 'fast_is_valid', 'escalated',
+            'reason', 'final_model', 'final_category_path', 'final_confidence',
+            'fast_duration_ms', 'strong_duration_ms'
+        ]
+        cursor = self.conn.cursor()
+        cursor.execute(f'''
+            INSERT INTO category_routing_log ({', '.join(columns)})
+            VALUES ({', '.join('?' for _ in columns)})
+        ''', [decision.get(column) for column in columns])
+        self.conn.commit()
+    
+    def get_product_definitions(self, product_keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Récupère les définitions produit en cache (Agent Produit) pour plusieurs produits.
+        
+        Args:
+            product_keys: Clés produit (voir _generate_product_key)
+            
+        Returns:
+            Dict {product_key: définition} pour les clés trouvées
+        """
+        definitions = {}
+        keys = list(dict.fromkeys(product_keys))
+        cursor = self.conn.cursor()
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            cursor.execute(f'''
+                SELECT product_key, definition_json FROM product_definition_cache
+                WHERE product_key IN ({', '.join('?' for _ in chunk)})
+            ''', chunk)
+            for row in cursor.fetchall():
+                try:
+                    definitions[row['product_key']] = json.loads(row['definition_json'])
+                except (ValueError, TypeError):
+                    logger.warning(f"Définition produit illisible en cache: {row['product_key']}")
+        
+        if definitions:
+            sql = '''
+                UPDATE product_definition_cache SET hit_count = hit_count + 1
+                WHERE product_key = ?
+            '''
+            if self.uow is not None:
+                for key in definitions:
+                    self.uow.add_statement(sql, (key,))
+            else:
+                cursor.executemany(sql, [(key,) for key in definitions])
+                self.conn.commit()
+        
+        return definitions
+    
+    def save_product_definition(self, product_key: str, definition: Dict[str, Any]):
+        """
+        Enregistre la définition produit de l'Agent Produit en cache.
+        
+        Args:
+            product_key: Clé produit (voir _generate_product_key)
+            definition: Définition (product_type, usage, material, search_keywords)
+        """
+        sql = '''
+            INSERT INTO product_definition_cache (product_key, definition_json)
+            VALUES (?, ?)
+            ON CONFLICT(product_key) DO UPDATE SET
+                definition_json = excluded.definition_json,
+                updated_at = CURRENT_TIMESTAMP
+        '''
+        params = (product_key, json.dumps(definition, ensure_ascii=False))
+        if self.uow is not None:
+            self.uow.add_statement(sql, params)
+        else:
+            self.conn.execute(sql, params)
+            self.conn.commit()
+    
+    def get_routing_stats(self) -> Dict[str, Any]:
+        """
+        Statistiques du routage en cascade de la catégorisation.
+        
+        Returns:
+            Dict avec total, escalated, escalation_rate, avg_fast_ms, avg_strong_ms
+        """
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT 
+                COUNT(*) as total,
+                SUM(CASE WHEN escalated THEN 1 ELSE 0 END) as escalated,
+                AVG(fast_duration_ms) as avg_fast_ms,
+                AVG(strong_duration_ms) as avg_strong_ms
+            FROM category_routing_log
+        ''')
+        result = cursor.fetchone()
+        total = result['total'] or 0
+        escalated = result['escalated'] or 0
+        
+        return {
+            'total': total,
+            'escalated': escalated,
+            'escalation_rate': escalated / total if total else 0.0,
+            'avg_fast_ms': result['avg_fast_ms'] or 0.0,
+            'avg_strong_ms': result['avg_strong_ms'] or 0.0
+        }
     
     def delete_taxonomy_cache(self, cache_id: int) -> bool:
         """
@@ -1310,13 +1951,15 @@ class AIPromptsDB:
     
     # ========== Gestion du Type Mapping (règles Type → Catégorie) ==========
     
-    def get_type_mapping(self, product_type: str, csv_type: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    def get_type_mapping(self, product_type: str, csv_type: Optional[str] = None,
+                         count_use: bool = True) -> Optional[Dict[str, Any]]:
         """
         Récupère la règle de mapping basée uniquement sur csv_type.
         
         Args:
             product_type: Type original du CSV (utilisé pour logging uniquement)
             csv_type: Type suggéré par SEO (ex: "TORCHONS") - CLÉ DE RECHERCHE
+            count_use: False pour vérifier l'existence d'une règle sans compter son utilisation
             
         Returns:
             Dict avec category_code, category_path, confidence ou None
@@ -1324,44 +1967,46 @@ class AIPromptsDB:
         if not csv_type or csv_type.strip() == '':
             return None
         
-        # Normaliser en UPPERCASE pour éviter les doublons (Thés, THÉS, thés, etc.)
-        csv_type_normalized = csv_type.strip().upper()
+        # Règles compilées en mémoire (clé normalisée en UPPERCASE : Thés, THÉS, thés...)
+        # Le compteur d'utilisation est écrit par flush_type_mapping_usage()
+        result = get_rule_engine(self.db_path).lookup(self.conn, csv_type, count_use=count_use)
         
-        cursor = self.conn.cursor()
+        if result:
+            logger.debug(f"✅ Règle trouvée: {csv_type} → {result['category_path']}")
         
-        # Chercher uniquement par csv_type (insensible à la casse via UPPER)
-        # Prioriser : 1) Plus utilisée (use_count), 2) Plus récente (created_at), 3) Plus confiante
-        cursor.execute('''
-            SELECT id, category_code, category_path, confidence, use_count, product_type
-            FROM type_category_mapping
-            WHERE UPPER(csv_type) = ? AND is_active = 1
-            AND category_code != '' AND category_path != ''
-            ORDER BY use_count DESC, created_at DESC, confidence DESC
-            LIMIT 1
-        ''', (csv_type_normalized,))
+        return result
+    
+    def refresh_type_mappings(self):
+        """Recharge les règles compilées si elles ont été modifiées depuis le dernier chargement."""
+        get_rule_engine(self.db_path).refresh(self.conn)
+    
+    def flush_type_mapping_usage(self) -> int:
+        """
+        Écrit en base les compteurs d'utilisation des règles accumulés en mémoire.
         
-        result = cursor.fetchone()
+        Returns:
+            Nombre de règles mises à jour
+        """
+        return get_rule_engine(self.db_path).flush(self.conn)
+    
+    def _type_mappings_changed(self, cursor):
+        """
+        Signale une modification des règles (à appeler avant le commit).
         
-        if result:
-            # Incrémenter le compteur d'utilisation
-            cursor.execute('''
-                UPDATE type_category_mapping
-                SET use_count = use_count + 1,
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE id = ?
-            ''', (result['id'],))
-            self.conn.commit()
-            
-            logger.info(f"✅ Règle trouvée: {csv_type} → {result['category_path']}")
-            
-            return {
-                'category_code': result['category_code'],
-                'category_path': result['category_path'],
-                'confidence': result['confidence'],
-                'use_count': result['use_count'] + 1
-            }
+        Incrémente la version stockée dans app_config (détectée par les autres
+        processus) et invalide les règles compilées de ce processus.
         
-        return None
+        Args:
+            cursor: Curseur de la transaction en cours
+        """
+        cursor.execute('''
+            INSERT INTO app_config (key, value, updated_at)
+            VALUES (?, '1', CURRENT_TIMESTAMP)
+            ON CONFLICT(key) DO UPDATE SET
+                value = CAST(CAST(value AS INTEGER) + 1 AS TEXT),
+                updated_at = CURRENT_TIMESTAMP
+        ''', (RULES_VERSION_KEY,))
+        invalidate_rule_engine(self.db_path)
     
     def save_type_mapping(self, product_type: str, csv_type: str, category_code: str, 
                          category_path: str, confidence: float = 1.0,
@@ -1412,6 +2057,7 @@ class AIPromptsDB:
                  created_by, updated_at, is_active)
                 VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, 1)
             ''', (product_type.strip(), csv_type_normalized, category_code, category_path, confidence, created_by))
+            self._type_mappings_changed(cursor)
             
             self.conn.commit()
             logger.info(f"💾 Type Mapping SAVED: {product_type} + {csv_type_normalized} → {category_path}")
@@ -1421,6 +2067,41 @@ class AIPromptsDB:
             logger.error(f"Erreur lors de la sauvegarde du mapping: {e}")
             return False
     
+    def save_mined_type_mappings(self, rules: List[Dict[str, Any]],
+                                 active_statuses: Tuple[str, ...] = ('auto',)) -> int:
+        """
+        Enregistre en une transaction les règles issues du minage du cache (voir rule_miner).
+        
+        Les csv_types qui ont déjà une règle ne sont pas modifiés.
+        
+        Args:
+            rules: Règles minées (csv_type, product_type, category_code, category_path,
+                confidence, status)
+            active_statuses: Statuts créés actifs (les autres sont créés inactifs)
+        
+        Returns:
+            Nombre de règles créées
+        """
+        if not rules:
+            return 0
+        
+        cursor = self.conn.cursor()
+        created = 0
+        for rule in rules:
+            cursor.execute('''
+                INSERT OR IGNORE INTO type_category_mapping
+                (product_type, csv_type, category_code, category_path, confidence,
+                 created_by, updated_at, is_active)
+                VALUES (?, ?, ?, ?, ?, 'rule_miner', CURRENT_TIMESTAMP, ?)
+            ''', (rule['product_type'], rule['csv_type'], rule['category_code'], rule['category_path'],
+                  round(rule['confidence'], 4), 1 if rule['status'] in active_statuses else 0))
+            created += cursor.rowcount
+        if created:
+            self._type_mappings_changed(cursor)
+        self.conn.commit()
+        logger.info(f"⛏️ {created} règle(s) minée(s) enregistrée(s)")
+        return created
+    
     def get_all_type_mappings(self) -> List[Dict[str, Any]]:
         """
         Récupère toutes les règles de mapping actives.
@@ -1498,6 +2179,7 @@ class AIPromptsDB:
                     WHERE id = ?
                 ''', (category_code, category_path, mapping_id))
             
+            self._type_mappings_changed(cursor)
             self.conn.commit()
             logger.info(f"✏️ Type Mapping modifié: ID {mapping_id} → {category_path}")
             return True
@@ -1519,6 +2201,7 @@ class AIPromptsDB:
         try:
             cursor = self.conn.cursor()
             cursor.execute('DELETE FROM type_category_mapping WHERE id = ?', (mapping_id,))
+            self._type_mappings_changed(cursor)
             self.conn.commit()
             logger.info(f"🗑️ Type Mapping supprimé: ID {mapping_id}")
             return True
@@ -1545,6 +2228,7 @@ class AIPromptsDB:
                 SET is_active = ?, updated_at = CURRENT_TIMESTAMP
                 WHERE id = ?
             ''', (1 if is_active else 0, mapping_id))
+            self._type_mappings_changed(cursor)
             self.conn.commit()
             logger.info(f"🔄 Type Mapping {'activé' if is_active else 'désactivé'}: ID {mapping_id}")
             return True
@@ -1553,6 +2237,50 @@ class AIPromptsDB:
             logger.error(f"Erreur lors du toggle: {e}")
             return False
     
+    @contextmanager
+    def unit_of_work(self):
+        """
+        Regroupe les écritures (lignes CSV, cache, changements) jusqu'à la sortie du bloc,
+        puis les écrit en une seule transaction.
+        
+        Usage:
+            with db.unit_of_work():
+                ...  # update_csv_row, save_to_cache, ... sont différés
+                db.flush_unit_of_work()  # écriture intermédiaire (ex: après chaque produit)
+        
+        Un bloc imbriqué réutilise l'unité de travail englobante. Si le bloc lève une
+        exception, les écritures en attente sont tout de même tentées, puis l'exception
+        d'origine est relancée (une erreur d'écriture est seulement journalisée).
+        """
+        if self.uow is not None:
+            yield self.uow
+            return
+        
+        uow = BatchUnitOfWork()
+        self.uow = uow
+        try:
+            yield uow
+        except BaseException:
+            self.uow = None
+            try:
+                uow.flush(self.conn)
+            except Exception as flush_error:
+                logger.error(f"Écritures en attente perdues après une erreur: {flush_error}")
+            raise
+        self.uow = None
+        uow.flush(self.conn)
+    
+    def flush_unit_of_work(self) -> int:
+        """
+        Écrit les écritures en attente de l'unité de travail courante, qui reste ouverte.
+        
+        Returns:
+            Nombre d'écritures effectuées (0 hors unité de travail)
+        """
+        if self.uow is None:
+            return 0
+        return self.uow.flush(self.conn)
+    
     def close(self):
         """Ferme la connexion à la base de données."""
         if self.conn:
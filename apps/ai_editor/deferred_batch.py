@@ -0,0 +1,219 @@
+"""
+Mode différé du traitement CSV : génération SEO via l'API batch du fournisseur.
+
+Pour les gros imports (10k+ produits), la latence interactive est inutile. Les
+prompts de tous les batches sont construits d'avance (mêmes batches qu'en mode
+interactif) et envoyés en un seul job batch (voir utils.batch_transport). Le job
+est enregistré avec le run : un traitement interrompu pendant l'attente reprend
+le suivi du même job avec --resume, sans rien renvoyer.
+
+Une fois le job terminé, chaque batch passe par process_batch() comme d'habitude :
+DeferredBatchAgent sert le premier passage avec les résultats reçus, et les
+produits absents ou invalides sont redemandés en interactif par les relances
+habituelles. Si le job échoue, tout le traitement se poursuit en interactif.
+"""
+
+import time
+import logging
+from typing import Dict, List, Any, Optional, Callable, Iterator, Tuple
+
+from utils.batch_transport import BatchTransport, BATCH_PENDING, BATCH_FAILED
+
+logger = logging.getLogger(__name__)
+
+# Statuts d'un job différé (table deferred_batch_jobs)
+DEFERRED_SUBMITTED = 'submitted'
+DEFERRED_COMPLETED = 'completed'
+DEFERRED_FAILED = 'failed'
+
+# Intervalle entre deux interrogations du fournisseur (secondes)
+DEFAULT_POLL_INTERVAL = 60
+
+# Attente maximale du job avant repli en interactif (heures)
+DEFAULT_MAX_WAIT_HOURS = 24
+
+
+class DeferredBatchAgent:
+    """
+    Agent SEO dont le premier passage de chaque batch est servi par les résultats
+    du job différé ; les relances sont déléguées à l'agent interactif.
+    """
+
+    def __init__(self, agent, results: Dict[str, Dict[str, Any]]):
+        """
+        Args:
+            agent: Agent SEO interactif
+            results: Résultats du job différé {handle: résultat}
+        """
+        self.agent = agent
+        self.results = results
+        self.last_batch_stats: Optional[Dict[str, Any]] = None
+        self.last_compaction_stats: Optional[Dict[str, int]] = None
+
+    def __getattr__(self, name):
+        return getattr(self.agent, name)
+
+    def generate_batch_stream(self, products_data: List[Dict[str, Any]], **kwargs) -> Iterator[Dict[str, Any]]:
+        """Même contrat que BaseAIAgent.generate_batch_stream()."""
+        ready = [p['Handle'] for p in products_data if p.get('Handle') in self.results]
+        if not ready:
+            yield from self.agent.generate_batch_stream(products_data, **kwargs)
+            self.last_batch_stats = self.agent.last_batch_stats
+            self.last_compaction_stats = self.agent.last_compaction_stats
+            return
+
+        self.last_batch_stats = {
+            'requested': len(products_data),
+            'returned': len(ready),
+            'truncated': False,
+            'output_chars': 0
+        }
+        self.last_compaction_stats = None
+        for handle in ready:
+            yield self.results.pop(handle)
+
+
+def run_deferred_batches(
+    db,
+    run_id: int,
+    provider_name: str,
+    agent,
+    transport: BatchTransport,
+    batches: List[List[str]],
+    products_data: Dict[str, Dict[str, Any]],
+    progress_callback: Optional[Callable[[str, int, int], None]] = None,
+    log_callback: Optional[Callable[[str], None]] = None,
+    cancel_check: Optional[Callable[[], bool]] = None
+) -> Optional[Tuple[List[List[str]], Dict[str, Dict[str, Any]]]]:
+    """
+    Envoie (ou reprend) le job batch du run, attend sa fin et récupère les résultats.
+
+    Args:
+        db: Instance de AIPromptsDB
+        run_id: ID du run
+        provider_name: Nom du fournisseur IA
+        agent: Agent SEO (construit les prompts et parse les réponses)
+        transport: Transport batch du fournisseur
+        batches: Batches prévus (handles)
+        products_data: Données CSV par handle
+        progress_callback: Callback pour la progression (message, current, total)
+        log_callback: Callback pour les logs
+        cancel_check: Callback pour vérifier l'annulation
+
+    Returns:
+        Tuple (batches à traiter, résultats {handle: résultat}) ; résultats vides si le
+        job a échoué (repli interactif) ; None si annulé pendant l'attente
+    """
+    def log(message: str):
+        logger.info(message)
+        if log_callback:
+            log_callback(message)
+
+    wanted = {h for batch in batches for h in batch}
+    job = db.get_deferred_batch_job(run_id)
+    if job and job['provider_name'] == provider_name:
+        # Reprise : mêmes batches que le job déjà envoyé (produits terminés depuis retirés)
+        job_batches = {cid: [h for h in handles if h in wanted] for cid, handles in job['batches'].items()}
+        covered = {h for handles in job_batches.values() for h in handles}
+        plan = [handles for handles in job_batches.values() if handles]
+        plan += [[h for h in batch if h not in covered] for batch in batches if set(batch) - covered]
+        log(f"♻️ Reprise du batch différé {job['remote_job_id']} ({len(covered)} produit(s))")
+    else:
+        plan = batches
+        job_batches = {f"batch-{idx}": handles for idx, handles in enumerate(batches, 1)}
+        requests = [
+            {'custom_id': cid, **agent.build_batch_request([products_data[h] for h in handles])}
+            for cid, handles in job_batches.items()
+        ]
+        try:
+            remote_job_id = transport.submit(requests)
+        except Exception as e:
+            logger.error(f"Envoi du batch différé impossible: {e}", exc_info=True)
+            log(f"⚠️ Envoi du batch différé impossible, traitement interactif: {str(e)[:100]}")
+            return plan, {}
+        job_id = db.create_deferred_batch_job(run_id, provider_name, remote_job_id, job_batches)
+        job = {'id': job_id, 'remote_job_id': remote_job_id}
+        log(f"📤 Batch différé {remote_job_id} envoyé: {len(requests)} requête(s), {len(wanted)} produit(s)")
+
+    state = _wait_for_job(db, transport, job['remote_job_id'], progress_callback, cancel_check)
+    if state is None:
+        log(f"⏸️ Attente du batch différé interrompue (reprise possible: {job['remote_job_id']})")
+        return None
+    if state['status'] == BATCH_FAILED:
+        db.update_deferred_batch_job(job['id'], DEFERRED_FAILED, state.get('error'))
+        log(f"⚠️ Batch différé en échec ({state.get('error')}), traitement interactif")
+        return plan, {}
+
+    try:
+        responses = transport.fetch_results(job['remote_job_id'])
+    except Exception as e:
+        logger.error(f"Récupération du batch différé impossible: {e}", exc_info=True)
+        log(f"⚠️ Résultats du batch différé indisponibles, traitement interactif: {str(e)[:100]}")
+        return plan, {}
+
+    results = {}
+    for cid, handles in job_batches.items():
+        if cid not in responses:
+            continue
+        try:
+            products = agent._parse_batch_response(responses[cid])
+        except ValueError as e:
+            logger.warning(f"Réponse {cid} du batch différé invalide: {e}")
+            continue
+        for product in products:
+            if product.get('handle') in handles:
+                results[product['handle']] = product
+
+    db.update_deferred_batch_job(job['id'], DEFERRED_COMPLETED)
+    log(f"📥 Batch différé terminé: {len(results)}/{len(wanted)} produit(s) reçu(s)")
+    return plan, results
+
+
+def _wait_for_job(
+    db,
+    transport: BatchTransport,
+    remote_job_id: str,
+    progress_callback: Optional[Callable[[str, int, int], None]] = None,
+    cancel_check: Optional[Callable[[], bool]] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Interroge le fournisseur jusqu'à la fin du job (ou le délai maximal).
+
+    Une erreur réseau pendant l'attente n'arrête pas le suivi.
+
+    Returns:
+        Dernier état du job (statut BATCH_COMPLETED ou BATCH_FAILED), None si annulé
+    """
+    poll_interval = max(0, db.get_config_int('deferred_batch_poll_interval', default=DEFAULT_POLL_INTERVAL))
+    max_wait_hours = db.get_config_int('deferred_batch_max_wait_hours', default=DEFAULT_MAX_WAIT_HOURS)
+    deadline = time.time() + max_wait_hours * 3600
+
+    while True:
+        try:
+            state = transport.poll(remote_job_id)
+        except Exception as e:
+            logger.warning(f"Suivi du batch différé {remote_job_id}: {e}")
+            state = {'status': BATCH_PENDING, 'completed': 0, 'total': 0}
+
+        if progress_callback and state.get('total'):
+            progress_callback(f"Batch différé: {state['completed']}/{state['total']} requête(s)",
+                              state['completed'], state['total'])
+        if state['status'] != BATCH_PENDING:
+            return state
+
+        if time.time() >= deadline:
+            try:
+                transport.cancel(remote_job_id)
+            except Exception as e:
+                logger.warning(f"Annulation du batch différé {remote_job_id}: {e}")
+            return {'status': BATCH_FAILED, 'error': f"délai de {max_wait_hours} h dépassé"}
+
+        # Attente par pas d'une seconde pour rester réactif à l'annulation
+        waited = 0
+        while waited < poll_interval:
+            if cancel_check and cancel_check():
+                return None
+            time.sleep(1)
+            waited += 1
+        if cancel_check and cancel_check():
+            return None
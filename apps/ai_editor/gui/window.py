@@ -21,6 +21,8 @@ from apps.ai_editor.db import AIPromptsDB
 from apps.ai_editor.csv_storage import CSVStorage
 from apps.ai_editor.processor import CSVAIProcessor, SEO_FIELD_MAPPING
 from utils.ai_providers import get_provider, AIProviderError
+from utils.job_service import get_job_service, JOB_COMPLETED, JOB_FAILED
+from utils import llm_telemetry
 from gui.progress_window import ProgressWindow
 
 
@@ -75,6 +77,7 @@ class AIEditorWindow(ctk.CTkToplevel):
         self.tab_diagnostic = self.tabview.add("Diagnostic")
         self.tab_visualizer = self.tabview.add("Visualiser")
         self.tab_history = self.tabview.add("Historique")
+        self.tab_telemetry = self.tabview.add("Télémétrie")
         
         # Remplir l'onglet Configuration
         self.create_config_tab()
@@ -94,6 +97,9 @@ class AIEditorWindow(ctk.CTkToplevel):
         # Remplir l'onglet Historique
         self.create_history_tab()
         
+        # Remplir l'onglet Télémétrie
+        self.create_telemetry_tab()
+        
         # Centrer la fenêtre
         self.center_window()
         
@@ -1830,7 +1836,7 @@ class AIEditorWindow(ctk.CTkToplevel):
         
         batch_label = ctk.CTkLabel(
             batch_size_frame,
-            text="Produits par batch:",
+            text="Produits par batch (max):",
             width=200
         )
         batch_label.pack(side="left", padx=10)
@@ -1865,7 +1871,7 @@ class AIEditorWindow(ctk.CTkToplevel):
         
         batch_info = ctk.CTkLabel(
             batch_size_frame,
-            text="(nombre de produits traités simultanément)",
+            text="(maximum par requête, ajusté selon le budget de tokens du modèle)",
             font=ctk.CTkFont(size=11),
             text_color="gray"
         )
@@ -1992,10 +1998,57 @@ class AIEditorWindow(ctk.CTkToplevel):
         )
         self.confidence_threshold_save_status_label.pack(fill="x", padx=20, pady=(0, 10))
         
+        # Configuration du mode cascade (modèle rapide d'abord, modèle fort si confiance basse)
+        cascade_frame = ctk.CTkFrame(batch_frame)
+        cascade_frame.pack(fill="x", padx=20, pady=(0, 10))
+        
+        self.cascade_enabled_var = ctk.BooleanVar(value=False)
+        cascade_checkbox = ctk.CTkCheckBox(
+            cascade_frame,
+            text="Cascade Google Shopping:",
+            variable=self.cascade_enabled_var,
+            width=200
+        )
+        cascade_checkbox.pack(side="left", padx=10)
+        
+        self.cascade_fast_model_dropdown = ctk.CTkComboBox(
+            cascade_frame,
+            values=["gemini-2.0-flash", "gemini-2.5-flash", "gemini-2.5-pro"],
+            width=180,
+            state="readonly"
+        )
+        self.cascade_fast_model_dropdown.set("gemini-2.0-flash")
+        self.cascade_fast_model_dropdown.pack(side="left", padx=10)
+        
+        save_cascade_button = ctk.CTkButton(
+            cascade_frame,
+            text="💾 Sauvegarder",
+            width=120,
+            command=self.save_cascade_config
+        )
+        save_cascade_button.pack(side="left", padx=10)
+        
+        cascade_info = ctk.CTkLabel(
+            cascade_frame,
+            text="(modèle rapide d'abord, escalade vers le modèle Gemini configuré si confiance < 50% ou catégorie invalide)",
+            font=ctk.CTkFont(size=11),
+            text_color="gray"
+        )
+        cascade_info.pack(side="left", padx=10)
+        
+        self.cascade_save_status_label = ctk.CTkLabel(
+            batch_frame,
+            text="",
+            font=ctk.CTkFont(size=11),
+            text_color="green"
+        )
+        self.cascade_save_status_label.pack(fill="x", padx=20, pady=(0, 10))
+        
         # Charger les valeurs depuis la base de données
         self.load_batch_size()
         self.load_max_tokens()
         self.load_confidence_threshold()
+        self.load_cascade_config()
     
     
     def save_batch_size(self):
@@ -2149,6 +2202,28 @@ class AIEditorWindow(ctk.CTkToplevel):
             self.confidence_threshold_dropdown.set("90")  # Valeur par défaut en cas d'erreur
             self.confidence_threshold_current_value_label.configure(text=f"Configuré: 90%")
     
+    def save_cascade_config(self):
+        """Sauvegarde la configuration du mode cascade dans la base de données."""
+        try:
+            self.db.save_config('cascade_enabled', self.cascade_enabled_var.get())
+            self.db.save_config('cascade_fast_model', self.cascade_fast_model_dropdown.get())
+            logger.info(f"Cascade sauvegardée: {self.cascade_enabled_var.get()} ({self.cascade_fast_model_dropdown.get()})")
+            
+            self.cascade_save_status_label.configure(text="✓ Sauvegardé")
+            self.after(2000, lambda: self.cascade_save_status_label.configure(text=""))
+        except Exception as e:
+            logger.error(f"Erreur lors de la sauvegarde de la cascade: {e}", exc_info=True)
+            self.cascade_save_status_label.configure(text="✗ Erreur de sauvegarde", text_color="red")
+            self.after(2000, lambda: self.cascade_save_status_label.configure(text="", text_color="green"))
+    
+    def load_cascade_config(self):
+        """Charge la configuration du mode cascade depuis la base de données."""
+        try:
+            self.cascade_enabled_var.set(self.db.get_config_bool('cascade_enabled', default=False))
+            self.cascade_fast_model_dropdown.set(self.db.get_config('cascade_fast_model', default='gemini-2.0-flash'))
+        except Exception as e:
+            logger.error(f"Erreur lors du chargement de la cascade: {e}", exc_info=True)
+    
     
     # ========== Section 5: Sélection des champs ==========
     
@@ -3104,6 +3179,20 @@ class AIEditorWindow(ctk.CTkToplevel):
                 self.export_csv_button.configure(state="normal")
                 return
         
+        # Proposer de reprendre un traitement interrompu avec les mêmes paramètres
+        resume = False
+        previous_run = self.db.find_resumable_run(
+            self.csv_import_id, self.current_prompt_set_id, provider, model,
+            selected_fields, list(selected_handles) if selected_handles else None
+        )
+        if previous_run and previous_run['done_count']:
+            resume = messagebox.askyesno(
+                "Reprendre le traitement",
+                f"Un traitement interrompu avec les mêmes paramètres a déjà traité "
+                f"{previous_run['done_count']} produit(s).\n\n"
+                f"Reprendre ce traitement (Oui) ou tout retraiter (Non) ?"
+            )
+        
         # Désactiver les boutons
         self.start_processing_button.configure(state="disabled")
         self.export_csv_button.configure(state="disabled")
@@ -3120,79 +3209,47 @@ class AIEditorWindow(ctk.CTkToplevel):
         # Récupérer l'état de la recherche Internet
         enable_search = self.enable_search_var.get()
         
-        # Créer un handler de logging pour capturer tous les logs
-        class GUILogHandler(logging.Handler):
-            def __init__(self, callback):
-                super().__init__()
-                self.callback = callback
-                
-            def emit(self, record):
-                try:
-                    msg = self.format(record)
-                    self.callback(msg)
-                except Exception:
-                    pass
-        
-        # Créer et configurer le handler
-        gui_handler = GUILogHandler(self.add_processing_log)
-        gui_handler.setLevel(logging.INFO)
-        formatter = logging.Formatter('%(message)s')
-        gui_handler.setFormatter(formatter)
+        # Traitement en tâche de fond : worker séparé, qui continue si la fenêtre est fermée
+        try:
+            job_id = get_job_service().submit('ai_process_csv', {
+                'db_path': self.db.db_path,
+                'csv_path': self.csv_path,
+                'csv_import_id': self.csv_import_id,  # Réutiliser l'import existant
+                'prompt_set_id': self.current_prompt_set_id,
+                'provider': provider,
+                'model': model,
+                'selected_fields': selected_fields,
+                'handles': sorted(selected_handles) if selected_handles else None,
+                'enable_search': enable_search,
+                'resume': resume
+            }, f"Traitement IA - {os.path.basename(self.csv_path)}")
+        except Exception as e:
+            logger.error(f"Erreur lors du démarrage du traitement: {e}", exc_info=True)
+            self.processing_error(str(e))
+            return
         
-        def process_thread():
-            loggers_to_monitor = []
-            try:
-                # Ajouter le handler aux loggers pertinents
-                loggers_to_monitor = [
-                    logging.getLogger('apps.ai_editor.processor'),
-                    logging.getLogger('apps.ai_editor.agents'),
-                    logging.getLogger('utils.ai_providers'),
-                    logging.getLogger('__main__')
-                ]
-                
-                for log in loggers_to_monitor:
-                    log.addHandler(gui_handler)
-                
-                # Créer une nouvelle connexion DB pour ce thread
-                thread_db = AIPromptsDB()
-                processor = CSVAIProcessor(thread_db)
-                
-                success, output_path, changes_dict, processing_result_id = processor.process_csv(
-                    self.csv_path,
-                    self.current_prompt_set_id,
-                    provider,
-                    model,
-                    selected_fields,
-                    selected_handles,
-                    progress_callback=self.update_processing_progress,
-                    log_callback=self.add_processing_log,
-                    cancel_check=None,
-                    enable_search=enable_search,
-                    csv_import_id=self.csv_import_id  # Réutiliser l'import existant
+        self.add_processing_log(f"📋 Tâche de fond {job_id} démarrée")
+        get_job_service().subscribe(job_id).attach(self, self._on_processing_job_update)
+    
+    def _on_processing_job_update(self, state: Dict):
+        """Affiche la progression et les logs de la tâche de traitement (boucle Tk)."""
+        if state['logs']:
+            self.add_processing_log('\n'.join(state['logs']))
+        job = state['job']
+        if job is None:
+            return
+        if job['progress_message']:
+            self.update_processing_progress(job['progress_message'], job['progress_current'], job['progress_total'])
+        if state['finished']:
+            result = job['result'] or {}
+            if job['status'] == JOB_FAILED and not result:
+                self.processing_error(job['error'] or "Erreur inconnue")
+            else:
+                self.processing_completed(
+                    job['status'] == JOB_COMPLETED,
+                    result.get('output_path'),
+                    result.get('changes') or {}
                 )
-                
-                # Fermer la connexion du thread
-                thread_db.close()
-                
-                # Finaliser dans le thread principal
-                if hasattr(self, 'winfo_exists') and self.winfo_exists():
-                    self.after(0, lambda: self.processing_completed(success, output_path, changes_dict))
-            
-            except Exception as e:
-                error_msg = str(e)
-                logger.error(f"Erreur lors du traitement: {e}", exc_info=True)
-                if hasattr(self, 'winfo_exists') and self.winfo_exists():
-                    self.after(0, lambda: self.processing_error(error_msg))
-            
-            finally:
-                # Retirer le handler des loggers
-                try:
-                    for log in loggers_to_monitor:
-                        log.removeHandler(gui_handler)
-                except Exception:
-                    pass
-        
-        threading.Thread(target=process_thread, daemon=True).start()
     
     def update_processing_progress(self, message: str, current: int, total: int):
         """Met à jour la barre de progression."""
@@ -4097,6 +4154,106 @@ class AIEditorWindow(ctk.CTkToplevel):
     
     # ========== ONGLET HISTORIQUE ==========
     
+    # Fenêtres d'analyse proposées dans l'onglet Télémétrie (libellé -> heures)
+    TELEMETRY_WINDOWS = {"1 h": 1, "24 h": 24, "7 j": 24 * 7}
+    
+    def create_telemetry_tab(self):
+        """Crée l'onglet Télémétrie : débit, latence, coût et quota des appels LLM."""
+        title_label = ctk.CTkLabel(
+            self.tab_telemetry,
+            text="📊 Télémétrie des appels IA",
+            font=ctk.CTkFont(size=20, weight="bold")
+        )
+        title_label.pack(pady=(20, 10))
+        
+        controls_frame = ctk.CTkFrame(self.tab_telemetry)
+        controls_frame.pack(fill="x", padx=20, pady=(0, 10))
+        
+        self.telemetry_window = ctk.CTkSegmentedButton(
+            controls_frame,
+            values=list(self.TELEMETRY_WINDOWS),
+            command=lambda _value: self.load_telemetry()
+        )
+        self.telemetry_window.set("24 h")
+        self.telemetry_window.pack(side="left", padx=10, pady=10)
+        
+        refresh_button = ctk.CTkButton(
+            controls_frame,
+            text="🔄 Rafraîchir",
+            command=self.load_telemetry,
+            width=150
+        )
+        refresh_button.pack(side="left", padx=10, pady=10)
+        
+        self.telemetry_text = ctk.CTkTextbox(self.tab_telemetry, font=ctk.CTkFont(family="Courier", size=12))
+        self.telemetry_text.pack(fill="both", expand=True, padx=20, pady=(0, 20))
+        
+        self.load_telemetry()
+    
+    def load_telemetry(self):
+        """Charge et affiche le tableau de bord de télémétrie."""
+        hours = self.TELEMETRY_WINDOWS.get(self.telemetry_window.get(), 24)
+        try:
+            dashboard = llm_telemetry.build_dashboard(self.db.db_path, since_hours=hours)
+            report = self._format_telemetry(dashboard)
+        except Exception as e:
+            logger.error(f"Erreur lors du chargement de la télémétrie: {e}", exc_info=True)
+            report = f"Erreur lors du chargement: {e}"
+        
+        self.telemetry_text.configure(state="normal")
+        self.telemetry_text.delete("1.0", "end")
+        self.telemetry_text.insert("1.0", report)
+        self.telemetry_text.configure(state="disabled")
+    
+    @staticmethod
+    def _format_telemetry(dashboard: Dict) -> str:
+        """Met en forme le tableau de bord de télémétrie (texte à colonnes fixes)."""
+        def money(value):
+            return f"{value:.4f} $" if value is not None else "—"
+        
+        def row(label, stats):
+            return (f"{label[:34]:<34} {stats['calls']:>6} {stats['products']:>7} "
+                    f"{stats['products_per_minute']:>8.1f} {stats['p50_ms']:>7} {stats['p95_ms']:>7} "
+                    f"{stats['cache_hit_rate']:>6.0%} {stats['errors'] + stats['quota_errors']:>5} "
+                    f"{stats['retries']:>5} {money(stats['cost_per_100_products']):>12}")
+        
+        header = (f"{'':<34} {'Appels':>6} {'Produits':>7} {'Prod/min':>8} {'p50 ms':>7} {'p95 ms':>7} "
+                  f"{'Cache':>6} {'Err.':>5} {'Ret.':>5} {'Coût/100':>12}")
+        
+        overall = dashboard['overall']
+        lines = [
+            f"Fenêtre: {dashboard['since_hours']} h",
+            f"Appels: {overall['calls']}  |  Produits traités: {overall['products']}  |  "
+            f"Débit: {overall['products_per_minute']:.1f} produits/min",
+            f"Latence: p50 {overall['p50_ms']} ms, p95 {overall['p95_ms']} ms  |  "
+            f"Cache de prompt: {overall['cache_hit_rate']:.0%} des appels",
+            f"Tokens: {overall['prompt_tokens']} en entrée, {overall['completion_tokens']} en sortie  |  "
+            f"Coût: {money(overall['cost_usd'])} ({money(overall['cost_per_100_products'])} pour 100 produits)",
+            f"Erreurs: {overall['errors']}  |  Quota: {overall['quota_errors']}  |  Nouvelles tentatives: {overall['retries']}",
+        ]
+        
+        sections = [
+            ("Par provider / modèle", dashboard['by_model'], lambda key: f"{key[0]} / {key[1]}"),
+            ("Par agent", dashboard['by_agent'], lambda key: key[0] or "—"),
+            ("Par taille de batch", dashboard['by_batch_size'], lambda key: f"{key[0]} produit(s)"),
+        ]
+        for title, groups, label in sections:
+            lines += ["", f"── {title} ──", header]
+            lines += [row(label(key), stats) for key, stats in groups.items()]
+        
+        lines += ["", "── Projection des quotas journaliers ──"]
+        if not dashboard['quotas']:
+            lines.append("Aucun quota configuré (section telemetry.quotas de ai_config.json)")
+        for provider, projection in dashboard['quotas'].items():
+            for limit_key, quota in projection.items():
+                unit = "tokens" if limit_key == 'tokens_per_day' else "requêtes"
+                hours_left = (f"épuisé dans ~{quota['hours_left']:.1f} h" if quota['hours_left'] is not None
+                              else "aucune consommation sur la dernière heure")
+                lines.append(f"{provider}: {quota['used']}/{quota['limit']} {unit} aujourd'hui, "
+                             f"{quota['remaining']} restants, {quota['per_hour']:.0f}/h → {hours_left}")
+        
+        return "\n".join(lines)
+    
     def create_history_tab(self):
         """Crée l'onglet Historique pour voir tous les imports et régénérer des CSV."""
         # Frame scrollable
@@ -0,0 +1,198 @@
+"""
+Parsing incrémental des réponses JSON batch streamées par les agents IA.
+
+Les réponses batch ont la forme {"products": [{...}, {...}, ...]}. Le parser lit
+le texte au fil de l'eau et retourne chaque objet produit dès que son accolade
+fermante est reçue, sans attendre la fin de la réponse.
+"""
+
+import re
+import json
+import logging
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+HANDLE_PATTERN = re.compile(r'"handle"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+
+def extract_handle(fragment: str) -> Optional[str]:
+    """
+    Extrait le handle d'un fragment JSON, même incomplet ou invalide.
+
+    Args:
+        fragment: Texte d'un objet produit (éventuellement tronqué)
+
+    Returns:
+        Handle trouvé ou None
+    """
+    match = HANDLE_PATTERN.search(fragment or '')
+    return match.group(1) if match else None
+
+
+class IncrementalProductsParser:
+    """
+    Parser incrémental du tableau de produits d'une réponse JSON.
+
+    Usage:
+        parser = IncrementalProductsParser()
+        for chunk in stream:
+            for product in parser.feed(chunk):
+                ...
+        parser.failed_handles()  # produits mal formés ou tronqués
+    """
+
+    def __init__(self, array_key: str = 'products'):
+        """
+        Initialise le parser.
+
+        Args:
+            array_key: Clé du tableau de produits dans l'objet racine
+        """
+        self.array_key = array_key
+        self._buffer = ''
+        self._pos = 0
+        self._array_started = False
+        self._array_closed = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._obj_start: Optional[int] = None
+        self._key_pattern = re.compile(r'"%s"\s*:\s*\[' % re.escape(array_key))
+
+        self.parsed_count = 0
+        self.malformed_fragments: List[str] = []
+
+    @property
+    def text(self) -> str:
+        """Texte complet reçu jusqu'ici."""
+        return self._buffer
+
+    @property
+    def is_complete(self) -> bool:
+        """True si le tableau de produits a été fermé."""
+        return self._array_closed
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """
+        Ajoute un fragment de texte et retourne les produits complétés par ce fragment.
+
+        Args:
+            chunk: Fragment de texte reçu du provider
+
+        Returns:
+            Liste des objets produits terminés (dans l'ordre de la réponse)
+        """
+        if not chunk:
+            return []
+
+        self._buffer += chunk
+
+        if not self._array_started and not self._find_array_start():
+            return []
+
+        return self._scan()
+
+    def _find_array_start(self) -> bool:
+        """Repère le début du tableau de produits ("products": [ ou tableau racine)."""
+        match = self._key_pattern.search(self._buffer)
+        if match:
+            self._pos = match.end()
+            self._array_started = True
+            return True
+
+        # Tableau racine sans objet englobant : le premier délimiteur est un '['
+        first_brace = self._buffer.find('{')
+        first_bracket = self._buffer.find('[')
+        if first_bracket != -1 and (first_brace == -1 or first_bracket < first_brace):
+            self._pos = first_bracket + 1
+            self._array_started = True
+            return True
+
+        return False
+
+    def _scan(self) -> List[Dict[str, Any]]:
+        """Parcourt le texte non encore lu et extrait les objets fermés."""
+        products = []
+        buffer = self._buffer
+        i = self._pos
+
+        while i < len(buffer) and not self._array_closed:
+            c = buffer[i]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+            elif c == '"':
+                self._in_string = True
+            elif c == '{':
+                if self._depth == 0:
+                    self._obj_start = i
+                self._depth += 1
+            elif c == '}' and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0 and self._obj_start is not None:
+                    product = self._parse_fragment(buffer[self._obj_start:i + 1])
+                    if product is not None:
+                        products.append(product)
+                    self._obj_start = None
+            elif c == ']' and self._depth == 0:
+                self._array_closed = True
+
+            i += 1
+
+        self._pos = i
+        return products
+
+    def _parse_fragment(self, fragment: str) -> Optional[Dict[str, Any]]:
+        """
+        Parse un objet produit complet (json standard puis json-repair).
+
+        Args:
+            fragment: Texte de l'objet, accolades comprises
+
+        Returns:
+            Dictionnaire du produit, ou None si l'objet est inutilisable
+        """
+        result = None
+        try:
+            # strict=False : tolère les retours à la ligne non échappés dans les chaînes
+            result = json.loads(fragment, strict=False)
+        except json.JSONDecodeError:
+            try:
+                from json_repair import repair_json
+                result = json.loads(repair_json(fragment))
+            except Exception:
+                result = None
+
+        if not isinstance(result, dict):
+            logger.warning(f"Objet produit mal formé ignoré (handle: {extract_handle(fragment)})")
+            self.malformed_fragments.append(fragment)
+            return None
+
+        self.parsed_count += 1
+        return result
+
+    def pending_fragment(self) -> str:
+        """Objet produit en cours (non fermé), par exemple si la réponse a été tronquée."""
+        if self._obj_start is None:
+            return ''
+        return self._buffer[self._obj_start:]
+
+    def failed_handles(self) -> List[str]:
+        """
+        Handles des produits mal formés ou tronqués.
+
+        Returns:
+            Liste des handles identifiables dans les fragments inutilisables
+        """
+        handles = []
+        for fragment in self.malformed_fragments + [self.pending_fragment()]:
+            handle = extract_handle(fragment)
+            if handle and handle not in handles:
+                handles.append(handle)
+        return handles
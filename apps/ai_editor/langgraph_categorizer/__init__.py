@@ -4,5 +4,6 @@ Architecture multi-agents avec agents spécialisés.
 """
 
 from .graph import GoogleShoppingCategorizationGraph
+from .cascade import CascadeCategorizer
 
-__all__ = ['GoogleShoppingCategorizationGraph']
+__all__ = ['GoogleShoppingCategorizationGraph', 'CascadeCategorizer']
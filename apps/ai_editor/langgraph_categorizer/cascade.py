@@ -0,0 +1,207 @@
+"""
+Catégorisation en cascade : modèle rapide d'abord, modèle fort si nécessaire.
+
+Chaque produit passe d'abord par le graph LangGraph avec un modèle rapide et peu
+coûteux. Seuls les produits dont la confiance est sous le seuil, ou dont la
+catégorie n'a pas passé la validation, sont recatégorisés avec le modèle fort.
+Chaque décision de routage est enregistrée dans category_routing_log.
+"""
+
+import time
+import logging
+from typing import Dict, Any, List, Optional
+
+from .graph import GoogleShoppingCategorizationGraph
+from apps.ai_editor.db import AIPromptsDB
+
+logger = logging.getLogger(__name__)
+
+# Seuil de confiance par défaut (identique au seuil de remontée à la catégorie parente)
+DEFAULT_CONFIDENCE_THRESHOLD = 0.5
+
+
+class CascadeCategorizer:
+    """Catégoriseur à deux niveaux avec escalade sur faible confiance ou validation KO."""
+    
+    def __init__(self, db: AIPromptsDB, fast_provider, strong_provider,
+                 confidence_threshold: float = DEFAULT_CONFIDENCE_THRESHOLD):
+        """
+        Initialise la cascade.
+        
+        Args:
+            db: Instance de AIPromptsDB
+            fast_provider: Provider du modèle rapide (premier passage)
+            strong_provider: Provider du modèle fort (escalade)
+            confidence_threshold: Confiance minimale pour accepter le modèle rapide (0.0 - 1.0)
+        """
+        self.db = db
+        self.fast_provider = fast_provider
+        self.strong_provider = strong_provider
+        self.confidence_threshold = confidence_threshold
+        self.fast_graph = GoogleShoppingCategorizationGraph(db, fast_provider)
+        self._strong_graph: Optional[GoogleShoppingCategorizationGraph] = None
+        
+        self.stats = {'total': 0, 'escalated': 0}
+    
+    @property
+    def product_agent(self):
+        """Agent Produit du modèle rapide (définitions partagées avec le modèle fort via le cache)."""
+        return self.fast_graph.product_agent
+    
+    @property
+    def strong_graph(self) -> GoogleShoppingCategorizationGraph:
+        """Graph du modèle fort (créé seulement à la première escalade)."""
+        if self._strong_graph is None:
+            self._strong_graph = GoogleShoppingCategorizationGraph(self.db, self.strong_provider)
+        return self._strong_graph
+    
+    def _escalation_reason(self, result: Dict[str, Any]) -> Optional[str]:
+        """
+        Détermine si le résultat du modèle rapide doit être escaladé.
+        
+        Args:
+            result: Résultat de GoogleShoppingCategorizationGraph.categorize()
+        
+        Returns:
+            Raison de l'escalade, ou None si le résultat est accepté
+        """
+        if not result.get('is_valid') or not result.get('category_code'):
+            return f"validation KO: {result.get('validation_error') or 'catégorie absente'}"
+        if result.get('confidence', 0.0) < self.confidence_threshold:
+            return f"confiance {result.get('confidence', 0.0):.0%} < {self.confidence_threshold:.0%}"
+        return None
+    
+    def categorize(self, product_data: dict) -> dict:
+        """
+        Catégorise un produit avec le modèle rapide, puis le modèle fort si nécessaire.
+        
+        Args:
+            product_data: Données du produit (dict avec Title, Type, etc.)
+        
+        Returns:
+            Même format que GoogleShoppingCategorizationGraph.categorize(), plus
+            'model' (modèle ayant produit le résultat) et 'escalated' (bool)
+        """
+        handle = product_data.get('Handle', 'unknown')
+        fast_model = getattr(self.fast_provider, 'model', None)
+        strong_model = getattr(self.strong_provider, 'model', None)
+        
+        start = time.perf_counter()
+        fast_result = self.fast_graph.categorize(product_data)
+        fast_ms = int((time.perf_counter() - start) * 1000)
+        
+        reason = self._escalation_reason(fast_result)
+        result = fast_result
+        strong_ms = None
+        
+        if reason:
+            logger.info(f"⬆️ {handle}: Escalade vers {strong_model} ({reason})")
+            start = time.perf_counter()
+            result = self.strong_graph.categorize(product_data)
+            strong_ms = int((time.perf_counter() - start) * 1000)
+        else:
+            logger.info(f"⚡ {handle}: Résultat de {fast_model} accepté ({fast_result['confidence']:.0%})")
+        
+        return self._record(product_data, fast_result, result, reason, fast_ms, strong_ms)
+    
+    def categorize_batch(self, products_data: List[dict],
+                         definitions: Optional[Dict[str, dict]] = None) -> Dict[str, dict]:
+        """
+        Catégorise plusieurs produits : un batch avec le modèle rapide, puis un batch
+        avec le modèle fort pour les seuls produits escaladés.
+        
+        Les durées enregistrées sont celles du batch réparties par produit.
+        
+        Args:
+            products_data: Liste des données produits
+            definitions: Définitions produit déjà obtenues {handle: définition} (optionnel)
+        
+        Returns:
+            Dict {handle: résultat} au même format que categorize()
+        """
+        if not products_data:
+            return {}
+        
+        strong_model = getattr(self.strong_provider, 'model', None)
+        
+        start = time.perf_counter()
+        fast_results = self.fast_graph.categorize_batch(products_data, definitions)
+        fast_ms = int((time.perf_counter() - start) * 1000 / len(products_data))
+        
+        reasons = {}
+        for product_data in products_data:
+            handle = product_data.get('Handle', 'unknown')
+            reason = self._escalation_reason(fast_results[handle])
+            if reason:
+                logger.info(f"⬆️ {handle}: Escalade vers {strong_model} ({reason})")
+                reasons[handle] = reason
+        
+        strong_results = {}
+        strong_ms = None
+        if reasons:
+            escalated = [p for p in products_data if p.get('Handle', 'unknown') in reasons]
+            start = time.perf_counter()
+            strong_results = self.strong_graph.categorize_batch(escalated, definitions)
+            strong_ms = int((time.perf_counter() - start) * 1000 / len(escalated))
+        
+        results = {}
+        for product_data in products_data:
+            handle = product_data.get('Handle', 'unknown')
+            reason = reasons.get(handle)
+            results[handle] = self._record(
+                product_data, fast_results[handle], strong_results.get(handle, fast_results[handle]),
+                reason, fast_ms, strong_ms if reason else None
+            )
+        
+        logger.info(f"⚡ Cascade batch: {len(reasons)}/{len(products_data)} produit(s) escaladé(s)")
+        return results
+    
+    def _record(self, product_data: dict, fast_result: Dict[str, Any], result: Dict[str, Any],
+                reason: Optional[str], fast_ms: int, strong_ms: Optional[int]) -> dict:
+        """
+        Met à jour les statistiques, enregistre la décision de routage et construit le résultat.
+        
+        Args:
+            product_data: Données du produit
+            fast_result: Résultat du modèle rapide
+            result: Résultat final (modèle fort si escaladé)
+            reason: Raison de l'escalade (None si non escaladé)
+            fast_ms: Durée du modèle rapide (ms)
+            strong_ms: Durée du modèle fort (ms, None si non escaladé)
+        
+        Returns:
+            Résultat final avec 'model' et 'escalated'
+        """
+        handle = product_data.get('Handle', 'unknown')
+        fast_model = getattr(self.fast_provider, 'model', None)
+        strong_model = getattr(self.strong_provider, 'model', None)
+        
+        self.stats['total'] += 1
+        if reason:
+            self.stats['escalated'] += 1
+        
+        try:
+            self.db.save_routing_decision({
+                'handle': handle,
+                'product_key': self.db._generate_product_key(product_data),
+                'fast_model': fast_model,
+                'strong_model': strong_model,
+                'fast_category_path': fast_result.get('category_path'),
+                'fast_confidence': fast_result.get('confidence'),
+                'fast_is_valid': bool(fast_result.get('is_valid')),
+                'escalated': bool(reason),
+                'reason': reason,
+                'final_model': strong_model if reason else fast_model,
+                'final_category_path': result.get('category_path'),
+                'final_confidence': result.get('confidence'),
+                'fast_duration_ms': fast_ms,
+                'strong_duration_ms': strong_ms
+            })
+        except Exception as e:
+            logger.warning(f"Impossible d'enregistrer la décision de routage pour {handle}: {e}")
+        
+        return {
+            **result,
+            'model': strong_model if reason else fast_model,
+            'escalated': bool(reason)
+        }
@@ -3,15 +3,21 @@ Graph LangGraph principal pour la catégorisation Google Shopping.
 """
 
 import logging
+from typing import Dict, List, Optional
 from langgraph.graph import StateGraph, END
-from .state import ProductCategorizationState
+from .state import ProductCategorizationState, BatchCategorizationState
 from .nodes import (
     extract_context_node,
     product_definition_node,
     sql_candidates_node,
     taxonomy_selection_node,
     validation_node,
-    retry_decision_node
+    retry_decision_node,
+    batch_product_definition_node,
+    batch_sql_candidates_node,
+    batch_taxonomy_selection_node,
+    batch_validation_node,
+    batch_retry_decision_node
 )
 from .product_agent import ProductSpecialistAgent
 from .taxonomy_agent import TaxonomySpecialistAgent
@@ -35,8 +41,9 @@ class GoogleShoppingCategorizationGraph:
         self.product_agent = ProductSpecialistAgent(gemini_provider, db)
         self.taxonomy_agent = TaxonomySpecialistAgent(gemini_provider, db)
         
-        # Construire le graph
+        # Construire les graphs (unitaire et batch)
         self.graph = self._build_graph()
+        self.batch_graph = self._build_batch_graph()
     
     def _build_graph(self) -> StateGraph:
         """Construit le graph LangGraph."""
@@ -73,13 +80,107 @@ class GoogleShoppingCategorizationGraph:
             "validation",
             retry_decision_node,
             {
-                "retry": "product_definition",  # Retry from product definition
+                "retry": "sql_candidates",  # Retry des candidates (définition produit conservée)
                 "output": END
             }
         )
         
         return workflow.compile()
     
+    def _build_batch_graph(self) -> StateGraph:
+        """
+        Construit le graph LangGraph batch.
+        
+        Chaque tour fait une seule requête Agent Produit et une seule requête
+        Agent Taxonomy pour tous les produits en attente ; seuls les produits
+        dont la validation échoue repassent dans un nouveau tour.
+        """
+        workflow = StateGraph(BatchCategorizationState)
+        
+        workflow.add_node(
+            "product_definition",
+            lambda state: batch_product_definition_node(state, self.product_agent)
+        )
+        workflow.add_node(
+            "sql_candidates",
+            lambda state: batch_sql_candidates_node(state, self.db)
+        )
+        workflow.add_node(
+            "taxonomy_selection",
+            lambda state: batch_taxonomy_selection_node(state, self.taxonomy_agent)
+        )
+        workflow.add_node(
+            "validation",
+            lambda state: batch_validation_node(state, self.db)
+        )
+        
+        workflow.set_entry_point("product_definition")
+        workflow.add_edge("product_definition", "sql_candidates")
+        workflow.add_edge("sql_candidates", "taxonomy_selection")
+        workflow.add_edge("taxonomy_selection", "validation")
+        
+        workflow.add_conditional_edges(
+            "validation",
+            batch_retry_decision_node,
+            {
+                "retry": "sql_candidates",  # Retry des produits en échec uniquement (définition conservée)
+                "output": END
+            }
+        )
+        
+        return workflow.compile()
+    
+    def categorize_batch(self, products_data: List[dict],
+                         definitions: Optional[Dict[str, dict]] = None) -> Dict[str, dict]:
+        """
+        Catégorise plusieurs produits en une exécution du graph (~2 requêtes LLM par tour).
+        
+        Args:
+            products_data: Liste des données produits (dict avec Handle, Title, Type, etc.)
+            definitions: Définitions produit déjà obtenues {handle: définition} (optionnel,
+                         l'Agent Produit n'est appelé que pour les autres produits)
+        
+        Returns:
+            Dict {handle: résultat} au même format que categorize()
+        """
+        if not products_data:
+            return {}
+        
+        products = {}
+        for product_data in products_data:
+            products[product_data.get('Handle', 'unknown')] = product_data
+        
+        initial_state: BatchCategorizationState = {
+            'products': products,
+            'pending': list(products.keys()),
+            'product_definitions': {
+                handle: dict(definition)
+                for handle, definition in (definitions or {}).items() if handle in products
+            },
+            'candidate_categories': {},
+            'results': {},
+            'retry_count': 0,
+            'max_retries': 2,
+            'rejected_categories': {}
+        }
+        
+        logger.info(f"🚀 Début catégorisation LangGraph batch: {len(products)} produit(s)")
+        final_state = self.batch_graph.invoke(initial_state)
+        
+        results = {}
+        for handle in products:
+            result = final_state['results'].get(handle) or {}
+            results[handle] = {
+                'category_code': result.get('category_code'),
+                'category_path': result.get('category_path'),
+                'confidence': result.get('confidence', 0.0),
+                'needs_review': result.get('needs_review', True),
+                'rationale': result.get('rationale', ''),
+                'is_valid': result.get('is_valid', False),
+                'validation_error': result.get('validation_error')
+            }
+        return results
+    
     def categorize(self, product_data: dict) -> dict:
         """
         Catégorise un produit.
@@ -93,7 +194,9 @@ class GoogleShoppingCategorizationGraph:
                 'category_path': str,
                 'confidence': float,
                 'needs_review': bool,
-                'rationale': str
+                'rationale': str,
+                'is_valid': bool,
+                'validation_error': str | None
             }
         """
         # Initialiser le state
@@ -109,7 +212,8 @@ class GoogleShoppingCategorizationGraph:
             'needs_review': True,
             'rationale': '',
             'retry_count': 0,
-            'max_retries': 2
+            'max_retries': 2,
+            'rejected_categories': []
         }
         
         # Exécuter le graph
@@ -122,5 +226,7 @@ class GoogleShoppingCategorizationGraph:
             'category_path': final_state.get('selected_category_path'),
             'confidence': final_state.get('confidence', 0.0),
             'needs_review': final_state.get('needs_review', True),
-            'rationale': final_state.get('rationale', '')
+            'rationale': final_state.get('rationale', ''),
+            'is_valid': final_state.get('is_valid', False),
+            'validation_error': final_state.get('validation_error')
         }
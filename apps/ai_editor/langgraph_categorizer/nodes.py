@@ -3,13 +3,18 @@ Nodes du graph LangGraph pour la catégorisation Google Shopping.
 """
 
 import logging
-from .state import ProductCategorizationState
+from typing import Optional, Tuple, List
+from .state import ProductCategorizationState, BatchCategorizationState
 from .product_agent import ProductSpecialistAgent
 from .taxonomy_agent import TaxonomySpecialistAgent
 from apps.ai_editor.db import AIPromptsDB
 
 logger = logging.getLogger(__name__)
 
+# Nombre de catégories candidates SQL, élargi à chaque retry
+CANDIDATES_MAX_RESULTS = 15
+CANDIDATES_RETRY_STEP = 10
+
 
 def extract_context_node(state: ProductCategorizationState) -> ProductCategorizationState:
     """Node 1: Extraction initiale (optionnel, actuellement minimal)."""
@@ -65,32 +70,99 @@ def product_definition_node(
     return state
 
 
-def sql_candidates_node(
-    state: ProductCategorizationState,
-    db: AIPromptsDB
-) -> ProductCategorizationState:
-    """Node 3: Récupération des catégories candidates via SQL enrichi."""
-    logger.info("📊 Node: Récupération des candidates SQL...")
+def _get_candidates(db: AIPromptsDB, product_data: dict, product_definition: Optional[dict],
+                    retry_count: int = 0, rejected: Optional[List[str]] = None):
+    """
+    Récupère les catégories candidates d'un produit, enrichies des keywords de sa définition.
+    
+    Au retry, la définition produit est réutilisée telle quelle : seules les candidates
+    changent (liste élargie, catégories déjà rejetées retirées).
+    
+    Args:
+        db: Instance de AIPromptsDB
+        product_data: Données du produit
+        product_definition: Définition de l'Agent Produit (optionnelle)
+        retry_count: Numéro du retry (0 au premier passage)
+        rejected: Chemins de catégories rejetés par la validation
     
+    Returns:
+        Liste de (code, path) candidates
+    """
     # Utiliser les keywords de la définition produit
-    enriched_data = state['product_data'].copy()
+    enriched_data = product_data.copy()
     keywords_used = []
-    if state['product_definition']:
+    if product_definition:
         # Ajouter les keywords à la recherche
-        keywords = state['product_definition'].get('search_keywords', [])
+        keywords = product_definition.get('search_keywords', [])
         keywords_used = keywords
         enriched_data['_enriched_keywords'] = ' '.join(keywords)
+    # Mode hiérarchique : une branche de plus explorée à chaque retry
+    enriched_data['_taxonomy_retry'] = retry_count
     
     logger.info(f"  🔑 Keywords utilisés pour SQL: {', '.join(keywords_used) if keywords_used else 'aucun (fallback sur titre/type)'}")
     
     # Appeler get_candidate_categories avec les données enrichies
-    candidates = db.get_candidate_categories(enriched_data, max_results=15)
+    max_results = CANDIDATES_MAX_RESULTS + CANDIDATES_RETRY_STEP * retry_count
+    candidates = db.get_candidate_categories(enriched_data, max_results=max_results)
+    if rejected:
+        candidates = [c for c in candidates if c[1] not in rejected]
+        logger.info(f"  🔄 Retry {retry_count}: {max_results} candidates max, {len(rejected)} catégorie(s) rejetée(s) exclue(s)")
+    return candidates
+
+
+def sql_candidates_node(
+    state: ProductCategorizationState,
+    db: AIPromptsDB
+) -> ProductCategorizationState:
+    """Node 3: Récupération des catégories candidates via SQL enrichi."""
+    logger.info("📊 Node: Récupération des candidates SQL...")
+    
+    candidates = _get_candidates(
+        db, state['product_data'], state['product_definition'],
+        state['retry_count'], state['rejected_categories']
+    )
     state['candidate_categories'] = candidates
     
     logger.info(f"  ✓ {len(candidates)} catégories candidates trouvées")
     return state
 
 
+def _normalize_selection(result) -> Tuple[str, float, str]:
+    """
+    Vérifie et normalise le résultat de l'Agent Taxonomy.
+    
+    Args:
+        result: Tuple (category_path, confidence, rationale) retourné par l'agent
+    
+    Returns:
+        Tuple (category_path, confidence float, rationale) avec valeurs par défaut si invalide
+    """
+    # Vérifier que le résultat est valide
+    if not result or len(result) != 3:
+        logger.error(f"❌ Taxonomy agent a retourné un résultat invalide: {result}")
+        return "Maison et jardin", 0.05, "Erreur: Résultat agent invalide"
+    
+    category_path, confidence, rationale = result
+    
+    # Vérifier et convertir confidence en float
+    try:
+        confidence = float(confidence)
+        # Si 0 ou négatif, utiliser le défaut
+        if confidence <= 0:
+            logger.warning(f"⚠️ Confidence invalide ({confidence}), utilisation de 0.5 par défaut")
+            confidence = 0.5
+    except (ValueError, TypeError):
+        logger.warning(f"⚠️ Confidence invalide '{confidence}', utilisation de 0.5 par défaut")
+        confidence = 0.5
+    
+    # Vérifier que category_path n'est pas None ou vide
+    if not category_path:
+        logger.error(f"❌ Taxonomy agent a retourné une catégorie vide")
+        return "Maison et jardin", 0.05, "Erreur: Catégorie vide"
+    
+    return category_path, confidence, rationale
+
+
 def taxonomy_selection_node(
     state: ProductCategorizationState,
     taxonomy_agent: TaxonomySpecialistAgent
@@ -113,32 +185,7 @@ def taxonomy_selection_node(
             state['candidate_categories']
         )
         
-        # Vérifier que le résultat est valide
-        if not result or len(result) != 3:
-            logger.error(f"❌ Taxonomy agent a retourné un résultat invalide: {result}")
-            category_path = "Maison et jardin"
-            confidence = 0.05
-            rationale = "Erreur: Résultat agent invalide"
-        else:
-            category_path, confidence, rationale = result
-            
-            # Vérifier et convertir confidence en float
-            try:
-                confidence = float(confidence)
-                # Si 0 ou négatif, utiliser le défaut
-                if confidence <= 0:
-                    logger.warning(f"⚠️ Confidence invalide ({confidence}), utilisation de 0.5 par défaut")
-                    confidence = 0.5
-            except (ValueError, TypeError):
-                logger.warning(f"⚠️ Confidence invalide '{confidence}', utilisation de 0.5 par défaut")
-                confidence = 0.5
-            
-            # Vérifier que category_path n'est pas None ou vide
-            if not category_path:
-                logger.error(f"❌ Taxonomy agent a retourné une catégorie vide")
-                category_path = "Maison et jardin"
-                confidence = 0.05
-                rationale = "Erreur: Catégorie vide"
+        category_path, confidence, rationale = _normalize_selection(result)
         
         state['selected_category_path'] = category_path
         state['confidence'] = float(confidence)  # Garantir que c'est un float
@@ -161,6 +208,39 @@ def taxonomy_selection_node(
     return state
 
 
+def _validate_category(db: AIPromptsDB, category_path: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Vérifie qu'une catégorie existe dans la taxonomie et a au moins 3 niveaux.
+    
+    Args:
+        db: Instance de AIPromptsDB
+        category_path: Chemin choisi par l'Agent Taxonomy
+    
+    Returns:
+        Tuple (code de la catégorie si valide, message d'erreur sinon)
+    """
+    # Vérifier que category_path n'est pas None ou vide
+    if not category_path:
+        logger.error(f"⚠ Validation KO: selected_category_path est None ou vide")
+        return None, "Aucune catégorie retournée par l'Agent Taxonomy (None ou vide)"
+    
+    # Vérifier que la catégorie existe dans la taxonomie
+    category_code = db.search_google_category(category_path)
+    if not category_code:
+        logger.warning(f"⚠ Validation KO: Catégorie non trouvée")
+        return None, f"Catégorie non trouvée: {category_path}"
+    
+    # Vérifier que la catégorie est suffisamment spécifique (au moins 3 niveaux)
+    path_levels = category_path.count('>') + 1
+    if path_levels < 3:
+        # Catégorie trop générale (ex: "Maison et jardin" ou "Maison et jardin > Linge")
+        logger.warning(f"⚠ Validation KO: Catégorie trop générale ({path_levels} niveaux)")
+        return None, f"Catégorie trop générale ({path_levels} niveau(x)): {category_path} - Nécessite au moins 3 niveaux"
+    
+    logger.info(f"✓ Validation OK: {category_code} - {category_path} ({path_levels} niveaux)")
+    return category_code, None
+
+
 def validation_node(
     state: ProductCategorizationState,
     db: AIPromptsDB
@@ -168,50 +248,157 @@ def validation_node(
     """Node 5: Validation de la catégorie choisie."""
     logger.info("✅ Node: Validation...")
     
-    # Vérifier que selected_category_path n'est pas None ou vide
-    if not state.get('selected_category_path'):
-        state['is_valid'] = False
-        state['validation_error'] = "Aucune catégorie retournée par l'Agent Taxonomy (None ou vide)"
-        logger.error(f"⚠ Validation KO: selected_category_path est None ou vide")
+    category_code, error = _validate_category(db, state.get('selected_category_path'))
+    
+    if category_code:
+        state['selected_category_code'] = category_code
+        state['is_valid'] = True
+        state['needs_review'] = state['confidence'] < 0.8  # Threshold
         return state
     
-    # Vérifier que la catégorie existe dans la taxonomie
-    category_code = db.search_google_category(state['selected_category_path'])
+    state['is_valid'] = False
+    state['validation_error'] = error
+    if state.get('selected_category_path'):
+        state['rejected_categories'].append(state['selected_category_path'])
     
-    if category_code:
-        # Vérifier que la catégorie est suffisamment spécifique (au moins 3 niveaux)
-        path_levels = state['selected_category_path'].count('>') + 1
-        
-        if path_levels < 3:
-            # Catégorie trop générale (ex: "Maison et jardin" ou "Maison et jardin > Linge")
-            state['is_valid'] = False
-            state['validation_error'] = f"Catégorie trop générale ({path_levels} niveau(x)): {state['selected_category_path']} - Nécessite au moins 3 niveaux"
-            logger.warning(f"⚠ Validation KO: Catégorie trop générale ({path_levels} niveaux)")
-        else:
-            state['selected_category_code'] = category_code
-            state['is_valid'] = True
-            state['needs_review'] = state['confidence'] < 0.8  # Threshold
-            logger.info(f"✓ Validation OK: {category_code} - {state['selected_category_path']} ({path_levels} niveaux)")
+    # Le compteur est mis à jour ici : les modifications du state faites dans
+    # la fonction de décision (conditional edge) ne sont pas conservées
+    state['retry_count'] += 1
+    if state['retry_count'] <= state['max_retries']:
+        logger.info(f"🔄 Retry {state['retry_count']}/{state['max_retries']}")
     else:
-        state['is_valid'] = False
-        state['validation_error'] = f"Catégorie non trouvée: {state['selected_category_path']}"
-        logger.warning(f"⚠ Validation KO: Catégorie non trouvée")
+        # Max retries atteint
+        state['needs_review'] = True
+        state['confidence'] = 0.0
+        logger.warning("❌ Max retries atteint, flagging for review")
     
     return state
 
 
 def retry_decision_node(state: ProductCategorizationState) -> str:
     """Décide si on retry ou pas."""
-    if state['is_valid']:
-        return "output"
+    if not state['is_valid'] and state['retry_count'] <= state['max_retries']:
+        return "retry"
+    return "output"
+
+
+# ============================================================================
+# GRAPH BATCH : plusieurs produits par exécution (1 requête par agent et par tour)
+# ============================================================================
+
+def batch_product_definition_node(
+    state: BatchCategorizationState,
+    product_agent: ProductSpecialistAgent
+) -> BatchCategorizationState:
+    """Node batch 1: l'Agent Produit définit tous les produits en attente en une requête."""
+    # Les définitions déjà fournies (analyse lancée en parallèle du SEO) ne sont pas redemandées
+    pending = [h for h in state['pending'] if h not in state['product_definitions']]
+    if not pending:
+        logger.info("🔍 Node batch: Définitions produit déjà disponibles")
+        return state
+    logger.info(f"🔍 Node batch: Définition de {len(pending)} produit(s)...")
+    
+    try:
+        definitions = product_agent.analyze_products([state['products'][h] for h in pending])
+    except Exception as e:
+        logger.error(f"❌ Erreur dans batch_product_definition_node: {e}")
+        definitions = {}
+    for handle in pending:
+        definition = definitions.get(handle) or product_agent._fallback_definition(state['products'][handle])
+        if 'product_type' not in definition:
+            definition['product_type'] = state['products'][handle].get('Title', 'Produit inconnu')
+        if 'search_keywords' not in definition:
+            definition['search_keywords'] = []
+        state['product_definitions'][handle] = definition
+    
+    return state
+
+
+def batch_sql_candidates_node(
+    state: BatchCategorizationState,
+    db: AIPromptsDB
+) -> BatchCategorizationState:
+    """Node batch 2: catégories candidates SQL de chaque produit en attente."""
+    logger.info(f"📊 Node batch: Candidates SQL pour {len(state['pending'])} produit(s)...")
+    
+    for handle in state['pending']:
+        state['candidate_categories'][handle] = _get_candidates(
+            db, state['products'][handle], state['product_definitions'].get(handle),
+            state['retry_count'], state['rejected_categories'].get(handle)
+        )
+    
+    return state
+
+
+def batch_taxonomy_selection_node(
+    state: BatchCategorizationState,
+    taxonomy_agent: TaxonomySpecialistAgent
+) -> BatchCategorizationState:
+    """Node batch 3: l'Agent Taxonomy choisit la catégorie de tous les produits en attente en une requête."""
+    pending = state['pending']
+    logger.info(f"🎯 Node batch: Sélection de {len(pending)} catégorie(s)...")
+    
+    items = [
+        (handle, state['product_definitions'][handle], state['candidate_categories'][handle])
+        for handle in pending
+    ]
+    try:
+        selections = taxonomy_agent.select_categories(items)
+    except Exception as e:
+        logger.error(f"❌ Erreur dans batch_taxonomy_selection_node: {e}")
+        selections = {}
+    
+    for handle in pending:
+        category_path, confidence, rationale = _normalize_selection(selections.get(handle))
+        state['results'][handle] = {
+            'category_code': None,
+            'category_path': category_path,
+            'confidence': float(confidence),
+            'needs_review': True,
+            'rationale': rationale,
+            'is_valid': False,
+            'validation_error': None
+        }
+    
+    return state
+
+
+def batch_validation_node(
+    state: BatchCategorizationState,
+    db: AIPromptsDB
+) -> BatchCategorizationState:
+    """Node batch 4: validation ; seuls les produits en échec restent en attente pour un nouveau tour."""
+    logger.info(f"✅ Node batch: Validation de {len(state['pending'])} produit(s)...")
     
-    if state['retry_count'] < state['max_retries']:
+    failed = []
+    for handle in state['pending']:
+        result = state['results'][handle]
+        category_code, error = _validate_category(db, result['category_path'])
+        if category_code:
+            result['category_code'] = category_code
+            result['is_valid'] = True
+            result['needs_review'] = result['confidence'] < 0.8  # Threshold
+        else:
+            result['validation_error'] = error
+            if result['category_path']:
+                state['rejected_categories'].setdefault(handle, []).append(result['category_path'])
+            failed.append(handle)
+    
+    state['pending'] = failed
+    if failed and state['retry_count'] < state['max_retries']:
         state['retry_count'] += 1
-        logger.info(f"🔄 Retry {state['retry_count']}/{state['max_retries']}")
-        return "retry"
+        logger.info(f"🔄 Retry {state['retry_count']}/{state['max_retries']} pour {len(failed)} produit(s)")
+    elif failed:
+        # Max retries atteint
+        for handle in failed:
+            state['results'][handle]['needs_review'] = True
+            state['results'][handle]['confidence'] = 0.0
+        logger.warning(f"❌ Max retries atteint, {len(failed)} produit(s) à revoir")
+        state['pending'] = []
     
-    # Max retries atteint
-    state['needs_review'] = True
-    state['confidence'] = 0.0
-    logger.warning("❌ Max retries atteint, flagging for review")
-    return "output"
+    return state
+
+
+def batch_retry_decision_node(state: BatchCategorizationState) -> str:
+    """Décide si un nouveau tour est nécessaire (produits en échec restants)."""
+    return "retry" if state['pending'] else "output"
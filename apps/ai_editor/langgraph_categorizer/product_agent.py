@@ -4,6 +4,10 @@ Agent spécialiste pour la définition des produits textiles français.
 
 import json
 import logging
+from typing import Dict, List, Tuple
+
+from apps.ai_editor.response_schemas import PRODUCT_DEFINITION_SCHEMA, PRODUCT_DEFINITIONS_BATCH_SCHEMA
+from utils.llm_telemetry import llm_call_context
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +30,9 @@ class ProductSpecialistAgent:
         """
         Analyse le produit et retourne une définition structurée.
         
+        La définition est mise en cache par contenu produit (Title/Type/Vendor) :
+        un produit identique n'est pas réanalysé par le LLM.
+        
         Args:
             product_data: Données du produit (Title, Type, Vendor, Tags, etc.)
         
@@ -37,6 +44,10 @@ class ProductSpecialistAgent:
                 "search_keywords": ["couverture", "lit", ...]
             }
         """
+        cached = self._get_cached_definitions([product_data])
+        if cached:
+            return next(iter(cached.values()))
+        
         prompt = f"""Analyse ce produit et réponds avec un JSON valide (une seule ligne).
 
 PRODUIT: {product_data.get('Title', '')}
@@ -57,13 +68,14 @@ JSON (une ligne):
 
 Réponds UNIQUEMENT le JSON."""
 
+        response = ''
         try:
             # Récupérer max_tokens depuis la configuration (par défaut 5000)
             max_tokens = 5000
             if self.db:
                 max_tokens = self.db.get_config_int('max_tokens', default=5000)
             
-            response = self.provider.generate(prompt, max_tokens=max_tokens)
+            response = self._generate_json(prompt, max_tokens, PRODUCT_DEFINITION_SCHEMA)
             logger.info(f"📤 Product Agent - Réponse brute LLM (max_tokens={max_tokens}): {response[:200]}...")
             
             # Parser le JSON avec plusieurs méthodes
@@ -81,6 +93,7 @@ Réponds UNIQUEMENT le JSON."""
             try:
                 result = json.loads(clean)
                 logger.info(f"✓ Produit défini: {result['product_type']} - Usage: {result['usage']}")
+                self._save_definition(product_data, result)
                 return result
             except json.JSONDecodeError as e:
                 logger.warning(f"Parsing JSON direct échoué: {e}, tentative de réparation...")
@@ -91,6 +104,7 @@ Réponds UNIQUEMENT le JSON."""
                     repaired = repair_json(clean)
                     result = json.loads(repaired)
                     logger.info(f"✓ Produit défini (JSON réparé): {result['product_type']} - Usage: {result['usage']}")
+                    self._save_definition(product_data, result)
                     return result
                 except Exception as e2:
                     logger.error(f"Réparation JSON échouée: {e2}")
@@ -99,42 +113,312 @@ Réponds UNIQUEMENT le JSON."""
         except Exception as e:
             logger.error(f"Erreur totale parsing JSON: {e}")
             logger.error(f"Réponse brute: {response[:200]}")
-            # Fallback: Analyse basique du titre
-            title_lower = product_data.get('Title', '').lower()
-            
-            # Détecter le type de produit depuis le titre
-            product_type = product_data.get('Type', '')
-            usage = "unknown"
-            keywords = []
-            
-            if 'plaid' in title_lower:
-                product_type = 'plaid'
-                usage = 'literie'
-                keywords = ['couverture', 'lit', 'literie', 'plaid']
-            elif 'nappe' in title_lower:
-                product_type = 'nappe'
-                usage = 'table'
-                keywords = ['nappe', 'table', 'linge de table']
-            elif 'rideau' in title_lower:
-                product_type = 'rideau'
-                usage = 'fenetre'
-                keywords = ['rideau', 'fenêtre', 'decoration']
-            elif 'serviette' in title_lower:
-                if 'bain' in title_lower or 'toilette' in title_lower:
-                    product_type = 'serviette de bain'
-                    usage = 'salle_de_bain'
-                    keywords = ['serviette', 'bain', 'toilette']
-                else:
-                    product_type = 'serviette de table'
-                    usage = 'table'
-                    keywords = ['serviette', 'table', 'linge de table']
+            return self._fallback_definition(product_data)
+    
+    def _product_key(self, product_data: dict) -> str:
+        """Clé de cache d'un produit (hash Title/Type/Vendor, handle si pas de base)."""
+        if self.db:
+            return self.db._generate_product_key(product_data)
+        return product_data.get('Handle', '')
+    
+    def _get_cached_definitions(self, products_data: List[dict]) -> Dict[str, dict]:
+        """
+        Récupère les définitions déjà en cache.
+        
+        Args:
+            products_data: Liste des données produits
+        
+        Returns:
+            Dict {handle: définition} pour les produits trouvés en cache
+        """
+        if not self.db:
+            return {}
+        
+        keys = {p.get('Handle', ''): self._product_key(p) for p in products_data}
+        try:
+            cached = self.db.get_product_definitions(list(keys.values()))
+        except Exception as e:
+            logger.warning(f"Lecture du cache des définitions produit impossible: {e}")
+            return {}
+        
+        definitions = {handle: dict(cached[key]) for handle, key in keys.items() if key in cached}
+        if definitions:
+            logger.info(f"💾 {len(definitions)} définition(s) produit trouvée(s) en cache (0 appel LLM)")
+        return definitions
+    
+    def _save_definition(self, product_data: dict, definition: dict):
+        """Enregistre une définition produit obtenue du LLM dans le cache."""
+        if not self.db:
+            return
+        try:
+            self.db.save_product_definition(self._product_key(product_data), definition)
+        except Exception as e:
+            logger.warning(f"Impossible de mettre en cache la définition de {product_data.get('Handle', '')}: {e}")
+    
+    def _get_max_tokens(self) -> int:
+        """Récupère max_tokens depuis la configuration (par défaut 5000)."""
+        if self.db:
+            return self.db.get_config_int('max_tokens', default=5000)
+        return 5000
+    
+    def _generate_json(self, prompt: str, max_tokens: int, schema: dict, batch_size: int = 1) -> str:
+        """
+        Appelle le LLM en imposant le schéma JSON de la réponse quand le provider le permet.
+        
+        Args:
+            prompt: Prompt complet
+            max_tokens: Limite de tokens en sortie
+            schema: Schéma JSON attendu
+            batch_size: Nombre de produits dans la requête (télémétrie)
+        
+        Returns:
+            Réponse brute du LLM
+        """
+        with llm_call_context(type(self).__name__, batch_size):
+            if getattr(self.provider, 'supports_response_schema', False):
+                return self.provider.generate(prompt, max_tokens=max_tokens, response_schema=schema)
+            return self.provider.generate(prompt, max_tokens=max_tokens)
+    
+    def _parse_json(self, response: str):
+        """
+        Parse une réponse JSON du LLM (markdown retiré, json-repair en secours).
+        
+        Args:
+            response: Réponse brute du LLM
+        
+        Returns:
+            Objet JSON décodé
+        """
+        clean = response.strip()
+        if clean.startswith('```json'):
+            clean = clean[7:]
+        if clean.startswith('```'):
+            clean = clean[3:]
+        if clean.endswith('```'):
+            clean = clean[:-3]
+        clean = clean.strip()
+        
+        try:
+            return json.loads(clean)
+        except json.JSONDecodeError as e:
+            logger.warning(f"Parsing JSON direct échoué: {e}, tentative de réparation...")
+            from json_repair import repair_json
+            return json.loads(repair_json(clean))
+    
+    def analyze_products(self, products_data: List[dict]) -> Dict[str, dict]:
+        """
+        Analyse plusieurs produits en une seule requête.
+        
+        Les produits en cache et les doublons (même contenu) ne sont pas envoyés au LLM.
+        
+        Args:
+            products_data: Liste des données produits (Handle, Title, Type, ...)
+        
+        Returns:
+            Dict {handle: définition} pour tous les produits (fallback basique
+            pour ceux absents ou invalides dans la réponse)
+        """
+        definitions, pending, duplicates = self.plan_definitions(products_data)
+        
+        if len(pending) == 1:
+            product_data = pending[0]
+            definitions[product_data.get('Handle', '')] = self.analyze_product(product_data)
+        elif pending:
+            definitions.update(self._analyze_products_llm(pending))
+        
+        return self.resolve_duplicates(definitions, duplicates)
+    
+    def plan_definitions(self, products_data: List[dict]) -> Tuple[Dict[str, dict], List[dict], Dict[str, str]]:
+        """
+        Sépare les produits déjà définis en cache de ceux à envoyer au LLM.
+        
+        Un seul produit est envoyé par contenu identique, les doublons reprennent sa définition.
+        
+        Args:
+            products_data: Liste des données produits
+        
+        Returns:
+            Tuple (définitions en cache {handle: définition},
+                   produits à analyser, doublons {handle: handle du produit analysé})
+        """
+        definitions = self._get_cached_definitions(products_data)
+        
+        to_analyze = {}
+        duplicates = {}
+        for product_data in products_data:
+            handle = product_data.get('Handle', '')
+            if handle in definitions:
+                continue
+            key = self._product_key(product_data)
+            if key in to_analyze:
+                duplicates[handle] = to_analyze[key].get('Handle', '')
             else:
-                keywords = [w for w in title_lower.split() if len(w) > 3][:5]
+                to_analyze[key] = product_data
+        
+        return definitions, list(to_analyze.values()), duplicates
+    
+    def resolve_duplicates(self, definitions: Dict[str, dict], duplicates: Dict[str, str]) -> Dict[str, dict]:
+        """
+        Copie la définition de chaque produit analysé vers ses doublons.
+        
+        Args:
+            definitions: Définitions {handle: définition}, complétées en place
+            duplicates: Doublons {handle: handle du produit analysé}
+        
+        Returns:
+            Les définitions complétées
+        """
+        for handle, source_handle in duplicates.items():
+            if source_handle in definitions:
+                definitions[handle] = dict(definitions[source_handle])
+        return definitions
+    
+    def accept_definitions(self, products_data: List[dict], definitions: Dict[str, dict]) -> Dict[str, dict]:
+        """
+        Complète les définitions reçues du LLM et les met en cache.
+        
+        Args:
+            products_data: Produits demandés
+            definitions: Définitions reçues {handle: définition}
+        
+        Returns:
+            Définitions acceptées {handle: définition} (produits absents de la réponse exclus)
+        """
+        accepted = {}
+        for product_data in products_data:
+            handle = product_data.get('Handle', '')
+            if handle in definitions:
+                definition = definitions[handle]
+                definition.setdefault('usage', 'Non déterminé')
+                definition.setdefault('material', '')
+                definition.setdefault('search_keywords', [])
+                self._save_definition(product_data, definition)
+                accepted[handle] = definition
+        return accepted
+    
+    def _analyze_products_llm(self, products_data: List[dict]) -> Dict[str, dict]:
+        """
+        Analyse plusieurs produits en une seule requête LLM (sans cache).
+        
+        Args:
+            products_data: Liste des données produits (Handle, Title, Type, ...)
+        
+        Returns:
+            Dict {handle: définition} pour tous les produits
+        """
+        definitions = self.accept_definitions(
+            products_data, self.request_definitions(products_data, self._get_max_tokens())
+        )
+        
+        for product_data in products_data:
+            handle = product_data.get('Handle', '')
+            if handle not in definitions:
+                logger.warning(f"⚠️ {handle}: absent de la réponse batch, fallback basique")
+                definitions[handle] = self._fallback_definition(product_data)
+        
+        return definitions
+    
+    def request_definitions(self, products_data: List[dict], max_tokens: int) -> Dict[str, dict]:
+        """
+        Demande au LLM la définition de plusieurs produits en une requête.
+        
+        N'utilise pas la base (cache, configuration) : peut être exécutée dans
+        un autre thread, en parallèle d'un autre agent.
+        
+        Args:
+            products_data: Liste des données produits (Handle, Title, Type, ...)
+            max_tokens: Limite de tokens en sortie
+        
+        Returns:
+            Dict {handle: définition} pour les produits présents et valides dans la réponse
+        """
+        products_text = "\n".join(
+            f"- handle={p.get('Handle', '')} | PRODUIT: {p.get('Title', '')} | TYPE: {p.get('Type', '')}"
+            for p in products_data
+        )
+        
+        prompt = f"""Analyse ces {len(products_data)} produits et réponds avec un JSON valide.
+
+PRODUITS:
+{products_text}
+
+CONTEXTE: 90% des produits sont dans "Maison et jardin" (textile, vaisselle, décoration, ustensiles) ou "Aliments, boissons et tabac" (thé, café, épices, biscuits).
+
+RÈGLES:
+- PLAID/COUVERTURE → usage="literie", keywords=["couverture","lit","literie"]
+- NAPPE/SERVIETTE DE TABLE → usage="table", keywords=["nappe","linge de table"]
+- RIDEAU → usage="fenetre", keywords=["rideau","fenetre"]
+- THÉ/CAFÉ/ÉPICES → usage="boisson" ou "aliment", keywords appropriés
+- VAISSELLE/TASSE/MUG → usage="vaisselle", keywords=["vaisselle","tasse","mug"]
+- USTENSILES/CASSEROLE → usage="cuisine", keywords=["ustensile","cuisine"]
+
+JSON (un objet par produit, handle recopié à l'identique):
+{{"products":[{{"handle":"...","product_type":"...","usage":"...","material":"...","search_keywords":["...","...","..."]}}]}}
+
+Réponds UNIQUEMENT le JSON."""
+        
+        definitions = {}
+        try:
+            response = self._generate_json(prompt, max_tokens, PRODUCT_DEFINITIONS_BATCH_SCHEMA, len(products_data))
+            logger.info(f"📤 Product Agent (batch {len(products_data)}) - Réponse brute LLM: {response[:200]}...")
             
-            logger.info(f"⚠️ Fallback utilisé: {product_type} - Usage: {usage}")
-            return {
-                "product_type": product_type,
-                "usage": usage,
-                "material": "",
-                "search_keywords": keywords if keywords else [product_data.get('Title', '')]
-            }
+            result = self._parse_json(response)
+            items = result.get('products', []) if isinstance(result, dict) else result
+            for item in items or []:
+                if isinstance(item, dict) and item.get('handle') and item.get('product_type'):
+                    definitions[item.pop('handle')] = item
+        except Exception as e:
+            logger.error(f"Erreur analyse batch des produits: {e}")
+        
+        logger.info(f"✓ {len(definitions)}/{len(products_data)} produits définis en 1 requête")
+        return definitions
+    
+    def _fallback_definition(self, product_data: dict) -> dict:
+        """
+        Définition basique déduite du titre (quand le LLM échoue).
+        
+        Args:
+            product_data: Données du produit
+        
+        Returns:
+            Définition {product_type, usage, material, search_keywords}
+        """
+        # Fallback: Analyse basique du titre
+        title_lower = product_data.get('Title', '').lower()
+        
+        # Détecter le type de produit depuis le titre
+        product_type = product_data.get('Type', '')
+        usage = "unknown"
+        keywords = []
+        
+        if 'plaid' in title_lower:
+            product_type = 'plaid'
+            usage = 'literie'
+            keywords = ['couverture', 'lit', 'literie', 'plaid']
+        elif 'nappe' in title_lower:
+            product_type = 'nappe'
+            usage = 'table'
+            keywords = ['nappe', 'table', 'linge de table']
+        elif 'rideau' in title_lower:
+            product_type = 'rideau'
+            usage = 'fenetre'
+            keywords = ['rideau', 'fenêtre', 'decoration']
+        elif 'serviette' in title_lower:
+            if 'bain' in title_lower or 'toilette' in title_lower:
+                product_type = 'serviette de bain'
+                usage = 'salle_de_bain'
+                keywords = ['serviette', 'bain', 'toilette']
+            else:
+                product_type = 'serviette de table'
+                usage = 'table'
+                keywords = ['serviette', 'table', 'linge de table']
+        else:
+            keywords = [w for w in title_lower.split() if len(w) > 3][:5]
+        
+        logger.info(f"⚠️ Fallback utilisé: {product_type} - Usage: {usage}")
+        return {
+            "product_type": product_type,
+            "usage": usage,
+            "material": "",
+            "search_keywords": keywords if keywords else [product_data.get('Title', '')]
+        }
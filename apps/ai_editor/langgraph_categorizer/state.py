@@ -2,7 +2,7 @@
 Définition du State pour le graph LangGraph de catégorisation.
 """
 
-from typing import TypedDict, Optional, List, Tuple
+from typing import TypedDict, Optional, List, Tuple, Dict
 
 
 class ProductCategorizationState(TypedDict):
@@ -29,6 +29,26 @@ class ProductCategorizationState(TypedDict):
     needs_review: bool
     rationale: str  # Explication de la décision
     
-    # Retry control
+    # Retry control (le retry repart des candidates SQL, sans réanalyser le produit)
     retry_count: int
     max_retries: int
+    rejected_categories: List[str]  # Chemins rejetés par la validation
+
+
+class BatchCategorizationState(TypedDict):
+    """State pour la catégorisation de plusieurs produits par exécution du graph."""
+    # Input
+    products: Dict[str, dict]  # {handle: product_data}
+    
+    # Produits à (re)traiter au tour courant (les produits validés en sortent)
+    pending: List[str]
+    
+    # Par produit
+    product_definitions: Dict[str, dict]
+    candidate_categories: Dict[str, List[Tuple[int, str]]]
+    results: Dict[str, dict]  # {handle: {category_code, category_path, confidence, ...}}
+    
+    # Retry control (commun au batch, repart des candidates SQL)
+    retry_count: int
+    max_retries: int
+    rejected_categories: Dict[str, List[str]]  # {handle: chemins rejetés par la validation}
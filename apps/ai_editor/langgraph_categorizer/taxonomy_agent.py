@@ -4,7 +4,10 @@ Agent spécialiste pour la sélection dans la taxonomie Google Shopping françai
 
 import json
 import logging
-from typing import List, Tuple
+from typing import Dict, List, Tuple
+
+from apps.ai_editor.response_schemas import CATEGORY_SELECTION_SCHEMA, CATEGORY_SELECTIONS_BATCH_SCHEMA
+from utils.llm_telemetry import llm_call_context
 
 logger = logging.getLogger(__name__)
 
@@ -64,7 +67,7 @@ Réponds UN SEUL JSON compact:
             if self.db:
                 max_tokens = self.db.get_config_int('max_tokens', default=5000)
             
-            response = self.provider.generate(prompt, max_tokens=max_tokens)
+            response = self._generate_json(prompt, max_tokens, CATEGORY_SELECTION_SCHEMA)
             logger.info(f"📤 Taxonomy Agent - Réponse brute LLM (max_tokens={max_tokens}): {response[:200]}...")
             
             # Parser JSON avec plusieurs méthodes
@@ -137,74 +140,205 @@ Réponds UN SEUL JSON compact:
             logger.error(f"Erreur totale parsing taxonomy JSON: {e}")
             logger.error(f"Réponse brute: {response[:200]}")
             
-            # Fallback intelligent: chercher une catégorie pertinente basée sur les keywords
-            if candidates and self.product_definition:
-                product_type = self.product_definition.get('product_type', '').lower()
-                usage = self.product_definition.get('usage', '').lower()
+            return self._fallback_selection(self.product_definition, candidates)
+    
+    def _generate_json(self, prompt: str, max_tokens: int, schema: dict, batch_size: int = 1) -> str:
+        """
+        Appelle le LLM en imposant le schéma JSON de la réponse quand le provider le permet.
+        
+        Args:
+            prompt: Prompt complet
+            max_tokens: Limite de tokens en sortie
+            schema: Schéma JSON attendu
+            batch_size: Nombre de produits dans la requête (télémétrie)
+        
+        Returns:
+            Réponse brute du LLM
+        """
+        with llm_call_context(type(self).__name__, batch_size):
+            if getattr(self.provider, 'supports_response_schema', False):
+                return self.provider.generate(prompt, max_tokens=max_tokens, response_schema=schema)
+            return self.provider.generate(prompt, max_tokens=max_tokens)
+    
+    def _parse_json(self, response: str):
+        """
+        Parse une réponse JSON du LLM (markdown retiré, json-repair en secours).
+        
+        Args:
+            response: Réponse brute du LLM
+        
+        Returns:
+            Objet JSON décodé
+        """
+        clean = response.strip()
+        if clean.startswith('```json'):
+            clean = clean[7:]
+        if clean.startswith('```'):
+            clean = clean[3:]
+        if clean.endswith('```'):
+            clean = clean[:-3]
+        clean = clean.strip()
+        
+        try:
+            return json.loads(clean)
+        except json.JSONDecodeError as e:
+            logger.warning(f"Parsing JSON direct échoué: {e}, tentative de réparation...")
+            from json_repair import repair_json
+            return json.loads(repair_json(clean))
+    
+    def select_categories(
+        self,
+        items: List[Tuple[str, dict, List[Tuple[int, str]]]]
+    ) -> Dict[str, Tuple[str, float, str]]:
+        """
+        Sélectionne la catégorie de plusieurs produits en une seule requête.
+        
+        Args:
+            items: Liste de (handle, définition produit, candidates [(code, path), ...])
+        
+        Returns:
+            Dict {handle: (category_path, confidence, rationale)} pour tous les produits
+            (fallback intelligent pour ceux absents ou invalides dans la réponse)
+        """
+        if len(items) == 1:
+            handle, product_definition, candidates = items[0]
+            return {handle: self.select_category(product_definition, candidates)}
+        
+        sections = []
+        for handle, product_definition, candidates in items:
+            candidates_text = "\n".join(f"{i+1}. {path}" for i, (code, path) in enumerate(candidates))
+            sections.append(
+                f"### handle={handle}\n"
+                f"PRODUIT: {product_definition.get('product_type', '')} | USAGE: {product_definition.get('usage', '')}\n"
+                f"CATÉGORIES (copie EXACTE):\n{candidates_text}"
+            )
+        
+        prompt = f"""Taxonomie Google Shopping FR. {len(items)} produits, chacun avec SES catégories candidates.
+
+{chr(10).join(sections)}
+
+RÈGLE: Pour chaque produit, choisis dans SES catégories la PLUS SPÉCIFIQUE (min 3 niveaux: A>B>C), JAMAIS juste "Maison et jardin".
+
+Réponds UN SEUL JSON compact (handle recopié à l'identique):
+{{"products":[{{"handle":"...","chosen_category":"chemin exact","confidence":0.95,"rationale":"raison 2-3 mots"}}]}}"""
+        
+        selections = {}
+        try:
+            max_tokens = self.db.get_config_int('max_tokens', default=5000) if self.db else 5000
+            response = self._generate_json(prompt, max_tokens, CATEGORY_SELECTIONS_BATCH_SCHEMA, len(items))
+            logger.info(f"📤 Taxonomy Agent (batch {len(items)}) - Réponse brute LLM: {response[:200]}...")
+            
+            result = self._parse_json(response)
+            entries = result.get('products', []) if isinstance(result, dict) else result
+            for entry in entries or []:
+                if not isinstance(entry, dict) or not entry.get('handle') or not entry.get('chosen_category'):
+                    continue
+                try:
+                    confidence = float(entry.get('confidence'))
+                    if confidence <= 0:
+                        confidence = 0.6
+                except (ValueError, TypeError):
+                    logger.warning(f"⚠️ Confidence invalide pour {entry['handle']}, utilisation de 0.6")
+                    confidence = 0.6
+                selections[entry['handle']] = (
+                    entry['chosen_category'],
+                    confidence,
+                    entry.get('rationale', '')
+                )
+        except Exception as e:
+            logger.error(f"Erreur sélection batch des catégories: {e}")
+        
+        for handle, product_definition, candidates in items:
+            if handle not in selections:
+                logger.warning(f"⚠️ {handle}: absent de la réponse batch, fallback")
+                selections[handle] = self._fallback_selection(product_definition, candidates)
+        
+        logger.info(f"✓ {len(items)} catégories sélectionnées en 1 requête")
+        return selections
+    
+    def _fallback_selection(
+        self,
+        product_definition: dict,
+        candidates: List[Tuple[int, str]]
+    ) -> Tuple[str, float, str]:
+        """
+        Sélection sans LLM : catégorie candidate correspondant au type de produit.
+        
+        Args:
+            product_definition: Définition du produit de l'agent produit
+            candidates: Liste de (code, path) candidates
+        
+        Returns:
+            (category_path, confidence, rationale)
+        """
+        # Fallback intelligent: chercher une catégorie pertinente basée sur les keywords
+        if candidates and product_definition:
+            product_type = product_definition.get('product_type', '').lower()
+            usage = product_definition.get('usage', '').lower()
+            
+            # PRIORITÉ 1: Chercher dans "Maison et jardin" ou "Aliments, boissons et tabac" (90% des produits)
+            priority_categories = []
+            other_categories = []
+            
+            for code, path in candidates:
+                path_lower = path.lower()
+                if path_lower.startswith('maison et jardin') or path_lower.startswith('aliments, boissons et tabac'):
+                    priority_categories.append((code, path, path_lower))
+                else:
+                    other_categories.append((code, path, path_lower))
+            
+            # Chercher d'abord dans les catégories prioritaires
+            search_categories = priority_categories + other_categories
+            
+            for code, path, path_lower in search_categories:
+                # TEXTILE/LINGE
+                if 'plaid' in product_type or 'couverture' in product_type:
+                    if 'couverture' in path_lower or 'literie' in path_lower or 'linge de lit' in path_lower:
+                        logger.info(f"⚠️ Fallback intelligent: {path}")
+                        return (path, 0.65, f"Fallback: {product_type} → {path}")
                 
-                # PRIORITÉ 1: Chercher dans "Maison et jardin" ou "Aliments, boissons et tabac" (90% des produits)
-                priority_categories = []
-                other_categories = []
+                elif 'nappe' in product_type or 'serviette' in product_type:
+                    if 'nappe' in path_lower or 'linge de table' in path_lower or 'serviette de table' in path_lower:
+                        logger.info(f"⚠️ Fallback intelligent: {path}")
+                        return (path, 0.65, f"Fallback: {product_type} → {path}")
                 
-                for code, path in candidates:
-                    path_lower = path.lower()
-                    if path_lower.startswith('maison et jardin') or path_lower.startswith('aliments, boissons et tabac'):
-                        priority_categories.append((code, path, path_lower))
-                    else:
-                        other_categories.append((code, path, path_lower))
+                elif 'rideau' in product_type:
+                    if 'rideau' in path_lower and 'embrasse' not in path_lower:
+                        logger.info(f"⚠️ Fallback intelligent: {path}")
+                        return (path, 0.65, f"Fallback: {product_type} → {path}")
                 
-                # Chercher d'abord dans les catégories prioritaires
-                search_categories = priority_categories + other_categories
+                # ALIMENTS & BOISSONS
+                elif 'thé' in product_type or 'infusion' in product_type:
+                    if 'thé' in path_lower or 'infusion' in path_lower:
+                        logger.info(f"⚠️ Fallback intelligent: {path}")
+                        return (path, 0.65, f"Fallback: {product_type} → {path}")
                 
-                for code, path, path_lower in search_categories:
-                    # TEXTILE/LINGE
-                    if 'plaid' in product_type or 'couverture' in product_type:
-                        if 'couverture' in path_lower or 'literie' in path_lower or 'linge de lit' in path_lower:
-                            logger.info(f"⚠️ Fallback intelligent: {path}")
-                            return (path, 0.65, f"Fallback: {product_type} → {path}")
-                    
-                    elif 'nappe' in product_type or 'serviette' in product_type:
-                        if 'nappe' in path_lower or 'linge de table' in path_lower or 'serviette de table' in path_lower:
-                            logger.info(f"⚠️ Fallback intelligent: {path}")
-                            return (path, 0.65, f"Fallback: {product_type} → {path}")
-                    
-                    elif 'rideau' in product_type:
-                        if 'rideau' in path_lower and 'embrasse' not in path_lower:
-                            logger.info(f"⚠️ Fallback intelligent: {path}")
-                            return (path, 0.65, f"Fallback: {product_type} → {path}")
-                    
-                    # ALIMENTS & BOISSONS
-                    elif 'thé' in product_type or 'infusion' in product_type:
-                        if 'thé' in path_lower or 'infusion' in path_lower:
-                            logger.info(f"⚠️ Fallback intelligent: {path}")
-                            return (path, 0.65, f"Fallback: {product_type} → {path}")
-                    
-                    elif 'café' in product_type:
-                        if 'café' in path_lower:
-                            logger.info(f"⚠️ Fallback intelligent: {path}")
-                            return (path, 0.65, f"Fallback: {product_type} → {path}")
-                    
-                    elif 'épice' in product_type or 'condiment' in product_type:
-                        if 'épice' in path_lower or 'assaisonnement' in path_lower:
-                            logger.info(f"⚠️ Fallback intelligent: {path}")
-                            return (path, 0.65, f"Fallback: {product_type} → {path}")
-                    
-                    # VAISSELLE & USTENSILES
-                    elif 'vaisselle' in product_type or 'tasse' in product_type or 'mug' in product_type:
-                        if 'vaisselle' in path_lower or 'tasse' in path_lower or 'mug' in path_lower:
-                            logger.info(f"⚠️ Fallback intelligent: {path}")
-                            return (path, 0.65, f"Fallback: {product_type} → {path}")
-                    
-                    elif 'ustensile' in product_type or 'casserole' in product_type:
-                        if 'ustensile' in path_lower or 'batterie de cuisine' in path_lower or 'casserole' in path_lower:
-                            logger.info(f"⚠️ Fallback intelligent: {path}")
-                            return (path, 0.65, f"Fallback: {product_type} → {path}")
-            
-            # Dernier recours: première catégorie avec warning
-            if candidates:
-                logger.warning("❌ Fallback: Première catégorie par défaut (peut être incorrect)")
-                return (candidates[0][1], 0.3, "Erreur parsing, première catégorie par défaut - NÉCESSITE RÉVISION")
-            
-            # Fallback absolu si vraiment aucune catégorie n'est disponible
-            logger.error("❌ ERREUR: Aucune catégorie candidate disponible - Utilisation de 'Maison et jardin' par défaut")
-            return ("Maison et jardin", 0.05, "Aucune catégorie pertinente trouvée - Catégorie générique par défaut")
+                elif 'café' in product_type:
+                    if 'café' in path_lower:
+                        logger.info(f"⚠️ Fallback intelligent: {path}")
+                        return (path, 0.65, f"Fallback: {product_type} → {path}")
+                
+                elif 'épice' in product_type or 'condiment' in product_type:
+                    if 'épice' in path_lower or 'assaisonnement' in path_lower:
+                        logger.info(f"⚠️ Fallback intelligent: {path}")
+                        return (path, 0.65, f"Fallback: {product_type} → {path}")
+                
+                # VAISSELLE & USTENSILES
+                elif 'vaisselle' in product_type or 'tasse' in product_type or 'mug' in product_type:
+                    if 'vaisselle' in path_lower or 'tasse' in path_lower or 'mug' in path_lower:
+                        logger.info(f"⚠️ Fallback intelligent: {path}")
+                        return (path, 0.65, f"Fallback: {product_type} → {path}")
+                
+                elif 'ustensile' in product_type or 'casserole' in product_type:
+                    if 'ustensile' in path_lower or 'batterie de cuisine' in path_lower or 'casserole' in path_lower:
+                        logger.info(f"⚠️ Fallback intelligent: {path}")
+                        return (path, 0.65, f"Fallback: {product_type} → {path}")
+        
+        # Dernier recours: première catégorie avec warning
+        if candidates:
+            logger.warning("❌ Fallback: Première catégorie par défaut (peut être incorrect)")
+            return (candidates[0][1], 0.3, "Erreur parsing, première catégorie par défaut - NÉCESSITE RÉVISION")
+        
+        # Fallback absolu si vraiment aucune catégorie n'est disponible
+        logger.error("❌ ERREUR: Aucune catégorie candidate disponible - Utilisation de 'Maison et jardin' par défaut")
+        return ("Maison et jardin", 0.05, "Aucune catégorie pertinente trouvée - Catégorie générique par défaut")
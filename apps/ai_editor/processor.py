@@ -3,10 +3,12 @@ Module de traitement CSV avec les agents IA.
 """
 
 import json
+import contextvars
 import logging
 from typing import Dict, List, Optional, Set, Callable, Tuple, Any
 from pathlib import Path
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
 import sys
 import os
@@ -15,13 +17,30 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from apps.ai_editor.db import AIPromptsDB
 from apps.ai_editor.csv_storage import CSVStorage
 from apps.ai_editor.agents import GoogleShoppingAgent, SEOAgent, QualityControlAgent
+from apps.ai_editor.batch_packer import BatchPacker
+from apps.ai_editor.deferred_batch import DeferredBatchAgent, run_deferred_batches
+from apps.ai_editor.barcode_content import (
+    DEFAULT_MAX_AGE_DAYS, product_barcodes, requested_fields, reusable_values
+)
+from apps.ai_editor.rule_engine import normalize_csv_type
 from apps.ai_editor.category_validator import CategoryValidator
 from apps.ai_editor.langgraph_categorizer.graph import GoogleShoppingCategorizationGraph
-from utils.ai_providers import get_provider, AIProviderError
+from apps.ai_editor.langgraph_categorizer.cascade import CascadeCategorizer
+from utils.ai_providers import get_provider, get_max_concurrent_requests, AIProviderError, AIQuotaError
+from utils.batch_transport import get_batch_transport
+from utils import llm_telemetry
 from utils.text_utils import normalize_type
 
 logger = logging.getLogger(__name__)
 
+# Exécuteur partagé pour les requêtes LLM lancées en parallèle d'un autre agent.
+# Les tâches soumises n'accèdent jamais à la base (connexion SQLite liée au thread).
+# Dimensionné sur le pool HTTP des providers (processing.max_concurrent_requests), moins
+# la connexion de la requête de l'agent principal, pour ne pas attendre une connexion libre.
+_agent_executor = ThreadPoolExecutor(
+    max_workers=max(1, get_max_concurrent_requests() - 1), thread_name_prefix='ai-agent'
+)
+
 # Mapping des clés JSON vers les champs CSV Shopify
 SEO_FIELD_MAPPING = {
     'seo_title': 'SEO Title',
@@ -72,6 +91,11 @@ class CSVAIProcessor:
         """
         self.db = db
         self.csv_storage = CSVStorage(db)
+        self.last_batch_stats: Optional[Dict[str, Any]] = None  # Statistiques SEO du dernier batch (1re requête)
+        
+        # Télémétrie des appels LLM (table llm_calls de la même base)
+        if db.get_config_bool('llm_telemetry_enabled', default=True):
+            llm_telemetry.configure(db.db_path)
     
     def _update_concordance_table(
         self,
@@ -133,6 +157,7 @@ class CSVAIProcessor:
                 confidence,
                 'auto'
             ))
+            self.db._type_mappings_changed(cursor)
             self.db.conn.commit()
             
             action = "mise à jour" if existing else "créée"
@@ -142,6 +167,475 @@ class CSVAIProcessor:
             logger.error(f"Erreur lors de la création/mise à jour de la règle: {e}")
             return False
     
+    def _create_langgraph(self, google_agent):
+        """
+        Crée le catégoriseur LangGraph (cascade si un modèle rapide est configuré).
+        
+        Args:
+            google_agent: Agent Google Shopping (provider fort et fast_provider optionnel)
+            
+        Returns:
+            Instance de CascadeCategorizer ou GoogleShoppingCategorizationGraph
+        """
+        fast_provider = getattr(google_agent, 'fast_provider', None)
+        if fast_provider is not None:
+            return CascadeCategorizer(
+                self.db,
+                fast_provider,
+                google_agent.ai_provider,
+                confidence_threshold=self.db.get_config_int('cascade_confidence_threshold', default=50) / 100.0
+            )
+        return GoogleShoppingCategorizationGraph(self.db, google_agent.ai_provider)
+    
+    def _start_definition_prefetch(
+        self,
+        langgraph,
+        batch_products: List[Dict[str, Any]],
+        log_callback: Optional[Callable[[str], None]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Lance l'analyse produit (Agent Produit) en parallèle du SEO.
+        
+        Seuls les produits sans définition en cache et sans règle pour leur csv_type
+        actuel sont analysés : ce sont ceux qui partiront probablement au LLM.
+        
+        Args:
+            langgraph: Catégoriseur (graph ou cascade) exposant product_agent
+            batch_products: Produits du batch
+            log_callback: Callback pour les logs
+            
+        Returns:
+            État de la préanalyse (à passer à _collect_definition_prefetch), ou None
+        """
+        product_keys = {
+            p['Handle']: self.db._generate_product_key(p) for p in batch_products if p.get('Handle')
+        }
+        cached_types = self.db.get_cached_types(list(product_keys.values()))
+        
+        candidates = []
+        for product_data in batch_products:
+            handle = product_data.get('Handle')
+            if not handle:
+                continue
+            cached = cached_types.get(product_keys[handle])
+            csv_type = cached['csv_type'] if cached else None
+            if product_data.get('Type', '').strip() and self.db.get_type_mapping(
+                    product_data['Type'], csv_type, count_use=False):
+                continue
+            candidates.append(product_data)
+        
+        if not candidates:
+            return None
+        
+        product_agent = langgraph.product_agent
+        definitions, pending, duplicates = product_agent.plan_definitions(candidates)
+        future = None
+        if pending:
+            # Le contexte (lot de télémétrie du batch) est transmis au thread de l'exécuteur
+            future = _agent_executor.submit(
+                contextvars.copy_context().run,
+                product_agent.request_definitions, pending, product_agent._get_max_tokens()
+            )
+            logger.info(f"⚡ Analyse produit de {len(pending)} produit(s) lancée en parallèle du SEO")
+            if log_callback:
+                log_callback(f"  ⚡ Analyse produit en parallèle du SEO ({len(pending)} produits)")
+        
+        return {
+            'product_agent': product_agent,
+            'definitions': definitions,
+            'pending': pending,
+            'duplicates': duplicates,
+            'future': future
+        }
+    
+    def _collect_definition_prefetch(self, prefetch: Optional[Dict[str, Any]]) -> Dict[str, dict]:
+        """
+        Attend la fin de l'analyse produit lancée en parallèle du SEO.
+        
+        Args:
+            prefetch: État retourné par _start_definition_prefetch
+            
+        Returns:
+            Définitions disponibles {handle: définition} (les produits absents seront
+            analysés normalement par le graph)
+        """
+        if not prefetch:
+            return {}
+        
+        product_agent = prefetch['product_agent']
+        definitions = prefetch['definitions']
+        if prefetch['future'] is not None:
+            try:
+                fetched = prefetch['future'].result()
+            except Exception as e:
+                logger.warning(f"Analyse produit parallèle échouée: {e}")
+                fetched = {}
+            definitions.update(product_agent.accept_definitions(prefetch['pending'], fetched))
+        
+        return product_agent.resolve_duplicates(definitions, prefetch['duplicates'])
+    
+    def _apply_google_category(
+        self,
+        csv_import_id: int,
+        handle: str,
+        category_code: Optional[str],
+        category_path: Optional[str],
+        confidence: float,
+        needs_review: bool,
+        rationale: str,
+        all_changes: Dict[str, Dict],
+        log_callback: Optional[Callable[[str], None]] = None
+    ):
+        """
+        Applique la catégorie Google Shopping d'un produit aux lignes CSV (ou marque l'échec).
+        
+        Args:
+            csv_import_id: ID de l'import CSV
+            handle: Handle du produit
+            category_code: Code de catégorie Google (None si échec)
+            category_path: Chemin de catégorie Google
+            confidence: Confiance (0.0 - 1.0)
+            needs_review: True si la catégorie doit être revue
+            rationale: Justification (règle ou LLM)
+            all_changes: Changements du batch, complétés en place
+            log_callback: Callback pour les logs
+        """
+        logger.info(f"✅ {handle}: Catégorie finale: {category_path} (code: {category_code})")
+        logger.info(f"  Confidence: {confidence:.2f} | Needs review: {needs_review}")
+        logger.info(f"  Rationale: {rationale}")
+        
+        rows = self.csv_storage.get_csv_rows(csv_import_id, [handle])
+        
+        if not category_code:
+            # Échec complet
+            for row in rows:
+                self.csv_storage.update_csv_row_status(
+                    row['id'],
+                    'error',
+                    error_message='Catégorisation échouée',
+                    ai_explanation=f'LangGraph: {rationale}'
+                )
+            if log_callback:
+                log_callback(f"  ❌ {handle}: Échec catégorisation")
+            return
+        
+        # Validation : vérifier que category_code est bien un ID, pas un chemin
+        if isinstance(category_code, str) and ' > ' in category_code:
+            logger.warning(f"⚠️ {handle}: category_code contient un chemin au lieu d'un ID: '{category_code}'")
+            logger.warning(f"  Ce chemin devrait être un ID numérique. Vérifier search_google_category().")
+        
+        if not rows:
+            return
+        
+        # Sauvegarder dans la base
+        for row in rows:
+            self.csv_storage.update_csv_row(
+                row['id'],
+                {
+                    'Google Shopping / Google Product Category': category_code,
+                    '_google_category_confidence': confidence,
+                    '_google_category_needs_review': needs_review,
+                    '_google_category_rationale': rationale
+                }
+            )
+        
+        # Statut selon needs_review
+        status = 'completed' if not needs_review else 'warning'
+        for row in rows:
+            self.csv_storage.update_csv_row_status(
+                row['id'],
+                status,
+                error_message=f"Confidence: {confidence:.0%}" if needs_review else None
+            )
+        
+        if handle not in all_changes:
+            all_changes[handle] = {}
+        all_changes[handle]['Google Shopping / Google Product Category'] = {
+            'original': rows[0]['data'].get('Google Shopping / Google Product Category', ''),
+            'new': category_code
+        }
+        
+        if log_callback:
+            status_icon = "✓" if not needs_review else "⚠"
+            log_callback(f"  {status_icon} {handle}: {category_path} (conf: {confidence:.0%})")
+    
+    def _apply_seo_result(
+        self,
+        csv_import_id: int,
+        handle: str,
+        result: Dict[str, Any],
+        selected_fields: Dict[str, bool],
+        log_callback: Optional[Callable[[str], None]] = None
+    ) -> Tuple[Optional[Dict], List[str]]:
+        """
+        Applique le résultat SEO d'un produit : mise à jour des lignes CSV, contrôle
+        qualité, statut et copie du type dans csv_type.
+        
+        Appelée dès qu'un produit est reçu (streaming), chaque produit est donc
+        enregistré sans attendre la fin du batch.
+        
+        Args:
+            csv_import_id: ID de l'import CSV
+            handle: Handle du produit
+            result: Résultat JSON de l'agent SEO pour ce produit
+            selected_fields: Champs sélectionnés pour le traitement
+            log_callback: Callback pour les logs
+            
+        Returns:
+            Tuple (changements {champ: {original, new}} ou None si aucun champ n'a été généré,
+                   liste des problèmes de complétude/qualité des champs sélectionnés, vide si
+                   une nouvelle génération ne peut pas améliorer le résultat)
+        """
+        # Récupérer les lignes CSV pour ce produit
+        rows = self.csv_storage.get_csv_rows(csv_import_id, [handle])
+        if not rows:
+            return None, ['Produit introuvable']
+        
+        # Préparer les changements
+        product_changes = {}
+        field_updates = {}
+        
+        # Déterminer quels champs sont sélectionnés
+        seo_selected_fields = None
+        if isinstance(selected_fields.get('seo'), dict):
+            # Nouveau format: {'seo': {'enabled': bool, 'fields': [liste]}}
+            seo_selected_fields = set(selected_fields['seo'].get('fields', []))
+        elif selected_fields.get('seo'):
+            # Ancien format: {'seo': True} - tous les champs sont sélectionnés
+            seo_selected_fields = set(SEO_FIELD_MAPPING.keys())
+        selected_csv_fields = {
+            csv_field for json_key, csv_field in SEO_FIELD_MAPPING.items()
+            if seo_selected_fields is None or json_key in seo_selected_fields
+        }
+        
+        # Mapper les champs SEO
+        for json_key, csv_field in SEO_FIELD_MAPPING.items():
+            if json_key in result and result[json_key]:
+                new_value = result[json_key]
+                
+                # NORMALISATION SPÉCIALE POUR LE CHAMP TYPE
+                # Le LLM génère 'type', on le normalise et on l'utilise pour type ET csv_type
+                if json_key == 'type':
+                    # Normaliser : MAJUSCULES, PLURIEL, SANS ACCENTS
+                    original_type = new_value
+                    new_value = normalize_type(new_value)
+                    logger.info(f"📝 {handle}: Type normalisé: '{original_type}' → '{new_value}'")
+                    
+                    # IMPORTANT : Cette valeur sera utilisée pour :
+                    # 1. Le champ CSV 'Type' (ci-dessous)
+                    # 2. Le champ cache 'csv_type' (lignes 342-368)
+                    # Garantie : type = csv_type = new_value
+                
+                original_value = rows[0]['data'].get(csv_field, '')
+                
+                # Ne mettre à jour que si le champ est sélectionné
+                if seo_selected_fields is None or json_key in seo_selected_fields:
+                    if new_value != original_value:
+                        field_updates[csv_field] = new_value
+                        product_changes[csv_field] = {
+                            'original': original_value,
+                            'new': new_value
+                        }
+        
+        # Ajouter le tag Lagustothèque
+        if 'Tags' in field_updates:
+            field_updates['Tags'] = add_lagustotheque_tag(field_updates['Tags'])
+        
+        # Contrôle qualité: vérifier que TOUS les champs requis ont une VALEUR (pas juste modifiés)
+        expected_fields = set(SEO_FIELD_MAPPING.values())
+        
+        # Règles de validation selon le prompt système SEO
+        VALIDATION_RULES = {
+            'SEO Title': {'min_length': 20, 'field_type': 'text'},
+            'SEO Description': {'min_length': 50, 'field_type': 'text'},
+            'Title': {'min_length': 10, 'field_type': 'text'},
+            'Body (HTML)': {'min_length': 350, 'field_type': 'html'},
+            'Tags': {'min_tags': 3, 'field_type': 'tags'},
+            'Image Alt Text': {'min_length': 10, 'field_type': 'text'},
+            'Type': {'min_length': 3, 'field_type': 'text'}
+        }
+        
+        # Vérifier les valeurs FINALES (après modification ou originales)
+        final_values = {}
+        quality_issues = []  # Liste des problèmes de qualité
+        selected_quality_issues = []  # Problèmes sur les champs sélectionnés (corrigeables par l'IA)
+        
+        for csv_field in expected_fields:
+            # Utiliser la nouvelle valeur si modifiée, sinon l'originale
+            final_value = field_updates.get(csv_field, rows[0]['data'].get(csv_field, ''))
+            
+            field_issues = []
+            if final_value and final_value.strip():
+                final_values[csv_field] = final_value
+                
+                # Appliquer les règles de validation
+                if csv_field in VALIDATION_RULES:
+                    rules = VALIDATION_RULES[csv_field]
+                    value_stripped = final_value.strip()
+                    
+                    # Validation de longueur
+                    if 'min_length' in rules:
+                        if len(value_stripped) < rules['min_length']:
+                            field_issues.append(
+                                f'{csv_field} trop court ({len(value_stripped)} car., min {rules["min_length"]})'
+                            )
+                    
+                    # Validation tags (minimum 3 tags)
+                    if 'min_tags' in rules:
+                        tags = [t.strip() for t in value_stripped.split(',') if t.strip()]
+                        if len(tags) < rules['min_tags']:
+                            field_issues.append(
+                                f'{csv_field}: {len(tags)} tag(s), minimum {rules["min_tags"]} requis'
+                            )
+                    
+                    # Validation HTML (vérifier présence de balises)
+                    if rules['field_type'] == 'html':
+                        if '<' not in value_stripped or '>' not in value_stripped:
+                            field_issues.append(f'{csv_field} sans balises HTML')
+            
+            quality_issues.extend(field_issues)
+            if csv_field in selected_csv_fields:
+                selected_quality_issues.extend(field_issues)
+        
+        missing_fields = expected_fields - set(final_values.keys())
+        
+        all_issues = []
+        if missing_fields:
+            all_issues.append(f'Champs manquants: {", ".join(missing_fields)}')
+        if quality_issues:
+            all_issues.extend(quality_issues)
+        
+        # Seuls les problèmes des champs sélectionnés justifient une relance : les valeurs
+        # générées pour les autres champs sont ignorées
+        retry_issues = list(selected_quality_issues)
+        selected_missing = missing_fields & selected_csv_fields
+        if selected_missing:
+            retry_issues.insert(0, f'Champs manquants: {", ".join(selected_missing)}')
+        
+        # Mettre à jour toutes les lignes du produit
+        if field_updates:
+            for row in rows:
+                self.csv_storage.update_csv_row(row['id'], field_updates)
+            
+            # Déterminer le status selon la complétude ET la qualité
+            if all_issues:
+                # Champs manquants OU problèmes de qualité - mettre à jour TOUTES les lignes du produit
+                for row in rows:
+                    self.csv_storage.update_csv_row_status(
+                        row['id'],
+                        'error',
+                        error_message=' | '.join(all_issues),
+                        ai_explanation=f'Problèmes détectés: {" / ".join(all_issues)}'
+                    )
+                if log_callback:
+                    if missing_fields:
+                        log_callback(f"  ⚠ {handle}: SEO partiel ({len(final_values)}/{len(expected_fields)} champs)")
+                    if quality_issues:
+                        log_callback(f"  ⚠ {handle}: {', '.join(quality_issues)}")
+            else:
+                # Tous les champs présents ET qualité OK - mettre à jour TOUTES les lignes du produit
+                for row in rows:
+                    self.csv_storage.update_csv_row_status(row['id'], 'completed')
+                if log_callback:
+                    log_callback(f"  ✓ {handle}: SEO complet")
+            
+            # Extraire le type depuis les résultats SEO
+            # Le LLM SEO génère UNIQUEMENT 'type', on l'utilise pour remplir csv_type
+            # Garantie : type = csv_type (même valeur, format identique)
+            type_value = field_updates.get('Type', '').strip()
+            
+            # Fallback : Si Type n'a pas été mis à jour, essayer de récupérer depuis result
+            if not type_value:
+                type_value = result.get('type', '').strip()
+                if type_value:
+                    type_value = normalize_type(type_value)
+            
+            # LOG: Afficher le type (qui sera copié dans csv_type)
+            logger.info(f"📋 {handle}: Type SEO (sera copié dans csv_type): '{type_value}'")
+            
+            if type_value:
+                # COPIE AUTOMATIQUE : type → csv_type
+                # Le type généré par SEO (déjà normalisé) est copié dans csv_type
+                # Garantie : CSV.Type = cache.csv_type = type_value
+                try:
+                    # Si pas de cache existant, une entrée minimale est créée
+                    self.db.set_cache_csv_type(rows[0]['data'], type_value)
+                    logger.info(f"💾 {handle}: Type copié → CSV.Type = cache.csv_type = '{type_value}'")
+                    
+                    # Note: La concordance sera créée APRÈS la phase Google Shopping
+                    # (quand on aura la catégorie complète)
+                except Exception as e:
+                    logger.error(f"Erreur lors de la sauvegarde de csv_type pour {handle}: {e}")
+            
+            return product_changes, retry_issues
+        else:
+            # Aucun champ généré - mettre à jour TOUTES les lignes
+            for row in rows:
+                self.csv_storage.update_csv_row_status(
+                    row['id'],
+                    'error',
+                    error_message='Aucun champ SEO généré',
+                    ai_explanation='L\'IA n\'a généré aucun champ SEO pour ce produit'
+                )
+            if log_callback:
+                log_callback(f"  ✗ {handle}: Aucun champ SEO généré")
+            return None, ['Aucun champ SEO généré']
+    
+    def _mark_product_error(
+        self,
+        csv_import_id: int,
+        handle: str,
+        error_message: str,
+        ai_explanation: str
+    ) -> None:
+        """
+        Passe toutes les lignes d'un produit en erreur.
+        
+        Args:
+            csv_import_id: ID de l'import CSV
+            handle: Handle du produit
+            error_message: Message d'erreur
+            ai_explanation: Explication affichée dans l'interface
+        """
+        rows = self.csv_storage.get_csv_rows(csv_import_id, [handle])
+        for row in rows:
+            self.csv_storage.update_csv_row_status(
+                row['id'],
+                'error',
+                error_message=error_message,
+                ai_explanation=ai_explanation
+            )
+
+    def _create_cascade_provider(
+        self,
+        gemini_api_key: str,
+        strong_provider,
+        log_callback: Optional[Callable[[str], None]] = None
+    ):
+        """
+        Crée le provider du modèle rapide si le mode cascade est activé.
+
+        Args:
+            gemini_api_key: Clé API Gemini
+            strong_provider: Provider Gemini configuré (modèle fort, utilisé en escalade)
+            log_callback: Callback pour les logs
+
+        Returns:
+            Provider du modèle rapide, ou None si la cascade est désactivée
+        """
+        if not self.db.get_config_bool('cascade_enabled', default=False):
+            return None
+
+        fast_model = self.db.get_config('cascade_fast_model', default='gemini-2.0-flash')
+        if not fast_model or fast_model == strong_provider.model:
+            logger.info("Cascade ignorée: modèle rapide identique au modèle configuré")
+            return None
+
+        fast_provider = get_provider('gemini', api_key=gemini_api_key, model=fast_model)
+        if log_callback:
+            log_callback(f"⚡ Cascade: {fast_model} d'abord, escalade vers {strong_provider.model} si confiance basse")
+        return fast_provider
+
     def process_batch(
         self,
         csv_import_id: int,
@@ -163,7 +657,22 @@ class CSVAIProcessor:
         Returns:
             Dict {handle: {changements}}
         """
+        # Les écritures sont regroupées en une transaction par produit (et une en fin de batch).
+        # Les appels LLM du batch (tous agents, relances comprises) forment un seul lot en télémétrie.
+        with self.db.unit_of_work(), llm_telemetry.llm_work_unit():
+            return self._process_batch(csv_import_id, batch_handles, agents, selected_fields, log_callback)
+    
+    def _process_batch(
+        self,
+        csv_import_id: int,
+        batch_handles: List[str],
+        agents: Dict[str, Any],
+        selected_fields: Dict[str, bool],
+        log_callback: Optional[Callable[[str], None]] = None
+    ) -> Dict[str, Dict]:
+        """Corps de process_batch() (exécuté dans l'unité de travail du batch)."""
         all_changes = {}
+        self.last_batch_stats = None
         
         try:
             if log_callback:
@@ -183,250 +692,118 @@ class CSVAIProcessor:
             # Liste des produits pour le batch
             batch_products = list(products_data.values())
             
+            # L'analyse produit de la catégorisation ne dépend pas du SEO : elle est lancée
+            # en parallèle, seule la recherche des règles (csv_type) attend le résultat SEO
+            langgraph = None
+            prefetch = None
+            if ('google_category' in agents and 'seo' in agents
+                    and self.db.get_config_bool('parallel_agents_enabled', default=True)):
+                try:
+                    langgraph = self._create_langgraph(agents['google_category'])
+                    prefetch = self._start_definition_prefetch(langgraph, batch_products, log_callback)
+                except Exception as e:
+                    logger.warning(f"Analyse produit parallèle non lancée: {e}")
+            
             # ===== TRAITEMENT SEO EN BATCH =====
             if 'seo' in agents:
                 try:
                     if log_callback:
                         log_callback(f"  📝 Génération SEO batch ({len(batch_products)} produits)...")
                     
-                    # Appeler generate_batch()
-                    seo_results = agents['seo'].generate_batch(batch_products)
+                    # Réponse streamée : chaque produit est enregistré dès sa réception.
+                    # Les produits absents, mal formés ou incomplets (champs sélectionnés) sont redemandés seuls,
+                    # sur un nombre limité de tours, avant d'être marqués en erreur.
+                    max_rounds = max(0, self.db.get_config_int('missing_handles_max_rounds', default=2))
+                    seo_pending = [h for h in batch_handles if h in products_data]
+                    seo_invalid: Dict[str, List[str]] = {}
+                    seo_error = None
                     
-                    # Traiter chaque résultat
-                    for result in seo_results:
-                        handle = result.get('handle')
-                        if not handle or handle not in products_data:
-                            logger.warning(f"Handle invalide ou non trouvé dans le batch: {handle}")
-                            continue
-                        
-                        # Récupérer les lignes CSV pour ce produit
-                        rows = self.csv_storage.get_csv_rows(csv_import_id, [handle])
-                        if not rows:
-                            continue
-                        
-                        # Préparer les changements
-                        product_changes = {}
-                        field_updates = {}
+                    for attempt in range(1 + max_rounds):
+                        if not seo_pending:
+                            break
                         
-                        # Déterminer quels champs sont sélectionnés
-                        seo_selected_fields = None
-                        if isinstance(selected_fields.get('seo'), dict):
-                            # Nouveau format: {'seo': {'enabled': bool, 'fields': [liste]}}
-                            seo_selected_fields = set(selected_fields['seo'].get('fields', []))
-                        elif selected_fields.get('seo'):
-                            # Ancien format: {'seo': True} - tous les champs sont sélectionnés
-                            seo_selected_fields = set(SEO_FIELD_MAPPING.keys())
+                        if attempt > 0 and log_callback:
+                            log_callback(f"  🔁 Relance {attempt}/{max_rounds} pour {len(seo_pending)} produit(s): {', '.join(seo_pending[:5])}{'...' if len(seo_pending) > 5 else ''}")
                         
-                        # Mapper les champs SEO
-                        for json_key, csv_field in SEO_FIELD_MAPPING.items():
-                            if json_key in result and result[json_key]:
-                                new_value = result[json_key]
-                                
-                                # NORMALISATION SPÉCIALE POUR LE CHAMP TYPE
-                                # Le LLM génère 'type', on le normalise et on l'utilise pour type ET csv_type
-                                if json_key == 'type':
-                                    # Normaliser : MAJUSCULES, PLURIEL, SANS ACCENTS
-                                    original_type = new_value
-                                    new_value = normalize_type(new_value)
-                                    logger.info(f"📝 {handle}: Type normalisé: '{original_type}' → '{new_value}'")
-                                    
-                                    # IMPORTANT : Cette valeur sera utilisée pour :
-                                    # 1. Le champ CSV 'Type' (ci-dessous)
-                                    # 2. Le champ cache 'csv_type' (lignes 342-368)
-                                    # Garantie : type = csv_type = new_value
+                        completed = set()
+                        seo_error = None
+                        retry_issues = {h: seo_invalid[h] for h in seo_pending if h in seo_invalid}
+                        try:
+                            for result in agents['seo'].generate_batch_stream(
+                                [products_data[h] for h in seo_pending],
+                                retry_issues=retry_issues
+                            ):
+                                handle = result.get('handle')
+                                if not handle or handle not in seo_pending:
+                                    logger.warning(f"Handle invalide ou non trouvé dans le batch: {handle}")
+                                    continue
+                                if handle in completed:
+                                    continue
                                 
-                                original_value = rows[0]['data'].get(csv_field, '')
+                                product_changes, issues = self._apply_seo_result(
+                                    csv_import_id, handle, result, selected_fields, log_callback
+                                )
+                                self.db.flush_unit_of_work()
+                                if product_changes is not None:
+                                    # Conserver la valeur originale de la première génération
+                                    merged = all_changes.setdefault(handle, {})
+                                    for field, change in product_changes.items():
+                                        if field in merged:
+                                            change = {**change, 'original': merged[field]['original']}
+                                        merged[field] = change
                                 
-                                # Ne mettre à jour que si le champ est sélectionné
-                                if seo_selected_fields is None or json_key in seo_selected_fields:
-                                    if new_value != original_value:
-                                        field_updates[csv_field] = new_value
-                                        product_changes[csv_field] = {
-                                            'original': original_value,
-                                            'new': new_value
-                                        }
-                        
-                        # Ajouter le tag Lagustothèque
-                        if 'Tags' in field_updates:
-                            field_updates['Tags'] = add_lagustotheque_tag(field_updates['Tags'])
+                                if issues:
+                                    # Résultat incomplet ou invalide : déjà marqué en erreur, sera redemandé
+                                    seo_invalid[handle] = issues
+                                else:
+                                    seo_invalid.pop(handle, None)
+                                    completed.add(handle)
                         
-                        # Contrôle qualité: vérifier que TOUS les champs requis ont une VALEUR (pas juste modifiés)
-                        expected_fields = set(SEO_FIELD_MAPPING.values())
+                        except AIQuotaError as e:
+                            # Inutile de redemander : le quota est épuisé
+                            logger.error(f"Erreur batch SEO (quota): {e}")
+                            seo_error = e
+                            seo_pending = [h for h in seo_pending if h not in completed]
+                            break
                         
-                        # Règles de validation selon le prompt système SEO
-                        VALIDATION_RULES = {
-                            'SEO Title': {'min_length': 20, 'field_type': 'text'},
-                            'SEO Description': {'min_length': 50, 'field_type': 'text'},
-                            'Title': {'min_length': 10, 'field_type': 'text'},
-                            'Body (HTML)': {'min_length': 350, 'field_type': 'html'},
-                            'Tags': {'min_tags': 3, 'field_type': 'tags'},
-                            'Image Alt Text': {'min_length': 10, 'field_type': 'text'},
-                            'Type': {'min_length': 3, 'field_type': 'text'}
-                        }
+                        except Exception as e:
+                            logger.error(f"Erreur batch SEO: {e}", exc_info=True)
+                            seo_error = e
                         
-                        # Vérifier les valeurs FINALES (après modification ou originales)
-                        final_values = {}
-                        quality_issues = []  # Liste des problèmes de qualité
+                        if attempt == 0:
+                            self.last_batch_stats = agents['seo'].last_batch_stats
+                            compaction = agents['seo'].last_compaction_stats
+                            if compaction and compaction['tokens_before'] and log_callback:
+                                saved = 1 - compaction['tokens_after'] / compaction['tokens_before']
+                                log_callback(f"  🗜️ Données produit compactées: {compaction['tokens_before']} → {compaction['tokens_after']} tokens (-{saved:.0%})")
                         
-                        for csv_field in expected_fields:
-                            # Utiliser la nouvelle valeur si modifiée, sinon l'originale
-                            final_value = field_updates.get(csv_field, rows[0]['data'].get(csv_field, ''))
-                            
-                            if final_value and final_value.strip():
-                                final_values[csv_field] = final_value
-                                
-                                # Appliquer les règles de validation
-                                if csv_field in VALIDATION_RULES:
-                                    rules = VALIDATION_RULES[csv_field]
-                                    value_stripped = final_value.strip()
-                                    
-                                    # Validation de longueur
-                                    if 'min_length' in rules:
-                                        if len(value_stripped) < rules['min_length']:
-                                            quality_issues.append(
-                                                f'{csv_field} trop court ({len(value_stripped)} car., min {rules["min_length"]})'
-                                            )
-                                    
-                                    # Validation tags (minimum 3 tags)
-                                    if 'min_tags' in rules:
-                                        tags = [t.strip() for t in value_stripped.split(',') if t.strip()]
-                                        if len(tags) < rules['min_tags']:
-                                            quality_issues.append(
-                                                f'{csv_field}: {len(tags)} tag(s), minimum {rules["min_tags"]} requis'
-                                            )
-                                    
-                                    # Validation HTML (vérifier présence de balises)
-                                    if rules['field_type'] == 'html':
-                                        if '<' not in value_stripped or '>' not in value_stripped:
-                                            quality_issues.append(f'{csv_field} sans balises HTML')
-                        
-                        missing_fields = expected_fields - set(final_values.keys())
-                        
-                        # Mettre à jour toutes les lignes du produit
-                        if field_updates:
-                            for row in rows:
-                                self.csv_storage.update_csv_row(row['id'], field_updates)
-                            
-                            # Déterminer le status selon la complétude ET la qualité
-                            if missing_fields or quality_issues:
-                                # Champs manquants OU problèmes de qualité - mettre à jour TOUTES les lignes du produit
-                                all_issues = []
-                                if missing_fields:
-                                    all_issues.append(f'Champs manquants: {", ".join(missing_fields)}')
-                                if quality_issues:
-                                    all_issues.extend(quality_issues)
-                                
-                                for row in rows:
-                                    self.csv_storage.update_csv_row_status(
-                                        row['id'],
-                                        'error',
-                                        error_message=' | '.join(all_issues),
-                                        ai_explanation=f'Problèmes détectés: {" / ".join(all_issues)}'
-                                    )
-                                if log_callback:
-                                    if missing_fields:
-                                        log_callback(f"  ⚠ {handle}: SEO partiel ({len(final_values)}/{len(expected_fields)} champs)")
-                                    if quality_issues:
-                                        log_callback(f"  ⚠ {handle}: {', '.join(quality_issues)}")
-                            else:
-                                # Tous les champs présents ET qualité OK - mettre à jour TOUTES les lignes du produit
-                                for row in rows:
-                                    self.csv_storage.update_csv_row_status(row['id'], 'completed')
-                                if log_callback:
-                                    log_callback(f"  ✓ {handle}: SEO complet")
-                            
-                            # Extraire le type depuis les résultats SEO
-                            # Le LLM SEO génère UNIQUEMENT 'type', on l'utilise pour remplir csv_type
-                            # Garantie : type = csv_type (même valeur, format identique)
-                            type_value = field_updates.get('Type', '').strip()
-                            
-                            # Fallback : Si Type n'a pas été mis à jour, essayer de récupérer depuis result
-                            if not type_value:
-                                type_value = result.get('type', '').strip()
-                                if type_value:
-                                    type_value = normalize_type(type_value)
-                            
-                            # LOG: Afficher le type (qui sera copié dans csv_type)
-                            logger.info(f"📋 {handle}: Type SEO (sera copié dans csv_type): '{type_value}'")
-                            
-                            if type_value:
-                                # COPIE AUTOMATIQUE : type → csv_type
-                                # Le type généré par SEO (déjà normalisé) est copié dans csv_type
-                                # Garantie : CSV.Type = cache.csv_type = type_value
-                                product_key = self.db._generate_product_key(rows[0]['data'])
-                                
-                                try:
-                                    cursor = self.db.conn.cursor()
-                                    cursor.execute('''
-                                        UPDATE product_category_cache
-                                        SET csv_type = ?, last_used_at = CURRENT_TIMESTAMP
-                                        WHERE product_key = ?
-                                    ''', (type_value, product_key))
-                                    
-                                    # Si pas de cache existant, créer une entrée minimale
-                                    if cursor.rowcount == 0:
-                                        self.db.save_to_cache(
-                                            rows[0]['data'],
-                                            '',  # category_code vide pour l'instant
-                                            '',  # category_path vide pour l'instant
-                                            0.0,  # confidence vide pour l'instant
-                                            f'Type SEO copié dans csv_type: {type_value}',
-                                            source='seo',
-                                            csv_type=type_value
-                                        )
-                                    
-                                    self.db.conn.commit()
-                                    logger.info(f"💾 {handle}: Type copié → CSV.Type = cache.csv_type = '{type_value}'")
-                                    
-                                    # Note: La concordance sera créée APRÈS la phase Google Shopping
-                                    # (quand on aura la catégorie complète)
-                                except Exception as e:
-                                    logger.error(f"Erreur lors de la sauvegarde de csv_type pour {handle}: {e}")
-                            
-                            all_changes[handle] = product_changes
-                        else:
-                            # Aucun champ généré - mettre à jour TOUTES les lignes
-                            for row in rows:
-                                self.csv_storage.update_csv_row_status(
-                                    row['id'],
-                                    'error',
-                                    error_message='Aucun champ SEO généré',
-                                    ai_explanation='L\'IA n\'a généré aucun champ SEO pour ce produit'
-                                )
-                            if log_callback:
-                                log_callback(f"  ✗ {handle}: Aucun champ SEO généré")
-                    
-                    # Vérifier les produits manquants
-                    returned_handles = {r.get('handle') for r in seo_results if r.get('handle')}
-                    missing_handles = set(batch_handles) - returned_handles
+                        seo_pending = [h for h in seo_pending if h not in completed]
                     
-                    for handle in missing_handles:
-                        rows = self.csv_storage.get_csv_rows(csv_import_id, [handle])
-                        if rows:
-                            # Mettre à jour TOUTES les lignes du produit manquant
-                            for row in rows:
-                                self.csv_storage.update_csv_row_status(
-                                    row['id'],
-                                    'error',
-                                    error_message='Produit non retourné par l\'IA',
-                                    ai_explanation='Le produit était inclus dans le batch mais absent de la réponse JSON'
-                                )
+                    # Produits toujours en échec après les relances
+                    for handle in seo_pending:
+                        if handle in seo_invalid:
+                            # Dernier résultat reçu déjà enregistré avec son statut d'erreur
+                            continue
+                        if seo_error is not None:
+                            self._mark_product_error(
+                                csv_import_id, handle,
+                                str(seo_error),
+                                f'Erreur lors du traitement batch SEO: {seo_error}'
+                            )
+                        else:
+                            self._mark_product_error(
+                                csv_import_id, handle,
+                                'Produit non retourné par l\'IA',
+                                'Le produit était inclus dans le batch mais absent de la réponse JSON'
+                            )
                             if log_callback:
                                 log_callback(f"  ✗ {handle}: Non retourné par l'IA")
+                    
+                    if seo_error is not None and seo_pending and log_callback:
+                        log_callback(f"  ✗ Erreur batch SEO: {str(seo_error)[:100]}")
                 
                 except Exception as e:
                     logger.error(f"Erreur batch SEO: {e}", exc_info=True)
-                    # Marquer tout le batch en erreur - TOUTES les lignes
-                    for handle in batch_handles:
-                        rows = self.csv_storage.get_csv_rows(csv_import_id, [handle])
-                        if rows:
-                            for row in rows:
-                                self.csv_storage.update_csv_row_status(
-                                    row['id'],
-                                    'error',
-                                    error_message=str(e),
-                                    ai_explanation=f'Erreur lors du traitement batch SEO: {e}'
-                                )
                     if log_callback:
                         log_callback(f"  ✗ Erreur batch SEO: {str(e)[:100]}")
             
@@ -438,78 +815,115 @@ class CSVAIProcessor:
                     if log_callback:
                         log_callback(f"  🛍️ Catégorisation Google Shopping ({len(batch_products)} produits)...")
                     
-                    # Créer le graph LangGraph seulement si nécessaire (lazy loading)
-                    langgraph = None
+                    # Définitions produit obtenues pendant le SEO (jointure avec l'analyse parallèle)
+                    prefetched_definitions = self._collect_definition_prefetch(prefetch)
                     llm_used_count = 0
                     rules_used_count = 0
                     
-                    # Traiter chaque produit avec règles ou LangGraph
+                    # Règles compilées à jour + csv_type du cache pour tout le batch (1 requête)
+                    self.db.refresh_type_mappings()
+                    product_keys = {}
                     for product_data in batch_products:
-                        handle = product_data.get('Handle')
-                        if not handle:
-                            continue
-                        
-                        logger.info(f"📦 {handle}: Début catégorisation")
-                        
-                        # ÉTAPE 0: Vérifier les règles Type → Catégorie (prioritaire!)
-                        # Récupérer product_type (original) et csv_type (suggéré) depuis le cache
-                        product_key = self.db._generate_product_key(product_data)
-                        cursor = self.db.conn.cursor()
-                        cursor.execute('''
-                            SELECT product_type, csv_type FROM product_category_cache
-                            WHERE product_key = ?
-                        ''', (product_key,))
-                        cached = cursor.fetchone()
-                        
-                        # product_type = toujours le type original du CSV
-                        product_type = product_data.get('Type', '').strip()
-                        
-                        # csv_type = type suggéré par SEO si disponible, sinon product_type
-                        csv_type = None
-                        if cached and cached['csv_type'] and cached['csv_type'].strip():
-                            csv_type = cached['csv_type'].strip()
-                        
-                        # Chercher dans la table de concordance avec product_type + csv_type
-                        type_mapping = None
-                        if product_type:
-                            type_mapping = self.db.get_type_mapping(product_type, csv_type)
+                        if product_data.get('Handle'):
+                            product_keys[product_data['Handle']] = self.db._generate_product_key(product_data)
+                    cached_types = self.db.get_cached_types(list(product_keys.values()))
+                    seen_keys = set()
+                    
+                    # Traitement par vagues : les règles sont appliquées immédiatement, les produits
+                    # sans règle sont catégorisés ensemble en une exécution du graph batch.
+                    # Un seul produit par csv_type part au LLM dans une vague : les suivants
+                    # attendent la vague suivante et profitent de la règle qu'il aura créée
+                    # (si aucune règle n'a été créée, ils partent tous au LLM à la vague suivante).
+                    remaining = [p for p in batch_products if p.get('Handle')]
+                    attempted_types = set()
+                    while remaining:
+                        llm_wave = []
+                        wave_types = set()
+                        deferred = []
                         
-                        if type_mapping:
-                            # ✅ RÈGLE TYPE trouvée - Utilisation directe (0 appel LLM!)
-                            category_code = type_mapping['category_code']
-                            category_path = type_mapping['category_path']
-                            confidence = type_mapping['confidence']
-                            rationale = f"Règle: {csv_type} (utilisée {type_mapping['use_count']} fois)"
-                            needs_review = False
-                            rules_used_count += 1
+                        for product_data in remaining:
+                            handle = product_data['Handle']
+                            logger.info(f"📦 {handle}: Début catégorisation")
                             
-                            logger.info(f"📋 {handle}: RÈGLE trouvée: {csv_type} → {category_path}")
+                            # ÉTAPE 0: Vérifier les règles Type → Catégorie (prioritaire!)
+                            # Récupérer product_type (original) et csv_type (suggéré) depuis le cache
+                            product_key = product_keys[handle]
+                            if product_key in seen_keys:
+                                # Clé déjà traitée dans ce batch : le cache a pu changer depuis le préchargement
+                                cached = self.db.get_cached_types([product_key]).get(product_key)
+                            else:
+                                cached = cached_types.get(product_key)
+                            seen_keys.add(product_key)
                             
-                            # Sauvegarder dans le cache pour historique
-                            self.db.save_to_cache(
-                                product_data,
-                                category_code,
-                                category_path,
-                                confidence,
-                                rationale,
-                                original_category_code=category_code,
-                                original_category_path=category_path,
-                                force_save=True,
-                                source='type_mapping'
-                            )
-                        else:
-                            # Pas de règle trouvée → Appeler le LLM Google Shopping
-                            # Créer le LangGraph seulement si nécessaire (lazy loading)
-                            if langgraph is None:
-                                logger.info("🤖 Initialisation du LangGraph (au moins 1 produit sans règle)")
-                                langgraph = GoogleShoppingCategorizationGraph(
-                                    self.db,
-                                    agents['google_category'].ai_provider
+                            # product_type = toujours le type original du CSV
+                            product_type = product_data.get('Type', '').strip()
+                            
+                            # csv_type = type suggéré par SEO si disponible, sinon product_type
+                            csv_type = None
+                            if cached and cached['csv_type'] and cached['csv_type'].strip():
+                                csv_type = cached['csv_type'].strip()
+                            
+                            # Chercher dans la table de concordance avec product_type + csv_type
+                            type_mapping = None
+                            if product_type:
+                                type_mapping = self.db.get_type_mapping(product_type, csv_type)
+                            
+                            if type_mapping:
+                                # ✅ RÈGLE TYPE trouvée - Utilisation directe (0 appel LLM!)
+                                category_code = type_mapping['category_code']
+                                category_path = type_mapping['category_path']
+                                confidence = type_mapping['confidence']
+                                rationale = f"Règle: {csv_type} (utilisée {type_mapping['use_count']} fois)"
+                                rules_used_count += 1
+                                
+                                logger.info(f"📋 {handle}: RÈGLE trouvée: {csv_type} → {category_path}")
+                                
+                                # Sauvegarder dans le cache pour historique
+                                self.db.save_to_cache(
+                                    product_data,
+                                    category_code,
+                                    category_path,
+                                    confidence,
+                                    rationale,
+                                    original_category_code=category_code,
+                                    original_category_path=category_path,
+                                    force_save=True,
+                                    source='type_mapping'
                                 )
+                                
+                                self._apply_google_category(
+                                    csv_import_id, handle, category_code, category_path,
+                                    confidence, False, rationale, all_changes, log_callback
+                                )
+                                self.db.flush_unit_of_work()
+                                continue
                             
-                            logger.info(f"🤖 {handle}: Appel LangGraph (pas de règle)")
-                            llm_used_count += 1
-                            result = langgraph.categorize(product_data)
+                            # Pas de règle trouvée → LLM Google Shopping (un seul produit par csv_type et par vague)
+                            type_key = normalize_csv_type(csv_type) if product_type else ''
+                            if type_key and type_key not in attempted_types:
+                                if type_key in wave_types:
+                                    logger.info(f"⏳ {handle}: csv_type {csv_type} déjà en cours de catégorisation, en attente de la règle")
+                                    deferred.append(product_data)
+                                    continue
+                                wave_types.add(type_key)
+                            llm_wave.append(product_data)
+                        
+                        if not llm_wave:
+                            break
+                        attempted_types |= wave_types
+                        
+                        # Créer le LangGraph seulement si nécessaire (lazy loading)
+                        if langgraph is None:
+                            logger.info("🤖 Initialisation du LangGraph (au moins 1 produit sans règle)")
+                            langgraph = self._create_langgraph(agents['google_category'])
+                        
+                        logger.info(f"🤖 Appel LangGraph batch pour {len(llm_wave)} produit(s) sans règle")
+                        llm_used_count += len(llm_wave)
+                        results = langgraph.categorize_batch(llm_wave, prefetched_definitions)
+                        
+                        for product_data in llm_wave:
+                            handle = product_data['Handle']
+                            result = results[handle]
                             
                             category_code = result['category_code']
                             category_path = result['category_path']
@@ -552,13 +966,7 @@ class CSVAIProcessor:
                                 
                                 # Créer/mettre à jour la règle type_category_mapping
                                 # Récupérer product_type et csv_type depuis le cache
-                                product_key = self.db._generate_product_key(product_data)
-                                cursor = self.db.conn.cursor()
-                                cursor.execute('''
-                                    SELECT product_type, csv_type FROM product_category_cache
-                                    WHERE product_key = ?
-                                ''', (product_key,))
-                                cache_entry = cursor.fetchone()
+                                cache_entry = self.db._get_cache_types(product_keys[handle])
                                 
                                 if cache_entry:
                                     product_type = cache_entry['product_type'] or product_data.get('Type', '').strip()
@@ -575,72 +983,28 @@ class CSVAIProcessor:
                                             category_path=category_path,
                                             confidence=confidence  # Confidence du LLM Google Shopping
                                         )
-                        
-                        logger.info(f"✅ {handle}: Catégorie finale: {category_path} (code: {category_code})")
-                        logger.info(f"  Confidence: {confidence:.2f} | Needs review: {needs_review}")
-                        logger.info(f"  Rationale: {rationale}")
-                        
-                        if category_code:
-                            # Validation : vérifier que category_code est bien un ID, pas un chemin
-                            if isinstance(category_code, str) and ' > ' in category_code:
-                                logger.warning(f"⚠️ {handle}: category_code contient un chemin au lieu d'un ID: '{category_code}'")
-                                logger.warning(f"  Ce chemin devrait être un ID numérique. Vérifier search_google_category().")
                             
-                            # Sauvegarder dans la base
-                            rows = self.csv_storage.get_csv_rows(csv_import_id, [handle])
-                            if rows:
-                                for row in rows:
-                                    self.csv_storage.update_csv_row(
-                                        row['id'],
-                                        {
-                                            'Google Shopping / Google Product Category': category_code,
-                                            '_google_category_confidence': confidence,
-                                            '_google_category_needs_review': needs_review,
-                                            '_google_category_rationale': rationale
-                                        }
-                                    )
-                                
-                                # Statut selon needs_review
-                                status = 'completed' if not needs_review else 'warning'
-                                for row in rows:
-                                    self.csv_storage.update_csv_row_status(
-                                        row['id'],
-                                        status,
-                                        error_message=f"Confidence: {confidence:.0%}" if needs_review else None
-                                    )
-                                
-                                if handle not in all_changes:
-                                    all_changes[handle] = {}
-                                all_changes[handle]['Google Shopping / Google Product Category'] = {
-                                    'original': rows[0]['data'].get('Google Shopping / Google Product Category', ''),
-                                    'new': category_code
-                                }
-                                
-                                if log_callback:
-                                    status_icon = "✓" if not needs_review else "⚠"
-                                    log_callback(f"  {status_icon} {handle}: {category_path} (conf: {confidence:.0%})")
-                        else:
-                            # Échec complet
-                            rows = self.csv_storage.get_csv_rows(csv_import_id, [handle])
-                            if rows:
-                                for row in rows:
-                                    self.csv_storage.update_csv_row_status(
-                                        row['id'],
-                                        'error',
-                                        error_message='Catégorisation échouée',
-                                        ai_explanation=f'LangGraph: {rationale}'
-                                    )
-                            if log_callback:
-                                log_callback(f"  ❌ {handle}: Échec catégorisation")
+                            self._apply_google_category(
+                                csv_import_id, handle, category_code, category_path,
+                                confidence, needs_review, rationale, all_changes, log_callback
+                            )
+                            self.db.flush_unit_of_work()
+                        
+                        remaining = deferred
+                    
+                    # Compteurs d'utilisation des règles : une seule écriture par batch
+                    self.db.flush_type_mapping_usage()
                     
                     # Message récapitulatif
+                    if isinstance(langgraph, CascadeCategorizer) and langgraph.stats['total'] and log_callback:
+                        log_callback(f"  ⚡ Cascade: {langgraph.stats['total'] - langgraph.stats['escalated']}/{langgraph.stats['total']} produits par le modèle rapide, {langgraph.stats['escalated']} escaladé(s)")
                     if log_callback:
                         if rules_used_count > 0 and llm_used_count == 0:
                             log_callback(f"✓ Batch de {len(batch_products)} produits traité (100% règles, 0 appel LLM)")
                         elif rules_used_count > 0 and llm_used_count > 0:
-                            log_callback(f"✓ Batch de {len(batch_products)} produits traité ({rules_used_count} règles, {llm_used_count} appels LLM)")
+                            log_callback(f"✓ Batch de {len(batch_products)} produits traité ({rules_used_count} règles, {llm_used_count} via LLM)")
                         elif llm_used_count > 0:
-                            log_callback(f"✓ Batch de {len(batch_products)} produits traité ({llm_used_count} appels LLM)")
+                            log_callback(f"✓ Batch de {len(batch_products)} produits traité ({llm_used_count} via LLM)")
                         else:
                             log_callback(f"✓ Batch de {len(batch_products)} produits traité")
                 
@@ -683,7 +1047,9 @@ class CSVAIProcessor:
         log_callback: Optional[Callable[[str], None]] = None,
         cancel_check: Optional[Callable[[], bool]] = None,
         enable_search: bool = False,
-        csv_import_id: Optional[int] = None
+        csv_import_id: Optional[int] = None,
+        resume: bool = False,
+        deferred: bool = False
     ) -> Tuple[bool, Optional[str], Dict, Optional[int]]:
         """
         Traite un fichier CSV avec les agents IA.
@@ -698,6 +1064,10 @@ class CSVAIProcessor:
             progress_callback: Callback pour la progression (message, current, total)
             log_callback: Callback pour les logs
             cancel_check: Callback pour vérifier l'annulation
+            resume: Reprendre le dernier run interrompu avec les mêmes paramètres
+                    (les produits déjà traités ne sont pas renvoyés à l'IA)
+            deferred: Générer le SEO via l'API batch du fournisseur (voir deferred_batch) ;
+                      activé aussi au-delà de deferred_batch_min_products produits
             
         Returns:
             Tuple (success, output_path, changes_dict, processing_result_id)
@@ -706,6 +1076,7 @@ class CSVAIProcessor:
             - changes_dict: {handle: {field: {'original': ..., 'new': ...}}}
             - processing_result_id: ID du résultat de traitement
         """
+        run_id = None
         try:
             # Vérifier l'annulation
             if cancel_check and cancel_check():
@@ -784,6 +1155,9 @@ class CSVAIProcessor:
                 )
                 # Donner accès à la taxonomie pour les catégories candidates
                 agents['google_category'].set_database(self.db)
+                agents['google_category'].fast_provider = self._create_cascade_provider(
+                    gemini_api_key, gemini_provider, log_callback
+                )
                 
                 if log_callback:
                     log_callback(f"🤖 Google Shopping: Gemini ({gemini_model})")
@@ -822,6 +1196,13 @@ class CSVAIProcessor:
             if log_callback:
                 log_callback(f"{total_products} produit(s) à traiter")
             
+            # Manifeste du run (reprise : produits déjà traités ignorés)
+            run_id, done_changes = self._open_processing_run(
+                csv_import_id, prompt_set_id, provider_name, model_name,
+                selected_fields, selected_handles, rows, resume, log_callback
+            )
+            done_changes = {h: c for h, c in done_changes.items() if h in products_by_handle}
+            
             # 7. Récupérer la taille du batch depuis la configuration
             batch_size = self.db.get_config_int('batch_size', default=20)
             logger.info(f"Taille du batch configurée: {batch_size}")
@@ -829,28 +1210,88 @@ class CSVAIProcessor:
                 log_callback(f"Configuration: batch_size={batch_size}")
             
             # 8. Traiter les produits
-            changes_dict = {}
-            processed_count = 0
-            handles_list = list(products_by_handle.keys())
+            changes_dict = dict(done_changes)
+            processed_count = len(done_changes)
+            handles_list = [h for h in products_by_handle if h not in done_changes]
+            
+            # Produits déjà connus par code-barres : contenu accepté réappliqué sans appel IA
+            reused_changes = self._reuse_barcode_content(
+                products_by_handle, handles_list, selected_fields, prompt_set_id, log_callback
+            )
+            if reused_changes:
+                self.db.save_run_items(run_id, list(reused_changes), reused_changes)
+                changes_dict.update({h: c for h, c in reused_changes.items() if c})
+                processed_count += len(reused_changes)
+                handles_list = [h for h in handles_list if h not in reused_changes]
             
             # Diviser en batches
             if batch_size > 1:
-                # Mode BATCH
-                batches = [handles_list[i:i+batch_size] for i in range(0, len(handles_list), batch_size)]
-                logger.info(f"Mode BATCH: {len(batches)} batch(s) de max {batch_size} produits")
+                # Mode BATCH : batches remplis selon un budget de tokens (batch_size = maximum)
+                products_data = {h: product_rows[0]['data'] for h, product_rows in products_by_handle.items()}
+                packer = BatchPacker(self.db, provider_name, model_name, batch_size)
+                use_budget = 'seo' in agents and self.db.get_config_bool('adaptive_batching', default=True)
+                
+                estimated_batches = len(packer.plan(handles_list, products_data)) if use_budget else -(-len(handles_list) // batch_size)
+                logger.info(f"Mode BATCH: ~{estimated_batches} batch(s) de max {batch_size} produits")
                 if log_callback:
-                    log_callback(f"Mode BATCH: {len(batches)} batch(s) à traiter")
+                    log_callback(f"Mode BATCH: ~{estimated_batches} batch(s) à traiter")
+                    if use_budget:
+                        log_callback(f"Budget de sortie par batch: {packer.output_budget} tokens")
+                
+                # Mode différé : SEO de tous les batches via l'API batch du fournisseur
+                deferred_plan = None
+                deferred_min_products = self.db.get_config_int('deferred_batch_min_products', default=0)
+                if 'seo' in agents and handles_list and (
+                        deferred or 0 < deferred_min_products <= len(handles_list)):
+                    transport = get_batch_transport(provider_name, ai_provider)
+                    if transport is None:
+                        if log_callback:
+                            log_callback(f"⚠️ Pas d'API batch pour {provider_name}, traitement interactif")
+                    else:
+                        planned = packer.plan(handles_list, products_data) if use_budget else [
+                            handles_list[i:i + batch_size] for i in range(0, len(handles_list), batch_size)
+                        ]
+                        deferred_run = run_deferred_batches(
+                            self.db, run_id, provider_name, agents['seo'], transport, planned,
+                            products_data, progress_callback, log_callback, cancel_check
+                        )
+                        if deferred_run is None:
+                            self.db.finish_processing_run(run_id, 'cancelled')
+                            return (False, None, changes_dict, None)
+                        deferred_plan, deferred_results = deferred_run
+                        handles_list = [h for batch in deferred_plan for h in batch]
+                        agents = dict(agents, seo=DeferredBatchAgent(agents['seo'], deferred_results))
                 
-                for batch_idx, batch_handles in enumerate(batches, 1):
+                remaining = list(handles_list)
+                batch_idx = 0
+                while remaining:
                     # Vérifier l'annulation
                     if cancel_check and cancel_check():
+                        self.db.finish_processing_run(run_id, 'cancelled')
                         return (False, None, changes_dict, None)
                     
+                    if deferred_plan is not None:
+                        batch_handles = deferred_plan.pop(0)
+                    elif use_budget:
+                        batch_handles = packer.next_batch(remaining, products_data)
+                    else:
+                        batch_handles = remaining[:batch_size]
+                    remaining = remaining[len(batch_handles):]
+                    batch_idx += 1
+                    
+                    # Le nombre total de batches dépend du budget, qui évolue en cours de traitement
+                    if deferred_plan is not None:
+                        total_batches = batch_idx + len(deferred_plan)
+                    else:
+                        total_batches = batch_idx + (len(packer.plan(remaining, products_data)) if use_budget else -(-len(remaining) // batch_size))
+                    
                     if log_callback:
-                        log_callback(f"Batch {batch_idx}/{len(batches)}: {len(batch_handles)} produits")
+                        log_callback(f"Batch {batch_idx}/{total_batches}: {len(batch_handles)} produits")
                     
                     if progress_callback:
-                        progress_callback(f"Batch {batch_idx}/{len(batches)}", processed_count, total_products)
+                        progress_callback(f"Batch {batch_idx}/{total_batches}", processed_count, total_products)
+                    
+                    estimated_output = sum(packer.estimate_product(products_data[h], h)[1] for h in batch_handles)
                     
                     # Traiter le batch
                     batch_changes = self.process_batch(
@@ -861,12 +1302,18 @@ class CSVAIProcessor:
                         log_callback
                     )
                     
-                    # Fusionner les changements
+                    # Ajuster le budget selon la réponse (troncature, produits manquants)
+                    if use_budget and deferred_plan is None:
+                        packer.record_batch(self.last_batch_stats, estimated_output)
+                    
+                    # Fusionner les changements (et les enregistrer pour une éventuelle reprise)
+                    self.db.save_run_items(run_id, batch_handles, batch_changes)
+                    self._store_barcode_content(csv_import_id, batch_changes, selected_fields, prompt_set_id)
                     changes_dict.update(batch_changes)
                     processed_count += len(batch_handles)
                     
                     if log_callback:
-                        log_callback(f"Batch {batch_idx}/{len(batches)}: {len(batch_changes)} produit(s) traité(s)")
+                        log_callback(f"Batch {batch_idx}/{total_batches}: {len(batch_changes)} produit(s) traité(s)")
             else:
                 # Mode SÉQUENTIEL (batch_size == 1)
                 logger.info(f"Mode SÉQUENTIEL: traitement produit par produit")
@@ -876,6 +1323,7 @@ class CSVAIProcessor:
                 for handle in handles_list:
                     # Vérifier l'annulation
                     if cancel_check and cancel_check():
+                        self.db.finish_processing_run(run_id, 'cancelled')
                         return (False, None, changes_dict, None)
                     
                     if log_callback:
@@ -893,6 +1341,8 @@ class CSVAIProcessor:
                         log_callback
                     )
                     
+                    self.db.save_run_items(run_id, [handle], batch_changes)
+                    self._store_barcode_content(csv_import_id, batch_changes, selected_fields, prompt_set_id)
                     changes_dict.update(batch_changes)
                     processed_count += 1
             
@@ -912,22 +1362,30 @@ class CSVAIProcessor:
             )
             
             # 10. Sauvegarder les changements dans product_field_changes
-            for handle, field_changes in changes_dict.items():
-                # Trouver les lignes du produit
-                product_rows = [r for r in rows if r['data'].get('Handle') == handle]
-                
-                for field_name, change_data in field_changes.items():
-                    # Sauvegarder pour chaque ligne (ou seulement la première?)
-                    if product_rows:
+            # (une seule transaction pour tous les changements)
+            first_row_ids = {}
+            for r in rows:
+                first_row_ids.setdefault(r['data'].get('Handle'), r['id'])
+            
+            with self.db.unit_of_work():
+                for handle, field_changes in changes_dict.items():
+                    # Première ligne du produit
+                    row_id = first_row_ids.get(handle)
+                    if row_id is None:
+                        continue
+                    
+                    for field_name, change_data in field_changes.items():
                         self.db.save_field_changes(
                             processing_result_id,
-                            product_rows[0]['id'],
+                            row_id,
                             handle,
                             field_name,
                             change_data['original'],
                             change_data['new']
                         )
             
+            self.db.finish_processing_run(run_id, 'completed', processing_result_id)
+            
             if log_callback:
                 log_callback(f"✅ Traitement terminé: {len(changes_dict)} produit(s) modifié(s)")
                 log_callback(f"💡 Utilisez le bouton 'Générer CSV' pour exporter le fichier")
@@ -936,9 +1394,195 @@ class CSVAIProcessor:
             
         except Exception as e:
             logger.error(f"Erreur lors du traitement CSV: {e}", exc_info=True)
+            if run_id is not None:
+                self.db.finish_processing_run(run_id, 'failed')
             if log_callback:
                 log_callback(f"Erreur: {e}")
             return (False, None, {}, None)
+        
+        finally:
+            llm_telemetry.flush()
+    
+    def _open_processing_run(
+        self,
+        csv_import_id: int,
+        prompt_set_id: int,
+        provider_name: str,
+        model_name: str,
+        selected_fields: Dict[str, Any],
+        selected_handles: Optional[Set[str]],
+        rows: List[Dict],
+        resume: bool,
+        log_callback: Optional[Callable[[str], None]] = None
+    ) -> Tuple[int, Dict[str, Dict]]:
+        """
+        Crée le manifeste d'un run, ou reprend le dernier run interrompu ayant les mêmes paramètres.
+        
+        À la reprise, les résultats des produits déjà traités sont réappliqués aux lignes
+        CSV (perdus si le CSV a été réimporté entre-temps).
+        
+        Args:
+            csv_import_id: ID de l'import CSV
+            prompt_set_id: ID de l'ensemble de prompts
+            provider_name: Nom du fournisseur IA
+            model_name: Nom du modèle
+            selected_fields: Champs sélectionnés
+            selected_handles: Handles sélectionnés (None = tous)
+            rows: Lignes CSV du traitement
+            resume: Reprendre le dernier run interrompu
+            log_callback: Callback pour les logs
+            
+        Returns:
+            Tuple (ID du run, changements des produits déjà traités {handle: {champ: {original, new}}})
+        """
+        run_key = (csv_import_id, prompt_set_id, provider_name, model_name, selected_fields,
+                   list(selected_handles) if selected_handles else None)
+        
+        run = self.db.find_resumable_run(*run_key) if resume else None
+        if run is None:
+            return self.db.create_processing_run(*run_key), {}
+        
+        done_changes = self.db.get_run_changes(run['id'])
+        restored = self._restore_run_changes(rows, done_changes)
+        self.db.finish_processing_run(run['id'], 'running')
+        
+        logger.info(f"♻️ Reprise du run {run['id']}: {len(done_changes)} produit(s) déjà traité(s), "
+                    f"{restored} ligne(s) restaurée(s)")
+        if log_callback:
+            log_callback(f"♻️ Reprise: {len(done_changes)} produit(s) déjà traité(s) ignoré(s)")
+        return run['id'], done_changes
+    
+    def _reuse_barcode_content(
+        self,
+        products_by_handle: Dict[str, List[Dict]],
+        handles: List[str],
+        selected_fields: Dict[str, Any],
+        prompt_set_id: int,
+        log_callback: Optional[Callable[[str], None]] = None
+    ) -> Dict[str, Dict]:
+        """
+        Réapplique le contenu connu par code-barres aux produits qui le permettent
+        (voir la politique de barcode_content).
+        
+        Args:
+            products_by_handle: Lignes CSV par handle
+            handles: Handles à traiter
+            selected_fields: Champs sélectionnés
+            prompt_set_id: Ensemble de prompts du traitement
+            log_callback: Callback pour les logs
+            
+        Returns:
+            Changements des produits réutilisés {handle: {champ: {original, new}}}
+            (dict vide pour un produit déjà à jour)
+        """
+        if not self.db.get_config_bool('barcode_reuse_enabled', default=True):
+            return {}
+        fields = requested_fields(selected_fields, SEO_FIELD_MAPPING)
+        barcodes_by_handle = {h: product_barcodes(products_by_handle[h]) for h in handles}
+        contents = self.db.get_barcode_contents(
+            [b for barcodes in barcodes_by_handle.values() for b in barcodes]
+        )
+        if not contents:
+            return {}
+        
+        max_age_days = self.db.get_config_int('barcode_reuse_max_age_days', default=DEFAULT_MAX_AGE_DAYS)
+        same_prompts = self.db.get_config_bool('barcode_reuse_same_prompts', default=True)
+        
+        reused = {}
+        used_barcodes = []
+        with self.db.unit_of_work():
+            for handle, barcodes in barcodes_by_handle.items():
+                values = None
+                for barcode in barcodes:
+                    values = reusable_values(contents.get(barcode), fields, prompt_set_id,
+                                             max_age_days, same_prompts)
+                    if values:
+                        used_barcodes.append(barcode)
+                        break
+                if not values:
+                    continue
+                
+                rows = products_by_handle[handle]
+                product_changes = {
+                    field: {'original': rows[0]['data'].get(field, ''), 'new': value}
+                    for field, value in values.items() if rows[0]['data'].get(field) != value
+                }
+                for row in rows:
+                    if product_changes:
+                        self.csv_storage.update_csv_row(row['id'], values)
+                    self.csv_storage.update_csv_row_status(row['id'], 'completed')
+                reused[handle] = product_changes
+        
+        if reused:
+            self.db.mark_barcode_content_used(used_barcodes)
+            logger.info(f"♻️ Contenu réutilisé par code-barres: {len(reused)} produit(s)")
+            if log_callback:
+                log_callback(f"♻️ {len(reused)} produit(s) déjà connu(s) par code-barres (sans appel IA)")
+        return reused
+    
+    def _store_barcode_content(
+        self,
+        csv_import_id: int,
+        batch_changes: Dict[str, Dict],
+        selected_fields: Dict[str, Any],
+        prompt_set_id: int
+    ):
+        """
+        Enregistre par code-barres le contenu des produits acceptés d'un batch
+        (statut 'completed' après contrôle qualité).
+        
+        Args:
+            csv_import_id: ID de l'import CSV
+            batch_changes: Changements du batch {handle: {champ: {original, new}}}
+            selected_fields: Champs sélectionnés
+            prompt_set_id: Ensemble de prompts du traitement
+        """
+        fields = requested_fields(selected_fields, SEO_FIELD_MAPPING)
+        if not batch_changes or not fields:
+            return
+        
+        rows_by_handle: Dict[str, List[Dict]] = {}
+        for row in self.csv_storage.get_csv_rows(csv_import_id, set(batch_changes)):
+            rows_by_handle.setdefault(row['handle'], []).append(row)
+        
+        for handle, rows in rows_by_handle.items():
+            barcodes = product_barcodes(rows)
+            if not barcodes or any(row.get('status') != 'completed' for row in rows):
+                continue
+            values = {f: rows[0]['data'][f] for f in fields if rows[0]['data'].get(f)}
+            self.db.save_barcode_content(barcodes, values, prompt_set_id, handle)
+    
+    def _restore_run_changes(self, rows: List[Dict], done_changes: Dict[str, Dict]) -> int:
+        """
+        Réapplique aux lignes CSV les changements enregistrés d'un run.
+        
+        Args:
+            rows: Lignes CSV
+            done_changes: Changements par handle {handle: {champ: {original, new}}}
+            
+        Returns:
+            Nombre de lignes mises à jour
+        """
+        restored = 0
+        with self.db.unit_of_work():
+            for row in rows:
+                field_changes = done_changes.get(row['data'].get('Handle', ''))
+                if not field_changes:
+                    continue
+                
+                field_updates = {}
+                for field_name, change_data in field_changes.items():
+                    new_value = change_data['new']
+                    if field_name == 'Tags':
+                        new_value = add_lagustotheque_tag(new_value)
+                    if row['data'].get(field_name) != new_value:
+                        field_updates[field_name] = new_value
+                
+                if field_updates:
+                    self.csv_storage.update_csv_row(row['id'], field_updates)
+                    self.csv_storage.update_csv_row_status(row['id'], 'completed')
+                    restored += 1
+        return restored
     
     def process_single_product(
         self,
@@ -1028,6 +1672,9 @@ class CSVAIProcessor:
             
             # Donner accès à la taxonomie pour les catégories candidates
             agents['google_category'].set_database(self.db)
+            agents['google_category'].fast_provider = self._create_cascade_provider(
+                gemini_api_key, gemini_provider, log_callback
+            )
             
             if log_callback:
                 log_callback(f"🤖 SEO: {provider_name.capitalize()} ({model_name})")
@@ -0,0 +1,230 @@
+"""
+Compaction des données produit avant leur envoi dans un prompt.
+
+Les descriptions Garnier et Artiga (Body (HTML)) représentent l'essentiel des
+tokens d'entrée : balises, styles inline et textes répétés d'un produit à
+l'autre. Avant chaque prompt :
+- le HTML est converti en texte (balises, styles et scripts retirés) ;
+- les lignes répétées dans un produit sont supprimées, et les paragraphes
+  communs à plusieurs produits d'un batch ne sont envoyés qu'une fois ;
+- chaque champ est limité à une longueur propre à l'agent, coupée sur un mot ;
+- les identifiants (Handle, SKU, code-barres) sont recopiés tels quels, car
+  la réponse de l'IA est rapprochée du produit par son handle.
+
+Le résultat ne dépend que des données d'entrée (même produit → même texte),
+ce qui garde les prompts stables pour le cache des providers.
+"""
+
+import re
+import logging
+from html import unescape
+from html.parser import HTMLParser
+from typing import Dict, Any, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Approximation du nombre de caractères par token (texte français + HTML)
+CHARS_PER_TOKEN = 4
+
+# Champ par défaut des limites (champs non listés)
+DEFAULT_FIELD = '*'
+
+# Champs identifiants jamais compactés (recopiés à l'identique dans la réponse)
+IDENTIFIER_FIELDS = {'Handle', 'Variant SKU', 'Variant Barcode'}
+
+# Longueur minimale d'un paragraphe pour être mis en commun entre produits
+COMMON_TEXT_MIN_CHARS = 40
+
+# Balises dont le contenu est ignoré
+_SKIPPED_TAGS = {'script', 'style', 'head', 'noscript'}
+
+# Balises qui séparent des blocs de texte
+_BLOCK_TAGS = {
+    'p', 'div', 'br', 'li', 'ul', 'ol', 'tr', 'table', 'section', 'article',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'blockquote', 'hr'
+}
+
+_HTML_HINT = re.compile(r'<[a-zA-Z/!][^>]*>')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estime le nombre de tokens d'un texte.
+
+    Args:
+        text: Texte à estimer
+
+    Returns:
+        Nombre de tokens estimé
+    """
+    if not text:
+        return 0
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+class _TextExtractor(HTMLParser):
+    """Extrait le texte d'un fragment HTML en conservant les séparations de blocs."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIPPED_TAGS:
+            self._skip_depth += 1
+        elif tag in _BLOCK_TAGS:
+            self.parts.append('\n')
+            if tag == 'li':
+                self.parts.append('- ')
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in _BLOCK_TAGS:
+            self.parts.append('\n')
+
+    def handle_endtag(self, tag):
+        if tag in _SKIPPED_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in _BLOCK_TAGS:
+            self.parts.append('\n')
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.parts.append(data)
+
+
+def html_to_text(html: str) -> str:
+    """
+    Convertit un fragment HTML en texte brut (une ligne par bloc, lignes répétées retirées).
+
+    Args:
+        html: Contenu HTML (ou texte simple)
+
+    Returns:
+        Texte sans balises ni espaces superflus
+    """
+    if not html:
+        return ''
+
+    html = str(html)
+    if _HTML_HINT.search(html):
+        extractor = _TextExtractor()
+        try:
+            extractor.feed(html)
+            extractor.close()
+            text = ''.join(extractor.parts)
+        except Exception:
+            # HTML trop cassé pour le parser : retrait simple des balises
+            text = unescape(_HTML_HINT.sub('\n', html))
+    else:
+        text = unescape(html)
+
+    lines = []
+    seen = set()
+    for line in text.split('\n'):
+        line = ' '.join(line.split())
+        if not line or line == '-' or line in seen:
+            continue
+        seen.add(line)
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def truncate_text(text: str, max_chars: int) -> str:
+    """
+    Limite un texte à max_chars caractères, coupé sur une fin de mot.
+
+    Args:
+        text: Texte à limiter
+        max_chars: Longueur maximale (0 ou moins : pas de limite)
+
+    Returns:
+        Texte limité, terminé par "…" s'il a été coupé
+    """
+    if max_chars <= 0 or len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    space = cut.rfind(' ')
+    if space > max_chars * 0.7:
+        cut = cut[:space]
+    return cut.rstrip(' ,;:.-\n') + '…'
+
+
+def compact_product(product_data: Dict[str, Any], field_limits: Dict[str, int]) -> Dict[str, Any]:
+    """
+    Compacte les champs d'un produit (HTML → texte, longueur limitée).
+
+    Args:
+        product_data: Données CSV du produit
+        field_limits: Longueur max par champ ('*' pour les champs non listés, 0 = pas de limite)
+
+    Returns:
+        Nouvelles données produit (champs vides retirés, identifiants inchangés)
+    """
+    default_limit = field_limits.get(DEFAULT_FIELD, 0)
+    compacted = {}
+    for field, value in product_data.items():
+        if value is None or value == '':
+            continue
+        if not isinstance(value, str) or field in IDENTIFIER_FIELDS:
+            compacted[field] = value
+            continue
+        text = html_to_text(value) if field == 'Body (HTML)' else ' '.join(value.split())
+        if text:
+            compacted[field] = truncate_text(text, field_limits.get(field, default_limit))
+    return compacted
+
+
+def compact_products(products_data: List[Dict[str, Any]],
+                     field_limits: Dict[str, int]) -> Tuple[List[Dict[str, Any]], List[str], Dict[str, int]]:
+    """
+    Compacte un batch : les paragraphes de description communs à plusieurs produits
+    sont retirés des produits et retournés une seule fois.
+
+    Args:
+        products_data: Données CSV des produits
+        field_limits: Longueur max par champ (voir compact_product)
+
+    Returns:
+        Tuple (produits compactés, paragraphes communs dans l'ordre d'apparition,
+               statistiques {'tokens_before', 'tokens_after'})
+    """
+    bodies = [html_to_text(p.get('Body (HTML)') or '') for p in products_data]
+
+    # Paragraphes présents dans au moins 2 produits (ordre déterministe : 1re apparition)
+    counts: Dict[str, int] = {}
+    order: List[str] = []
+    for body in bodies:
+        for line in set(body.split('\n')):
+            if len(line) >= COMMON_TEXT_MIN_CHARS:
+                if line not in counts:
+                    counts[line] = 0
+                counts[line] += 1
+    for body in bodies:
+        for line in body.split('\n'):
+            if counts.get(line, 0) >= 2 and line not in order:
+                order.append(line)
+    common = set(order) if len(products_data) > 1 else set()
+    if not common:
+        order = []
+
+    compacted = []
+    for product_data, body in zip(products_data, bodies):
+        if common and body:
+            kept = [line for line in body.split('\n') if line not in common]
+            refs = [f"[texte commun {order.index(line) + 1}]" for line in body.split('\n') if line in common]
+            body = '\n'.join(refs + kept)
+        compacted.append(compact_product({**product_data, 'Body (HTML)': body}, field_limits))
+
+    stats = {
+        'tokens_before': sum(estimate_tokens(_fields_text(p)) for p in products_data),
+        'tokens_after': sum(estimate_tokens(_fields_text(p)) for p in compacted)
+                        + sum(estimate_tokens(line) for line in order)
+    }
+    return compacted, order, stats
+
+
+def _fields_text(product_data: Dict[str, Any]) -> str:
+    """Texte envoyé pour les champs d'un produit (nom + valeur)."""
+    return '\n'.join(f"{field}: {value}" for field, value in product_data.items()
+                     if value is not None and value != '')
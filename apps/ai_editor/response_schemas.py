@@ -0,0 +1,85 @@
+"""
+Schémas JSON des réponses attendues des agents IA.
+
+Les providers qui le permettent (OpenAI, Claude, Gemini) contraignent leur sortie
+à ces schémas : la réponse est un JSON valide, sans bloc markdown ni texte autour,
+et le parsing ne passe plus par le nettoyage regex ni par json-repair.
+"""
+
+from typing import Dict, Any, List, Optional
+
+STRING = {"type": "string"}
+NUMBER = {"type": "number"}
+STRING_LIST = {"type": "array", "items": STRING}
+
+
+def object_schema(properties: Dict[str, Dict[str, Any]], required: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Construit le schéma d'un objet JSON.
+    
+    Args:
+        properties: Schéma de chaque propriété
+        required: Propriétés obligatoires (défaut: toutes)
+        
+    Returns:
+        Schéma JSON de l'objet
+    """
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties) if required is None else required
+    }
+
+
+def products_schema(item_properties: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Schéma d'une réponse batch {"products": [{"handle": ..., ...}]}.
+    
+    Args:
+        item_properties: Propriétés de chaque produit (hors handle)
+        
+    Returns:
+        Schéma JSON de la réponse batch
+    """
+    return object_schema({
+        "products": {
+            "type": "array",
+            "items": object_schema({"handle": STRING, **item_properties})
+        }
+    })
+
+
+# Agent SEO : les 7 champs Shopify générés
+SEO_FIELDS = {
+    "seo_title": STRING,
+    "seo_description": STRING,
+    "title": STRING,
+    "body_html": STRING,
+    "tags": STRING,
+    "image_alt_text": STRING,
+    "type": STRING
+}
+SEO_RESPONSE_SCHEMA = object_schema(SEO_FIELDS)
+SEO_BATCH_RESPONSE_SCHEMA = products_schema(SEO_FIELDS)
+
+# Agent Google Shopping (mode batch)
+GOOGLE_CATEGORY_BATCH_RESPONSE_SCHEMA = products_schema({"google_category": STRING})
+
+# LangGraph : définition produit (ProductSpecialistAgent)
+PRODUCT_DEFINITION_FIELDS = {
+    "product_type": STRING,
+    "usage": STRING,
+    "material": STRING,
+    "search_keywords": STRING_LIST
+}
+PRODUCT_DEFINITION_SCHEMA = object_schema(PRODUCT_DEFINITION_FIELDS)
+PRODUCT_DEFINITIONS_BATCH_SCHEMA = products_schema(PRODUCT_DEFINITION_FIELDS)
+
+# LangGraph : sélection de catégorie (TaxonomySpecialistAgent)
+CATEGORY_SELECTION_FIELDS = {
+    "chosen_category": STRING,
+    "confidence": NUMBER,
+    "rationale": STRING
+}
+CATEGORY_SELECTION_SCHEMA = object_schema(CATEGORY_SELECTION_FIELDS)
+CATEGORY_SELECTIONS_BATCH_SCHEMA = products_schema(CATEGORY_SELECTION_FIELDS)
@@ -0,0 +1,208 @@
+"""
+Moteur de règles Type → Catégorie compilé en mémoire.
+
+Les règles actives de type_category_mapping sont chargées une fois dans un
+dictionnaire indexé par csv_type normalisé (strip + UPPER) : une recherche ne
+fait plus aucune requête SQL. Les compteurs d'utilisation sont accumulés en
+mémoire et écrits en une seule transaction par batch (flush).
+
+Le moteur est partagé par chemin de base (chaque thread GUI ouvre sa propre
+connexion). Il est invalidé à chaque modification d'une règle, y compris depuis
+un autre processus, grâce à la version stockée dans app_config
+(type_mapping_version).
+"""
+
+import os
+import logging
+import threading
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Clé app_config incrémentée à chaque modification des règles
+RULES_VERSION_KEY = 'type_mapping_version'
+
+_engines: Dict[str, 'TypeRuleEngine'] = {}
+_engines_lock = threading.Lock()
+
+
+def normalize_csv_type(csv_type: Optional[str]) -> str:
+    """
+    Normalise un csv_type pour la recherche (Thés, THÉS, thés → THÉS).
+
+    Args:
+        csv_type: Type suggéré par SEO
+
+    Returns:
+        csv_type normalisé (chaîne vide si absent)
+    """
+    return (csv_type or '').strip().upper()
+
+
+def get_rule_engine(db_path: str) -> 'TypeRuleEngine':
+    """
+    Retourne le moteur de règles partagé pour une base.
+
+    Args:
+        db_path: Chemin de la base SQLite
+
+    Returns:
+        Instance de TypeRuleEngine
+    """
+    key = os.path.abspath(db_path)
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = TypeRuleEngine()
+            _engines[key] = engine
+        return engine
+
+
+def invalidate_rule_engine(db_path: str):
+    """
+    Invalide les règles compilées d'une base (après création/modification/suppression).
+
+    Args:
+        db_path: Chemin de la base SQLite
+    """
+    with _engines_lock:
+        engine = _engines.get(os.path.abspath(db_path))
+    if engine is not None:
+        engine.invalidate()
+
+
+class TypeRuleEngine:
+    """Règles actives indexées par csv_type normalisé, avec compteurs d'utilisation en mémoire."""
+
+    def __init__(self):
+        """Initialise un moteur vide (chargé à la première recherche)."""
+        self._lock = threading.Lock()
+        self._rules: Optional[Dict[str, Dict[str, Any]]] = None
+        self._version: Optional[str] = None
+        self._pending_uses: Dict[int, int] = {}
+
+    def invalidate(self):
+        """Force le rechargement des règles à la prochaine recherche."""
+        with self._lock:
+            self._rules = None
+
+    def _read_version(self, conn) -> Optional[str]:
+        """Lit la version des règles dans app_config."""
+        row = conn.execute('SELECT value FROM app_config WHERE key = ?', (RULES_VERSION_KEY,)).fetchone()
+        return row[0] if row else None
+
+    def _load(self, conn):
+        """
+        Compile les règles actives en dictionnaire.
+
+        Pour un même csv_type normalisé, garde la règle prioritaire
+        (plus utilisée, puis plus récente, puis plus confiante).
+        """
+        version = self._read_version(conn)
+        rows = conn.execute('''
+            SELECT id, csv_type, category_code, category_path, confidence, use_count, product_type
+            FROM type_category_mapping
+            WHERE is_active = 1 AND category_code != '' AND category_path != ''
+            ORDER BY use_count DESC, created_at DESC, confidence DESC
+        ''').fetchall()
+
+        rules = {}
+        for row in rows:
+            key = normalize_csv_type(row['csv_type'])
+            if key and key not in rules:
+                rules[key] = dict(row)
+
+        self._rules = rules
+        self._version = version
+        logger.info(f"📋 {len(rules)} règle(s) Type → Catégorie compilée(s) en mémoire")
+
+    def refresh(self, conn):
+        """
+        Recharge les règles si elles ont été modifiées (par ce processus ou un autre).
+
+        À appeler une fois par batch : une seule lecture de app_config.
+
+        Args:
+            conn: Connexion SQLite (row_factory Row)
+        """
+        with self._lock:
+            if self._rules is None or self._read_version(conn) != self._version:
+                self._load(conn)
+
+    def lookup(self, conn, csv_type: Optional[str], count_use: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Recherche la règle d'un csv_type et comptabilise son utilisation en mémoire.
+
+        Args:
+            conn: Connexion SQLite (utilisée uniquement si les règles ne sont pas chargées)
+            csv_type: Type suggéré par SEO
+            count_use: False pour une simple vérification (utilisation non comptée)
+
+        Returns:
+            Dict avec category_code, category_path, confidence, use_count ou None
+        """
+        key = normalize_csv_type(csv_type)
+        if not key:
+            return None
+
+        with self._lock:
+            if self._rules is None:
+                self._load(conn)
+
+            rule = self._rules.get(key)
+            if rule is None:
+                return None
+
+            pending = self._pending_uses.get(rule['id'], 0)
+            if count_use:
+                pending += 1
+                self._pending_uses[rule['id']] = pending
+
+            return {
+                'category_code': rule['category_code'],
+                'category_path': rule['category_path'],
+                'confidence': rule['confidence'],
+                'use_count': rule['use_count'] + pending
+            }
+
+    def flush(self, conn) -> int:
+        """
+        Écrit les compteurs d'utilisation accumulés en une seule transaction.
+
+        Args:
+            conn: Connexion SQLite
+
+        Returns:
+            Nombre de règles mises à jour
+        """
+        with self._lock:
+            pending = self._pending_uses
+            self._pending_uses = {}
+
+        if not pending:
+            return 0
+
+        try:
+            conn.executemany('''
+                UPDATE type_category_mapping
+                SET use_count = use_count + ?,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', [(count, rule_id) for rule_id, count in pending.items()])
+            conn.commit()
+        except Exception as e:
+            # Remettre les compteurs pour le prochain flush
+            logger.warning(f"Flush des compteurs de règles échoué: {e}")
+            with self._lock:
+                for rule_id, count in pending.items():
+                    self._pending_uses[rule_id] = self._pending_uses.get(rule_id, 0) + count
+            return 0
+
+        # Garder les compteurs compilés cohérents avec la base (ordre de priorité)
+        with self._lock:
+            if self._rules is not None:
+                for rule in self._rules.values():
+                    if rule['id'] in pending:
+                        rule['use_count'] += pending[rule['id']]
+
+        return len(pending)
@@ -0,0 +1,185 @@
+"""
+Apprentissage en masse des règles Type → Catégorie depuis le cache de catégorisation.
+
+_update_concordance_table ne crée une règle que pour le produit en cours de
+traitement. Les catégorisations déjà en cache (product_category_cache) contiennent
+pourtant, pour chaque csv_type, l'avis concordant de nombreux appels LLM.
+
+Le minage regroupe le cache par csv_type normalisé et retient la catégorie
+majoritaire quand :
+- le groupe compte au moins rule_mining_min_products produits ;
+- la part de produits d'accord (agreement) atteint rule_mining_min_agreement % ;
+- la confiance moyenne des produits d'accord atteint rule_mining_min_confidence %.
+
+Une règle au-dessus des seuils d'auto-activation (rule_mining_auto_min_products,
+rule_mining_auto_agreement) est créée active ; les autres sont créées inactives
+(propositions à valider dans la fenêtre Taxonomie). Un csv_type qui a déjà une
+règle n'est jamais modifié : un désaccord est seulement signalé (conflict).
+"""
+
+import logging
+from typing import Dict, List, Any, Optional, Callable
+
+from apps.ai_editor.rule_engine import normalize_csv_type
+
+logger = logging.getLogger(__name__)
+
+# Statuts d'une règle minée
+RULE_AUTO = 'auto'          # Créée active
+RULE_PROPOSED = 'proposed'  # Créée inactive, à valider
+RULE_CONFLICT = 'conflict'  # Une règle existante désigne une autre catégorie
+RULE_EXISTING = 'existing'  # Une règle existante désigne déjà cette catégorie
+
+MINED_RULE_CREATOR = 'rule_miner'
+
+# Seuils par défaut (surchargés par app_config, pourcentages)
+DEFAULT_MIN_PRODUCTS = 3
+DEFAULT_MIN_AGREEMENT = 80
+DEFAULT_MIN_CONFIDENCE = 85
+DEFAULT_AUTO_MIN_PRODUCTS = 5
+DEFAULT_AUTO_AGREEMENT = 95
+
+
+def _thresholds(db) -> Dict[str, float]:
+    """Seuils de minage depuis la configuration (pourcentages convertis en 0.0-1.0)."""
+    return {
+        'min_products': db.get_config_int('rule_mining_min_products', default=DEFAULT_MIN_PRODUCTS),
+        'min_agreement': db.get_config_int('rule_mining_min_agreement', default=DEFAULT_MIN_AGREEMENT) / 100.0,
+        'min_confidence': db.get_config_int('rule_mining_min_confidence', default=DEFAULT_MIN_CONFIDENCE) / 100.0,
+        'auto_min_products': db.get_config_int('rule_mining_auto_min_products', default=DEFAULT_AUTO_MIN_PRODUCTS),
+        'auto_agreement': db.get_config_int('rule_mining_auto_agreement', default=DEFAULT_AUTO_AGREEMENT) / 100.0
+    }
+
+
+def mine_type_rules(cache_rows: List[Dict[str, Any]], existing_rules: Dict[str, Dict[str, Any]],
+                    thresholds: Dict[str, float]) -> List[Dict[str, Any]]:
+    """
+    Calcule les règles candidates à partir des lignes du cache de catégorisation.
+
+    Args:
+        cache_rows: Lignes de product_category_cache (csv_type, product_type,
+            category_code, category_path, confidence)
+        existing_rules: Règles existantes indexées par csv_type normalisé
+        thresholds: Seuils (voir _thresholds)
+
+    Returns:
+        Règles candidates (csv_type, product_type, category_code, category_path,
+        products, agreement, confidence, status), les plus fréquentes en premier
+    """
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    for row in cache_rows:
+        csv_type = normalize_csv_type(row.get('csv_type'))
+        if csv_type:
+            groups.setdefault(csv_type, []).append(row)
+
+    rules = []
+    for csv_type, rows in groups.items():
+        if len(rows) < thresholds['min_products']:
+            continue
+
+        by_category: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            by_category.setdefault(row['category_code'], []).append(row)
+        category_code, agreeing = max(by_category.items(), key=lambda item: (len(item[1]), item[0]))
+
+        agreement = len(agreeing) / len(rows)
+        confidence = sum(row['confidence'] or 0.0 for row in agreeing) / len(agreeing)
+        if agreement < thresholds['min_agreement'] or confidence < thresholds['min_confidence']:
+            continue
+
+        product_types = [row.get('product_type') or '' for row in agreeing]
+        product_type = max(set(product_types), key=lambda value: (product_types.count(value), value)) or csv_type
+
+        existing = existing_rules.get(csv_type)
+        if existing:
+            status = RULE_EXISTING if existing['category_code'] == category_code else RULE_CONFLICT
+        elif len(rows) >= thresholds['auto_min_products'] and agreement >= thresholds['auto_agreement']:
+            status = RULE_AUTO
+        else:
+            status = RULE_PROPOSED
+
+        rules.append({
+            'csv_type': csv_type,
+            'product_type': product_type,
+            'category_code': category_code,
+            'category_path': agreeing[0]['category_path'],
+            'products': len(rows),
+            'agreement': agreement,
+            'confidence': confidence,
+            'status': status
+        })
+
+    rules.sort(key=lambda rule: (-rule['products'], rule['csv_type']))
+    return rules
+
+
+def project_coverage(cache_rows: List[Dict[str, Any]], covered_types: set) -> float:
+    """
+    Part des produits du cache dont le csv_type a une règle active (catégorisés sans LLM).
+
+    Args:
+        cache_rows: Lignes de product_category_cache
+        covered_types: csv_types normalisés couverts par une règle active
+
+    Returns:
+        Part entre 0.0 et 1.0
+    """
+    if not cache_rows:
+        return 0.0
+    covered = sum(1 for row in cache_rows if normalize_csv_type(row.get('csv_type')) in covered_types)
+    return covered / len(cache_rows)
+
+
+def run_rule_mining(db, apply: bool = True,
+                    log_callback: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """
+    Mine les règles du cache, les enregistre si demandé et projette le gain.
+
+    Args:
+        db: Instance de AIPromptsDB
+        apply: Enregistrer les règles (actives ou proposées) ; False = simulation
+        log_callback: Callback pour les logs
+
+    Returns:
+        Rapport : règles par statut, règles créées, couverture avant/après
+        (auto seules, et si toutes les propositions sont validées)
+    """
+    def log(message: str):
+        logger.info(message)
+        if log_callback:
+            log_callback(message)
+
+    cache_rows = db.get_categorization_cache_rows()
+    existing_rules = {normalize_csv_type(rule['csv_type']): rule for rule in db.get_all_type_mappings()}
+    rules = mine_type_rules(cache_rows, existing_rules, _thresholds(db))
+    log(f"⛏️ {len(cache_rows)} catégorisation(s) en cache, {len(rules)} règle(s) candidate(s)")
+
+    active_types = {csv_type for csv_type, rule in existing_rules.items() if rule.get('is_active')}
+    auto_types = {rule['csv_type'] for rule in rules if rule['status'] == RULE_AUTO}
+    proposed_types = {rule['csv_type'] for rule in rules if rule['status'] == RULE_PROPOSED}
+
+    created = 0
+    if apply:
+        created = db.save_mined_type_mappings(
+            [rule for rule in rules if rule['status'] in (RULE_AUTO, RULE_PROPOSED)],
+            active_statuses=(RULE_AUTO,)
+        )
+
+    for rule in rules:
+        if rule['status'] == RULE_CONFLICT:
+            log(f"⚠️ Conflit {rule['csv_type']}: le cache indique {rule['category_path']} "
+                f"({rule['agreement']:.0%} de {rule['products']} produits), règle existante conservée")
+
+    report = {
+        'rules': rules,
+        'counts': {status: sum(1 for rule in rules if rule['status'] == status)
+                   for status in (RULE_AUTO, RULE_PROPOSED, RULE_CONFLICT, RULE_EXISTING)},
+        'created': created,
+        'cached_products': len(cache_rows),
+        'coverage_before': project_coverage(cache_rows, active_types),
+        'coverage_after': project_coverage(cache_rows, active_types | auto_types),
+        'coverage_if_approved': project_coverage(cache_rows, active_types | auto_types | proposed_types)
+    }
+    log(f"📈 Produits catégorisés sans LLM: {report['coverage_before']:.0%} → {report['coverage_after']:.0%} "
+        f"({report['coverage_if_approved']:.0%} si les {len(proposed_types)} proposition(s) sont validées)")
+    return report
@@ -0,0 +1,207 @@
+"""
+Sélection hiérarchique des catégories candidates de la taxonomie Google Shopping.
+
+La recherche à plat (LIKE par mot-clé sur tous les chemins) rate souvent la bonne
+feuille et s'appuie sur des bonus fixes ("Maison et jardin"). En mode hiérarchique,
+la sélection se fait en deux étapes, sans appel IA :
+1. choix des branches (deux premiers niveaux, ex: "Maison et jardin > Linge") par
+   un score pondéré par la rareté des mots-clés (idf) sur le vocabulaire de chaque
+   sous-arbre ;
+2. seules les catégories situées sous les branches retenues sont proposées,
+   classées par mots-clés trouvés dans leur chemin.
+
+Le prompt de catégorisation reste court et ne contient que des options cohérentes
+entre elles, ce qui réduit les rejets de la validation et donc les retries.
+"""
+
+import math
+import re
+import logging
+from typing import Dict, List, Tuple, Iterable, Set
+
+from utils.text_utils import remove_accents
+
+logger = logging.getLogger(__name__)
+
+# Profondeur d'une branche (niveau 1 > niveau 2)
+BRANCH_DEPTH = 2
+
+# Profondeur minimale d'une catégorie proposée (même règle que la recherche à plat)
+MIN_CANDIDATE_DEPTH = 3
+
+# Nombre de branches retenues au premier passage (élargi à chaque retry)
+DEFAULT_MAX_BRANCHES = 3
+
+# Catégories racines jamais proposées (même exclusion que la recherche à plat)
+EXCLUDED_ROOTS = ('entreprise et industrie',)
+
+# Une branche secondaire n'est retenue que si son score atteint ce ratio du meilleur
+BRANCH_MIN_SCORE_RATIO = 0.5
+
+# Mots ignorés dans les chemins et les mots-clés
+STOP_WORDS = {
+    'pour', 'avec', 'sans', 'tout', 'tous', 'dans', 'cette', 'entre', 'plus',
+    'les', 'des', 'une', 'aux', 'et', 'de', 'du', 'la', 'le', 'en', 'un', 'et/ou'
+}
+
+
+def normalize_token(word: str) -> str:
+    """
+    Normalise un mot pour la comparaison : minuscules, sans accents, sans marque du pluriel.
+
+    Args:
+        word: Mot brut
+
+    Returns:
+        Mot normalisé (ex: "Nappes" → "nappe", "Bijoux" → "bijou")
+    """
+    word = remove_accents(word.lower())
+    if len(word) > 3 and word[-1] in 'sx':
+        word = word[:-1]
+    return word
+
+
+def tokenize(text: str) -> Set[str]:
+    """
+    Mots significatifs normalisés d'un texte.
+
+    Args:
+        text: Texte (chemin de catégorie, titre, mots-clés)
+
+    Returns:
+        Ensemble de mots normalisés
+    """
+    return {
+        normalize_token(word) for word in re.split(r"[^\w]+", text)
+        if len(word) > 2 and word.lower() not in STOP_WORDS and not word.isdigit()
+    }
+
+
+def keyword_tokens(keywords: Iterable[str]) -> Set[str]:
+    """Mots normalisés d'une liste de mots-clés (chaque mot-clé peut contenir plusieurs mots)."""
+    tokens: Set[str] = set()
+    for keyword in keywords:
+        tokens |= tokenize(keyword)
+    return tokens
+
+
+class TaxonomyTree:
+    """Taxonomie indexée par branche (deux premiers niveaux) pour la sélection hiérarchique."""
+
+    def __init__(self, categories: List[Tuple[str, str]]):
+        """
+        Construit l'index à partir des catégories de la table google_taxonomy.
+
+        Args:
+            categories: Liste de tuples (code, path)
+        """
+        # branche -> catégories de profondeur >= MIN_CANDIDATE_DEPTH (code, path, mots du chemin sous la branche, mots du dernier niveau)
+        self.branches: Dict[str, List[Tuple[str, str, Set[str], Set[str]]]] = {}
+        self.branch_label_tokens: Dict[str, Set[str]] = {}
+        self.branch_tokens: Dict[str, Set[str]] = {}
+
+        for code, path in categories:
+            levels = [level.strip() for level in path.split('>')]
+            if len(levels) < BRANCH_DEPTH or levels[0].lower() in EXCLUDED_ROOTS:
+                continue
+            branch = ' > '.join(levels[:BRANCH_DEPTH])
+            if branch not in self.branches:
+                self.branches[branch] = []
+                self.branch_label_tokens[branch] = tokenize(' '.join(levels[:BRANCH_DEPTH]))
+                self.branch_tokens[branch] = set(self.branch_label_tokens[branch])
+            if len(levels) >= MIN_CANDIDATE_DEPTH:
+                below = tokenize(' '.join(levels[BRANCH_DEPTH:]))
+                self.branches[branch].append((code, path, below, tokenize(levels[-1])))
+                self.branch_tokens[branch] |= below
+
+        # Rareté de chaque mot parmi les branches : un mot présent partout ne départage rien
+        document_frequency: Dict[str, int] = {}
+        for tokens in self.branch_tokens.values():
+            for token in tokens:
+                document_frequency[token] = document_frequency.get(token, 0) + 1
+        branch_count = max(1, len(self.branches))
+        self.idf = {token: math.log(1 + branch_count / df) for token, df in document_frequency.items()}
+
+    def __len__(self) -> int:
+        return len(self.branches)
+
+    def score_branches(self, keywords: Iterable[str]) -> List[Tuple[str, float]]:
+        """
+        Score de chaque branche pour des mots-clés produit (branches sans mot trouvé exclues).
+
+        Un mot-clé présent dans le libellé de la branche compte double par rapport à un
+        mot présent seulement dans une de ses sous-catégories.
+
+        Args:
+            keywords: Mots-clés du produit
+
+        Returns:
+            Liste (branche, score) triée par score décroissant
+        """
+        tokens = keyword_tokens(keywords)
+        scores = []
+        for branch, branch_tokens in self.branch_tokens.items():
+            label = self.branch_label_tokens[branch]
+            score = sum(self.idf[token] * (2 if token in label else 1)
+                        for token in tokens if token in branch_tokens)
+            if score > 0:
+                scores.append((branch, score))
+        scores.sort(key=lambda item: (-item[1], item[0]))
+        return scores
+
+    def select_branches(self, keywords: Iterable[str], max_branches: int = DEFAULT_MAX_BRANCHES) -> List[str]:
+        """
+        Étape 1 : branches retenues pour un produit.
+
+        Args:
+            keywords: Mots-clés du produit
+            max_branches: Nombre maximum de branches
+
+        Returns:
+            Branches retenues, de la plus probable à la moins probable
+        """
+        scores = self.score_branches(keywords)
+        if not scores:
+            return []
+        best = scores[0][1]
+        return [branch for branch, score in scores[:max_branches] if score >= best * BRANCH_MIN_SCORE_RATIO]
+
+    def candidates(self, keywords: Iterable[str], max_results: int = 15,
+                   max_branches: int = DEFAULT_MAX_BRANCHES) -> List[Tuple[str, str]]:
+        """
+        Étape 2 : catégories candidates, uniquement sous les branches retenues.
+
+        Les catégories contenant des mots-clés absents du libellé de la branche passent
+        en tête (mot du dernier niveau compté triple) ; la liste est complétée par les sous-catégories directes des
+        branches, qui donnent à l'IA les options voisines.
+
+        Args:
+            keywords: Mots-clés du produit
+            max_results: Nombre maximum de catégories
+            max_branches: Nombre maximum de branches explorées
+
+        Returns:
+            Liste de tuples (code, path) ; vide si aucune branche ne correspond
+        """
+        keywords = list(keywords)
+        tokens = keyword_tokens(keywords)
+        branches = self.select_branches(keywords, max_branches)
+        if not branches:
+            return []
+
+        scored = []
+        for rank, branch in enumerate(branches):
+            # Les mots du libellé de la branche ne départagent pas ses sous-catégories
+            branch_keywords = tokens - self.branch_label_tokens[branch]
+            for code, path, below, last_level in self.branches[branch]:
+                matched = branch_keywords & below
+                score = sum(self.idf.get(token, 0) * (3 if token in last_level else 1) for token in matched)
+                depth = path.count('>') + 1
+                if score > 0 or depth == MIN_CANDIDATE_DEPTH:
+                    # Tri : score, puis branche la plus probable, puis catégorie la plus spécifique
+                    scored.append((-score, rank, -depth, path, code))
+
+        scored.sort()
+        result = [(code, path) for _, _, _, path, code in scored[:max_results]]
+        logger.info(f"🌳 Branches retenues: {' | '.join(branches)} → {len(result)} catégories candidates")
+        return result
@@ -0,0 +1,184 @@
+"""
+Unité de travail pour regrouper les écritures en base d'un batch.
+
+Pendant un batch, les écritures ne sont plus exécutées une par une avec leur
+propre commit : elles sont collectées en mémoire puis écrites en une seule
+transaction courte (flush). Les mises à jour de champs d'une même ligne CSV
+sont fusionnées, et data_json n'est relu et réécrit qu'une fois par ligne.
+
+Les lectures faites pendant le batch (lignes CSV, csv_type du cache) voient
+les écritures en attente grâce aux overlays.
+"""
+
+import json
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class BatchUnitOfWork:
+    """Écritures en attente d'un batch (lignes CSV, statuts, cache, changements de champs)."""
+
+    def __init__(self):
+        """Initialise une unité de travail vide."""
+        self.row_fields: Dict[int, Dict[str, Any]] = {}
+        self.row_status: Dict[int, Tuple[str, Optional[str], Optional[str]]] = {}
+        self.cache_overlay: Dict[str, Dict[str, Any]] = {}
+        self.statements: List[Tuple[str, tuple]] = []
+
+    @property
+    def pending_count(self) -> int:
+        """Nombre d'écritures en attente."""
+        return len(self.row_fields) + len(self.row_status) + len(self.statements)
+
+    # ========== Lignes CSV ==========
+
+    def update_row(self, csv_row_id: int, field_updates: Dict[str, Any]):
+        """
+        Ajoute des mises à jour de champs pour une ligne (fusionnées avec les précédentes).
+
+        Args:
+            csv_row_id: ID de la ligne
+            field_updates: Dictionnaire {field_name: new_value}
+        """
+        self.row_fields.setdefault(csv_row_id, {}).update(field_updates)
+
+    def set_row_status(self, csv_row_id: int, status: str, error_message: str = None, ai_explanation: str = None):
+        """
+        Enregistre le statut d'une ligne (seul le dernier statut est écrit).
+
+        Args:
+            csv_row_id: ID de la ligne
+            status: Nouveau status
+            error_message: Message d'erreur court (optionnel)
+            ai_explanation: Explication complète de l'IA (optionnel)
+        """
+        self.row_status[csv_row_id] = (status, error_message, ai_explanation)
+
+    def overlay_row(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Applique les écritures en attente à une ligne lue en base.
+
+        Args:
+            row: Ligne (dict avec id, data, status, ...)
+
+        Returns:
+            La même ligne, mise à jour
+        """
+        fields = self.row_fields.get(row['id'])
+        if fields:
+            row['data'].update(fields)
+        status = self.row_status.get(row['id'])
+        if status:
+            row['status'], row['error_message'], row['ai_explanation'] = status
+        return row
+
+    # ========== Cache et autres écritures ==========
+
+    def add_statement(self, sql: str, params: tuple = ()):
+        """
+        Diffère une requête d'écriture (exécutée dans l'ordre au flush).
+
+        Args:
+            sql: Requête SQL
+            params: Paramètres de la requête
+        """
+        self.statements.append((sql, params))
+
+    def set_cache_types(self, product_key: str, product_type: Optional[str], csv_type: Optional[str]):
+        """
+        Mémorise product_type/csv_type en attente pour une entrée du cache de catégorisation.
+
+        Args:
+            product_key: Clé produit
+            product_type: Type original du CSV
+            csv_type: Type suggéré par SEO
+        """
+        self.cache_overlay[product_key] = {'product_type': product_type, 'csv_type': csv_type}
+
+    def get_cache_types(self, product_key: str) -> Optional[Dict[str, Any]]:
+        """
+        Retourne product_type/csv_type en attente pour une clé produit.
+
+        Args:
+            product_key: Clé produit
+
+        Returns:
+            Dict {'product_type', 'csv_type'} ou None si rien n'est en attente
+        """
+        return self.cache_overlay.get(product_key)
+
+    # ========== Écriture ==========
+
+    def flush(self, conn) -> int:
+        """
+        Écrit toutes les écritures en attente en une seule transaction.
+
+        Args:
+            conn: Connexion SQLite (row_factory Row)
+
+        Returns:
+            Nombre d'écritures effectuées
+
+        Raises:
+            sqlite3.Error: Si la transaction échoue (annulée, les écritures restent en attente)
+        """
+        count = self.pending_count
+        if not count:
+            return 0
+
+        try:
+            cursor = conn.cursor()
+
+            if self.row_fields:
+                row_ids = list(self.row_fields.keys())
+                current = {}
+                for start in range(0, len(row_ids), 500):
+                    chunk = row_ids[start:start + 500]
+                    cursor.execute(f'''
+                        SELECT id, data_json FROM csv_rows WHERE id IN ({', '.join('?' for _ in chunk)})
+                    ''', chunk)
+                    for row in cursor.fetchall():
+                        current[row['id']] = json.loads(row['data_json'])
+
+                updates = []
+                for row_id, fields in self.row_fields.items():
+                    if row_id not in current:
+                        logger.warning(f"Ligne CSV {row_id} introuvable, mise à jour ignorée")
+                        continue
+                    data = current[row_id]
+                    data.update(fields)
+                    updates.append((json.dumps(data, ensure_ascii=False), row_id))
+
+                cursor.executemany('''
+                    UPDATE csv_rows
+                    SET data_json = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                ''', updates)
+
+            if self.row_status:
+                cursor.executemany('''
+                    UPDATE csv_rows
+                    SET status = ?,
+                        error_message = ?,
+                        ai_explanation = ?,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                ''', [(*status, row_id) for row_id, status in self.row_status.items()])
+
+            for sql, params in self.statements:
+                cursor.execute(sql, params)
+
+            conn.commit()
+
+        except Exception:
+            conn.rollback()
+            raise
+
+        self.row_fields.clear()
+        self.row_status.clear()
+        self.cache_overlay.clear()
+        self.statements.clear()
+        logger.debug(f"Unité de travail: {count} écriture(s) en une transaction")
+        return count
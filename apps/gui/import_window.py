@@ -18,6 +18,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from utils.scraper_registry import registry
 from utils.env_manager import EnvManager
+from utils.job_service import get_job_service
 from apps.gui.progress_window import ProgressWindow
 
 
@@ -1029,46 +1030,8 @@ class ImportWindow(ctk.CTkToplevel):
             # Ouvrir la fenêtre de progression
             self.progress_window = ProgressWindow(self, f"Import {self.selected_scraper.get_display_name()} - Gamme")
             
-            # Démarrer le scraping dans un thread
-            def scrape_thread():
-                def progress_callback(message, current, total):
-                    if self.progress_window and not self.progress_window.is_cancelled:
-                        self.progress_window.after(0, lambda: self.progress_window.update_progress(message, current, total))
-                
-                def log_callback(message):
-                    if self.progress_window:
-                        msg = message
-                        def add_log_message():
-                            if self.progress_window:
-                                try:
-                                    self.progress_window.add_log(msg)
-                                except Exception as e:
-                                    print(f"Erreur lors de l'ajout du log: {e}")
-                        self.progress_window.after(0, add_log_message)
-                
-                def cancel_check():
-                    """Vérifie si l'annulation a été demandée."""
-                    return self.progress_window.is_cancelled if self.progress_window else False
-                
-                success, output_file, error = self.selected_scraper.scrape(
-                    [],  # Pas de catégories pour le mode gamme
-                    None,  # Pas de sous-catégories
-                    options,
-                    progress_callback,
-                    log_callback,
-                    cancel_check
-                )
-                
-                if self.progress_window:
-                    if self.progress_window.is_cancelled:
-                        self.progress_window.after(0, lambda: self.progress_window.finish(False, None, "Annulation demandée par l'utilisateur"))
-                    else:
-                        final_success = success
-                        final_output_file = output_file
-                        final_error = error
-                        self.progress_window.after(0, lambda: self.progress_window.finish(final_success, final_output_file, final_error))
-            
-            threading.Thread(target=scrape_thread, daemon=True).start()
+            # Démarrer le scraping en tâche de fond (worker séparé, survit à la fermeture de la fenêtre)
+            self._submit_scrape_job([], None, options, "Gamme")
             return
         
         # Mode catégories (code existant)
@@ -1177,49 +1140,39 @@ class ImportWindow(ctk.CTkToplevel):
         import threading
         threading.Thread(target=check_errors, daemon=True).start()
         
-        # Démarrer le scraping dans un thread
-        def scrape_thread():
-            def progress_callback(message, current, total):
-                if self.progress_window and not self.progress_window.is_cancelled:
-                    self.progress_window.after(0, lambda: self.progress_window.update_progress(message, current, total))
-            
-            def log_callback(message):
-                if self.progress_window:
-                    # Créer une closure pour capturer correctement la valeur de message
-                    msg = message  # Capturer la valeur dans une variable locale
-                    def add_log_message():
-                        if self.progress_window:
-                            try:
-                                self.progress_window.add_log(msg)
-                            except Exception as e:
-                                print(f"Erreur lors de l'ajout du log: {e}")
-                    self.progress_window.after(0, add_log_message)
-            
-            def cancel_check():
-                """Vérifie si l'annulation a été demandée."""
-                return self.progress_window.is_cancelled if self.progress_window else False
-            
-            success, output_file, error = self.selected_scraper.scrape(
-                selected_categories,
-                selected_subcategories,
-                options,
-                progress_callback,
-                log_callback,
-                cancel_check
-            )
-            
+        # Démarrer le scraping en tâche de fond (worker séparé, survit à la fermeture de la fenêtre)
+        self._submit_scrape_job(selected_categories, selected_subcategories, options)
+    
+    def _submit_scrape_job(self, categories: List[Dict], subcategories: Optional[List[Dict]],
+                           options: Dict, mode_label: Optional[str] = None):
+        """
+        Soumet le scraping au service de tâches et y abonne la fenêtre de progression.
+        
+        Args:
+            categories: Catégories sélectionnées
+            subcategories: Sous-catégories sélectionnées (None si aucune)
+            options: Options du scraper
+            mode_label: Précision ajoutée au libellé de la tâche (ex: "Gamme")
+        """
+        label = f"Import {self.selected_scraper.get_display_name()}"
+        if mode_label:
+            label += f" - {mode_label}"
+        
+        try:
+            job_id = get_job_service().submit('scrape', {
+                'scraper': self.selected_scraper.get_name(),
+                'categories': categories,
+                'subcategories': subcategories,
+                'options': options
+            }, label)
+        except Exception as e:
             if self.progress_window:
-                # Si annulé, fermer la fenêtre
-                if self.progress_window.is_cancelled:
-                    self.progress_window.after(0, lambda: self.progress_window.finish(False, None, "Annulation demandée par l'utilisateur"))
-                else:
-                    # Capturer les variables dans la closure pour éviter les problèmes de scope
-                    final_success = success
-                    final_output_file = output_file
-                    final_error = error
-                    self.progress_window.after(0, lambda: self.progress_window.finish(final_success, final_output_file, final_error))
+                self.progress_window.finish(False, None, f"Impossible de démarrer la tâche: {e}")
+            return
         
-        threading.Thread(target=scrape_thread, daemon=True).start()
+        if self.progress_window:
+            self.progress_window.add_log(f"📋 Tâche de fond {job_id} : {label}")
+            self.progress_window.attach_job(job_id)
     
     def on_mode_changed(self):
         """Appelé quand le mode d'import change."""
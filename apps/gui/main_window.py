@@ -25,6 +25,7 @@ from apps.ai_editor.gui.window import AIEditorWindow
 from utils.setup_checker import SetupChecker
 from utils.cleanup import remove_outputs_directory
 from utils.app_config import get_config
+from utils.job_service import get_job_service
 
 # Importer viewer_window de manière optionnelle (nécessite tkinterweb)
 try:
@@ -98,6 +99,12 @@ class MainWindow(ctk.CTk):
         # Configurer le handler de fermeture pour nettoyer les fichiers générés
         self.protocol("WM_DELETE_WINDOW", self.on_closing)
         
+        # Service de tâches de fond : reprend les tâches interrompues lors de la dernière session
+        try:
+            get_job_service()
+        except Exception as e:
+            logging.error(f"Impossible de démarrer le service de tâches: {e}")
+        
         # Gérer la réactivation de l'app sur macOS (clic sur l'icône du Dock)
         self.bind("<FocusIn>", lambda e: self.on_app_focus())
         self.bind("<Map>", lambda e: self.on_app_focus())
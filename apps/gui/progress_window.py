@@ -24,6 +24,7 @@ class ProgressWindow(ctk.CTkToplevel):
         # Variables
         self.is_cancelled = False
         self.output_file: Optional[str] = None
+        self.job_id: Optional[int] = None  # Tâche de fond suivie (service de tâches)
         
         # Configuration CustomTkinter
         ctk.set_appearance_mode("dark")
@@ -236,6 +237,9 @@ class ProgressWindow(ctk.CTkToplevel):
     def cancel(self):
         """Annule le scraping (thread-safe)."""
         self.is_cancelled = True
+        if self.job_id is not None:
+            from utils.job_service import get_job_service
+            get_job_service().cancel(self.job_id)
         # Planifier l'exécution dans le thread GUI principal
         try:
             self.after(0, self._cancel_safe)
@@ -279,6 +283,40 @@ class ProgressWindow(ctk.CTkToplevel):
             # Si after() échoue (fenêtre détruite), ne rien faire
             pass
     
+    def attach_job(self, job_id: int):
+        """
+        Suit une tâche du service de tâches : progression et logs lus par lots
+        dans la boucle Tk, fin affichée quand la tâche est terminée.
+        
+        Fermer la fenêtre n'arrête pas la tâche.
+        
+        Args:
+            job_id: ID de la tâche
+        """
+        from utils.job_service import get_job_service, JOB_COMPLETED, JOB_CANCELLED
+        
+        self.job_id = job_id
+        
+        def on_update(state):
+            if state['logs']:
+                self._add_log_safe('\n'.join(state['logs']))
+            job = state['job']
+            if job is None:
+                return
+            if job['progress_message']:
+                self._update_progress_safe(job['progress_message'], job['progress_current'], job['progress_total'])
+            if state['finished']:
+                result = job['result'] or {}
+                if job['status'] == JOB_CANCELLED:
+                    self.is_cancelled = True
+                self._finish_safe(
+                    job['status'] == JOB_COMPLETED,
+                    result.get('output_file'),
+                    job['error']
+                )
+        
+        get_job_service().subscribe(job_id).attach(self, on_update)
+    
     def _finish_safe(self, success: bool, output_file: Optional[str] = None, error: Optional[str] = None):
         """Termine l'affichage de la progression (appelé depuis le thread GUI)."""
         # Vérifier que la fenêtre n'a pas été détruite
@@ -147,6 +147,15 @@ class TaxonomyWindow(ctk.CTkFrame):
         )
         self.refresh_rules_button.pack(side="left", padx=10)
         
+        self.mine_rules_button = ctk.CTkButton(
+            button_frame,
+            text="⛏️ Miner les règles",
+            command=self.mine_rules,
+            width=180,
+            height=40
+        )
+        self.mine_rules_button.pack(side="left", padx=10)
+        
         # Label de statut pour les règles
         self.rules_status_label = ctk.CTkLabel(
             rules_frame,
@@ -221,6 +230,43 @@ class TaxonomyWindow(ctk.CTkFrame):
                 text_color="red"
             )
     
+    def mine_rules(self):
+        """
+        Lance le minage des règles depuis le cache de catégorisation (tâche de fond).
+        
+        Les règles très sûres sont créées actives, les autres inactives (à valider).
+        """
+        from utils.job_service import get_job_service, JOB_COMPLETED
+        
+        self.mine_rules_button.configure(state="disabled")
+        self.rules_status_label.configure(text="⛏️ Minage des règles en cours...", text_color="gray")
+        
+        def on_update(state):
+            job = state['job']
+            if job is None or not state['finished']:
+                return
+            self.mine_rules_button.configure(state="normal")
+            report = job['result']
+            if job['status'] != JOB_COMPLETED or not report:
+                self.rules_status_label.configure(
+                    text=f"❌ Erreur lors du minage: {job['error']}",
+                    text_color="red"
+                )
+                return
+            counts = report['counts']
+            self.refresh_rules()
+            self.rules_status_label.configure(
+                text=(f"⛏️ {counts['auto']} règle(s) active(s), {counts['proposed']} proposition(s) à valider, "
+                      f"{counts['conflict']} conflit(s) — sans LLM: {report['coverage_before']:.0%} → "
+                      f"{report['coverage_after']:.0%} ({report['coverage_if_approved']:.0%} si validées)"),
+                text_color="green"
+            )
+        
+        job_id = get_job_service().submit(
+            'mine_type_rules', {'db_path': self.db.db_path, 'apply': True}, "Minage des règles Type → Catégorie"
+        )
+        get_job_service().subscribe(job_id).attach(self, on_update)
+    
     def on_confidence_filter_changed(self, value=None):
         """Appelé quand le filtre de confidence change."""
         self.refresh_rules()
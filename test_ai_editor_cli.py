@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Script de test pour le traitement IA en ligne de commande.
+"""
+
+import io
+import os
+import json
+import tempfile
+from contextlib import redirect_stdout
+
+import pandas as pd
+
+import apps.ai_editor.processor as processor_module
+from apps.ai_editor.db import AIPromptsDB
+from apps.ai_editor.cli import main, build_selected_fields, partition_handles, EXIT_OK, EXIT_USAGE
+
+
+HANDLES = ['nappe-1', 'nappe-2', 'nappe-3']
+
+
+class SEOProvider:
+    """Provider simulé : génère le SEO des produits du prompt."""
+
+    def generate(self, prompt, max_tokens=None, **kwargs):
+        return json.dumps({"products": [
+            {"handle": h, "seo_title": f"Nappe en lin lavé {h}"}
+            for h in HANDLES if f"Handle: {h}" in prompt
+        ]})
+
+
+def test_arguments():
+    """Champs au format de la fenêtre IA, répartition stable entre workers."""
+
+    print("=" * 70)
+    print("TEST ARGUMENTS CLI")
+    print("=" * 70)
+
+    fields = build_selected_fields('seo', 'seo_title,tags')
+    assert fields == {'seo': {'enabled': True, 'fields': ['seo_title', 'tags']}, 'google_category': False}
+    assert build_selected_fields('google_category', None)['seo'] == {'enabled': False, 'fields': []}
+    for bad in [('description', None), ('seo', 'prix')]:
+        try:
+            build_selected_fields(*bad)
+            assert False, bad
+        except ValueError as e:
+            print(f"  ✓ Refusé: {e}")
+
+    parts = partition_handles(['c', 'a', 'd', 'b', 'e'], 2)
+    assert parts == [['a', 'c', 'e'], ['b', 'd']]
+    assert partition_handles(['a'], 3) == [['a']]
+
+
+def test_main_json_lines():
+    """Un traitement complet écrit des événements JSON et retourne 0."""
+
+    print("=" * 70)
+    print("TEST CLI JSON LINES")
+    print("=" * 70)
+
+    tmp_dir = tempfile.mkdtemp()
+    db_path = os.path.join(tmp_dir, 'test.db')
+    with AIPromptsDB(db_path) as db:
+        db.create_prompt_set("Test", "SYSTÈME", "SEO", "CATÉGORIE", is_default=True)
+        db.save_ai_credentials('openai', 'cle-test')
+        db.save_config('batch_size', 5)
+
+    csv_path = os.path.join(tmp_dir, 'produits.csv')
+    pd.DataFrame([
+        {'Handle': h, 'Title': f'Nappe {h}', 'Type': 'Linge', 'Vendor': 'Garnier', 'Body (HTML)': '', 'Tags': ''}
+        for h in HANDLES
+    ]).to_csv(csv_path, index=False)
+
+    original_get_provider = processor_module.get_provider
+    processor_module.get_provider = lambda *args, **kwargs: SEOProvider()
+    try:
+        output = io.StringIO()
+        with redirect_stdout(output):
+            code = main([csv_path, '--model', 'test', '--seo-fields', 'seo_title', '--db', db_path])
+            usage_code = main([csv_path, '--fields', 'description', '--db', db_path])
+    finally:
+        processor_module.get_provider = original_get_provider
+
+    events = [json.loads(line) for line in output.getvalue().splitlines()]
+    print(f"  Événements: {[e['event'] for e in events]}")
+    assert code == EXIT_OK and usage_code == EXIT_USAGE
+    assert events[0]['event'] == 'start' and events[0]['model'] == 'test'
+    done = [e for e in events if e['event'] == 'done']
+    assert len(done) == 1 and done[0]['success'] and done[0]['processed'] == len(HANDLES)
+    assert any(e['event'] == 'progress' for e in events)
+    assert events[-1]['event'] == 'error'
+
+
+if __name__ == "__main__":
+    test_arguments()
+    test_main_json_lines()
+    print("\n✅ TESTS TERMINÉS")
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Script de test pour la réutilisation du contenu par code-barres (EAN/GTIN).
+"""
+
+import os
+import json
+import tempfile
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+import apps.ai_editor.processor as processor_module
+from apps.ai_editor.db import AIPromptsDB
+from apps.ai_editor.processor import CSVAIProcessor
+from apps.ai_editor.barcode_content import normalize_barcode, reusable_values
+
+
+EAN = '4006381333931'
+
+
+def _seo_product(handle):
+    return {
+        "handle": handle, "seo_title": f"Nappe en lin lavé {handle}", "seo_description": "d" * 60,
+        "title": f"Nappe en lin {handle}", "body_html": "<p>" + "x" * 400 + "</p>",
+        "tags": "nappe, lin, table", "image_alt_text": f"Nappe en lin {handle}", "type": "NAPPES"
+    }
+
+
+class SEOProvider:
+    """Provider simulé : SEO complet pour les produits du prompt, handles envoyés mémorisés."""
+
+    def __init__(self, handles):
+        self.handles = handles
+        self.sent = []
+
+    def generate(self, prompt, max_tokens=None, **kwargs):
+        batch = [h for h in self.handles if f"Handle: {h}" in prompt]
+        self.sent.extend(batch)
+        return json.dumps({"products": [_seo_product(h) for h in batch]})
+
+
+def test_normalize_and_policy():
+    """Clé de contrôle, zéros de tête perdus à l'import, règles de réutilisation."""
+
+    print("=" * 70)
+    print("TEST CODE-BARRES ET POLITIQUE")
+    print("=" * 70)
+
+    assert normalize_barcode(EAN) == '0' + EAN
+    assert normalize_barcode(float(EAN)) == normalize_barcode(f"{EAN}.0") == '0' + EAN
+    assert normalize_barcode('036000291452') == normalize_barcode(36000291452) == '00036000291452'
+    for invalid in ['4006381333932', '12345', '', 'abc', None, float('nan'), '00000000']:
+        assert normalize_barcode(invalid) is None, invalid
+
+    now = datetime(2026, 1, 1)
+    entry = {
+        'SEO Title': {'value': 'Titre', 'prompt_set_id': 1, 'updated_at': (now - timedelta(days=10)).isoformat()},
+        'Tags': {'value': 'a, b', 'prompt_set_id': 2, 'updated_at': (now - timedelta(days=400)).isoformat()}
+    }
+    assert reusable_values(entry, ['SEO Title'], 1, 180, True, now) == {'SEO Title': 'Titre'}
+    assert reusable_values(entry, ['SEO Title'], 3, 180, True, now) is None
+    assert reusable_values(entry, ['SEO Title'], 3, 180, False, now) == {'SEO Title': 'Titre'}
+    assert reusable_values(entry, ['SEO Title', 'Tags'], 1, 180, False, now) is None
+    assert reusable_values(entry, ['SEO Title', 'Tags'], 1, 0, False, now) is not None
+    assert reusable_values(entry, ['SEO Title', 'Title'], 1, 0, False, now) is None
+    print("  ✓ Normalisation GTIN-14 et politique de réutilisation")
+
+
+def test_reuse_across_imports():
+    """Un article déjà traité dans un autre import n'est pas renvoyé à l'IA."""
+
+    print("=" * 70)
+    print("TEST RÉUTILISATION ENTRE IMPORTS")
+    print("=" * 70)
+
+    tmp_dir = tempfile.mkdtemp()
+    db = AIPromptsDB(os.path.join(tmp_dir, 'test.db'))
+    db.get_ai_credentials = lambda provider_name: 'cle-test'
+    prompt_set_id = db.create_prompt_set("Test", "SYSTÈME", "SEO", "CATÉGORIE")
+    processor = CSVAIProcessor(db)
+    provider = SEOProvider(['nappe-garnier', 'nappe-boutique-2', 'torchon-neuf'])
+    fields = {'seo': True, 'google_category': False}
+
+    def _import(name, products):
+        csv_path = os.path.join(tmp_dir, name)
+        pd.DataFrame([
+            {'Handle': h, 'Title': title, 'Type': 'Linge', 'Vendor': 'Garnier', 'Body (HTML)': '',
+             'Tags': '', 'Variant Barcode': barcode}
+            for h, title, barcode in products
+        ]).to_csv(csv_path, index=False)
+        return csv_path, processor.csv_storage.import_csv(csv_path)
+
+    original_get_provider = processor_module.get_provider
+    processor_module.get_provider = lambda *args, **kwargs: provider
+    try:
+        csv_path, csv_import_id = _import('garnier.csv', [('nappe-garnier', 'Nappe', EAN)])
+        success, _, _, _ = processor.process_csv(csv_path, prompt_set_id, 'openai', 'test', fields,
+                                                 csv_import_id=csv_import_id)
+        assert success and provider.sent == ['nappe-garnier']
+
+        # Réexport pour une autre boutique : titre modifié, même EAN (lu comme nombre)
+        provider.sent.clear()
+        csv_path, csv_import_id = _import('boutique-2.csv', [
+            ('nappe-boutique-2', 'Nappe lin (édition boutique)', float(EAN)),
+            ('torchon-neuf', 'Torchon', '036000291452')
+        ])
+        success, _, changes, _ = processor.process_csv(csv_path, prompt_set_id, 'openai', 'test', fields,
+                                                       csv_import_id=csv_import_id)
+    finally:
+        processor_module.get_provider = original_get_provider
+
+    row = processor.csv_storage.get_csv_rows(csv_import_id, {'nappe-boutique-2'})[0]
+    print(f"  Envoyés à l'IA: {provider.sent}, réutilisé: {row['data']['SEO Title']!r}")
+    assert success and provider.sent == ['torchon-neuf']
+    assert row['data']['SEO Title'] == "Nappe en lin lavé nappe-garnier"
+    assert row['data']['Tags'].endswith('Lagustothèque') and row['status'] == 'completed'
+    assert changes['nappe-boutique-2']['Title']['new'] == "Nappe en lin nappe-garnier"
+
+    # Réutilisation désactivée : le produit est régénéré
+    db.save_config('barcode_reuse_enabled', False)
+    assert processor._reuse_barcode_content({'x': [row]}, ['x'], fields, prompt_set_id) == {}
+
+
+if __name__ == "__main__":
+    test_normalize_and_policy()
+    test_reuse_across_imports()
+    print("\n✅ TESTS TERMINÉS")
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Script de test pour la catégorisation LangGraph de plusieurs produits par exécution du graph.
+"""
+
+import os
+import json
+import tempfile
+
+from apps.ai_editor.db import AIPromptsDB
+from apps.ai_editor.langgraph_categorizer.graph import GoogleShoppingCategorizationGraph
+
+
+TAXONOMY = {
+    'Maison et jardin > Linge > Nappes': '1',
+    'Maison et jardin > Linge > Torchons': '2',
+    'Aliments, boissons et tabac > Boissons > Thé': '3'
+}
+
+
+class MockProvider:
+    """Provider simulé : répond aux prompts batch des deux agents et compte les requêtes."""
+
+    def __init__(self, choices):
+        self.choices = choices
+        self.prompts = []
+
+    def generate(self, prompt, max_tokens=None):
+        self.prompts.append(prompt)
+        handles = [h for h in self.choices if f"handle={h}" in prompt]
+        if '"search_keywords"' in prompt:
+            return json.dumps({"products": [
+                {"handle": h, "product_type": h, "usage": "", "material": "", "search_keywords": [h]}
+                for h in handles
+            ]})
+        return json.dumps({"products": [
+            {"handle": h, "chosen_category": self.choices[h].pop(0), "confidence": 0.9, "rationale": "test"}
+            for h in handles
+        ]})
+
+
+def test_categorize_batch():
+    """Deux requêtes pour tout le batch, seuls les produits invalides sont retentés."""
+
+    print("=" * 70)
+    print("TEST CATÉGORISATION BATCH")
+    print("=" * 70)
+
+    tmp_dir = tempfile.mkdtemp()
+    db = AIPromptsDB(os.path.join(tmp_dir, 'test.db'))
+    db.search_google_category = lambda path: TAXONOMY.get(path)
+    db.get_candidate_categories = lambda data, max_results=15: [(code, path) for path, code in TAXONOMY.items()]
+
+    provider = MockProvider({
+        'nappe': ['Maison et jardin > Linge > Nappes'],
+        'torchon': ['Maison et jardin > Linge', 'Maison et jardin > Linge > Torchons'],
+        'the': ['Thé vert', 'Aliments, boissons et tabac > Boissons > Thé']
+    })
+    graph = GoogleShoppingCategorizationGraph(db, provider)
+
+    results = graph.categorize_batch([
+        {'Handle': 'nappe', 'Title': 'Nappe'},
+        {'Handle': 'torchon', 'Title': 'Torchon'},
+        {'Handle': 'the', 'Title': 'Thé'}
+    ])
+
+    for handle, result in results.items():
+        print(f"  ✓ {handle}: {result['category_path']} ({result['category_code']})")
+    print(f"  Requêtes LLM: {len(provider.prompts)}")
+
+    assert all(result['is_valid'] for result in results.values())
+    assert results['the']['category_code'] == '3'
+    # 1er tour: 2 requêtes pour 3 produits, 2e tour: 1 sélection pour les 2 produits invalides
+    # (les définitions produit sont conservées)
+    assert len(provider.prompts) == 3
+    assert 'handle=nappe' not in provider.prompts[2]
+    assert 'handle=the' in provider.prompts[2] and 'handle=torchon' in provider.prompts[2]
+
+
+class FailingDefinitionProvider(MockProvider):
+    """Provider simulé dont l'Agent Produit échoue (erreur API)."""
+
+    def generate(self, prompt, max_tokens=None):
+        if '"search_keywords"' in prompt:
+            self.prompts.append(prompt)
+            raise RuntimeError("502 Bad Gateway")
+        return super().generate(prompt, max_tokens)
+
+
+def test_categorize_batch_definition_error():
+    """Un seul produit et une erreur de l'Agent Produit : définition de repli, catégorisation poursuivie."""
+
+    tmp_dir = tempfile.mkdtemp()
+    db = AIPromptsDB(os.path.join(tmp_dir, 'test.db'))
+    db.search_google_category = lambda path: TAXONOMY.get(path)
+    db.get_candidate_categories = lambda data, max_results=15: [(code, path) for path, code in TAXONOMY.items()]
+
+    provider = FailingDefinitionProvider({'nappe': ['Maison et jardin > Linge > Nappes']})
+    graph = GoogleShoppingCategorizationGraph(db, provider)
+
+    results = graph.categorize_batch([{'Handle': 'nappe', 'Title': 'Nappe', 'Type': 'Nappes'}])
+
+    print(f"  ✓ nappe (définition de repli): {results['nappe']['category_path']}")
+    assert results['nappe']['is_valid']
+    assert results['nappe']['category_code'] == '1'
+
+
+if __name__ == "__main__":
+    test_categorize_batch()
+    test_categorize_batch_definition_error()
+    print("\n✅ TESTS TERMINÉS")
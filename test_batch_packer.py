@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Script de test pour le découpage des batches selon un budget de tokens.
+"""
+
+import os
+import tempfile
+
+from apps.ai_editor.db import AIPromptsDB
+from apps.ai_editor.batch_packer import BatchPacker, MIN_OUTPUT_BUDGET
+
+
+def test_batch_packer():
+    """Les batches respectent le budget et le budget s'adapte aux troncatures."""
+
+    print("=" * 70)
+    print("TEST BATCH PACKER")
+    print("=" * 70)
+
+    tmp_dir = tempfile.mkdtemp()
+    db = AIPromptsDB(os.path.join(tmp_dir, 'test.db'))
+
+    products = {}
+    for i in range(10):
+        products[f'court-{i}'] = {'Handle': f'court-{i}', 'Title': f'Torchon {i}', 'Body (HTML)': ''}
+    for i in range(3):
+        products[f'long-{i}'] = {'Handle': f'long-{i}', 'Title': f'Nappe {i}', 'Body (HTML)': '<p>' + 'x' * 8000 + '</p>'}
+    handles = list(products.keys())
+
+    packer = BatchPacker(db, 'openai', 'gpt-test', max_batch_size=20)
+    batches = packer.plan(handles, products)
+    print(f"  Budget initial: {packer.output_budget} tokens → {[len(b) for b in batches]}")
+
+    # Chaque batch tient dans le budget (sauf un produit seul trop gros)
+    for batch in batches:
+        output_total = sum(packer.estimate_product(products[h], h)[1] for h in batch)
+        assert len(batch) == 1 or output_total <= packer.output_budget
+    assert sum(len(b) for b in batches) == len(handles)
+
+    # batch_size reste un plafond
+    small_cap = BatchPacker(db, 'openai', 'gpt-test', max_batch_size=2)
+    assert all(len(b) <= 2 for b in small_cap.plan(handles, products))
+
+    # Troncature observée → budget réduit et persisté
+    first = packer.next_batch(handles, products)
+    initial_budget = packer.output_budget
+    packer.record_batch({'requested': len(first), 'returned': len(first) - 2, 'truncated': True, 'output_chars': 0})
+    assert packer.output_budget < initial_budget
+    assert packer.output_budget >= MIN_OUTPUT_BUDGET
+
+    reloaded = BatchPacker(db, 'openai', 'gpt-test', max_batch_size=20)
+    assert reloaded.output_budget == packer.output_budget
+    print(f"  ✓ Après troncature: {initial_budget} → {reloaded.output_budget} tokens (persisté)")
+
+    # Batch plein sans erreur → budget augmenté
+    reduced = reloaded.output_budget
+    batch = reloaded.next_batch(handles, products)
+    reloaded.record_batch({'requested': len(batch), 'returned': len(batch), 'truncated': False, 'output_chars': 0})
+    assert reloaded.output_budget > reduced
+    print(f"  ✓ Après batch complet: {reduced} → {reloaded.output_budget} tokens")
+
+    # Un autre modèle a son propre budget
+    other = BatchPacker(db, 'claude', 'claude-test', max_batch_size=20)
+    assert other.output_budget == initial_budget
+
+    db.close()
+
+
+if __name__ == "__main__":
+    test_batch_packer()
+    print("\n✅ TESTS TERMINÉS")
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Script de test pour la catégorisation en cascade (modèle rapide → modèle fort).
+"""
+
+import os
+import tempfile
+
+from apps.ai_editor.db import AIPromptsDB
+from apps.ai_editor.langgraph_categorizer.cascade import CascadeCategorizer
+
+
+class MockProvider:
+    def __init__(self, model):
+        self.model = model
+
+
+class MockGraph:
+    """Graph simulé : résultats prédéfinis par handle."""
+
+    def __init__(self, results):
+        self.results = results
+        self.calls = []
+
+    def categorize(self, product_data):
+        self.calls.append(product_data['Handle'])
+        return self.results[product_data['Handle']]
+
+
+def _result(path, confidence, is_valid=True):
+    return {
+        'category_code': '123' if is_valid else None,
+        'category_path': path,
+        'confidence': confidence,
+        'needs_review': confidence < 0.8,
+        'rationale': 'test',
+        'is_valid': is_valid,
+        'validation_error': None if is_valid else f"Catégorie non trouvée: {path}"
+    }
+
+
+def test_cascade_routing():
+    """Seuls les produits peu sûrs ou invalides sont escaladés, et chaque décision est tracée."""
+
+    print("=" * 70)
+    print("TEST CASCADE")
+    print("=" * 70)
+
+    tmp_dir = tempfile.mkdtemp()
+    db = AIPromptsDB(os.path.join(tmp_dir, 'test.db'))
+
+    cascade = CascadeCategorizer(db, MockProvider('rapide'), MockProvider('fort'), confidence_threshold=0.5)
+    cascade.fast_graph = MockGraph({
+        'nappe': _result('Maison et jardin > Linge > Nappes', 0.9),
+        'plaid': _result('Maison et jardin > Linge', 0.3),
+        'the': _result('Thé vert', 0.9, is_valid=False)
+    })
+    cascade._strong_graph = MockGraph({
+        'plaid': _result('Maison et jardin > Linge > Literie > Couvertures', 0.85),
+        'the': _result('Aliments, boissons et tabac > Boissons > Thé', 0.9)
+    })
+
+    results = {h: cascade.categorize({'Handle': h, 'Title': h}) for h in ('nappe', 'plaid', 'the')}
+
+    assert not results['nappe']['escalated'] and results['nappe']['model'] == 'rapide'
+    assert results['plaid']['escalated'] and results['plaid']['confidence'] == 0.85
+    assert results['the']['escalated'] and results['the']['model'] == 'fort'
+    assert cascade._strong_graph.calls == ['plaid', 'the']
+    for handle, result in results.items():
+        print(f"  {'⬆️' if result['escalated'] else '⚡'} {handle}: {result['category_path']} ({result['model']})")
+
+    stats = db.get_routing_stats()
+    print(f"  Journal: {stats}")
+    assert stats['total'] == 3 and stats['escalated'] == 2
+
+
+if __name__ == "__main__":
+    test_cascade_routing()
+    print("\n✅ TESTS TERMINÉS")
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Script de test pour le traitement parallèle des descriptions dans utils/csv_ai_processor.
+"""
+
+import os
+import tempfile
+import threading
+
+import pandas as pd
+
+from utils.ai_providers import AIProviderError
+from utils.csv_ai_processor import CSVAIProcessor
+
+
+def _write_csv(tmp_dir, count):
+    csv_path = os.path.join(tmp_dir, 'produits.csv')
+    rows = []
+    for i in range(count):
+        # 2 lignes (variantes) par produit, la 2e sans titre
+        rows.append({'Handle': f'p{i}', 'Title': f'Nappe {i}', 'Body (HTML)': '<p>ancienne</p>'})
+        rows.append({'Handle': f'p{i}', 'Title': '', 'Body (HTML)': ''})
+    pd.DataFrame(rows).to_csv(csv_path, index=False)
+    return csv_path
+
+
+class MockProvider:
+    """Provider simulé : les 2 premiers appels doivent être simultanés, p3 échoue."""
+
+    config = {"processing": {"max_concurrent_requests": 2}}
+
+    def __init__(self):
+        self.barrier = threading.Barrier(2, timeout=5)
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def generate(self, prompt, context=None):
+        with self.lock:
+            self.calls += 1
+            first_calls = self.calls <= 2
+        if first_calls:
+            self.barrier.wait()
+        if context['title'] == 'Nappe 3':
+            raise AIProviderError("quota")
+        return f"<p>{context['title']} réécrite</p>"
+
+
+def test_process_csv_concurrent():
+    """Appels IA en parallèle, toutes les variantes mises à jour, erreurs isolées."""
+
+    print("=" * 70)
+    print("TEST CSV AI PROCESSOR PARALLÈLE")
+    print("=" * 70)
+
+    tmp_dir = tempfile.mkdtemp()
+    csv_path = _write_csv(tmp_dir, 5)
+    provider = MockProvider()
+    processor = CSVAIProcessor(provider)
+    progress = []
+
+    success, output_path, error = processor.process_csv(
+        csv_path, output_path=os.path.join(tmp_dir, 'out.csv'), prompt="Réécris",
+        progress_callback=lambda message, current, total: progress.append((current, total))
+    )
+    print(f"  Workers: {processor.max_workers}, appels: {provider.calls}, erreur: {error}")
+    assert success and error == "1 erreur(s) rencontrée(s)"
+    assert processor.max_workers == 2
+    assert progress[-1] == (5, 5)
+
+    df = pd.read_csv(output_path)
+    updated = df[df['Handle'] == 'p1']['Body (HTML)'].tolist()
+    assert updated == ['<p>Nappe 1 réécrite</p>'] * 2
+    assert df[df['Handle'] == 'p3']['Body (HTML)'].iloc[0] == '<p>ancienne</p>'
+
+
+def test_process_csv_cancel():
+    """L'annulation arrête le traitement sans écrire de fichier."""
+
+    tmp_dir = tempfile.mkdtemp()
+    csv_path = _write_csv(tmp_dir, 10)
+
+    class FastProvider:
+        calls = 0
+
+        def generate(self, prompt, context=None):
+            FastProvider.calls += 1
+            return "<p>ok</p>"
+
+    completed = []
+    processor = CSVAIProcessor(FastProvider(), max_workers=1)
+    success, output_path, error = processor.process_csv(
+        csv_path, prompt="Réécris",
+        progress_callback=lambda message, current, total: completed.append(current),
+        cancel_check=lambda: len(completed) >= 3
+    )
+    print(f"  Annulation après {len(completed)} produits ({FastProvider.calls} appels)")
+    assert not success and error == "Traitement annulé" and output_path is None
+    assert FastProvider.calls == 3
+
+
+if __name__ == "__main__":
+    test_process_csv_concurrent()
+    test_process_csv_cancel()
+    print("\n✅ TESTS TERMINÉS")
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Script de test pour le mode différé (API batch OpenAI) contre un serveur local de remplacement.
+"""
+
+import os
+import re
+import json
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+import apps.ai_editor.processor as processor_module
+from apps.ai_editor.db import AIPromptsDB
+from apps.ai_editor.processor import CSVAIProcessor
+from apps.ai_editor.deferred_batch import DeferredBatchAgent
+from utils.ai_providers import OpenAIProvider
+
+
+HANDLES = ['nappe-1', 'nappe-2', 'nappe-3', 'nappe-4', 'nappe-5']
+FIELDS = {'seo': {'enabled': True, 'fields': ['seo_title', 'tags']}, 'google_category': False}
+
+
+class BatchAPIStandIn(BaseHTTPRequestHandler):
+    """Sous-ensemble de l'API Batch OpenAI : fichiers JSONL, création et suivi des batches."""
+
+    files = {}
+    batches = {}
+    polls = {}
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, payload, raw=False):
+        body = payload.encode('utf-8') if raw else json.dumps(payload).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream' if raw else 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _batch(self, batch_id):
+        batch = self.batches[batch_id]
+        return {'id': batch_id, 'object': 'batch', 'endpoint': '/v1/chat/completions', 'created_at': 0,
+                'input_file_id': batch['input'], 'completion_window': '24h', 'status': batch['status'],
+                'output_file_id': batch.get('output'), 'errors': None,
+                'request_counts': {'total': batch['total'], 'completed': batch['done'], 'failed': 0}}
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8')
+        if self.path.endswith('/files'):
+            file_id = f"file-{len(self.files) + 1}"
+            self.files[file_id] = '\n'.join(re.findall(r'^\{"custom_id".*$', body, re.M))
+            self._send({'id': file_id, 'object': 'file', 'bytes': len(body), 'created_at': 0,
+                        'filename': 'batch.jsonl', 'purpose': 'batch', 'status': 'processed'})
+        elif self.path.endswith('/batches'):
+            params = json.loads(body)
+            batch_id = f"batch_{len(self.batches) + 1}"
+            total = len(self.files[params['input_file_id']].splitlines())
+            self.batches[batch_id] = {'input': params['input_file_id'], 'status': 'validating', 'total': total, 'done': 0}
+            self._send(self._batch(batch_id))
+
+    def do_GET(self):
+        if '/batches/' in self.path:
+            batch_id = self.path.rsplit('/', 1)[1]
+            batch = self.batches[batch_id]
+            self.polls[batch_id] = self.polls.get(batch_id, 0) + 1
+            if self.polls[batch_id] >= 3 and batch['status'] != 'completed':
+                batch.update(status='completed', done=batch['total'], output=self._complete(batch['input']))
+            elif batch['status'] == 'validating':
+                batch['status'] = 'in_progress'
+            self._send(self._batch(batch_id))
+        elif self.path.endswith('/content'):
+            self._send(self.files[self.path.split('/')[-2]], raw=True)
+
+    def _complete(self, input_file_id):
+        """Génère le fichier de résultats : SEO des handles de chaque requête."""
+        lines = []
+        for line in self.files[input_file_id].splitlines():
+            request = json.loads(line)
+            prompt = request['body']['messages'][-1]['content']
+            handles = dict.fromkeys(re.findall(r'^Handle: (\S+)$', prompt, re.M))
+            content = json.dumps({'products': [
+                {'handle': h, 'seo_title': f"Nappe en lin lavé {h}", 'tags': 'nappe, lin, table'} for h in handles
+            ]})
+            lines.append(json.dumps({'id': 'r', 'custom_id': request['custom_id'], 'error': None, 'response': {
+                'status_code': 200, 'body': {'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}}]}
+            }}))
+        output_id = f"file-{len(self.files) + 1}"
+        self.files[output_id] = '\n'.join(lines)
+        return output_id
+
+
+def test_deferred_processing():
+    """Job envoyé une fois, attente annulée puis reprise, résultats appliqués par process_batch."""
+
+    print("=" * 70)
+    print("TEST MODE DIFFÉRÉ (API BATCH)")
+    print("=" * 70)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), BatchAPIStandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    original_get_provider = processor_module.get_provider
+    original_base_url = os.environ.get('OPENAI_BASE_URL')
+    os.environ['OPENAI_BASE_URL'] = f"http://127.0.0.1:{server.server_port}/v1"
+    try:
+        provider = OpenAIProvider(api_key='cle-test', model='gpt-4o-mini')
+        processor_module.get_provider = lambda *args, **kwargs: provider
+        _run_deferred(provider)
+    finally:
+        processor_module.get_provider = original_get_provider
+        if original_base_url is None:
+            os.environ.pop('OPENAI_BASE_URL', None)
+        else:
+            os.environ['OPENAI_BASE_URL'] = original_base_url
+        server.shutdown()
+
+
+def _run_deferred(provider):
+    tmp_dir = tempfile.mkdtemp()
+    db = AIPromptsDB(os.path.join(tmp_dir, 'test.db'))
+    db.get_ai_credentials = lambda provider_name: 'cle-test'
+    db.save_config('batch_size', 2)
+    db.save_config('adaptive_batching', False)
+    db.save_config('deferred_batch_poll_interval', 0)
+    db.save_config('missing_handles_max_rounds', 0)  # Pas de relance interactive (pas d'API chat ici)
+    db.save_config('llm_telemetry_enabled', False)
+
+    csv_path = os.path.join(tmp_dir, 'produits.csv')
+    pd.DataFrame([
+        {'Handle': h, 'Title': f'Nappe {h}', 'Type': 'Linge', 'Vendor': 'Garnier', 'Body (HTML)': '', 'Tags': ''}
+        for h in HANDLES
+    ]).to_csv(csv_path, index=False)
+
+    processor = CSVAIProcessor(db)
+    csv_import_id = processor.csv_storage.import_csv(csv_path)
+    prompt_set_id = db.create_prompt_set("Test", "SYSTÈME", "SEO", "CATÉGORIE")
+    args = (csv_path, prompt_set_id, 'openai', 'gpt-4o-mini', FIELDS)
+
+    # 1er passage : annulé pendant l'attente du job, qui reste enregistré avec le run
+    success, _, changes, _ = processor.process_csv(
+        *args, cancel_check=lambda: bool(BatchAPIStandIn.polls), csv_import_id=csv_import_id, deferred=True
+    )
+    run = db.find_resumable_run(csv_import_id, prompt_set_id, 'openai', 'gpt-4o-mini', FIELDS)
+    job = db.get_deferred_batch_job(run['id'])
+    print(f"  Annulé: job {job['remote_job_id']} ({job['status']}), batches {job['batches']}")
+    assert not success and changes == {} and run['status'] == 'cancelled'
+    assert job['status'] == 'submitted' and len(job['batches']) == 3
+    assert len(BatchAPIStandIn.batches) == 1
+
+    # Reprise : même job suivi jusqu'au bout, aucun nouvel envoi
+    success, _, changes, _ = processor.process_csv(*args, csv_import_id=csv_import_id, resume=True, deferred=True)
+    print(f"  Repris: {sorted(changes)}, batches envoyés: {len(BatchAPIStandIn.batches)}")
+    assert success and sorted(changes) == HANDLES
+    assert len(BatchAPIStandIn.batches) == 1
+    assert changes['nappe-3']['SEO Title']['new'] == "Nappe en lin lavé nappe-3"
+    assert db.get_deferred_batch_job(run['id'])['status'] == 'completed'
+    db.close()
+
+
+def test_deferred_agent_fallback():
+    """Les produits sans résultat différé sont générés par l'agent interactif."""
+
+    print("=" * 70)
+    print("TEST REPLI INTERACTIF")
+    print("=" * 70)
+
+    class InteractiveAgent:
+        last_batch_stats = {'requested': 1, 'returned': 1, 'truncated': False, 'output_chars': 10}
+        last_compaction_stats = None
+
+        def generate_batch_stream(self, products_data, **kwargs):
+            for product in products_data:
+                yield {'handle': product['Handle'], 'seo_title': 'interactif'}
+
+    agent = DeferredBatchAgent(InteractiveAgent(), {'a': {'handle': 'a', 'seo_title': 'différé'}})
+    first = list(agent.generate_batch_stream([{'Handle': 'a'}, {'Handle': 'b'}]))
+    retry = list(agent.generate_batch_stream([{'Handle': 'b'}]))
+    print(f"  1er passage: {first}, relance: {retry}")
+    assert first == [{'handle': 'a', 'seo_title': 'différé'}] and agent.last_batch_stats['returned'] == 1
+    assert retry == [{'handle': 'b', 'seo_title': 'interactif'}] and agent.results == {}
+
+
+if __name__ == "__main__":
+    test_deferred_processing()
+    test_deferred_agent_fallback()
+    print("\n✅ TESTS TERMINÉS")
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Script de test pour l'optimisation multi-champs de GoogleShoppingOptimizer (une requête par batch).
+"""
+
+import os
+import json
+import tempfile
+
+import pandas as pd
+
+from utils.google_shopping_optimizer import GoogleShoppingOptimizer
+
+
+class MockProvider:
+    """Provider simulé : répond pour chaque handle du prompt, sauf ceux à oublier au 1er passage."""
+
+    supports_response_schema = True
+
+    def __init__(self, forget):
+        self.forget = set(forget)
+        self.calls = []
+
+    def generate(self, prompt, max_tokens=None, response_schema=None):
+        self.calls.append(response_schema)
+        handles = [line.split('=', 1)[1] for line in prompt.split('\n') if line.startswith('### handle=')]
+        products = []
+        for handle in handles:
+            if handle in self.forget and len(handles) > 1:
+                continue
+            products.append({
+                "handle": handle,
+                "seo_title": f"Titre {handle} " + "x" * 80,
+                "google_shopping_mpn": f"MPN-{handle}",
+                "google_shopping_condition": "new"
+            })
+        return json.dumps({"products": products})
+
+
+def test_optimize_csv_batches():
+    """Tous les champs en une requête par batch, produits oubliés redemandés seuls."""
+
+    print("=" * 70)
+    print("TEST GOOGLE SHOPPING OPTIMIZER")
+    print("=" * 70)
+
+    tmp_dir = tempfile.mkdtemp()
+    csv_path = os.path.join(tmp_dir, 'produits.csv')
+    rows = []
+    for i in range(7):
+        # 2 lignes (variantes) par produit
+        rows.append({'Handle': f'p{i}', 'Title': f'Nappe {i}', 'Body (HTML)': '<p>Nappe en <b>lin</b></p>', 'Variant SKU': f'S{i}a'})
+        rows.append({'Handle': f'p{i}', 'Title': '', 'Body (HTML)': '', 'Variant SKU': f'S{i}b'})
+    pd.DataFrame(rows).to_csv(csv_path, index=False)
+
+    provider = MockProvider(forget=['p3'])
+    optimizer = GoogleShoppingOptimizer(provider)
+    optimizer.config = {
+        "enabled": True,
+        "batch_size": 5,
+        "fields": {"SEO Title": True, "Google Shopping / MPN": True, "Google Shopping / Condition": True}
+    }
+
+    success, output_path, error = optimizer.optimize_csv(csv_path, output_path=os.path.join(tmp_dir, 'out.csv'))
+    print(f"  Requêtes IA: {len(provider.calls)} pour 7 produits x 3 champs")
+    assert success and error is None
+
+    # 2 batches (5 + 2) + 1 requête pour le produit oublié
+    assert len(provider.calls) == 3
+    keys = set(provider.calls[0]['properties']['products']['items']['properties'])
+    assert keys == {'handle', 'seo_title', 'google_shopping_mpn', 'google_shopping_condition'}
+
+    df = pd.read_csv(output_path)
+    assert len(df) == 14
+    assert (df['Google Shopping / MPN'] == 'MPN-' + df['Handle']).all()
+    assert df['SEO Title'].str.len().max() == 60
+    print("  ✓ Toutes les variantes mises à jour")
+
+
+if __name__ == "__main__":
+    test_optimize_csv_batches()
+    print("\n✅ TESTS TERMINÉS")
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Script de test pour le service de tâches de fond.
+"""
+
+import os
+import time
+import tempfile
+
+import utils.job_service as job_service
+from utils.job_service import JobService, job_handler
+
+
+@job_handler('test_compteur')
+def _run_counter(params, context):
+    """Tâche de test : compte jusqu'à params['total'], s'arrête si annulée."""
+    for i in range(params['total']):
+        if context.is_cancelled():
+            return {'success': False, 'count': i}
+        context.log(f"étape {i}")
+        context.progress("Comptage", i + 1, params['total'])
+        time.sleep(params.get('delay', 0))
+    return {'success': True, 'count': params['total']}
+
+
+def _wait(service, job_id, timeout=30):
+    """Attend la fin d'une tâche en faisant tourner le planificateur."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        service.run_pending()
+        job = service.store.get_job(job_id)
+        if job['status'] in job_service.FINISHED_STATUSES:
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"Tâche {job_id} non terminée")
+
+
+def test_jobs_in_process():
+    """Exécution, logs par lots, annulation et reprise des tâches interrompues."""
+
+    print("=" * 70)
+    print("TEST SERVICE DE TÂCHES")
+    print("=" * 70)
+
+    service = JobService(os.path.join(tempfile.mkdtemp(), 'jobs.db'), max_workers=2, in_process=True)
+    cancel_check_interval = job_service.CANCEL_CHECK_INTERVAL
+    job_service.CANCEL_CHECK_INTERVAL = 0
+    try:
+        _run_in_process_jobs(service)
+    finally:
+        job_service.CANCEL_CHECK_INTERVAL = cancel_check_interval
+
+
+def _run_in_process_jobs(service):
+    """Tâches exécutées dans des threads (même comportement qu'un worker)."""
+    job_id = service.submit('test_compteur', {'total': 5}, "Compteur")
+    subscription = service.subscribe(job_id)
+    job = _wait(service, job_id)
+    state = subscription.poll()
+    print(f"  ✓ {job['label']}: {job['status']}, {len(state['logs'])} logs, résultat {job['result']}")
+    assert job['status'] == job_service.JOB_COMPLETED and job['result']['count'] == 5
+    assert state['finished'] and state['logs'] == [f"étape {i}" for i in range(5)]
+    assert (job['progress_current'], job['progress_total']) == (5, 5)
+    assert subscription.poll()['logs'] == []
+
+    # Annulation d'une tâche en cours, puis d'une tâche encore en file
+    job_id = service.submit('test_compteur', {'total': 500, 'delay': 0.01})
+    time.sleep(0.1)
+    service.cancel(job_id)
+    job = _wait(service, job_id)
+    print(f"  ✓ Annulée après {job['result']['count']} étapes")
+    assert job['status'] == job_service.JOB_CANCELLED and job['result']['count'] < 500
+
+    queued_id = service.store.create_job('test_compteur', {'total': 1})
+    service.cancel(queued_id)
+    assert service.store.get_job(queued_id)['status'] == job_service.JOB_CANCELLED
+
+    # Tâche running dont le worker a disparu : remise en file avec resume=True
+    orphan_id = service.store.create_job('test_compteur', {'total': 2})
+    service.store.claim_job(orphan_id, pid=2 ** 22 + 12345)
+    assert service.recover_interrupted() == [orphan_id]
+    job = service.store.get_job(orphan_id)
+    assert job['status'] == job_service.JOB_QUEUED and job['params']['resume'] is True
+    assert _wait(service, orphan_id)['status'] == job_service.JOB_COMPLETED
+
+
+def test_worker_process():
+    """La tâche tourne dans un processus séparé et enregistre son échec."""
+
+    print("=" * 70)
+    print("TEST WORKER SÉPARÉ")
+    print("=" * 70)
+
+    service = JobService(os.path.join(tempfile.mkdtemp(), 'jobs.db'), in_process=False)
+    job_id = service.submit('scrape', {'scraper': 'inconnu'}, "Scraper inconnu")
+    job = _wait(service, job_id, timeout=60)
+    print(f"  ✓ PID {job['pid']} ≠ {os.getpid()}: {job['status']} ({job['error']})")
+    assert job['pid'] and job['pid'] != os.getpid()
+    assert job['status'] == job_service.JOB_FAILED and 'inconnu' in job['error']
+    logs = [entry['message'] for entry in service.store.get_logs(job_id)]
+    assert any('inconnu' in message for message in logs)
+
+
+if __name__ == "__main__":
+    test_jobs_in_process()
+    test_worker_process()
+    print("\n✅ TESTS TERMINÉS")
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Script de test pour la télémétrie des appels LLM (table llm_calls).
+"""
+
+import os
+import json
+import tempfile
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from utils import llm_telemetry
+from utils.ai_providers import AIProvider, AIQuotaError
+from utils.llm_telemetry import tracked_call, LLMCallStore
+from apps.ai_editor.agents import SEOAgent
+from apps.ai_editor.langgraph_categorizer.product_agent import ProductSpecialistAgent
+from apps.ai_editor.langgraph_categorizer.taxonomy_agent import TaxonomySpecialistAgent
+
+
+class FakeProvider(AIProvider):
+    """Provider simulé : usage fixe, échecs programmables, streaming délégué à generate()."""
+
+    telemetry_name = "fake"
+
+    def __init__(self):
+        super().__init__(api_key="cle-test", model="gpt-4o-mini-test")
+        self.failures = 0
+        self.quota = False
+
+    def get_default_model(self):
+        return "gpt-4o-mini-test"
+
+    def list_models(self):
+        return [self.model]
+
+    @tracked_call
+    def generate(self, prompt, context=None, max_tokens=None, cache_prefix=None, response_schema=None):
+        if self.quota:
+            raise AIQuotaError("Fake", "Quota dépassé")
+        while self.failures:
+            self.failures -= 1
+            llm_telemetry.note_retry()
+        llm_telemetry.note_usage(1000, 200, 600 if cache_prefix else 0)
+        handles = dict.fromkeys(line.split("Handle: ")[1] for line in prompt.splitlines() if "Handle: " in line)
+        return json.dumps({"products": [{"handle": h, "seo_title": h} for h in handles]})
+
+    @tracked_call
+    def generate_stream(self, prompt, context=None, max_tokens=None, cache_prefix=None, response_schema=None):
+        # Délègue à generate() : un seul appel doit être enregistré
+        yield from super().generate_stream(prompt, context, max_tokens, cache_prefix, response_schema)
+
+
+def test_recording():
+    """Appels enregistrés avec agent, batch, tokens, tentatives, coût et issue."""
+
+    print("=" * 70)
+    print("TEST ENREGISTREMENT DES APPELS")
+    print("=" * 70)
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'test.db')
+    llm_telemetry.configure(db_path)
+    provider = FakeProvider()
+    provider.config = {"telemetry": {"pricing_per_million": {
+        "gpt-4o": {"input": 2.5, "output": 10.0},
+        "gpt-4o-mini": {"input": 0.15, "cached_input": 0.075, "output": 0.6}
+    }}}
+    try:
+        agent = SEOAgent(provider, "SYSTÈME", "SEO")
+        products = [{'Handle': 'nappe-lin', 'Title': 'Nappe'}, {'Handle': 'torchon', 'Title': 'Torchon'}]
+        provider.failures = 2
+        assert len(agent.generate_batch(products)) == 2
+        assert "".join(provider.generate_stream("Handle: plaid")).startswith('{"products"')
+        provider.quota = True
+        try:
+            provider.generate("Handle: plaid")
+            raise AssertionError("AIQuotaError attendue")
+        except AIQuotaError:
+            pass
+        llm_telemetry.flush()
+    finally:
+        llm_telemetry.configure(None)
+
+    store = LLMCallStore(db_path)
+    calls = store.get_calls()
+    store.close()
+    for call in calls:
+        print(f"  {call['agent']} x{call['batch_size']}: {call['outcome']}, {call['retries']} retry, "
+              f"cache={call['cache_hit']}, {call['cost_usd']} $")
+    assert [call['outcome'] for call in calls] == ['ok', 'ok', 'quota']
+    batch_call, stream_call, _ = calls
+    assert (batch_call['agent'], batch_call['batch_size'], batch_call['retries']) == ('SEOAgent', 2, 2)
+    assert batch_call['provider'] == 'fake' and batch_call['cache_hit'] == 1
+    # 400 tokens hors cache, 600 en cache, 200 en sortie (tarif gpt-4o-mini, préfixe le plus long)
+    assert abs(batch_call['cost_usd'] - (400 * 0.15 + 600 * 0.075 + 200 * 0.6) / 1e6) < 1e-9
+    assert stream_call['streamed'] == 1 and stream_call['agent'] is None and stream_call['cache_hit'] == 0
+
+    dashboard = llm_telemetry.build_dashboard(db_path, config={})
+    assert dashboard['overall']['products'] == 3 and dashboard['overall']['quota_errors'] == 1
+    assert set(dashboard['by_agent']) == {('SEOAgent',), (None,)} and dashboard['quotas'] == {}
+
+
+def test_statistics():
+    """Percentiles, coût pour 100 produits, débit et projection du quota."""
+
+    print("=" * 70)
+    print("TEST STATISTIQUES")
+    print("=" * 70)
+
+    now = datetime(2026, 1, 1, 12).timestamp()
+    calls = [
+        {'provider': 'openai', 'model': 'm', 'agent': 'SEOAgent', 'batch_size': 10, 'outcome': 'ok',
+         'latency_ms': 1000 * (i + 1), 'retries': 0, 'cache_hit': i % 2, 'prompt_tokens': 1000,
+         'completion_tokens': 500, 'cost_usd': 0.01, 'started_at': now - 600 + i * 60}
+        for i in range(10)
+    ]
+    calls.append(dict(calls[0], outcome='error', retries=2, batch_size=10))
+    stats = llm_telemetry.summarize_calls(calls)
+    print(f"  p50={stats['p50_ms']} p95={stats['p95_ms']} coût/100={stats['cost_per_100_products']:.4f} "
+          f"débit={stats['products_per_minute']:.1f}/min")
+    assert stats['products'] == 100 and stats['errors'] == 1 and stats['retries'] == 2
+    assert (stats['p50_ms'], stats['p95_ms']) == (5500, 9550)
+    assert abs(stats['cost_per_100_products'] - 0.11) < 1e-9
+    assert abs(stats['products_per_minute'] - 100 / (550 / 60)) < 1e-6
+    assert stats['cache_hit_rate'] == 0.5
+
+    projection = llm_telemetry.project_quota(calls, {'tokens_per_day': 100000, 'requests_per_day': 0}, now)
+    tokens = projection['tokens_per_day']
+    print(f"  Quota: {tokens['used']}/{tokens['limit']}, ~{tokens['hours_left']:.1f} h restantes")
+    assert list(projection) == ['tokens_per_day'] and tokens['used'] == 16500
+    assert tokens['hours_left'] is not None and tokens['hours_left'] > 0
+    assert llm_telemetry.project_quota(calls, {'tokens_per_day': 0}, now) is None
+
+
+def test_products_counted_once():
+    """Les appels de tous les agents d'un même batch, relances comprises, comptent chaque produit une fois."""
+
+    print("=" * 70)
+    print("TEST COMPTAGE DES PRODUITS PAR LOT")
+    print("=" * 70)
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'test.db')
+    llm_telemetry.configure(db_path)
+    provider = FakeProvider()
+    products = [{'Handle': f'nappe-{i}', 'Title': f'Nappe {i}'} for i in range(3)]
+    try:
+        with llm_telemetry.llm_work_unit():
+            seo = SEOAgent(provider, "SYSTÈME", "SEO")
+            seo.generate_batch(products)
+            seo.generate_batch(products[2:])  # Relance d'un produit
+            # Analyse produit lancée dans un autre thread (comme en parallèle du SEO)
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                executor.submit(
+                    contextvars.copy_context().run,
+                    ProductSpecialistAgent(provider)._generate_json, "Handle: nappe-0", 100, {}, 2
+                ).result()
+            TaxonomySpecialistAgent(provider)._generate_json("Handle: nappe-0", 100, {}, 2)
+        # Appel hors lot : compté pour sa taille de batch
+        SEOAgent(provider, "SYSTÈME", "SEO").generate_batch([{'Handle': 'plaid', 'Title': 'Plaid'}])
+        llm_telemetry.flush()
+    finally:
+        llm_telemetry.configure(None)
+
+    store = LLMCallStore(db_path)
+    calls = store.get_calls()
+    store.close()
+    agents = [call['agent'] for call in calls]
+    print(f"  Appels: {agents}")
+    assert agents == ['SEOAgent', 'SEOAgent', 'ProductSpecialistAgent', 'TaxonomySpecialistAgent', 'SEOAgent']
+    assert len({call['work_id'] for call in calls[:4]}) == 1 and calls[4]['work_id'] is None
+
+    stats = llm_telemetry.summarize_calls(calls)
+    print(f"  Produits: {stats['products']}")
+    assert stats['products'] == 4
+
+
+if __name__ == "__main__":
+    test_recording()
+    test_statistics()
+    test_products_counted_once()
+    print("\n✅ TESTS TERMINÉS")
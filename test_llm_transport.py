@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Script de test pour le transport LLM enregistrement/rejeu et le benchmark hors ligne.
+"""
+
+import os
+import json
+import tempfile
+
+import apps.ai_editor.processor as processor_module
+from apps.ai_editor.db import AIPromptsDB
+from apps.ai_editor.cli import build_selected_fields
+from apps.ai_editor.benchmark import generate_fixture_csv, run_benchmark
+from apps.ai_editor.response_schemas import products_schema, SEO_FIELDS
+from utils import llm_transport
+from utils.llm_telemetry import tracked_call
+from utils.llm_transport import transport_call, synthesize_response, CassetteMissError
+
+
+FIELDS = build_selected_fields('seo', None)
+
+
+class FakeProvider:
+    """Provider compteur : répond 'réponse N' au N-ième appel réel."""
+
+    telemetry_name = 'fake'
+
+    def __init__(self, model='fake-1'):
+        self.model = model
+        self.calls = 0
+
+    @tracked_call
+    @transport_call
+    def generate(self, prompt, context=None, max_tokens=None, cache_prefix=None, response_schema=None):
+        self.calls += 1
+        return f"réponse {self.calls} à {prompt}"
+
+    @tracked_call
+    @transport_call
+    def generate_stream(self, prompt, context=None, max_tokens=None, cache_prefix=None, response_schema=None):
+        self.calls += 1
+        yield from ["début ", f"réponse {self.calls} ", "x" * 150]
+
+
+class LocalOpenAIProvider(FakeProvider):
+    """Se présente comme OpenAI et répond localement en JSON valide."""
+
+    telemetry_name = 'openai'
+    supports_prompt_cache = True
+    supports_response_schema = True
+
+    @tracked_call
+    @transport_call
+    def generate_stream(self, prompt, context=None, max_tokens=None, cache_prefix=None, response_schema=None):
+        self.calls += 1
+        yield synthesize_response(prompt, response_schema)
+
+
+def test_record_replay():
+    """Réponses rejouées à l'identique, sans appel au provider."""
+
+    print("=" * 70)
+    print("TEST ENREGISTREMENT / REJEU")
+    print("=" * 70)
+
+    cassette = os.path.join(tempfile.mkdtemp(), 'cassette.jsonl')
+    provider = FakeProvider()
+    try:
+        llm_transport.configure(llm_transport.MODE_RECORD, cassette)
+        recorded = [provider.generate("A"), provider.generate("A"), ''.join(provider.generate_stream("B"))]
+        assert provider.calls == 3
+
+        llm_transport.configure(llm_transport.MODE_REPLAY, cassette, latency_scale=0)
+        replayed = [provider.generate("A"), provider.generate("A"), ''.join(provider.generate_stream("B"))]
+        print(f"  Enregistré: {recorded[:2]}, rejoué: {replayed[:2]}")
+        assert replayed == recorded and provider.calls == 3
+
+        try:
+            provider.generate("A", max_tokens=10)
+            assert False, "requête absente de la cassette"
+        except CassetteMissError as e:
+            print(f"  Absente: {e}")
+        assert provider.calls == 3
+    finally:
+        llm_transport.configure(None)
+
+
+def test_synthetic_response():
+    """Réponse synthétique conforme au schéma : un produit par handle, catégorie candidate."""
+
+    print("=" * 70)
+    print("TEST RÉPONSES SYNTHÉTIQUES")
+    print("=" * 70)
+
+    prompt = "Handle: nappe-lin\nTitle: Nappe\n\nHandle: plaid-laine\nTitle: Plaid"
+    products = json.loads(synthesize_response(prompt, products_schema(SEO_FIELDS)))['products']
+    print(f"  Produits: {[p['handle'] for p in products]}")
+    assert [p['handle'] for p in products] == ['nappe-lin', 'plaid-laine']
+    assert set(products[0]) == {'handle', *SEO_FIELDS}
+    assert 20 <= len(products[0]['seo_title']) <= 70 and len(products[0]['body_html']) >= 350
+    assert len(products[0]['tags'].split(',')) >= 3
+
+    prompt = "### handle=nappe-lin\nCandidates:\n1. Maison > Linge de table\n2. Maison > Décoration"
+    schema = {'type': 'object', 'properties': {'chosen_category': {'type': 'string'}, 'confidence': {'type': 'number'}}}
+    choice = json.loads(synthesize_response(prompt, schema))
+    print(f"  Catégorie: {choice}")
+    assert choice == {'chosen_category': 'Maison > Linge de table', 'confidence': 0.9}
+
+
+def test_benchmark():
+    """process_csv de bout en bout : synthétique, puis enregistrement et rejeu."""
+
+    print("=" * 70)
+    print("TEST BENCHMARK")
+    print("=" * 70)
+
+    tmp_dir = tempfile.mkdtemp()
+    csv_path = os.path.join(tmp_dir, 'fixture.csv')
+    generate_fixture_csv(csv_path, 3)
+
+    report = run_benchmark(csv_path, llm_transport.MODE_SYNTHETIC, 'openai', 'gpt-4o-mini', FIELDS, batch_size=2)
+    run = report['runs'][0]
+    print(f"  Synthétique: {run['changed']}/{run['products']} produits, {run['llm_calls']} appels")
+    assert run['success'] and run['changed'] == 3 and run['llm_calls'] == 2
+
+    # Enregistrement avec un provider local, puis rejeu par le vrai OpenAIProvider (sans réseau)
+    provider = LocalOpenAIProvider('gpt-4o-mini')
+    original_get_provider = processor_module.get_provider
+    processor_module.get_provider = lambda *args, **kwargs: provider
+    cassette = os.path.join(tmp_dir, 'cassette.jsonl')
+    source_db = os.path.join(tmp_dir, 'source.db')
+    with AIPromptsDB(source_db) as db:
+        db.save_ai_credentials('openai', 'cle-test', 'gpt-4o-mini')
+    try:
+        recorded = run_benchmark(csv_path, llm_transport.MODE_RECORD, 'openai', 'gpt-4o-mini', FIELDS,
+                                 cassette_path=cassette, source_db=source_db, batch_size=2)
+        processor_module.get_provider = original_get_provider
+        replayed = run_benchmark(csv_path, llm_transport.MODE_REPLAY, 'openai', 'gpt-4o-mini', FIELDS,
+                                 cassette_path=cassette, latency_scale=0, batch_size=2, repeat=2)
+    finally:
+        processor_module.get_provider = original_get_provider
+    print(f"  Enregistré: {recorded['transport']}, rejoué: {replayed['transport']}")
+    assert recorded['transport']['recorded'] == 2
+    assert all(run['success'] and run['changed'] == 3 for run in replayed['runs'])
+    assert replayed['transport']['replayed'] == 2 and replayed['median']['llm_calls'] == 2
+
+
+if __name__ == "__main__":
+    test_record_replay()
+    test_synthetic_response()
+    test_benchmark()
+    print("\n✅ TESTS TERMINÉS")
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Script de test pour l'exécution en parallèle de l'analyse produit (Google Shopping) et du SEO.
+"""
+
+import os
+import json
+import tempfile
+import threading
+
+import pandas as pd
+
+from apps.ai_editor.db import AIPromptsDB
+from apps.ai_editor.processor import CSVAIProcessor
+from apps.ai_editor.agents import SEOAgent, GoogleShoppingAgent
+
+
+TAXONOMY = {'Maison et jardin > Linge > Nappes': '1'}
+
+
+def _seo_product(handle, csv_type):
+    return {
+        "handle": handle, "seo_title": f"Nappe en lin lavé {handle}", "seo_description": "d" * 60,
+        "title": f"Nappe en lin {handle}", "body_html": "<p>" + "x" * 400 + "</p>",
+        "tags": "nappe, lin, table", "image_alt_text": f"Nappe en lin {handle}", "type": csv_type
+    }
+
+
+def test_definitions_during_seo():
+    """L'Agent Produit répond pendant que le SEO est en cours, le graph ne le rappelle pas."""
+
+    print("=" * 70)
+    print("TEST AGENTS EN PARALLÈLE")
+    print("=" * 70)
+
+    tmp_dir = tempfile.mkdtemp()
+    db = AIPromptsDB(os.path.join(tmp_dir, 'test.db'))
+    db.search_google_category = lambda path: TAXONOMY.get(path)
+    db.get_candidate_categories = lambda data, max_results=15: [(code, path) for path, code in TAXONOMY.items()]
+
+    csv_path = os.path.join(tmp_dir, 'produits.csv')
+    handles = ['nappe-1', 'chemin-2']
+    csv_types = {'nappe-1': 'NAPPES', 'chemin-2': 'CHEMINS DE TABLE'}
+    pd.DataFrame([
+        {'Handle': h, 'Title': f'Nappe {h}', 'Type': 'Linge', 'Vendor': 'Garnier', 'Body (HTML)': '', 'Tags': ''}
+        for h in handles
+    ]).to_csv(csv_path, index=False)
+
+    processor = CSVAIProcessor(db)
+    csv_import_id = processor.csv_storage.import_csv(csv_path)
+
+    definitions_done = threading.Event()
+    seen_during_seo = []
+    google_prompts = []
+
+    class SEOProvider:
+        def generate(self, prompt, max_tokens=None):
+            # Le SEO attend que l'analyse produit soit terminée : impossible en séquentiel
+            seen_during_seo.append(definitions_done.wait(timeout=5))
+            return json.dumps({"products": [_seo_product(h, csv_types[h]) for h in handles if f"Handle: {h}" in prompt]})
+
+    class GoogleProvider:
+        model = 'test'
+
+        def generate(self, prompt, max_tokens=None):
+            google_prompts.append(prompt)
+            batch = [h for h in handles if f"handle={h}" in prompt]
+            if '"search_keywords"' in prompt:
+                definitions_done.set()
+                return json.dumps({"products": [
+                    {"handle": h, "product_type": "nappe", "usage": "table", "search_keywords": ["nappe"]}
+                    for h in batch
+                ]})
+            return json.dumps({"products": [
+                {"handle": h, "chosen_category": "Maison et jardin > Linge > Nappes", "confidence": 0.9}
+                for h in batch
+            ]})
+
+    google_agent = GoogleShoppingAgent(GoogleProvider(), "SYSTÈME", "CATÉGORIE")
+    google_agent.set_database(db)
+    agents = {'seo': SEOAgent(SEOProvider(), "SYSTÈME", "SEO"), 'google_category': google_agent}
+
+    changes = processor.process_batch(
+        csv_import_id, handles, agents, {'seo': True, 'google_category': True}
+    )
+
+    print(f"  SEO a vu l'analyse produit terminée: {seen_during_seo}")
+    print(f"  Requêtes Google Shopping: {len(google_prompts)}")
+    assert seen_during_seo and all(seen_during_seo)
+    # 1 analyse produit (pendant le SEO) + 1 sélection de catégorie, pas de nouvelle analyse
+    assert len(google_prompts) == 2
+    assert sum('"search_keywords"' in p for p in google_prompts) == 1
+    assert all(changes[h]['Google Shopping / Google Product Category']['new'] == '1' for h in handles)
+
+
+if __name__ == "__main__":
+    test_definitions_during_seo()
+    print("\n✅ TESTS TERMINÉS")
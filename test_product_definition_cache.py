@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Script de test pour le cache des définitions produit du LangGraph.
+"""
+
+import os
+import json
+import tempfile
+
+from apps.ai_editor.db import AIPromptsDB
+from apps.ai_editor.langgraph_categorizer.graph import GoogleShoppingCategorizationGraph
+
+
+TAXONOMY = {
+    'Maison et jardin > Linge': '1',
+    'Maison et jardin > Linge > Nappes': '2',
+    'Maison et jardin > Arts de la table > Nappes': '3'
+}
+
+
+class MockProvider:
+    """Provider simulé : compte les requêtes de chaque agent."""
+
+    def __init__(self, choices):
+        self.choices = choices
+        self.definition_calls = 0
+        self.taxonomy_prompts = []
+
+    def generate(self, prompt, max_tokens=None):
+        if '"search_keywords"' in prompt:
+            self.definition_calls += 1
+            return json.dumps({"product_type": "nappe", "usage": "table", "material": "lin",
+                               "search_keywords": ["nappe", "table"]})
+        self.taxonomy_prompts.append(prompt)
+        return json.dumps({"chosen_category": self.choices.pop(0), "confidence": 0.9, "rationale": "test"})
+
+
+def test_definition_cache():
+    """Le retry ne réanalyse pas le produit et une nouvelle exécution réutilise la définition en cache."""
+
+    print("=" * 70)
+    print("TEST CACHE DÉFINITION PRODUIT")
+    print("=" * 70)
+
+    tmp_dir = tempfile.mkdtemp()
+    db = AIPromptsDB(os.path.join(tmp_dir, 'test.db'))
+    db.search_google_category = lambda path: TAXONOMY.get(path)
+    db.get_candidate_categories = lambda data, max_results=15: [(code, path) for path, code in TAXONOMY.items()]
+
+    product = {'Handle': 'nappe-lin', 'Title': 'Nappe en lin', 'Type': 'Linge', 'Vendor': 'Garnier'}
+
+    # 1er passage : catégorie trop générale, puis retry sur les candidates uniquement
+    provider = MockProvider(['Maison et jardin > Linge', 'Maison et jardin > Linge > Nappes'])
+    result = GoogleShoppingCategorizationGraph(db, provider).categorize(product)
+    print(f"  ✓ {result['category_path']} ({provider.definition_calls} définition, {len(provider.taxonomy_prompts)} sélections)")
+
+    assert result['is_valid'] and result['category_code'] == '2'
+    assert provider.definition_calls == 1
+    assert len(provider.taxonomy_prompts) == 2
+    # La catégorie rejetée n'est plus proposée au retry
+    assert 'Maison et jardin > Linge\n' not in provider.taxonomy_prompts[1] + '\n'
+
+    # 2e passage (même contenu produit, autre handle) : définition lue en cache
+    provider = MockProvider(['Maison et jardin > Arts de la table > Nappes'])
+    result = GoogleShoppingCategorizationGraph(db, provider).categorize({**product, 'Handle': 'nappe-lin-2'})
+    print(f"  ✓ Réexécution: {provider.definition_calls} définition LLM")
+
+    assert result['category_code'] == '3'
+    assert provider.definition_calls == 0
+
+
+if __name__ == "__main__":
+    test_definition_cache()
+    print("\n✅ TESTS TERMINÉS")
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Script de test pour la compaction des données produit avant les prompts.
+"""
+
+from apps.ai_editor.prompt_compaction import html_to_text, compact_products, truncate_text
+from apps.ai_editor.agents import SEOAgent, GoogleShoppingAgent
+
+
+BOILERPLATE = "Livraison offerte dès 60 € d'achat, retours gratuits sous 30 jours."
+
+
+def _body(text):
+    return (f'<div style="font-family: Arial; color: #333"><style>.x {{ color: red }}</style>'
+            f'<p><strong>{text}</strong>&nbsp;100% lin lavé.</p>'
+            f'<ul><li>Lavable à 40°</li><li>Fabriqué en France</li></ul>'
+            f'<p>{BOILERPLATE}</p></div>')
+
+
+def test_html_to_text():
+    """Balises, styles et entités sont retirés, les blocs restent séparés."""
+
+    print("=" * 70)
+    print("TEST COMPACTION HTML")
+    print("=" * 70)
+
+    text = html_to_text(_body("Nappe Garnier"))
+    print(f"  {text!r}")
+    assert '<' not in text and 'color' not in text and '&nbsp;' not in text
+    assert text.split('\n')[:3] == ["Nappe Garnier 100% lin lavé.", "- Lavable à 40°", "- Fabriqué en France"]
+    assert truncate_text("un deux trois quatre cinq", 22) == "un deux trois quatre…"
+
+
+def test_compact_batch():
+    """Le texte commun n'est envoyé qu'une fois et la compaction est déterministe."""
+
+    products = [
+        {'Handle': 'nappe', 'Title': 'Nappe', 'Body (HTML)': _body("Nappe Garnier"), 'Tags': ''},
+        {'Handle': 'torchon', 'Title': 'Torchon', 'Body (HTML)': _body("Torchon Artiga")}
+    ]
+    compacted, common, stats = compact_products(products, SEOAgent.FIELD_LIMITS)
+    print(f"  Tokens: {stats['tokens_before']} → {stats['tokens_after']}")
+
+    assert common == [BOILERPLATE]
+    assert all(BOILERPLATE not in p['Body (HTML)'] for p in compacted)
+    assert compacted[0]['Body (HTML)'].startswith("[texte commun 1]")
+    assert 'Tags' not in compacted[0]
+    assert stats['tokens_after'] < stats['tokens_before'] / 2
+    assert compact_products(products, SEOAgent.FIELD_LIMITS) == (compacted, common, stats)
+
+    # Prompt batch : texte commun une seule fois, limites propres à l'agent
+    _, prompt = SEOAgent(None, "SYSTÈME", "SEO")._build_batch_prompt_parts(products)
+    assert prompt.count(BOILERPLATE) == 1 and '<p>' not in prompt
+
+    long_product = [{'Handle': 'plaid', 'Body (HTML)': '<p>' + 'mot ' * 500 + '</p>'}]
+    seo_body = compact_products(long_product, SEOAgent.FIELD_LIMITS)[0][0]['Body (HTML)']
+    google_body = compact_products(long_product, GoogleShoppingAgent.FIELD_LIMITS)[0][0]['Body (HTML)']
+    print(f"  Body limité: SEO {len(seo_body)} caractères, Google Shopping {len(google_body)}")
+    assert len(google_body) < len(seo_body) <= SEOAgent.FIELD_LIMITS['Body (HTML)'] + 1
+
+    # Identifiants recopiés tels quels : le handle du prompt correspond au produit
+    handle = 'nappe-en-lin-lave-' + 'x' * 200 + '  bis'
+    compacted = compact_products([{'Handle': handle, 'Title': 'Nappe'}], GoogleShoppingAgent.FIELD_LIMITS)[0]
+    assert compacted[0]['Handle'] == handle
+    _, prompt = SEOAgent(None, "SYSTÈME", "SEO")._build_batch_prompt_parts([{'Handle': handle, 'Title': 'Nappe'}])
+    assert f"Handle: {handle}\n" in prompt
+    print("  ✓ Handle long non compacté dans le prompt")
+
+
+if __name__ == "__main__":
+    test_html_to_text()
+    test_compact_batch()
+    print("\n✅ TESTS TERMINÉS")
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Script de test pour le registre des providers IA partagés.
+"""
+
+from utils.ai_providers import get_provider, get_max_concurrent_requests, clear_provider_registry
+from apps.ai_editor import processor
+
+
+def _has_google_genai():
+    """Indique si le SDK google-genai est installé."""
+    try:
+        from google import genai  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def test_shared_providers():
+    """Un même (provider, clé, modèle) réutilise son instance et son pool HTTP."""
+
+    print("=" * 70)
+    print("TEST REGISTRE DES PROVIDERS")
+    print("=" * 70)
+
+    clear_provider_registry()
+
+    first = get_provider('openai', api_key='sk-test', model='gpt-4o-mini')
+    second = get_provider('openai', api_key='sk-test', model='gpt-4o-mini')
+    other_model = get_provider('openai', api_key='sk-test', model='gpt-4')
+    other_key = get_provider('openai', api_key='sk-autre', model='gpt-4o-mini')
+    private = get_provider('openai', api_key='sk-test', model='gpt-4o-mini', shared=False)
+
+    assert first is second
+    assert first.client is second.client
+    assert other_model is not first and other_key is not first and private is not first
+    print("  ✓ Instance réutilisée pour le même provider/clé/modèle")
+
+    if _has_google_genai():
+        gemini = get_provider('gemini', api_key='gemini-test', model='gemini-2.5-flash')
+        assert get_provider('gemini', api_key='gemini-test', model='gemini-2.5-flash') is gemini
+    else:
+        print("  - Gemini ignoré (google-genai non installé)")
+
+    limits = first._http_limits()
+    expected = first.config.get('processing', {}).get('max_concurrent_requests', 4)
+    print(f"  ✓ Pool HTTP: {limits.max_connections} connexions, {limits.max_keepalive_connections} keep-alive")
+    assert limits.max_connections == limits.max_keepalive_connections == expected
+
+    # Exécuteur des requêtes parallèles dimensionné sur le même réglage que le pool
+    assert get_max_concurrent_requests(first.config) == get_max_concurrent_requests() == expected
+    assert get_max_concurrent_requests({'processing': {'max_concurrent_requests': 0}}) == 1
+    assert processor._agent_executor._max_workers == max(1, expected - 1)
+    print(f"  ✓ Exécuteur des agents: {processor._agent_executor._max_workers} thread(s)")
+
+    clear_provider_registry()
+    assert get_provider('openai', api_key='sk-test', model='gpt-4o-mini') is not first
+
+
+if __name__ == "__main__":
+    test_shared_providers()
+    print("\n✅ TESTS TERMINÉS")
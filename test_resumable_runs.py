@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Script de test pour la reprise d'un traitement CSV interrompu.
+"""
+
+import os
+import json
+import tempfile
+
+import pandas as pd
+
+import apps.ai_editor.processor as processor_module
+from apps.ai_editor.db import AIPromptsDB
+from apps.ai_editor.processor import CSVAIProcessor
+
+
+HANDLES = ['nappe-1', 'nappe-2', 'nappe-3', 'nappe-4']
+FIELDS = {'seo': {'enabled': True, 'fields': ['seo_title', 'tags']}, 'google_category': False}
+
+
+class SEOProvider:
+    """Provider simulé : génère le SEO des produits du prompt et mémorise les handles envoyés."""
+
+    def __init__(self):
+        self.sent = []
+
+    def generate(self, prompt, max_tokens=None, **kwargs):
+        batch = [h for h in HANDLES if f"Handle: {h}" in prompt]
+        self.sent.extend(batch)
+        return json.dumps({"products": [
+            {"handle": h, "seo_title": f"Nappe en lin lavé {h}", "tags": "nappe, lin, table"}
+            for h in batch
+        ]})
+
+
+def test_resume_run():
+    """Le run annulé est repris : seuls les produits restants sont envoyés à l'IA."""
+
+    print("=" * 70)
+    print("TEST REPRISE D'UN TRAITEMENT")
+    print("=" * 70)
+
+    tmp_dir = tempfile.mkdtemp()
+    db = AIPromptsDB(os.path.join(tmp_dir, 'test.db'))
+    db.get_ai_credentials = lambda provider_name: 'cle-test'
+    db.save_config('batch_size', 2)
+    db.save_config('adaptive_batching', False)
+
+    csv_path = os.path.join(tmp_dir, 'produits.csv')
+    # Champs non sélectionnés déjà valides : les produits traités passent le contrôle qualité
+    body = '<p>' + 'Nappe en lin lavé, douce et résistante, pour une table élégante au quotidien. ' * 5 + '</p>'
+    pd.DataFrame([
+        {'Handle': h, 'Title': f'Nappe en lin {h}', 'Type': 'NAPPES', 'Vendor': 'Garnier', 'Body (HTML)': body,
+         'Tags': '', 'SEO Description': f'Nappe en lin lavé {h}, douce et résistante pour habiller votre table.',
+         'Image Alt Text': f'Nappe en lin {h}'}
+        for h in HANDLES
+    ]).to_csv(csv_path, index=False)
+
+    processor = CSVAIProcessor(db)
+    csv_import_id = processor.csv_storage.import_csv(csv_path)
+    prompt_set_id = db.create_prompt_set("Test", "SYSTÈME", "SEO", "CATÉGORIE")
+    provider = SEOProvider()
+    original_get_provider = processor_module.get_provider
+    processor_module.get_provider = lambda *args, **kwargs: provider
+    try:
+        _run_and_resume(db, processor, provider, csv_path, csv_import_id, prompt_set_id)
+    finally:
+        processor_module.get_provider = original_get_provider
+
+
+def _run_and_resume(db, processor, provider, csv_path, csv_import_id, prompt_set_id):
+    args = (csv_path, prompt_set_id, 'openai', 'test', FIELDS)
+
+    # 1er passage : annulé après le premier batch
+    success, _, changes, _ = processor.process_csv(
+        *args, cancel_check=lambda: len(provider.sent) >= 2, csv_import_id=csv_import_id
+    )
+    run = db.find_resumable_run(csv_import_id, prompt_set_id, 'openai', 'test', FIELDS)
+    print(f"  Annulé: {sorted(changes)} (run {run['id']}, statut {run['status']})")
+    assert not success and sorted(changes) == HANDLES[:2]
+    assert run['status'] == 'cancelled' and run['done_count'] == 2
+    assert {r['status'] for r in processor.csv_storage.get_csv_rows(csv_import_id, HANDLES[:2])} == {'completed'}
+
+    # Un produit en erreur n'est pas marqué 'done' : il sera retraité à la reprise
+    db.save_run_items(run['id'], ['nappe-3'], {'nappe-3': {'Tags': {'original': '', 'new': 'nappe'}}})
+    assert db.find_resumable_run(csv_import_id, prompt_set_id, 'openai', 'test', FIELDS)['done_count'] == 2
+
+    # 2e passage : reprise, les produits déjà traités ne sont pas renvoyés
+    provider.sent.clear()
+    success, _, changes, result_id = processor.process_csv(*args, csv_import_id=csv_import_id, resume=True)
+    print(f"  Reprise: envoyés {provider.sent}, changements {len(changes)}")
+    assert success and set(provider.sent) == set(HANDLES[2:])
+    assert sorted(changes) == HANDLES
+    assert changes['nappe-1']['SEO Title']['new'] == "Nappe en lin lavé nappe-1"
+    assert db.find_resumable_run(csv_import_id, prompt_set_id, 'openai', 'test', FIELDS) is None
+    assert len(db.get_product_changes('nappe-1', result_id)) == 2
+
+    # Réimport du CSV : les résultats du run repris sont restaurés dans les lignes
+    db.finish_processing_run(run['id'], 'cancelled')
+    new_import_id = processor.csv_storage.import_csv(csv_path)
+    db.conn.execute('UPDATE processing_runs SET csv_import_id = ? WHERE id = ?', (new_import_id, run['id']))
+    provider.sent.clear()
+    processor.process_csv(*args, csv_import_id=new_import_id, resume=True)
+    row = processor.csv_storage.get_csv_rows(new_import_id, ['nappe-2'])[0]
+    print(f"  Restauré après réimport: {row['data']['Tags']!r}")
+    assert provider.sent == []
+    assert row['data']['SEO Title'] == "Nappe en lin lavé nappe-2"
+    assert row['data']['Tags'].endswith('Lagustothèque')
+
+
+if __name__ == "__main__":
+    test_resume_run()
+    print("\n✅ TESTS TERMINÉS")
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Script de test pour le moteur de règles Type → Catégorie compilé en mémoire.
+"""
+
+import os
+import tempfile
+
+from apps.ai_editor.db import AIPromptsDB
+
+
+def _use_count(db, csv_type):
+    row = db.conn.execute('SELECT use_count FROM type_category_mapping WHERE csv_type = ?', (csv_type,)).fetchone()
+    return row['use_count']
+
+
+def test_rule_engine():
+    """Recherche sans SQL, compteurs écrits au flush, invalidation à chaque modification."""
+
+    print("=" * 70)
+    print("TEST MOTEUR DE RÈGLES")
+    print("=" * 70)
+
+    tmp_dir = tempfile.mkdtemp()
+    db_path = os.path.join(tmp_dir, 'test.db')
+    db = AIPromptsDB(db_path)
+
+    db.save_type_mapping('Linge', 'Nappes', '4143', 'Maison et jardin > Linge > Linge de table > Nappes')
+
+    # Insensible à la casse et aux espaces
+    for csv_type in ('NAPPES', ' nappes ', 'Nappes'):
+        rule = db.get_type_mapping('Linge', csv_type)
+        assert rule and rule['category_code'] == '4143'
+    assert rule['use_count'] == 3
+    assert db.get_type_mapping('Linge', 'TORCHONS') is None
+    print("  ✓ Règle trouvée en mémoire pour NAPPES / nappes / Nappes")
+
+    # Compteurs en mémoire jusqu'au flush
+    assert _use_count(db, 'NAPPES') == 0
+    assert db.flush_type_mapping_usage() == 1
+    assert _use_count(db, 'NAPPES') == 3
+    print("  ✓ use_count écrit en une fois au flush")
+
+    # Désactivation depuis une autre connexion (autre fenêtre) : visible après refresh
+    other = AIPromptsDB(db_path)
+    rule_id = other.conn.execute('SELECT id FROM type_category_mapping').fetchone()['id']
+    other.toggle_type_mapping(rule_id, False)
+    db.refresh_type_mappings()
+    assert db.get_type_mapping('Linge', 'NAPPES') is None
+
+    other.toggle_type_mapping(rule_id, True)
+    db.refresh_type_mappings()
+    assert db.get_type_mapping('Linge', 'NAPPES')['use_count'] == 4
+    print("  ✓ Règles rechargées après modification")
+
+    db.flush_type_mapping_usage()
+    other.close()
+    db.close()
+
+
+if __name__ == "__main__":
+    test_rule_engine()
+    print("\n✅ TESTS TERMINÉS")
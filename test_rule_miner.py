@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Script de test pour le minage des règles Type → Catégorie depuis le cache.
+"""
+
+import os
+import tempfile
+
+from apps.ai_editor.db import AIPromptsDB
+from apps.ai_editor.rule_miner import run_rule_mining, RULE_AUTO, RULE_PROPOSED, RULE_CONFLICT
+
+
+NAPPES = ('4203', 'Maison et jardin > Linge > Linge de table > Nappes')
+TORCHONS = ('4077', 'Maison et jardin > Linge > Serviettes > Torchons')
+PLAIDS = ('1985', 'Maison et jardin > Linge > Literie > Couvertures')
+MUGS = ('2169', 'Maison et jardin > Arts de la table et arts culinaires > Arts de la table > Mugs')
+
+
+def _fill_cache(db, csv_type, category, count, confidence=0.95, start=0):
+    """Insère count catégorisations d'un même csv_type dans product_category_cache."""
+    cursor = db.conn.cursor()
+    for i in range(start, start + count):
+        cursor.execute('''
+            INSERT INTO product_category_cache
+            (product_key, title, product_type, category_code, category_path, confidence, csv_type)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (f"{csv_type}-{i}", f"{csv_type} {i}", csv_type.title(), category[0], category[1],
+              confidence, csv_type.lower()))
+    db.conn.commit()
+
+
+def test_rule_mining():
+    """Règles actives, propositions, conflits et groupes sous les seuils."""
+
+    print("=" * 70)
+    print("TEST MINAGE DES RÈGLES")
+    print("=" * 70)
+
+    db = AIPromptsDB(os.path.join(tempfile.mkdtemp(), 'test.db'))
+    _fill_cache(db, 'NAPPES', NAPPES, 6)                      # unanime → active
+    _fill_cache(db, 'TORCHONS', TORCHONS, 4)                  # 4 produits → proposée
+    _fill_cache(db, 'PLAIDS', PLAIDS, 5, confidence=0.6)      # confiance trop basse
+    _fill_cache(db, 'MUGS', MUGS, 2)                          # trop peu de produits
+    _fill_cache(db, 'THÉ', NAPPES, 4)                         # règle existante différente
+    db.save_type_mapping('Thé', 'THÉ', '2073', 'Alimentation, boissons et tabac > Boissons > Thé et infusions')
+
+    preview = run_rule_mining(db, apply=False)
+    assert preview['created'] == 0 and len(db.get_all_type_mappings()) == 1
+
+    report = run_rule_mining(db)
+    statuses = {rule['csv_type']: rule['status'] for rule in report['rules']}
+    print(f"  Statuts: {statuses}")
+    print(f"  Couverture: {report['coverage_before']:.0%} → {report['coverage_after']:.0%} "
+          f"({report['coverage_if_approved']:.0%} si validées)")
+    assert statuses == {'NAPPES': RULE_AUTO, 'TORCHONS': RULE_PROPOSED, 'THÉ': RULE_CONFLICT}
+    assert report['created'] == 2 and report['cached_products'] == 21
+    assert (report['coverage_before'], report['coverage_after'], report['coverage_if_approved']) == (4 / 21, 10 / 21, 14 / 21)
+
+    rules = {rule['csv_type']: rule for rule in db.get_all_type_mappings()}
+    assert rules['NAPPES']['is_active'] and rules['NAPPES']['created_by'] == 'rule_miner'
+    assert not rules['TORCHONS']['is_active']
+    assert rules['THÉ']['category_code'] == '2073'
+    assert db.get_type_mapping('Nappes', 'nappes ')['category_code'] == NAPPES[0]
+    assert db.get_type_mapping('Torchons', 'TORCHONS') is None
+
+    # Un second passage ne recrée rien
+    assert run_rule_mining(db)['created'] == 0
+    db.close()
+
+
+if __name__ == "__main__":
+    test_rule_mining()
+    print("\n✅ TESTS TERMINÉS")
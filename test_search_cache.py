@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Script de test pour le cache et l'exécution en parallèle des recherches Perplexity.
+"""
+
+import threading
+from types import SimpleNamespace
+
+from utils.search_tools import PerplexitySearchTool, clear_search_cache, normalize_query
+
+
+class MockCompletions:
+    """API Perplexity simulée : compte les appels, bloque tant que 2 recherches ne sont pas en cours."""
+
+    def __init__(self):
+        self.queries = []
+        self.barrier = threading.Barrier(2, timeout=5)
+
+    def create(self, model, messages, max_tokens, temperature):
+        query = messages[-1]['content']
+        self.queries.append(query)
+        self.barrier.wait()
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f"résultat {query}"))])
+
+
+def test_search_many():
+    """Les requêtes distinctes partent en parallèle, les doublons normalisés sont servis par le cache."""
+
+    print("=" * 70)
+    print("TEST CACHE RECHERCHE PERPLEXITY")
+    print("=" * 70)
+
+    clear_search_cache()
+    tool = PerplexitySearchTool("test-key")
+    completions = MockCompletions()
+    tool.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+    # La barrière n'est franchie que si les deux recherches distinctes sont simultanées
+    results = tool.search_many([
+        "nappe coton enduit garnier thiebaut",
+        "Marque Artiga histoire",
+        "  Nappe coton  enduit Garnier Thiebaut ?"
+    ])
+    print(f"  Appels API: {len(completions.queries)}")
+    assert len(completions.queries) == 2
+    assert results[0] == results[2] == "résultat nappe coton enduit garnier thiebaut"
+    assert results[1] == "résultat Marque Artiga histoire"
+
+    # Un autre produit pose la même question : aucun nouvel appel
+    assert tool.search("NAPPE coton enduit garnier thiebaut") == results[0]
+    assert len(completions.queries) == 2
+    assert normalize_query(" Marque  ARTIGA histoire!") == "marque artiga histoire"
+
+    clear_search_cache()
+
+
+if __name__ == "__main__":
+    test_search_many()
+    print("\n✅ TESTS TERMINÉS")
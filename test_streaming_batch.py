@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Script de test pour le parsing incrémental des réponses batch streamées.
+"""
+
+import os
+import json
+import tempfile
+
+import pandas as pd
+
+from apps.ai_editor.json_stream import IncrementalProductsParser
+from apps.ai_editor.agents import SEOAgent
+from apps.ai_editor.db import AIPromptsDB
+from apps.ai_editor.processor import CSVAIProcessor
+
+
+def _chunks(text, size):
+    """Découpe un texte en fragments de taille fixe (simule un stream)."""
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def test_incremental_parser():
+    """Les produits sont retournés dès que leur objet JSON est fermé."""
+
+    print("=" * 70)
+    print("TEST PARSER JSON INCRÉMENTAL")
+    print("=" * 70)
+
+    response = "```json\n" + json.dumps({
+        "products": [
+            {"handle": "nappe-1", "tags": "a, b, c", "body_html": "<p>{texte} avec \"guillemets\"</p>"},
+            {"handle": "torchon-2", "tags": ["x", "y"]}
+        ]
+    }, ensure_ascii=False) + "\n```"
+
+    parser = IncrementalProductsParser()
+    received = []
+    for chunk in _chunks(response, 7):
+        for product in parser.feed(chunk):
+            received.append(product['handle'])
+            print(f"  ✓ Produit reçu après {len(parser.text)} caractères: {product['handle']}")
+
+    assert received == ["nappe-1", "torchon-2"]
+    assert parser.is_complete
+    assert parser.failed_handles() == []
+
+    # Réponse tronquée : le premier produit est exploitable, le second est signalé
+    truncated = '{"products": [{"handle": "a", "title": "A"}, {"handle": "b", "title": "B'
+    parser = IncrementalProductsParser()
+    products = []
+    for chunk in _chunks(truncated, 5):
+        products.extend(parser.feed(chunk))
+
+    assert [p['handle'] for p in products] == ["a"]
+    assert not parser.is_complete
+    assert parser.failed_handles() == ["b"]
+    print("  ✓ Réponse tronquée: produit 'b' signalé pour nouvelle demande")
+
+
+def test_generate_batch_stream():
+    """generate_batch_stream() fonctionne avec un provider streaming et un provider classique."""
+
+    response = json.dumps({"products": [
+        {"handle": "p1", "seo_title": "Titre 1"},
+        {"handle": "p2", "seo_title": "Titre 2"}
+    ]})
+
+    class MockStreamingProvider:
+        supports_prompt_cache = True
+
+        def generate_stream(self, prompt, context=None, max_tokens=None, cache_prefix=None):
+            assert cache_prefix and "PROMPT SYSTÈME" in cache_prefix
+            assert "p1" in prompt and "PROMPT SYSTÈME" not in prompt
+            for chunk in _chunks(response, 10):
+                yield chunk
+
+    class MockProvider:
+        def generate(self, prompt, max_tokens=None):
+            assert prompt.startswith("PROMPT SYSTÈME")
+            return response
+
+    products_data = [{'Handle': 'p1', 'Title': 'Produit 1'}, {'Handle': 'p2', 'Title': 'Produit 2'}]
+
+    for provider in (MockStreamingProvider(), MockProvider()):
+        agent = SEOAgent(provider, "PROMPT SYSTÈME", "Génère le SEO")
+        handles = [p['handle'] for p in agent.generate_batch_stream(products_data)]
+        print(f"  ✓ {provider.__class__.__name__}: {handles}")
+        assert handles == ["p1", "p2"]
+
+
+def test_retry_issues_prompt():
+    """Les problèmes du résultat précédent sont rappelés pour le produit redemandé uniquement."""
+
+    agent = SEOAgent(None, "PROMPT SYSTÈME", "Génère le SEO")
+    products_data = [{'Handle': 'p1', 'Title': 'Produit 1'}, {'Handle': 'p2', 'Title': 'Produit 2'}]
+    prefix, prompt = agent._build_batch_prompt_parts(
+        products_data, retry_issues={'p2': ['Champs manquants: seo_title']}
+    )
+
+    assert "CORRECTION REQUISE" not in prefix
+    assert prompt.count("CORRECTION REQUISE") == 1
+    assert prompt.index("CORRECTION REQUISE") > prompt.index("Handle: p2")
+    assert "Champs manquants: seo_title" in prompt
+    print("  ✓ Problèmes rappelés dans la partie variable du prompt pour p2")
+
+
+def test_retry_selected_fields_only():
+    """Seuls les problèmes des champs sélectionnés provoquent une relance."""
+
+    tmp_dir = tempfile.mkdtemp()
+    db = AIPromptsDB(os.path.join(tmp_dir, 'test.db'))
+    db.save_config('missing_handles_max_rounds', 2)
+
+    csv_path = os.path.join(tmp_dir, 'produits.csv')
+    # Body (HTML) vide et champs non sélectionnés absents : le contrôle qualité les signale
+    pd.DataFrame([
+        {'Handle': h, 'Title': f'Nappe {h}', 'Body (HTML)': '', 'Tags': ''} for h in ('p1', 'p2')
+    ]).to_csv(csv_path, index=False)
+    processor = CSVAIProcessor(db)
+    csv_import_id = processor.csv_storage.import_csv(csv_path)
+
+    class MockProvider:
+        def __init__(self):
+            self.prompts = []
+
+        def generate(self, prompt, max_tokens=None, **kwargs):
+            self.prompts.append(prompt)
+            # p2 reçoit un titre trop court au 1er appel (champ sélectionné)
+            title = "Court" if len(self.prompts) == 1 else "Nappe en lin lavé p2"
+            products = [
+                {"handle": "p1", "seo_title": "Nappe en lin lavé p1", "tags": "nappe, lin, table"},
+                {"handle": "p2", "seo_title": title, "tags": "nappe, lin, table"}
+            ]
+            return json.dumps({"products": [p for p in products if f"Handle: {p['handle']}" in prompt]})
+
+    provider = MockProvider()
+    agents = {'seo': SEOAgent(provider, "PROMPT SYSTÈME", "Génère le SEO")}
+    fields = {'seo': {'enabled': True, 'fields': ['seo_title', 'tags']}}
+    changes = processor.process_batch(csv_import_id, ['p1', 'p2'], agents, fields)
+
+    print(f"  ✓ Appels IA: {len(provider.prompts)}, produits: {sorted(changes)}")
+    assert len(provider.prompts) == 2
+    assert "Handle: p1" not in provider.prompts[1] and "Handle: p2" in provider.prompts[1]
+    assert changes['p2']['SEO Title']['new'] == "Nappe en lin lavé p2"
+
+
+if __name__ == "__main__":
+    test_incremental_parser()
+    test_generate_batch_stream()
+    test_retry_issues_prompt()
+    test_retry_selected_fields_only()
+    print("\n✅ TESTS TERMINÉS")
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Script de test pour la sortie JSON contrainte (schéma de réponse) des providers et des agents.
+"""
+
+import json
+from types import SimpleNamespace
+
+from apps.ai_editor.agents import SEOAgent
+from apps.ai_editor.response_schemas import SEO_BATCH_RESPONSE_SCHEMA, SEO_FIELDS
+from utils.ai_providers import OpenAIProvider, ClaudeProvider, STRUCTURED_OUTPUT_TOOL
+
+
+def _seo_product(handle):
+    return {"handle": handle, **{field: f"{field} {handle}" for field in SEO_FIELDS}}
+
+
+def test_agent_requests_schema():
+    """L'agent SEO transmet son schéma et parse la réponse sans nettoyage regex."""
+
+    print("=" * 70)
+    print("TEST SORTIE STRUCTURÉE - AGENT")
+    print("=" * 70)
+
+    class SchemaProvider:
+        supports_response_schema = True
+        supports_prompt_cache = True
+
+        def __init__(self):
+            self.schemas = []
+
+        def generate(self, prompt, cache_prefix=None, max_tokens=None, response_schema=None):
+            self.schemas.append(response_schema)
+            return json.dumps({"products": [_seo_product("nappe"), _seo_product("torchon")]})
+
+    provider = SchemaProvider()
+    agent = SEOAgent(provider, "SYSTÈME", "SEO")
+    agent._clean_json_response = lambda response: (_ for _ in ()).throw(AssertionError("nettoyage regex appelé"))
+
+    products = agent.generate_batch([{'Handle': 'nappe', 'Title': 'Nappe'}, {'Handle': 'torchon', 'Title': 'Torchon'}])
+    print(f"  ✓ {len(products)} produits parsés directement")
+    assert provider.schemas == [SEO_BATCH_RESPONSE_SCHEMA]
+    assert [p['handle'] for p in products] == ['nappe', 'torchon']
+
+
+def test_provider_params():
+    """OpenAI reçoit un schéma strict (mode JSON pour les anciens modèles), Claude un tool forcé."""
+
+    print("=" * 70)
+    print("TEST SORTIE STRUCTURÉE - PROVIDERS")
+    print("=" * 70)
+
+    openai = OpenAIProvider(api_key='sk-test', model='gpt-4o-mini')
+    params = openai._build_chat_params("prompt", response_schema=SEO_BATCH_RESPONSE_SCHEMA)
+    schema = params["response_format"]["json_schema"]["schema"]
+    assert params["response_format"]["type"] == "json_schema"
+    assert schema["additionalProperties"] is False
+    assert schema["properties"]["products"]["items"]["additionalProperties"] is False
+    assert "additionalProperties" not in SEO_BATCH_RESPONSE_SCHEMA
+    openai.model = 'gpt-3.5-turbo'
+    assert openai._build_chat_params("prompt", response_schema=SEO_BATCH_RESPONSE_SCHEMA)["response_format"] == {"type": "json_object"}
+    assert "response_format" not in openai._build_chat_params("prompt")
+    print("  ✓ OpenAI: json_schema strict / json_object")
+
+    expected = {"products": [_seo_product("nappe")]}
+    calls = []
+
+    def create(**params):
+        calls.append(params)
+        block = SimpleNamespace(type="tool_use", name=STRUCTURED_OUTPUT_TOOL, id="tool_1", input=expected)
+        return SimpleNamespace(content=[block], stop_reason="tool_use", usage=None)
+
+    claude = ClaudeProvider(api_key='sk-ant-test', model='claude-haiku-4-5-20251001')
+    claude.anthropic_client = SimpleNamespace(messages=SimpleNamespace(create=create))
+    response = claude.generate("prompt", response_schema=SEO_BATCH_RESPONSE_SCHEMA)
+    assert json.loads(response) == expected
+    assert calls[0]["tool_choice"] == {"type": "tool", "name": STRUCTURED_OUTPUT_TOOL}
+    assert calls[0]["tools"][0]["input_schema"] == SEO_BATCH_RESPONSE_SCHEMA
+    print("  ✓ Claude: réponse lue dans les arguments du tool forcé")
+
+
+if __name__ == "__main__":
+    test_agent_requests_schema()
+    test_provider_params()
+    print("\n✅ TESTS TERMINÉS")
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Script de test pour la sélection hiérarchique des catégories de la taxonomie.
+"""
+
+import os
+import tempfile
+
+from apps.ai_editor.db import AIPromptsDB
+from apps.ai_editor.taxonomy_tree import TaxonomyTree, normalize_token
+
+
+TAXONOMY = [
+    ('536', 'Maison et jardin'),
+    ('4171', 'Maison et jardin > Linge'),
+    ('4143', 'Maison et jardin > Linge > Linge de table'),
+    ('4203', 'Maison et jardin > Linge > Linge de table > Nappes'),
+    ('4343', 'Maison et jardin > Linge > Linge de table > Chemins de table'),
+    ('569', 'Maison et jardin > Linge > Literie'),
+    ('1985', 'Maison et jardin > Linge > Literie > Couvertures'),
+    ('4077', 'Maison et jardin > Linge > Serviettes > Torchons'),
+    ('638', 'Maison et jardin > Arts de la table et arts culinaires'),
+    ('672', 'Maison et jardin > Arts de la table et arts culinaires > Arts de la table'),
+    ('3406', 'Maison et jardin > Arts de la table et arts culinaires > Arts de la table > Pinces et poids de nappes'),
+    ('2169', 'Maison et jardin > Arts de la table et arts culinaires > Arts de la table > Mugs'),
+    ('412', 'Alimentation, boissons et tabac'),
+    ('413', 'Alimentation, boissons et tabac > Boissons'),
+    ('2073', 'Alimentation, boissons et tabac > Boissons > Thé et infusions'),
+    ('111', 'Entreprise et industrie'),
+    ('5830', 'Entreprise et industrie > Restauration'),
+    ('5831', 'Entreprise et industrie > Restauration > Nappes jetables'),
+]
+
+
+def test_tree_selection():
+    """Branches choisies par mots-clés, candidates limitées à ces branches."""
+
+    print("=" * 70)
+    print("TEST SÉLECTION HIÉRARCHIQUE")
+    print("=" * 70)
+
+    tree = TaxonomyTree(TAXONOMY)
+    assert normalize_token("Nappes") == "nappe" and normalize_token("Thé") == "the"
+    assert 'Entreprise et industrie > Restauration' not in tree.branches
+
+    branches = tree.select_branches(['nappe', 'linge', 'table'])
+    print(f"  Branches (nappe): {branches}")
+    assert branches[0] == 'Maison et jardin > Linge'
+
+    candidates = [path for _, path in tree.candidates(['nappe', 'linge'], max_results=3)]
+    print(f"  Candidates: {candidates}")
+    assert candidates[0] == 'Maison et jardin > Linge > Linge de table > Nappes'
+    assert len(candidates) == 3 and all(path.count('>') >= 2 for path in candidates)
+
+    thé = [path for _, path in tree.candidates(['Thé', 'infusion'])]
+    assert thé == ['Alimentation, boissons et tabac > Boissons > Thé et infusions']
+    assert tree.candidates(['ordinateur']) == []
+
+
+def test_db_candidates():
+    """get_candidate_categories : mode hiérarchique par défaut, recherche à plat en repli."""
+
+    print("=" * 70)
+    print("TEST CANDIDATES EN BASE")
+    print("=" * 70)
+
+    tmp_dir = tempfile.mkdtemp()
+    taxonomy_path = os.path.join(tmp_dir, 'taxonomy.txt')
+    with open(taxonomy_path, 'w', encoding='utf-8') as f:
+        f.write("# Google_Product_Taxonomy_Version: test\n")
+        f.writelines(f"{code} - {path}\n" for code, path in TAXONOMY)
+
+    db = AIPromptsDB(os.path.join(tmp_dir, 'test.db'))
+    db.import_google_taxonomy(taxonomy_path)
+    product = {'Title': 'Nappe en lin lavé', 'Type': 'Linge de table'}
+
+    hierarchical = db.get_candidate_categories(product, max_results=5)
+    print(f"  Hiérarchique: {[path for _, path in hierarchical]}")
+    assert hierarchical[0][1] == 'Maison et jardin > Linge > Linge de table > Nappes'
+    assert not any(path.startswith('Maison et jardin > Arts') for _, path in hierarchical[:2])
+
+    db.save_config('taxonomy_hierarchical_selection', False)
+    flat = db.get_candidate_categories(product, max_results=5)
+    print(f"  À plat: {[path for _, path in flat]}")
+    assert flat and all(path.count('>') >= 2 for _, path in flat)
+
+
+if __name__ == "__main__":
+    test_tree_selection()
+    test_db_candidates()
+    print("\n✅ TESTS TERMINÉS")
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Script de test pour l'unité de travail (écritures d'un batch en une transaction).
+"""
+
+import os
+import tempfile
+
+import pandas as pd
+
+from apps.ai_editor.db import AIPromptsDB
+from apps.ai_editor.csv_storage import CSVStorage
+
+
+def test_unit_of_work():
+    """Écritures différées, visibles pendant le batch, écrites en une fois à la sortie."""
+
+    print("=" * 70)
+    print("TEST UNITÉ DE TRAVAIL")
+    print("=" * 70)
+
+    tmp_dir = tempfile.mkdtemp()
+    db = AIPromptsDB(os.path.join(tmp_dir, 'test.db'))
+    csv_path = os.path.join(tmp_dir, 'produits.csv')
+    pd.DataFrame([
+        {'Handle': 'nappe', 'Title': 'Nappe', 'Type': 'Linge', 'Vendor': 'Garnier', 'Tags': ''},
+        {'Handle': 'torchon', 'Title': 'Torchon', 'Type': 'Linge', 'Vendor': 'Garnier', 'Tags': ''}
+    ]).to_csv(csv_path, index=False)
+
+    storage = CSVStorage(db)
+    import_id = storage.import_csv(csv_path)
+    row = storage.get_csv_rows(import_id, ['nappe'])[0]
+    product = row['data']
+
+    # Une autre connexion ne voit rien avant la fin du batch
+    other = AIPromptsDB(db.db_path)
+    other_storage = CSVStorage(other)
+
+    with db.unit_of_work() as uow:
+        storage.update_csv_row(row['id'], {'Title': 'Nappe en lin'})
+        storage.update_csv_row(row['id'], {'Tags': 'linge, table'})
+        storage.update_csv_row_status(row['id'], 'completed')
+        db.set_cache_csv_type(product, 'NAPPES')
+
+        # Lectures pendant le batch : écritures en attente visibles
+        pending = storage.get_csv_rows(import_id, ['nappe'])[0]
+        assert pending['data']['Title'] == 'Nappe en lin' and pending['data']['Tags'] == 'linge, table'
+        assert pending['status'] == 'completed'
+        key = db._generate_product_key(product)
+        assert db.get_cached_types([key])[key]['csv_type'] == 'NAPPES'
+        assert len(uow.row_fields) == 1
+        print(f"  ✓ {uow.pending_count} écriture(s) en attente, visibles dans le batch")
+
+        committed = other_storage.get_csv_rows(import_id, ['nappe'])[0]
+        assert committed['data']['Title'] == 'Nappe'
+        print("  ✓ Rien d'écrit en base avant la fin du batch")
+
+    committed = other_storage.get_csv_rows(import_id, ['nappe'])[0]
+    assert committed['data']['Title'] == 'Nappe en lin' and committed['data']['Tags'] == 'linge, table'
+    assert committed['status'] == 'completed'
+    assert other.get_cached_types([key])[key]['csv_type'] == 'NAPPES'
+    print("  ✓ Écritures fusionnées et commitées en une transaction")
+
+    # Écriture intermédiaire (après chaque produit) : visible avant la fin du batch
+    torchon = storage.get_csv_rows(import_id, ['torchon'])[0]
+    with db.unit_of_work():
+        storage.update_csv_row(torchon['id'], {'Title': 'Torchon en lin'})
+        assert db.flush_unit_of_work() == 1
+        assert other_storage.get_csv_rows(import_id, ['torchon'])[0]['data']['Title'] == 'Torchon en lin'
+    print("  ✓ Écritures d'un produit commitées sans attendre la fin du batch")
+
+    # Exception dans le bloc : l'erreur d'origine est relancée, même si l'écriture échoue
+    try:
+        with db.unit_of_work() as uow:
+            uow.add_statement('UPDATE table_inexistante SET x = 1')
+            raise ValueError("erreur du batch")
+    except ValueError as e:
+        assert str(e) == "erreur du batch"
+    else:
+        raise AssertionError("exception d'origine non relancée")
+    assert db.uow is None
+    print("  ✓ Exception d'origine conservée malgré l'échec de l'écriture")
+
+    other.close()
+    db.close()
+
+
+if __name__ == "__main__":
+    test_unit_of_work()
+    print("\n✅ TESTS TERMINÉS")
@@ -5,13 +5,37 @@ Gestion des différents fournisseurs d'API IA (OpenAI, Claude, Gemini).
 import os
 import json
 import time
+import hashlib
 import logging
+import threading
 from abc import ABC, abstractmethod
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple, Iterator, Callable
 from pathlib import Path
 
+from utils import llm_telemetry
+from utils.llm_telemetry import tracked_call
+from utils.llm_transport import transport_call
+
 logger = logging.getLogger(__name__)
 
+# Instruction système commune à tous les providers
+DEFAULT_SYSTEM_INSTRUCTION = "Tu es un expert en e-commerce et SEO. Tu génères du contenu optimisé pour les produits en ligne."
+
+
+# Taille par défaut du pool de connexions HTTP d'un client (requêtes simultanées)
+DEFAULT_HTTP_POOL_SIZE = 4
+
+# Durée de vie d'une connexion keep-alive inutilisée (secondes)
+HTTP_KEEPALIVE_EXPIRY = 120.0
+
+# Nom du tool utilisé par Claude pour retourner une réponse conforme au schéma JSON
+STRUCTURED_OUTPUT_TOOL = "reponse_json"
+
+# Providers partagés pour toute la durée de l'application :
+# (provider, empreinte de la clé, modèle, options de recherche) -> instance
+_provider_registry: Dict[Tuple, 'AIProvider'] = {}
+_registry_lock = threading.Lock()
+
 
 class AIProviderError(Exception):
     """Exception pour les erreurs des fournisseurs IA."""
@@ -29,6 +53,12 @@ class AIQuotaError(AIProviderError):
 class AIProvider(ABC):
     """Classe abstraite pour les fournisseurs d'API IA."""
     
+    # Les providers acceptent un paramètre cache_prefix dans generate()
+    supports_prompt_cache = True
+    
+    # Les providers acceptent un paramètre response_schema dans generate() (sortie JSON contrainte)
+    supports_response_schema = True
+    
     def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None):
         self.api_key = api_key
         # Charger la config AVANT d'appeler get_default_model() qui en a besoin
@@ -64,7 +94,25 @@ class AIProvider(ABC):
         error_lower = error_message.lower()
         return any(keyword in error_lower for keyword in quota_keywords)
     
-    def _load_config(self) -> Dict[str, Any]:
+    def _http_limits(self):
+        """
+        Limites du pool HTTP du client SDK, dimensionnées sur la concurrence configurée
+        (processing.max_concurrent_requests dans ai_config.json).
+        
+        Returns:
+            Instance de httpx.Limits
+        """
+        import httpx
+        
+        pool_size = get_max_concurrent_requests(getattr(self, 'config', None) or self._load_config())
+        return httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+        )
+    
+    @staticmethod
+    def _load_config() -> Dict[str, Any]:
         """Charge la configuration depuis ai_config.json."""
         config_path = Path(__file__).parent.parent / "ai_config.json"
         try:
@@ -80,10 +128,101 @@ class AIProvider(ABC):
         pass
     
     @abstractmethod
-    def generate(self, prompt: str, context: Optional[Dict[str, Any]] = None, max_tokens: Optional[int] = None) -> str:
-        """Génère du texte à partir d'un prompt."""
+    def generate(self, prompt: str, context: Optional[Dict[str, Any]] = None, max_tokens: Optional[int] = None,
+                 cache_prefix: Optional[str] = None, response_schema: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Génère du texte à partir d'un prompt.
+        
+        Args:
+            prompt: Partie variable du prompt (données produit), envoyée en dernier
+            context: Contexte produit optionnel
+            max_tokens: Nombre maximum de tokens en sortie
+            cache_prefix: Partie fixe du prompt (prompt système, instructions de l'agent),
+                envoyée en tête et marquée comme cacheable quand le provider le permet
+            response_schema: Schéma JSON imposé à la réponse (sortie structurée du provider)
+        """
         pass
     
+    def generate_stream(self, prompt: str, context: Optional[Dict[str, Any]] = None, max_tokens: Optional[int] = None,
+                        cache_prefix: Optional[str] = None,
+                        response_schema: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        """
+        Génère du texte en streaming, fragment par fragment.
+        
+        Implémentation par défaut : un seul fragment contenant la réponse complète.
+        Les providers qui savent streamer surchargent cette méthode.
+        
+        Args:
+            prompt: Partie variable du prompt
+            context: Contexte produit optionnel
+            max_tokens: Nombre maximum de tokens en sortie
+            cache_prefix: Partie fixe du prompt (voir generate())
+            response_schema: Schéma JSON imposé à la réponse (voir generate())
+            
+        Yields:
+            Fragments de texte dans l'ordre de génération
+        """
+        yield self.generate(prompt, context=context, max_tokens=max_tokens, cache_prefix=cache_prefix,
+                            response_schema=response_schema)
+    
+    def _stream_with_retry(self, open_stream: Callable[[], Iterator[str]], provider_label: str) -> Iterator[str]:
+        """
+        Exécute un stream avec la politique de retry de ai_config.json.
+        
+        Une nouvelle tentative n'est faite que si aucun fragment n'a encore été transmis :
+        au-delà, l'appelant a déjà consommé une partie de la réponse.
+        
+        Args:
+            open_stream: Fonction ouvrant le stream et retournant un itérateur de fragments
+            provider_label: Nom du provider pour les messages d'erreur
+            
+        Yields:
+            Fragments de texte
+        """
+        processing_config = self.config.get("processing", {})
+        max_retries = processing_config.get("max_retries", 3)
+        retry_delay = processing_config.get("retry_delay", 2.0)
+        
+        for attempt in range(max_retries):
+            started = False
+            try:
+                for chunk in open_stream():
+                    if chunk:
+                        started = True
+                        yield chunk
+                return
+            
+            except AIQuotaError:
+                raise
+            
+            except Exception as e:
+                error_msg = str(e)
+                
+                if self._is_quota_error(error_msg):
+                    raise self._quota_error(error_msg)
+                
+                if started:
+                    raise AIProviderError(f"Stream {provider_label} interrompu: {e}")
+                
+                if attempt < max_retries - 1:
+                    logger.warning(f"Tentative {attempt + 1} échouée pour {provider_label} (streaming): {e}. Nouvelle tentative dans {retry_delay}s...")
+                    llm_telemetry.note_retry()
+                    time.sleep(retry_delay)
+                else:
+                    raise AIProviderError(f"Erreur {provider_label} après {max_retries} tentatives: {e}")
+    
+    def _quota_error(self, error_msg: str) -> AIQuotaError:
+        """Construit l'erreur de quota du provider (surchargée par chaque provider)."""
+        return AIQuotaError(self.__class__.__name__, f"❌ Quota dépassé ou tokens insuffisants.\n\n• Erreur : {error_msg}", error_msg)
+    
+    def _is_prompt_cache_enabled(self) -> bool:
+        """Indique si le cache de prompt est activé (section prompt_cache de ai_config.json)."""
+        return bool(self.config.get("prompt_cache", {}).get("enabled", True))
+    
+    def _is_structured_output_enabled(self) -> bool:
+        """Indique si la sortie JSON contrainte est activée (section structured_output de ai_config.json)."""
+        return bool(self.config.get("structured_output", {}).get("enabled", True))
+    
     @abstractmethod
     def list_models(self) -> list[str]:
         """Liste les modèles disponibles pour ce fournisseur."""
@@ -114,11 +253,14 @@ class AIProvider(ABC):
 class OpenAIProvider(AIProvider):
     """Fournisseur OpenAI (GPT-4, GPT-3.5)."""
     
+    # Nom du provider dans la télémétrie (table llm_calls)
+    telemetry_name = "openai"
+    
     def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None, 
                  enable_search: bool = False, perplexity_api_key: Optional[str] = None,
                  perplexity_model: Optional[str] = None):
         try:
-            from openai import OpenAI
+            from openai import OpenAI, DefaultHttpxClient
             self.OpenAI = OpenAI
         except ImportError:
             raise AIProviderError("La bibliothèque 'openai' n'est pas installée. Installez-la avec: pip install openai")
@@ -129,7 +271,8 @@ class OpenAIProvider(AIProvider):
         if not api_key:
             raise AIProviderError("OPENAI_API_KEY n'est pas définie. Définissez-la dans le fichier .env ou passez-la en paramètre.")
         
-        self.client = self.OpenAI(api_key=api_key)
+        # Client unique par provider : connexions keep-alive réutilisées d'un appel à l'autre
+        self.client = self.OpenAI(api_key=api_key, http_client=DefaultHttpxClient(limits=self._http_limits()))
         
         # Support du tool de recherche Internet (Perplexity)
         self.enable_search = enable_search
@@ -153,6 +296,19 @@ class OpenAIProvider(AIProvider):
         
         super().__init__(api_key, model)
     
+    def _quota_error(self, error_msg: str) -> AIQuotaError:
+        """Construit l'erreur de quota OpenAI avec les solutions à proposer."""
+        return AIQuotaError(
+            "OpenAI",
+            "❌ Quota OpenAI dépassé ou tokens insuffisants.\n\n"
+            "Solutions :\n"
+            "• Vérifiez votre compte OpenAI : https://platform.openai.com/account/usage\n"
+            "• Rechargez des crédits si nécessaire\n"
+            "• Vérifiez les limites de votre plan\n"
+            f"• Erreur : {error_msg}",
+            error_msg
+        )
+    
     def get_default_model(self) -> str:
         """Retourne le modèle par défaut pour OpenAI."""
         models = self.config.get("ai_providers", {}).get("models", {}).get("openai", {})
@@ -305,41 +461,83 @@ class OpenAIProvider(AIProvider):
             # Retourner les modèles par défaut (GPT-5 uniquement)
             return ["gpt-5", "gpt-5-mini", "gpt-5-nano", "gpt-5-pro"]
     
-    def generate(self, prompt: str, context: Optional[Dict[str, Any]] = None, max_tokens: Optional[int] = None) -> str:
-        """Génère du texte avec OpenAI, avec support optionnel de la recherche Internet."""
+    def _build_chat_params(self, prompt: str, context: Optional[Dict[str, Any]] = None, max_tokens: Optional[int] = None,
+                           cache_prefix: Optional[str] = None,
+                           response_schema: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Construit les paramètres de base d'un appel chat.completions.
+        
+        Le cache de prompt OpenAI est automatique sur les préfixes identiques : la partie
+        fixe (cache_prefix) est placée dans le message système, avant les données produit.
+        Avec response_schema, la sortie est contrainte au schéma (structured outputs) ou,
+        pour les anciens modèles, au mode JSON.
+        
+        Returns:
+            Paramètres (model, messages, température et limite de tokens selon le modèle)
+        """
         full_prompt = self._build_prompt(prompt, context)
         
+        system_content = DEFAULT_SYSTEM_INSTRUCTION
+        if cache_prefix:
+            system_content = f"{DEFAULT_SYSTEM_INSTRUCTION}\n\n{cache_prefix}"
+        
+        params = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_content},
+                {"role": "user", "content": full_prompt}
+            ]
+        }
+        
+        # Ajouter la température si le modèle la supporte
+        if self._supports_custom_temperature(self.model):
+            params["temperature"] = 0.7
+        
+        # Ajouter le paramètre de tokens selon le modèle
+        if self._is_new_model(self.model):
+            params["max_completion_tokens"] = max_tokens or 3000
+        else:
+            params["max_tokens"] = max_tokens or 3000
+        
+        if response_schema and self._is_structured_output_enabled():
+            if self._supports_json_schema(self.model):
+                params["response_format"] = {
+                    "type": "json_schema",
+                    "json_schema": {"name": "reponse", "schema": _strict_json_schema(response_schema), "strict": True}
+                }
+            else:
+                params["response_format"] = {"type": "json_object"}
+        
+        return params
+    
+    def _supports_json_schema(self, model_name: str) -> bool:
+        """
+        Détermine si un modèle accepte response_format de type json_schema (structured outputs).
+        
+        Args:
+            model_name: Nom du modèle OpenAI
+            
+        Returns:
+            True pour gpt-4o, gpt-4.1, la série O et GPT-5+, False pour les anciens modèles (mode JSON)
+        """
+        return 'gpt-4.1' in model_name.lower() or self._is_new_model(model_name)
+    
+    @tracked_call
+    @transport_call
+    def generate(self, prompt: str, context: Optional[Dict[str, Any]] = None, max_tokens: Optional[int] = None,
+                 cache_prefix: Optional[str] = None, response_schema: Optional[Dict[str, Any]] = None) -> str:
+        """Génère du texte avec OpenAI, avec support optionnel de la recherche Internet."""
         processing_config = self.config.get("processing", {})
         max_retries = processing_config.get("max_retries", 3)
         retry_delay = processing_config.get("retry_delay", 2.0)
         
-        # Déterminer le bon paramètre pour les tokens selon le modèle
-        use_completion_tokens = self._is_new_model(self.model)
-        logger.info(f"Modèle OpenAI: {self.model}, use_completion_tokens={use_completion_tokens}")
+        logger.info(f"Modèle OpenAI: {self.model}, use_completion_tokens={self._is_new_model(self.model)}")
         
         for attempt in range(max_retries):
             try:
-                # Préparer les messages de base
-                messages = [
-                    {"role": "system", "content": "Tu es un expert en e-commerce et SEO. Tu génères du contenu optimisé pour les produits en ligne."},
-                    {"role": "user", "content": full_prompt}
-                ]
-                
                 # Préparer les paramètres de base
-                params = {
-                    "model": self.model,
-                    "messages": messages
-                }
-                
-                # Ajouter la température si le modèle la supporte
-                if self._supports_custom_temperature(self.model):
-                    params["temperature"] = 0.7
-                
-                # Ajouter le paramètre de tokens selon le modèle
-                if use_completion_tokens:
-                    params["max_completion_tokens"] = max_tokens or 3000
-                else:
-                    params["max_tokens"] = max_tokens or 3000
+                params = self._build_chat_params(prompt, context, max_tokens, cache_prefix, response_schema)
+                messages = params["messages"]
                 
                 # Ajouter les tools si la recherche est activée
                 if self.enable_search and self.search_tool:
@@ -351,6 +549,7 @@ class OpenAIProvider(AIProvider):
                 
                 # Premier appel à l'IA
                 response = self.client.chat.completions.create(**params)
+                self._log_cache_usage(response)
                 message = response.choices[0].message
                 
                 # Vérifier si l'IA veut utiliser un tool (faire une recherche)
@@ -374,16 +573,18 @@ class OpenAIProvider(AIProvider):
                         ]
                     })
                     
-                    # Traiter chaque tool_call et ajouter les réponses
-                    for tool_call in message.tool_calls:
+                    queries = []
+                    for index, tool_call in enumerate(message.tool_calls, 1):
                         function_args = json.loads(tool_call.function.arguments)
-                        query = function_args.get("query", "")
-                        
-                        logger.info(f"🔎 Requête de recherche #{message.tool_calls.index(tool_call) + 1}: '{query}'")
-                        
-                        # Exécuter la recherche via Perplexity
-                        logger.info("⏳ Interrogation de Perplexity en cours...")
-                        search_results = self.search_tool.search(query)
+                        queries.append(function_args.get("query", ""))
+                        logger.info(f"🔎 Requête de recherche #{index}: '{queries[-1]}'")
+                    
+                    # Exécuter les recherches via Perplexity (en parallèle, avec cache)
+                    logger.info("⏳ Interrogation de Perplexity en cours...")
+                    all_results = self.search_tool.search_many(queries)
+                    
+                    # Ajouter les réponses du tool, dans l'ordre des tool_calls
+                    for tool_call, search_results in zip(message.tool_calls, all_results):
                         logger.info(f"✅ Résultats de recherche reçus ({len(search_results)} caractères)")
                         logger.debug(f"Résultats Perplexity: {search_results[:500]}...")
                         
@@ -403,6 +604,7 @@ class OpenAIProvider(AIProvider):
                         del params["tool_choice"]
                     
                     final_response = self.client.chat.completions.create(**params)
+                    self._log_cache_usage(final_response)
                     logger.info("✅ Réponse finale générée avec les résultats de recherche")
                     return final_response.choices[0].message.content.strip()
                 
@@ -421,27 +623,61 @@ class OpenAIProvider(AIProvider):
                 
                 # Détecter les erreurs de quota/tokens OpenAI
                 if self._is_quota_error(error_msg):
-                    raise AIQuotaError(
-                        "OpenAI",
-                        "❌ Quota OpenAI dépassé ou tokens insuffisants.\n\n"
-                        "Solutions :\n"
-                        "• Vérifiez votre compte OpenAI : https://platform.openai.com/account/usage\n"
-                        "• Rechargez des crédits si nécessaire\n"
-                        "• Vérifiez les limites de votre plan\n"
-                        f"• Erreur : {error_msg}",
-                        error_msg
-                    )
+                    raise self._quota_error(error_msg)
                 
                 if attempt < max_retries - 1:
                     logger.warning(f"Tentative {attempt + 1} échouée pour OpenAI: {e}. Nouvelle tentative dans {retry_delay}s...")
+                    llm_telemetry.note_retry()
                     time.sleep(retry_delay)
                 else:
                     raise AIProviderError(f"Erreur OpenAI après {max_retries} tentatives: {e}")
+    
+    @tracked_call
+    @transport_call
+    def generate_stream(self, prompt: str, context: Optional[Dict[str, Any]] = None, max_tokens: Optional[int] = None,
+                        cache_prefix: Optional[str] = None,
+                        response_schema: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        """
+        Génère du texte avec OpenAI en streaming.
+        
+        Avec la recherche Internet activée, la réponse dépend d'appels de tools :
+        on revient alors à generate() et la réponse arrive en un seul fragment.
+        """
+        if self.enable_search and self.search_tool:
+            yield from super().generate_stream(prompt, context, max_tokens, cache_prefix, response_schema)
+            return
+        
+        def open_stream() -> Iterator[str]:
+            params = self._build_chat_params(prompt, context, max_tokens, cache_prefix, response_schema)
+            params["stream"] = True
+            # Le dernier fragment porte l'usage (tokens) de la requête
+            params["stream_options"] = {"include_usage": True}
+            for chunk in self.client.chat.completions.create(**params):
+                if getattr(chunk, 'usage', None):
+                    self._log_cache_usage(chunk)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        
+        yield from self._stream_with_retry(open_stream, "OpenAI")
+    
+    @staticmethod
+    def _log_cache_usage(response) -> None:
+        """Journalise le nombre de tokens d'entrée servis par le cache de prompt OpenAI et le transmet à la télémétrie."""
+        try:
+            usage = response.usage
+            cached = getattr(usage.prompt_tokens_details, 'cached_tokens', 0) or 0
+            logger.debug(f"💾 Cache prompt OpenAI: {cached}/{usage.prompt_tokens} tokens d'entrée en cache")
+            llm_telemetry.note_usage(usage.prompt_tokens, usage.completion_tokens, cached)
+        except Exception:
+            pass
 
 
 class ClaudeProvider(AIProvider):
     """Fournisseur Anthropic (Claude)."""
     
+    # Nom du provider dans la télémétrie (table llm_calls)
+    telemetry_name = "claude"
+    
     def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None,
                  enable_search: bool = False, perplexity_api_key: Optional[str] = None,
                  perplexity_model: Optional[str] = None):
@@ -459,6 +695,12 @@ class ClaudeProvider(AIProvider):
         
         self.client.api_key = api_key
         
+        # Client unique par provider : connexions keep-alive réutilisées d'un appel à l'autre
+        self.anthropic_client = anthropic.Anthropic(
+            api_key=api_key,
+            http_client=anthropic.DefaultHttpxClient(limits=self._http_limits())
+        )
+        
         # Support du tool de recherche Internet (Perplexity)
         self.enable_search = enable_search
         self.search_tool = None
@@ -481,6 +723,19 @@ class ClaudeProvider(AIProvider):
         
         super().__init__(api_key, model)
     
+    def _quota_error(self, error_msg: str) -> AIQuotaError:
+        """Construit l'erreur de quota Claude avec les solutions à proposer."""
+        return AIQuotaError(
+            "Claude",
+            "❌ Quota Claude (Anthropic) dépassé ou tokens insuffisants.\n\n"
+            "Solutions :\n"
+            "• Vérifiez votre compte Anthropic : https://console.anthropic.com/settings/usage\n"
+            "• Rechargez des crédits si nécessaire\n"
+            "• Vérifiez les limites de votre plan\n"
+            f"• Erreur : {error_msg}",
+            error_msg
+        )
+    
     def get_default_model(self) -> str:
         """Retourne le modèle par défaut pour Claude."""
         models = self.config.get("ai_providers", {}).get("models", {}).get("claude", {})
@@ -489,8 +744,7 @@ class ClaudeProvider(AIProvider):
     def list_models(self) -> list[str]:
         """Liste les modèles disponibles pour Claude depuis l'API."""
         try:
-            # Créer un client temporaire pour lister les modèles
-            client = self.client.Anthropic(api_key=self.api_key)
+            client = self.anthropic_client
             
             # Appeler l'API pour lister les modèles
             models_response = client.models.list()
@@ -538,45 +792,107 @@ class ClaudeProvider(AIProvider):
                 "claude-3-opus-20240229"
             ]
     
-    def generate(self, prompt: str, context: Optional[Dict[str, Any]] = None, max_tokens: Optional[int] = None) -> str:
-        """Génère du texte avec Claude."""
+    def _build_message_params(self, prompt: str, context: Optional[Dict[str, Any]] = None, max_tokens: Optional[int] = None,
+                              cache_prefix: Optional[str] = None,
+                              response_schema: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Construit les paramètres de base d'un appel messages.create.
+        
+        Si cache_prefix est fourni, il est envoyé comme bloc système marqué cache_control
+        (cache éphémère Anthropic) et seules les données produit restent dans le message user.
+        Avec response_schema, Claude doit appeler le tool STRUCTURED_OUTPUT_TOOL dont
+        l'input_schema est le schéma : ses arguments forment la réponse JSON.
+        
+        Returns:
+            Paramètres (model, max_tokens, temperature, system, messages)
+        """
         full_prompt = self._build_prompt(prompt, context)
         
+        params = {
+            "model": self.model,
+            "max_tokens": max_tokens or 3000,
+            "temperature": 0.7,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": f"{DEFAULT_SYSTEM_INSTRUCTION}\n\n{full_prompt}"
+                }
+            ]
+        }
+        
+        # Préfixe fixe en bloc système cacheable, données produit en dernier
+        if cache_prefix:
+            system_block = {"type": "text", "text": f"{DEFAULT_SYSTEM_INSTRUCTION}\n\n{cache_prefix}"}
+            if self._is_prompt_cache_enabled():
+                system_block["cache_control"] = {"type": "ephemeral"}
+            params["system"] = [system_block]
+            params["messages"] = [{"role": "user", "content": full_prompt}]
+        
+        if response_schema and self._is_structured_output_enabled():
+            params["tools"] = [{
+                "name": STRUCTURED_OUTPUT_TOOL,
+                "description": "Retourne la réponse finale au format JSON demandé.",
+                "input_schema": response_schema
+            }]
+            params["tool_choice"] = {"type": "tool", "name": STRUCTURED_OUTPUT_TOOL}
+        
+        return params
+    
+    @staticmethod
+    def _message_text(message) -> str:
+        """
+        Extrait la réponse d'un message Claude : arguments du tool de sortie structurée
+        sérialisés en JSON, sinon le premier bloc texte.
+        """
+        for block in message.content:
+            if block.type == "tool_use" and block.name == STRUCTURED_OUTPUT_TOOL:
+                return json.dumps(block.input, ensure_ascii=False)
+        for block in message.content:
+            if block.type == "text":
+                return block.text.strip()
+        return ""
+    
+    @tracked_call
+    @transport_call
+    def generate(self, prompt: str, context: Optional[Dict[str, Any]] = None, max_tokens: Optional[int] = None,
+                 cache_prefix: Optional[str] = None, response_schema: Optional[Dict[str, Any]] = None) -> str:
+        """Génère du texte avec Claude."""
         processing_config = self.config.get("processing", {})
         max_retries = processing_config.get("max_retries", 3)
         retry_delay = processing_config.get("retry_delay", 2.0)
         
         # ÉTAPE 1: Construire les paramètres et faire le premier appel (HORS de la boucle retry)
         try:
-            client = self.client.Anthropic(api_key=self.api_key)
+            client = self.anthropic_client
             
             # Construire les paramètres de base
-            params = {
-                "model": self.model,
-                "max_tokens": max_tokens or 3000,
-                "temperature": 0.7,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": f"Tu es un expert en e-commerce et SEO. Tu génères du contenu optimisé pour les produits en ligne.\n\n{full_prompt}"
-                    }
-                ]
-            }
+            params = self._build_message_params(prompt, context, max_tokens, cache_prefix, response_schema)
+            structured = "tool_choice" in params
             
             # Ajouter les tools si la recherche est activée
             if self.enable_search and self.search_tool:
-                params["tools"] = [self.search_tool.get_tool_definition_claude()]
+                params["tools"] = [self.search_tool.get_tool_definition_claude()] + params.get("tools", [])
+                if structured:
+                    # Claude choisit entre la recherche et la réponse structurée
+                    params["tool_choice"] = {"type": "any"}
                 logger.info("🌐 Recherche Internet ACTIVÉE - Tool Perplexity disponible pour Claude")
             else:
                 logger.info("🔒 Recherche Internet DÉSACTIVÉE - Claude utilisera uniquement les données fournies")
             
             # Premier appel à l'IA
             message = client.messages.create(**params)
+            self._log_cache_usage(message)
+            
+            # Réponse structurée directe (pas de recherche)
+            if structured and any(block.type == "tool_use" and block.name == STRUCTURED_OUTPUT_TOOL
+                                  for block in message.content):
+                return self._message_text(message)
             
             # Vérifier si Claude veut utiliser un tool (faire une recherche)
             if message.stop_reason == "tool_use":
                 # Extraire tous les tool calls
-                tool_use_blocks = [block for block in message.content if block.type == "tool_use"]
+                tool_use_blocks = [block for block in message.content
+                                   if block.type == "tool_use" and block.name != STRUCTURED_OUTPUT_TOOL]
                 logger.info(f"🔍 Claude a décidé de faire une recherche Internet ({len(tool_use_blocks)} appel(s))")
                 
                 if tool_use_blocks:
@@ -586,17 +902,19 @@ class ClaudeProvider(AIProvider):
                     assistant_content = []
                     tool_results = []
                     
-                    for tool_use_block in tool_use_blocks:
+                    queries = [tool_use_block.input.get("query", "") for tool_use_block in tool_use_blocks]
+                    for index, query in enumerate(queries, 1):
+                        logger.info(f"🔎 Requête de recherche #{index}: '{query}'")
+                    
+                    # Exécuter les recherches via Perplexity (en parallèle, avec cache)
+                    logger.info("⏳ Interrogation de Perplexity en cours...")
+                    all_results = self.search_tool.search_many(queries)
+                    
+                    for tool_use_block, query, search_results in zip(tool_use_blocks, queries, all_results):
                         # S'assurer que l'ID est un string pur
                         tool_id = str(tool_use_block.id)
                         logger.debug(f"Tool use block ID: {tool_id} (type: {type(tool_use_block.id)})")
                         
-                        query = tool_use_block.input.get("query", "")
-                        logger.info(f"🔎 Requête de recherche #{tool_use_blocks.index(tool_use_block) + 1}: '{query}'")
-                        
-                        # Exécuter la recherche via Perplexity
-                        logger.info("⏳ Interrogation de Perplexity en cours...")
-                        search_results = self.search_tool.search(query)
                         logger.info(f"✅ Résultats de recherche reçus ({len(search_results)} caractères)")
                         logger.debug(f"Résultats Perplexity: {search_results[:500]}...")
                         
@@ -637,8 +955,10 @@ class ClaudeProvider(AIProvider):
                     logger.debug(f"✅ Messages tool ajoutés ({len(tool_use_blocks)} tool_call(s))")
                     logger.debug(f"Structure: {len(params['messages'])} messages total")
                     
-                    # Retirer les tools pour la réponse finale
-                    if "tools" in params:
+                    # Retirer les tools pour la réponse finale (sauf le tool de sortie structurée)
+                    if structured:
+                        params["tool_choice"] = {"type": "tool", "name": STRUCTURED_OUTPUT_TOOL}
+                    elif "tools" in params:
                         del params["tools"]
             
             # Pas de recherche nécessaire
@@ -646,7 +966,7 @@ class ClaudeProvider(AIProvider):
                 if self.enable_search and self.search_tool:
                     logger.info("ℹ️  Claude n'a pas jugé nécessaire de faire une recherche (données suffisantes)")
                 # Retourner directement la réponse
-                return message.content[0].text.strip()
+                return self._message_text(message)
         
         except Exception as e:
             # Si erreur pendant le premier appel ou la recherche, propager l'erreur
@@ -657,35 +977,80 @@ class ClaudeProvider(AIProvider):
         for attempt in range(max_retries):
             try:
                 final_response = client.messages.create(**params)
+                self._log_cache_usage(final_response)
                 logger.info("✅ Réponse finale générée avec les résultats de recherche")
-                return final_response.content[0].text.strip()
+                return self._message_text(final_response)
             
             except Exception as e:
                 error_msg = str(e)
                 
                 # Détecter les erreurs de quota/tokens
                 if self._is_quota_error(error_msg):
-                    raise AIQuotaError(
-                        "Claude",
-                        "❌ Quota Claude (Anthropic) dépassé ou tokens insuffisants.\n\n"
-                        "Solutions :\n"
-                        "• Vérifiez votre compte Anthropic : https://console.anthropic.com/settings/usage\n"
-                        "• Rechargez des crédits si nécessaire\n"
-                        "• Vérifiez les limites de votre plan\n"
-                        f"• Erreur : {error_msg}",
-                        error_msg
-                    )
+                    raise self._quota_error(error_msg)
                 
                 if attempt < max_retries - 1:
                     logger.warning(f"Tentative {attempt + 1} échouée pour Claude: {e}. Nouvelle tentative dans {retry_delay}s...")
+                    llm_telemetry.note_retry()
                     time.sleep(retry_delay)
                 else:
                     raise AIProviderError(f"Erreur Claude après {max_retries} tentatives: {e}")
+    
+    @tracked_call
+    @transport_call
+    def generate_stream(self, prompt: str, context: Optional[Dict[str, Any]] = None, max_tokens: Optional[int] = None,
+                        cache_prefix: Optional[str] = None,
+                        response_schema: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        """
+        Génère du texte avec Claude en streaming.
+        
+        Avec la recherche Internet activée, on revient à generate() (réponse en un fragment).
+        """
+        if self.enable_search and self.search_tool:
+            yield from super().generate_stream(prompt, context, max_tokens, cache_prefix, response_schema)
+            return
+        
+        def open_stream() -> Iterator[str]:
+            client = self.anthropic_client
+            params = self._build_message_params(prompt, context, max_tokens, cache_prefix, response_schema)
+            with client.messages.stream(**params) as stream:
+                if "tool_choice" not in params:
+                    yield from stream.text_stream
+                else:
+                    # Sortie structurée : les arguments du tool arrivent en fragments JSON
+                    for event in stream:
+                        if event.type == "content_block_delta" and event.delta.type == "input_json_delta":
+                            yield event.delta.partial_json
+                self._log_cache_usage(stream.get_final_message())
+        
+        yield from self._stream_with_retry(open_stream, "Claude")
+    
+    @staticmethod
+    def _log_cache_usage(message) -> None:
+        """Journalise les tokens écrits/lus dans le cache de prompt Anthropic et les transmet à la télémétrie."""
+        try:
+            usage = message.usage
+            created = getattr(usage, 'cache_creation_input_tokens', 0) or 0
+            read = getattr(usage, 'cache_read_input_tokens', 0) or 0
+            logger.debug(f"💾 Cache prompt Claude: {read} tokens lus, {created} tokens écrits, {usage.input_tokens} non cachés")
+            # input_tokens n'inclut pas les tokens lus/écrits dans le cache
+            llm_telemetry.note_usage(usage.input_tokens + read + created, usage.output_tokens, read)
+        except Exception:
+            pass
 
 
 class GeminiProvider(AIProvider):
     """Fournisseur Google Gemini."""
     
+    # Nom du provider dans la télémétrie (table llm_calls)
+    telemetry_name = "gemini"
+    
+    # Contenus mis en cache côté Gemini, partagés entre instances du processus :
+    # clé (hash modèle + préfixe) -> (nom du cached content ou None si échec, expiration)
+    _cached_contents: Dict[str, Tuple[Optional[str], float]] = {}
+    # Créations en cours : clé -> événement signalé quand le résultat est enregistré
+    _cache_in_flight: Dict[str, threading.Event] = {}
+    _cache_lock = threading.Lock()
+    
     def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None):
         try:
             import google.genai as genai
@@ -707,12 +1072,30 @@ class GeminiProvider(AIProvider):
         
         # Créer le client avec la nouvelle API
         try:
-            self.client = self.genai.Client(api_key=api_key)
+            # Client unique par provider : connexions keep-alive réutilisées d'un appel à l'autre
+            from google.genai import types
+            self.client = self.genai.Client(
+                api_key=api_key,
+                http_options=types.HttpOptions(client_args={'limits': self._http_limits()})
+            )
         except Exception as e:
             raise AIProviderError(f"Impossible d'initialiser le client Google Gemini: {e}")
         
         super().__init__(api_key, model)
     
+    def _quota_error(self, error_msg: str) -> AIQuotaError:
+        """Construit l'erreur de quota Gemini avec les solutions à proposer."""
+        return AIQuotaError(
+            "Gemini",
+            "❌ Quota Gemini (Google) dépassé ou tokens insuffisants.\n\n"
+            "Solutions :\n"
+            "• Vérifiez votre compte Google Cloud : https://console.cloud.google.com/\n"
+            "• Rechargez des crédits si nécessaire\n"
+            "• Vérifiez les limites de votre plan\n"
+            f"• Erreur : {error_msg}",
+            error_msg
+        )
+    
     def get_default_model(self) -> str:
         """Retourne le modèle par défaut pour Gemini."""
         models = self.config.get("ai_providers", {}).get("models", {}).get("gemini", {})
@@ -847,33 +1230,145 @@ class GeminiProvider(AIProvider):
             # En cas d'erreur, retourner uniquement le modèle par défaut
             return [self.get_default_model()]
     
-    def generate(self, prompt: str, context: Optional[Dict[str, Any]] = None, max_tokens: Optional[int] = None) -> str:
-        """Génère du texte avec Gemini."""
+    def _get_cached_content(self, model_name: str, cache_prefix: str) -> Optional[str]:
+        """
+        Retourne le nom d'un cached content Gemini contenant le préfixe fixe du prompt,
+        en le créant si nécessaire.
+        
+        Les préfixes trop courts (sous le minimum accepté par l'API) ne sont pas cachés.
+        En cas d'échec de création, l'échec est mémorisé jusqu'à expiration pour ne pas
+        retenter à chaque appel ; le prompt est alors envoyé en entier.
+        
+        Args:
+            model_name: Nom du modèle (avec préfixe "models/")
+            cache_prefix: Partie fixe du prompt
+            
+        Returns:
+            Nom du cached content, ou None pour un envoi inline
+        """
+        cache_config = self.config.get("prompt_cache", {})
+        if not self._is_prompt_cache_enabled():
+            return None
+        if len(cache_prefix) < cache_config.get("gemini_min_prefix_chars", 16000):
+            return None
+        
+        ttl = int(cache_config.get("gemini_ttl_seconds", 3600))
+        key = hashlib.sha256(f"{model_name}\n{cache_prefix}".encode('utf-8')).hexdigest()
+        now = time.time()
+        
+        # La création (appel réseau) se fait hors du verrou : seuls les appels qui attendent
+        # le même préfixe patientent, une seule création est lancée par préfixe
+        while True:
+            with self._cache_lock:
+                entry = self._cached_contents.get(key)
+                # Marge de 60s pour ne pas utiliser un cache sur le point d'expirer
+                if entry and entry[1] - 60 > now:
+                    return entry[0]
+                in_flight = self._cache_in_flight.get(key)
+                if in_flight is None:
+                    in_flight = self._cache_in_flight[key] = threading.Event()
+                    break
+            in_flight.wait()
+            now = time.time()
+        
+        cached_name = None
+        try:
+            from google.genai import types
+            cached = self.client.caches.create(
+                model=model_name,
+                config=types.CreateCachedContentConfig(
+                    system_instruction=DEFAULT_SYSTEM_INSTRUCTION,
+                    contents=[cache_prefix],
+                    ttl=f"{ttl}s",
+                    display_name=f"prompt-prefix-{key[:12]}"
+                )
+            )
+            cached_name = cached.name
+            logger.info(f"💾 Préfixe de prompt mis en cache Gemini ({len(cache_prefix)} caractères, TTL {ttl}s)")
+        except Exception as e:
+            logger.warning(f"⚠️ Cache Gemini indisponible, envoi du prompt complet: {e}")
+        finally:
+            with self._cache_lock:
+                self._cached_contents[key] = (cached_name, now + ttl)
+                del self._cache_in_flight[key]
+            in_flight.set()
+        return cached_name
+    
+    def _forget_cached_content(self, cached_name: str) -> None:
+        """Oublie un cached content (expiré ou supprimé côté Gemini)."""
+        with self._cache_lock:
+            for key, (name, _) in list(self._cached_contents.items()):
+                if name == cached_name:
+                    del self._cached_contents[key]
+    
+    def _build_request(self, prompt: str, context: Optional[Dict[str, Any]] = None, max_tokens: Optional[int] = None,
+                       cache_prefix: Optional[str] = None,
+                       response_schema: Optional[Dict[str, Any]] = None) -> Tuple[str, str, Dict[str, Any], Optional[str]]:
+        """
+        Construit une requête generate_content.
+        
+        Si cache_prefix est fourni, il est servi depuis un cached content Gemini quand c'est
+        possible ; sinon il est envoyé en tête du contenu (ordre stable, compatible avec le
+        cache implicite de Gemini 2.5). Avec response_schema, la réponse est du JSON
+        conforme au schéma (response_mime_type application/json).
+        
+        Returns:
+            Tuple (nom du modèle, contenu, config, nom du cached content utilisé ou None)
+        """
         full_prompt = self._build_prompt(prompt, context)
         
+        # Nouvelle API google-genai
+        # Ajouter le préfixe "models/" si nécessaire (l'API l'attend)
+        model_name = self.model
+        if not model_name.startswith('models/'):
+            model_name = f"models/{model_name}"
+        
+        generation_config = {
+            "max_output_tokens": max_tokens or 3000,
+            "temperature": 0.7
+        }
+        
+        if response_schema and self._is_structured_output_enabled():
+            generation_config["response_mime_type"] = "application/json"
+            generation_config["response_schema"] = response_schema
+        
+        cached_name = None
+        if cache_prefix:
+            cached_name = self._get_cached_content(model_name, cache_prefix)
+        
+        if cached_name:
+            # Instruction système et préfixe sont déjà dans le cache
+            generation_config["cached_content"] = cached_name
+            full_content = full_prompt
+        elif cache_prefix:
+            full_content = f"{DEFAULT_SYSTEM_INSTRUCTION}\n\n{cache_prefix}\n\n{full_prompt}"
+        else:
+            full_content = f"{DEFAULT_SYSTEM_INSTRUCTION}\n\n{full_prompt}"
+        
+        return model_name, full_content, generation_config, cached_name
+    
+    @tracked_call
+    @transport_call
+    def generate(self, prompt: str, context: Optional[Dict[str, Any]] = None, max_tokens: Optional[int] = None,
+                 cache_prefix: Optional[str] = None, response_schema: Optional[Dict[str, Any]] = None) -> str:
+        """Génère du texte avec Gemini."""
         processing_config = self.config.get("processing", {})
         max_retries = processing_config.get("max_retries", 3)
         retry_delay = processing_config.get("retry_delay", 2.0)
         
         for attempt in range(max_retries):
+            cached_name = None
             try:
-                system_instruction = "Tu es un expert en e-commerce et SEO. Tu génères du contenu optimisé pour les produits en ligne."
-                full_content = f"{system_instruction}\n\n{full_prompt}"
-                
-                # Nouvelle API google-genai
-                # Ajouter le préfixe "models/" si nécessaire (l'API l'attend)
-                model_name = self.model
-                if not model_name.startswith('models/'):
-                    model_name = f"models/{model_name}"
+                model_name, full_content, generation_config, cached_name = self._build_request(
+                    prompt, context, max_tokens, cache_prefix, response_schema
+                )
                 
                 response = self.client.models.generate_content(
                     model=model_name,
                     contents=full_content,
-                    config={
-                        "max_output_tokens": max_tokens or 3000,
-                        "temperature": 0.7
-                    }
+                    config=generation_config
                 )
+                self._log_usage(response)
                 
                 # Extraire le texte de la réponse
                 if hasattr(response, 'text'):
@@ -899,32 +1394,120 @@ class GeminiProvider(AIProvider):
             except Exception as e:
                 error_msg = str(e)
                 
+                # Un cached content expiré provoque une erreur : le recréer à la tentative suivante
+                if cached_name:
+                    self._forget_cached_content(cached_name)
+                
                 # Détecter les erreurs de quota/tokens
                 if self._is_quota_error(error_msg):
-                    raise AIQuotaError(
-                        "Gemini",
-                        "❌ Quota Gemini (Google) dépassé ou tokens insuffisants.\n\n"
-                        "Solutions :\n"
-                        "• Vérifiez votre compte Google Cloud : https://console.cloud.google.com/\n"
-                        "• Rechargez des crédits si nécessaire\n"
-                        "• Vérifiez les limites de votre plan\n"
-                        f"• Erreur : {error_msg}",
-                        error_msg
-                    )
+                    raise self._quota_error(error_msg)
                 
                 if attempt < max_retries - 1:
                     logger.warning(f"Tentative {attempt + 1} échouée pour Gemini: {e}. Nouvelle tentative dans {retry_delay}s...")
+                    llm_telemetry.note_retry()
                     time.sleep(retry_delay)
                 else:
                     raise AIProviderError(f"Erreur Gemini après {max_retries} tentatives: {e}")
+    
+    @tracked_call
+    @transport_call
+    def generate_stream(self, prompt: str, context: Optional[Dict[str, Any]] = None, max_tokens: Optional[int] = None,
+                        cache_prefix: Optional[str] = None,
+                        response_schema: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        """Génère du texte avec Gemini en streaming."""
+        def open_stream() -> Iterator[str]:
+            model_name, full_content, generation_config, cached_name = self._build_request(
+                prompt, context, max_tokens, cache_prefix, response_schema
+            )
+            last_chunk = None
+            try:
+                for chunk in self.client.models.generate_content_stream(
+                    model=model_name,
+                    contents=full_content,
+                    config=generation_config
+                ):
+                    last_chunk = chunk
+                    text = getattr(chunk, 'text', None)
+                    if text:
+                        yield text
+            except Exception:
+                if cached_name:
+                    self._forget_cached_content(cached_name)
+                raise
+            # L'usage du dernier fragment couvre toute la réponse
+            if last_chunk is not None:
+                self._log_usage(last_chunk)
+        
+        yield from self._stream_with_retry(open_stream, "Gemini")
+    
+    @staticmethod
+    def _log_usage(response) -> None:
+        """Transmet à la télémétrie les tokens d'une réponse Gemini (usage_metadata)."""
+        try:
+            usage = response.usage_metadata
+            cached = getattr(usage, 'cached_content_token_count', 0) or 0
+            logger.debug(f"💾 Cache Gemini: {cached}/{usage.prompt_token_count} tokens d'entrée en cache")
+            llm_telemetry.note_usage(usage.prompt_token_count, getattr(usage, 'candidates_token_count', 0), cached)
+        except Exception:
+            pass
+
+
+def get_max_concurrent_requests(config: Optional[Dict[str, Any]] = None) -> int:
+    """
+    Nombre de requêtes IA simultanées (processing.max_concurrent_requests dans ai_config.json).
+    
+    Dimensionne le pool HTTP des clients et les exécuteurs qui lancent des requêtes en parallèle.
+    
+    Args:
+        config: Configuration déjà chargée (défaut: ai_config.json)
+        
+    Returns:
+        Nombre de requêtes simultanées (au moins 1)
+    """
+    if config is None:
+        config = AIProvider._load_config()
+    try:
+        value = int(config.get("processing", {}).get("max_concurrent_requests", DEFAULT_HTTP_POOL_SIZE))
+    except (TypeError, ValueError):
+        value = DEFAULT_HTTP_POOL_SIZE
+    return max(1, value)
+
+
+def _strict_json_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Adapte un schéma au mode strict d'OpenAI : objets fermés, toutes les propriétés obligatoires.
+    
+    Args:
+        schema: Schéma JSON
+        
+    Returns:
+        Copie du schéma compatible structured outputs
+    """
+    strict = dict(schema)
+    if strict.get("type") == "object" and "properties" in strict:
+        strict["properties"] = {name: _strict_json_schema(prop) for name, prop in strict["properties"].items()}
+        strict["required"] = list(strict["properties"])
+        strict["additionalProperties"] = False
+    if strict.get("type") == "array" and "items" in strict:
+        strict["items"] = _strict_json_schema(strict["items"])
+    return strict
+
+
+def _key_fingerprint(api_key: Optional[str]) -> str:
+    """Empreinte d'une clé API (la clé elle-même n'est pas utilisée comme clé du registre)."""
+    return hashlib.sha256((api_key or '').encode('utf-8')).hexdigest()[:16]
 
 
 def get_provider(provider_name: str, api_key: Optional[str] = None, model: Optional[str] = None, 
                  enable_search: bool = False, perplexity_api_key: Optional[str] = None,
-                 perplexity_model: Optional[str] = None) -> AIProvider:
+                 perplexity_model: Optional[str] = None, shared: bool = True) -> AIProvider:
     """
     Factory pour créer un fournisseur IA.
     
+    Par défaut, les providers sont partagés pour toute la durée de l'application :
+    un même (provider, clé, modèle) réutilise son client SDK et ses connexions HTTP
+    keep-alive d'un traitement à l'autre.
+    
     Args:
         provider_name: Nom du provider (openai, claude, gemini)
         api_key: Clé API du provider
@@ -932,10 +1515,40 @@ def get_provider(provider_name: str, api_key: Optional[str] = None, model: Optio
         enable_search: Active la recherche Internet via Perplexity (uniquement OpenAI pour l'instant)
         perplexity_api_key: Clé API Perplexity pour la recherche
         perplexity_model: Modèle Perplexity à utiliser (sonar par défaut)
+        shared: False pour forcer la création d'une nouvelle instance
         
     Returns:
         Instance du provider IA
     """
+    if not shared:
+        return _create_provider(provider_name, api_key, model, enable_search,
+                                perplexity_api_key, perplexity_model)
+    
+    registry_key = (
+        provider_name.lower(), _key_fingerprint(api_key), model,
+        enable_search, _key_fingerprint(perplexity_api_key) if enable_search else None,
+        perplexity_model if enable_search else None
+    )
+    with _registry_lock:
+        provider = _provider_registry.get(registry_key)
+        if provider is None:
+            provider = _create_provider(provider_name, api_key, model, enable_search,
+                                        perplexity_api_key, perplexity_model)
+            _provider_registry[registry_key] = provider
+            logger.info(f"🔌 Provider {provider_name} ({provider.model}) créé et partagé")
+        return provider
+
+
+def clear_provider_registry():
+    """Oublie les providers partagés (ex: après modification des clés API)."""
+    with _registry_lock:
+        _provider_registry.clear()
+
+
+def _create_provider(provider_name: str, api_key: Optional[str], model: Optional[str],
+                     enable_search: bool, perplexity_api_key: Optional[str],
+                     perplexity_model: Optional[str]) -> AIProvider:
+    """Crée une nouvelle instance de provider (voir get_provider)."""
     providers = {
         "openai": OpenAIProvider,
         "claude": ClaudeProvider,
@@ -88,6 +88,18 @@ def get_supplier_db_path(supplier: str) -> str:
         return f"database/{supplier_lower}_products.db"
 
 
+def get_jobs_db_path() -> str:
+    """Retourne le chemin de la base des tâches de fond (scraping, traitements IA).
+
+    Format automatique: database/jobs.db
+    """
+    if getattr(sys, "frozen", False):
+        db_path = Path.home() / "Library" / "Application Support" / "ScrapersShopify" / "database" / "jobs.db"
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        return str(db_path)
+    return "database/jobs.db"
+
+
 def get_garnier_db_path() -> str:
     """Retourne le chemin de la base de données Garnier.
     
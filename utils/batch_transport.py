@@ -0,0 +1,234 @@
+"""
+Transports des API batch asynchrones des fournisseurs IA (OpenAI Batch, Anthropic Message Batches).
+
+En mode différé, les prompts de tous les batches d'un traitement sont envoyés en un seul
+job batch du fournisseur : pas de latence interactive, mais un débit bien plus élevé et
+un coût réduit (environ -50%). Les résultats arrivent en quelques minutes ou heures.
+
+Un transport prend des requêtes {custom_id, prompt, cache_prefix, max_tokens, response_schema}
+et retourne les réponses brutes par custom_id. Les paramètres de chaque requête sont
+construits par le provider lui-même (mêmes messages, modèle et schéma qu'en interactif).
+
+Les transports sont enregistrés par nom de provider avec @batch_transport ; un transport
+de remplacement (serveur local, tests) peut être enregistré de la même façon.
+"""
+
+import io
+import json
+import logging
+from abc import ABC, abstractmethod
+from typing import Dict, List, Any, Optional, Callable
+
+logger = logging.getLogger(__name__)
+
+# Statuts normalisés d'un job batch
+BATCH_PENDING = 'pending'
+BATCH_COMPLETED = 'completed'
+BATCH_FAILED = 'failed'
+
+# Délai de traitement demandé au fournisseur
+BATCH_COMPLETION_WINDOW = '24h'
+
+
+class BatchTransport(ABC):
+    """Envoi, suivi et récupération d'un job batch asynchrone."""
+
+    def __init__(self, provider):
+        """
+        Args:
+            provider: Provider IA (construit les paramètres des requêtes)
+        """
+        self.provider = provider
+
+    @abstractmethod
+    def submit(self, requests: List[Dict[str, Any]]) -> str:
+        """
+        Envoie les requêtes en un job batch.
+
+        Args:
+            requests: Requêtes {custom_id, prompt, cache_prefix, max_tokens, response_schema}
+
+        Returns:
+            ID du job chez le fournisseur
+        """
+        pass
+
+    @abstractmethod
+    def poll(self, job_id: str) -> Dict[str, Any]:
+        """
+        Récupère l'état d'un job.
+
+        Returns:
+            Dict {status (BATCH_*), completed, total, error}
+        """
+        pass
+
+    @abstractmethod
+    def fetch_results(self, job_id: str) -> Dict[str, str]:
+        """
+        Récupère les réponses d'un job terminé.
+
+        Returns:
+            Dict {custom_id: réponse brute} (requêtes en erreur omises)
+        """
+        pass
+
+    def cancel(self, job_id: str):
+        """Annule un job en cours (sans effet si non supporté)."""
+        pass
+
+
+BATCH_TRANSPORTS: Dict[str, Callable[[Any], BatchTransport]] = {}
+
+
+def batch_transport(provider_name: str):
+    """Enregistre le transport batch d'un provider : factory(provider) -> BatchTransport."""
+    def decorator(factory):
+        BATCH_TRANSPORTS[provider_name] = factory
+        return factory
+    return decorator
+
+
+def get_batch_transport(provider_name: str, provider) -> Optional[BatchTransport]:
+    """
+    Transport batch d'un provider.
+
+    Args:
+        provider_name: Nom du provider (openai, claude, gemini)
+        provider: Instance du provider
+
+    Returns:
+        Transport, ou None si le provider n'a pas d'API batch
+    """
+    factory = BATCH_TRANSPORTS.get(provider_name)
+    return factory(provider) if factory else None
+
+
+@batch_transport('openai')
+class OpenAIBatchTransport(BatchTransport):
+    """API Batch OpenAI : fichier JSONL de requêtes chat.completions, résultats en JSONL."""
+
+    ENDPOINT = '/v1/chat/completions'
+
+    def __init__(self, provider, client=None):
+        """
+        Args:
+            provider: OpenAIProvider
+            client: Client OpenAI (défaut: celui du provider)
+        """
+        super().__init__(provider)
+        self.client = client or provider.client
+
+    def submit(self, requests: List[Dict[str, Any]]) -> str:
+        lines = []
+        for request in requests:
+            body = self.provider._build_chat_params(
+                request['prompt'], None, request.get('max_tokens'),
+                request.get('cache_prefix'), request.get('response_schema')
+            )
+            lines.append(json.dumps({
+                'custom_id': request['custom_id'],
+                'method': 'POST',
+                'url': self.ENDPOINT,
+                'body': body
+            }, ensure_ascii=False))
+
+        payload = io.BytesIO(('\n'.join(lines) + '\n').encode('utf-8'))
+        input_file = self.client.files.create(file=('batch.jsonl', payload), purpose='batch')
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=self.ENDPOINT,
+            completion_window=BATCH_COMPLETION_WINDOW
+        )
+        logger.info(f"📤 Batch OpenAI {batch.id}: {len(requests)} requête(s)")
+        return batch.id
+
+    def poll(self, job_id: str) -> Dict[str, Any]:
+        batch = self.client.batches.retrieve(job_id)
+        counts = batch.request_counts
+        if batch.status == 'completed' or (batch.status == 'expired' and batch.output_file_id):
+            status = BATCH_COMPLETED
+        elif batch.status in ('failed', 'expired', 'cancelled'):
+            status = BATCH_FAILED
+        else:
+            status = BATCH_PENDING
+        error = None
+        if batch.errors and batch.errors.data:
+            error = '; '.join(e.message or e.code or '' for e in batch.errors.data)
+        return {
+            'status': status,
+            'completed': (counts.completed + counts.failed) if counts else 0,
+            'total': counts.total if counts else 0,
+            'error': error or (batch.status if status == BATCH_FAILED else None)
+        }
+
+    def fetch_results(self, job_id: str) -> Dict[str, str]:
+        batch = self.client.batches.retrieve(job_id)
+        if not batch.output_file_id:
+            return {}
+
+        results = {}
+        for line in self.client.files.content(batch.output_file_id).text.splitlines():
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            response = entry.get('response') or {}
+            if entry.get('error') or response.get('status_code') != 200:
+                logger.warning(f"Requête batch {entry.get('custom_id')} en erreur: {entry.get('error') or response.get('status_code')}")
+                continue
+            results[entry['custom_id']] = response['body']['choices'][0]['message']['content'] or ''
+        return results
+
+    def cancel(self, job_id: str):
+        self.client.batches.cancel(job_id)
+
+
+@batch_transport('claude')
+class ClaudeBatchTransport(BatchTransport):
+    """API Message Batches d'Anthropic : requêtes messages.create, résultats par custom_id."""
+
+    def __init__(self, provider, client=None):
+        """
+        Args:
+            provider: ClaudeProvider
+            client: Client Anthropic (défaut: celui du provider)
+        """
+        super().__init__(provider)
+        self.client = client or provider.anthropic_client
+
+    def submit(self, requests: List[Dict[str, Any]]) -> str:
+        batch = self.client.messages.batches.create(requests=[
+            {
+                'custom_id': request['custom_id'],
+                'params': self.provider._build_message_params(
+                    request['prompt'], None, request.get('max_tokens'),
+                    request.get('cache_prefix'), request.get('response_schema')
+                )
+            }
+            for request in requests
+        ])
+        logger.info(f"📤 Batch Claude {batch.id}: {len(requests)} requête(s)")
+        return batch.id
+
+    def poll(self, job_id: str) -> Dict[str, Any]:
+        batch = self.client.messages.batches.retrieve(job_id)
+        counts = batch.request_counts
+        done = counts.succeeded + counts.errored + counts.canceled + counts.expired
+        return {
+            'status': BATCH_COMPLETED if batch.processing_status == 'ended' else BATCH_PENDING,
+            'completed': done,
+            'total': done + counts.processing,
+            'error': None
+        }
+
+    def fetch_results(self, job_id: str) -> Dict[str, str]:
+        results = {}
+        for entry in self.client.messages.batches.results(job_id):
+            if entry.result.type != 'succeeded':
+                logger.warning(f"Requête batch {entry.custom_id} en erreur: {entry.result.type}")
+                continue
+            results[entry.custom_id] = self.provider._message_text(entry.result.message)
+        return results
+
+    def cancel(self, job_id: str):
+        self.client.messages.batches.cancel(job_id)
@@ -4,6 +4,7 @@ Traitement des fichiers CSV Shopify avec l'IA pour modifier les descriptions.
 
 import pandas as pd
 import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from typing import Optional, Dict, List, Callable, Set
 from pathlib import Path
 from datetime import datetime
@@ -11,12 +12,34 @@ from utils.ai_providers import AIProvider, AIProviderError
 
 logger = logging.getLogger(__name__)
 
+# Nombre d'appels IA simultanés par défaut (processing.max_concurrent_requests dans ai_config.json)
+DEFAULT_MAX_WORKERS = 4
+
 
 class CSVAIProcessor:
     """Processeur CSV pour modifier les descriptions avec l'IA."""
     
-    def __init__(self, ai_provider: AIProvider):
+    def __init__(self, ai_provider: AIProvider, max_workers: Optional[int] = None):
+        """
+        Args:
+            ai_provider: Provider IA utilisé pour générer les descriptions
+            max_workers: Nombre d'appels IA simultanés (défaut: configuration du provider)
+        """
         self.ai_provider = ai_provider
+        if max_workers is None:
+            config = getattr(ai_provider, 'config', None) or {}
+            max_workers = config.get("processing", {}).get("max_concurrent_requests", DEFAULT_MAX_WORKERS)
+        self.max_workers = max(1, int(max_workers))
+    
+    @staticmethod
+    def _product_context(first_row: pd.Series) -> Dict[str, str]:
+        """Contexte envoyé à l'IA à partir de la première ligne d'un produit."""
+        context = {}
+        for key, column in (("title", "Title"), ("type", "Type"), ("tags", "Tags"),
+                            ("vendor", "Vendor"), ("body_html", "Body (HTML)")):
+            value = first_row.get(column, "")
+            context[key] = "" if pd.isna(value) else value
+        return context
     
     def process_csv(
         self,
@@ -60,14 +83,14 @@ class CSVAIProcessor:
                     log_callback(f"❌ {error_msg}")
                 return False, None, error_msg
             
-            # Grouper par Handle pour traiter chaque produit une seule fois
-            unique_handles = df["Handle"].unique()
+            # Grouper par Handle en une passe : première ligne de chaque produit (ordre du CSV)
+            first_rows = df.groupby("Handle", sort=False).head(1)
             
             # Filtrer selon la sélection
             if selected_handles:
-                unique_handles = [h for h in unique_handles if h in selected_handles]
+                first_rows = first_rows[first_rows["Handle"].isin(selected_handles)]
             
-            total_products = len(unique_handles)
+            total_products = len(first_rows)
             
             if total_products == 0:
                 error_msg = "Aucun produit à traiter"
@@ -87,76 +110,81 @@ class CSVAIProcessor:
                     log_callback(f"❌ {error_msg}")
                 return False, None, error_msg
             
-            # Traiter chaque produit
-            processed_count = 0
+            products = [(row["Handle"], self._product_context(row)) for _, row in first_rows.iterrows()]
+            
+            # Appels IA en parallèle (au plus max_workers en cours), résultats traités dans ce thread
+            new_descriptions: Dict[str, str] = {}
             errors = []
+            completed = 0
+            queue = iter(products)
+            in_flight = {}
+            executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='csv-ai')
             
-            for idx, handle in enumerate(unique_handles):
-                # Vérifier l'annulation
-                if cancel_check and cancel_check():
+            def submit_next():
+                item = next(queue, None)
+                if item is not None:
+                    handle, context = item
                     if log_callback:
-                        log_callback("⚠️ Traitement annulé par l'utilisateur")
-                    return False, None, "Traitement annulé"
-                
-                if progress_callback:
-                    progress_callback(f"Traitement du produit {idx + 1}/{total_products}", idx + 1, total_products)
-                
-                # Récupérer toutes les lignes de ce produit
-                product_rows = df[df["Handle"] == handle]
-                
-                if product_rows.empty:
-                    continue
-                
-                # Prendre la première ligne pour extraire les infos du produit
-                first_row = product_rows.iloc[0]
-                
-                # Construire le contexte
-                context = {
-                    "title": first_row.get("Title", ""),
-                    "type": first_row.get("Type", ""),
-                    "tags": first_row.get("Tags", ""),
-                    "vendor": first_row.get("Vendor", ""),
-                    "body_html": first_row.get("Body (HTML)", "")
-                }
-                
-                # Appeler l'IA pour générer la nouvelle description
-                try:
-                    if log_callback:
-                        log_callback(f"🤖 Génération de la description pour '{context.get('title', handle)}'...")
-                    
-                    new_description = self.ai_provider.generate(prompt, context)
-                    
-                    if not new_description:
-                        error_msg = f"Description vide générée pour {handle}"
-                        logger.warning(error_msg)
-                        errors.append(error_msg)
-                        if log_callback:
-                            log_callback(f"⚠️ {error_msg}")
-                        continue
-                    
-                    # Mettre à jour toutes les lignes de ce produit
-                    df.loc[df["Handle"] == handle, "Body (HTML)"] = new_description
-                    
-                    processed_count += 1
-                    
-                    if log_callback:
-                        log_callback(f"✅ Description mise à jour pour '{context.get('title', handle)}'")
-                
-                except AIProviderError as e:
-                    error_msg = f"Erreur IA pour {handle}: {str(e)}"
-                    logger.error(error_msg)
-                    errors.append(error_msg)
-                    if log_callback:
-                        log_callback(f"❌ {error_msg}")
-                    continue
+                        log_callback(f"🤖 Génération de la description pour '{context.get('title') or handle}'...")
+                    in_flight[executor.submit(self.ai_provider.generate, prompt, context)] = item
+            
+            try:
+                for _ in range(self.max_workers):
+                    submit_next()
                 
-                except Exception as e:
-                    error_msg = f"Erreur inattendue pour {handle}: {str(e)}"
-                    logger.error(error_msg, exc_info=True)
-                    errors.append(error_msg)
-                    if log_callback:
-                        log_callback(f"❌ {error_msg}")
-                    continue
+                while in_flight:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        handle, context = in_flight.pop(future)
+                        completed += 1
+                        
+                        if progress_callback:
+                            progress_callback(f"Traitement du produit {completed}/{total_products}", completed, total_products)
+                        
+                        try:
+                            new_description = future.result()
+                            
+                            if not new_description:
+                                error_msg = f"Description vide générée pour {handle}"
+                                logger.warning(error_msg)
+                                errors.append(error_msg)
+                                if log_callback:
+                                    log_callback(f"⚠️ {error_msg}")
+                            else:
+                                new_descriptions[handle] = new_description
+                                if log_callback:
+                                    log_callback(f"✅ Description mise à jour pour '{context.get('title') or handle}'")
+                        
+                        except AIProviderError as e:
+                            error_msg = f"Erreur IA pour {handle}: {str(e)}"
+                            logger.error(error_msg)
+                            errors.append(error_msg)
+                            if log_callback:
+                                log_callback(f"❌ {error_msg}")
+                        
+                        except Exception as e:
+                            error_msg = f"Erreur inattendue pour {handle}: {str(e)}"
+                            logger.error(error_msg, exc_info=True)
+                            errors.append(error_msg)
+                            if log_callback:
+                                log_callback(f"❌ {error_msg}")
+                        
+                        # Vérifier l'annulation
+                        if cancel_check and cancel_check():
+                            if log_callback:
+                                log_callback("⚠️ Traitement annulé par l'utilisateur")
+                            return False, None, "Traitement annulé"
+                        
+                        submit_next()
+            finally:
+                # Annulation ou erreur : ne pas attendre les appels encore en file
+                executor.shutdown(wait=False, cancel_futures=True)
+            
+            # Mettre à jour toutes les lignes des produits traités en une affectation
+            processed_count = len(new_descriptions)
+            if new_descriptions:
+                mask = df["Handle"].isin(new_descriptions.keys())
+                df.loc[mask, "Body (HTML)"] = df.loc[mask, "Handle"].map(new_descriptions)
             
             # Générer le chemin de sortie si non spécifié
             if not output_path:
@@ -2,16 +2,26 @@
 Optimisation des champs Google Shopping avec l'IA.
 """
 
+import re
 import pandas as pd
 import json
 import logging
-from typing import Optional, Dict, List, Callable, Set
+from typing import Optional, Dict, List, Callable, Set, Any
 from pathlib import Path
 from datetime import datetime
 from utils.ai_providers import AIProvider, AIProviderError
 
 logger = logging.getLogger(__name__)
 
+# Nombre de produits optimisés par requête IA (tous les champs activés en une fois)
+DEFAULT_BATCH_SIZE = 5
+
+# Tokens de sortie prévus par champ et par produit
+TOKENS_PER_FIELD = 150
+
+# Longueur max de la description envoyée dans le prompt
+BODY_MAX_CHARS = 500
+
 
 class GoogleShoppingOptimizer:
     """Optimiseur pour les champs Google Shopping."""
@@ -45,6 +55,217 @@ class GoogleShoppingOptimizer:
         prompts = self.config.get("default_prompts", {})
         return prompts.get(field_name, f"Génère une valeur optimisée pour le champ '{field_name}'.")
     
+    @staticmethod
+    def field_key(field_name: str) -> str:
+        """
+        Clé JSON d'un champ dans la réponse de l'IA (ex: "Google Shopping / MPN" → "google_shopping_mpn").
+        
+        Args:
+            field_name: Nom de la colonne CSV
+            
+        Returns:
+            Clé en minuscules sans espaces ni ponctuation
+        """
+        return re.sub(r'[^a-z0-9]+', '_', field_name.lower()).strip('_')
+    
+    def get_response_schema(self, fields: List[str]) -> Dict[str, Any]:
+        """
+        Schéma JSON de la réponse batch : un objet par produit avec tous les champs demandés.
+        
+        Args:
+            fields: Champs à générer
+            
+        Returns:
+            Schéma JSON {"products": [{"handle": ..., <champ>: ...}]}
+        """
+        item_properties = {"handle": {"type": "string"}}
+        for field_name in fields:
+            item_properties[self.field_key(field_name)] = {"type": "string"}
+        return {
+            "type": "object",
+            "properties": {
+                "products": {
+                    "type": "array",
+                    "items": {"type": "object", "properties": item_properties, "required": list(item_properties)}
+                }
+            },
+            "required": ["products"]
+        }
+    
+    def build_batch_prompt(self, products: List[Dict[str, Any]], fields: List[str]) -> str:
+        """
+        Construit le prompt demandant tous les champs de plusieurs produits en une requête.
+        
+        Args:
+            products: Contextes produit (handle, title, type, tags, vendor, body_html, sku, barcode)
+            fields: Champs à générer
+            
+        Returns:
+            Prompt complet
+        """
+        instructions = "\n".join(
+            f"- {self.field_key(field_name)} ({field_name}): {self.get_prompt_for_field(field_name)}"
+            for field_name in fields
+        )
+        
+        sections = []
+        for product in products:
+            lines = [f"### handle={product['handle']}"]
+            for label, key in (("Titre", "title"), ("Type", "type"), ("Marque", "vendor"), ("Tags", "tags"),
+                               ("SKU", "sku"), ("Code-barres", "barcode"), ("Description", "body_html")):
+                if product.get(key):
+                    lines.append(f"- {label}: {product[key]}")
+            sections.append("\n".join(lines))
+        
+        example = {"handle": "...", **{self.field_key(field_name): "..." for field_name in fields}}
+        return f"""Optimise les champs Google Shopping de ces {len(products)} produit(s).
+
+CHAMPS À GÉNÉRER (clé JSON: consigne):
+{instructions}
+
+PRODUITS:
+{chr(10).join(sections)}
+
+Réponds UNIQUEMENT avec un JSON valide, un objet par produit (handle recopié à l'identique):
+{json.dumps({"products": [example]}, ensure_ascii=False)}"""
+    
+    def optimize_products(self, products: List[Dict[str, Any]], fields: List[str]) -> Dict[str, Dict[str, str]]:
+        """
+        Génère tous les champs activés de plusieurs produits en une seule requête IA.
+        
+        Args:
+            products: Contextes produit (voir build_batch_prompt)
+            fields: Champs à générer
+            
+        Returns:
+            Dict {handle: {champ: valeur nettoyée}} pour les produits présents dans la réponse
+            
+        Raises:
+            AIProviderError: Si l'appel IA échoue
+            ValueError: Si la réponse n'est pas un JSON exploitable
+        """
+        prompt = self.build_batch_prompt(products, fields)
+        
+        # Récupérer max_tokens depuis la configuration (par défaut 5000), limité au besoin du batch
+        max_tokens = TOKENS_PER_FIELD * len(fields) * len(products) + 200
+        if self.db:
+            max_tokens = min(self.db.get_config_int('max_tokens', default=5000), max_tokens)
+        
+        if getattr(self.ai_provider, 'supports_response_schema', False):
+            response = self.ai_provider.generate(prompt, max_tokens=max_tokens,
+                                                 response_schema=self.get_response_schema(fields))
+        else:
+            response = self.ai_provider.generate(prompt, max_tokens=max_tokens)
+        
+        items = self._parse_response(response)
+        
+        handles = {product['handle'] for product in products}
+        results = {}
+        for item in items:
+            if not isinstance(item, dict) or item.get('handle') not in handles:
+                continue
+            values = {}
+            for field_name in fields:
+                value = self._clean_value(field_name, item.get(self.field_key(field_name)))
+                if value:
+                    values[field_name] = value
+            results[item['handle']] = values
+        return results
+    
+    def _optimize_batch(self, batch: List[Dict[str, Any]], fields: List[str], errors: List[str],
+                        log_callback: Optional[Callable[[str], None]] = None) -> Dict[str, Dict[str, str]]:
+        """
+        Optimise un batch ; les produits absents de la réponse sont redemandés un par un.
+        
+        Args:
+            batch: Contextes produit
+            fields: Champs à générer
+            errors: Liste des erreurs, complétée en place
+            log_callback: Callback pour les logs
+            
+        Returns:
+            Dict {handle: {champ: valeur}}
+        """
+        results = {}
+        sub_batches = [batch]
+        for attempt in range(2):
+            for sub_batch in sub_batches:
+                handles = ', '.join(p['handle'] for p in sub_batch)
+                try:
+                    results.update(self.optimize_products(sub_batch, fields))
+                
+                except AIProviderError as e:
+                    error_msg = f"Erreur IA ({handles}): {str(e)}"
+                    logger.error(error_msg)
+                    errors.append(error_msg)
+                    if log_callback:
+                        log_callback(f"❌ {error_msg}")
+                
+                except Exception as e:
+                    error_msg = f"Erreur inattendue ({handles}): {str(e)}"
+                    logger.error(error_msg, exc_info=True)
+                    errors.append(error_msg)
+                    if log_callback:
+                        log_callback(f"❌ {error_msg}")
+            
+            missing = [p for p in batch if p['handle'] not in results]
+            if not missing or len(batch) == 1:
+                break
+            sub_batches = [[p] for p in missing]
+        return results
+    
+    def _parse_response(self, response: str) -> List[Dict[str, Any]]:
+        """Décode la réponse batch {"products": [...]} (json-repair en secours)."""
+        clean = (response or '').strip()
+        if clean.startswith('```'):
+            clean = clean.split('\n', 1)[-1]
+            if clean.endswith('```'):
+                clean = clean[:-3]
+        try:
+            result = json.loads(clean)
+        except json.JSONDecodeError:
+            from json_repair import repair_json
+            result = json.loads(repair_json(clean))
+        
+        items = result.get('products') if isinstance(result, dict) else result
+        if not isinstance(items, list):
+            raise ValueError("Format JSON invalide: clé 'products' manquante")
+        return items
+    
+    @staticmethod
+    def _clean_value(field_name: str, value: Any) -> str:
+        """Nettoie une valeur générée (guillemets, longueurs max SEO)."""
+        if value is None:
+            return ''
+        value = str(value).strip().strip('"').strip("'")
+        
+        # Validation spécifique selon le champ
+        if "SEO Title" in field_name and len(value) > 60:
+            value = value[:57] + "..."
+        if "SEO Description" in field_name and len(value) > 160:
+            value = value[:157] + "..."
+        return value
+    
+    @staticmethod
+    def _product_context(handle: str, first_row: pd.Series) -> Dict[str, Any]:
+        """Contexte d'un produit à partir de sa première ligne CSV."""
+        def text(column: str) -> str:
+            value = first_row.get(column, "")
+            return "" if pd.isna(value) else str(value)
+        
+        body = re.sub(r'<[^>]+>', ' ', text("Body (HTML)"))
+        body = ' '.join(body.split())[:BODY_MAX_CHARS]
+        return {
+            "handle": handle,
+            "title": text("Title"),
+            "type": text("Type"),
+            "tags": text("Tags"),
+            "vendor": text("Vendor"),
+            "body_html": body,
+            "sku": text("Variant SKU"),
+            "barcode": text("Variant Barcode")
+        }
+    
     def optimize_csv(
         self,
         csv_path: str,
@@ -104,8 +325,12 @@ class GoogleShoppingOptimizer:
                 for field in missing_fields:
                     df[field] = ""
             
-            # Grouper par Handle pour traiter chaque produit une seule fois
-            unique_handles = df["Handle"].unique()
+            # Grouper par Handle une seule fois : lignes de chaque produit (ordre du CSV)
+            rows_by_handle = {
+                handle: df.index[positions]
+                for handle, positions in df.groupby("Handle", sort=False).indices.items()
+            }
+            unique_handles = list(rows_by_handle)
             
             # Filtrer selon la sélection
             if selected_handles:
@@ -120,112 +345,54 @@ class GoogleShoppingOptimizer:
                     log_callback(f"⚠️ {error_msg}")
                 return False, None, error_msg
             
+            batch_size = max(1, int(self.config.get("batch_size", DEFAULT_BATCH_SIZE)))
+            
             if log_callback:
                 log_callback(f"📊 {total_products} produit(s) à traiter")
                 log_callback(f"🎯 Champs à optimiser: {', '.join(enabled_fields)}")
+                log_callback(f"📦 {len(enabled_fields)} champ(s) par requête, {batch_size} produit(s) par requête")
             
-            # Traiter chaque produit
+            # Traiter les produits par batch : tous les champs en une requête
             processed_count = 0
             errors = []
+            done = 0
             
-            for idx, handle in enumerate(unique_handles):
+            for start in range(0, total_products, batch_size):
                 # Vérifier l'annulation
                 if cancel_check and cancel_check():
                     if log_callback:
                         log_callback("⚠️ Traitement annulé par l'utilisateur")
                     return False, None, "Traitement annulé"
                 
-                if progress_callback:
-                    progress_callback(f"Traitement du produit {idx + 1}/{total_products}", idx + 1, total_products)
-                
-                # Récupérer toutes les lignes de ce produit
-                product_rows = df[df["Handle"] == handle]
-                
-                if product_rows.empty:
-                    continue
+                batch = [
+                    self._product_context(handle, df.loc[rows_by_handle[handle][0]])
+                    for handle in unique_handles[start:start + batch_size]
+                ]
                 
-                # Prendre la première ligne pour extraire les infos du produit
-                first_row = product_rows.iloc[0]
-                
-                # Construire le contexte
-                context = {
-                    "title": first_row.get("Title", ""),
-                    "type": first_row.get("Type", ""),
-                    "tags": first_row.get("Tags", ""),
-                    "vendor": first_row.get("Vendor", ""),
-                    "body_html": first_row.get("Body (HTML)", ""),
-                    "sku": first_row.get("Variant SKU", ""),
-                    "barcode": first_row.get("Variant Barcode", "")
-                }
+                if log_callback:
+                    log_callback(f"🤖 Optimisation de {len(batch)} produit(s) en une requête...")
                 
-                # Traiter chaque champ activé
-                product_updated = False
+                results = self._optimize_batch(batch, enabled_fields, errors, log_callback)
                 
-                for field_name in enabled_fields:
-                    try:
-                        # Récupérer le prompt pour ce champ
-                        prompt = self.get_prompt_for_field(field_name)
-                        
-                        # Construire un contexte spécifique pour ce champ
-                        field_context = context.copy()
-                        
-                        # Ajouter des informations spécifiques selon le champ
-                        if "MPN" in field_name:
-                            field_context["hint"] = f"SKU: {context.get('sku', 'N/A')}, Code-barres: {context.get('barcode', 'N/A')}"
-                        
-                        if log_callback:
-                            log_callback(f"🤖 Optimisation du champ '{field_name}' pour '{context.get('title', handle)}'...")
-                        
-                        # Récupérer max_tokens depuis la configuration (par défaut 5000, mais on limite à 1000 ici)
-                        max_tokens = 1000
-                        if self.db:
-                            configured_max = self.db.get_config_int('max_tokens', default=5000)
-                            # Pour ce cas d'usage (un seul champ), on limite à 1000 même si la config est plus haute
-                            max_tokens = min(configured_max, 1000)
-                        
-                        # Générer la valeur optimisée
-                        optimized_value = self.ai_provider.generate(prompt, field_context, max_tokens=max_tokens)
-                        
-                        if not optimized_value:
-                            continue
-                        
-                        # Nettoyer la valeur (supprimer les guillemets si présents)
-                        optimized_value = optimized_value.strip().strip('"').strip("'")
-                        
-                        # Validation spécifique selon le champ
-                        if "SEO Title" in field_name and len(optimized_value) > 60:
-                            optimized_value = optimized_value[:57] + "..."
-                        
-                        if "SEO Description" in field_name and len(optimized_value) > 160:
-                            optimized_value = optimized_value[:157] + "..."
-                        
-                        # Mettre à jour toutes les lignes de ce produit
-                        df.loc[df["Handle"] == handle, field_name] = optimized_value
-                        product_updated = True
-                        
-                        if log_callback:
-                            log_callback(f"✅ '{field_name}' optimisé: {optimized_value[:50]}...")
+                for product in batch:
+                    done += 1
+                    handle = product['handle']
+                    if progress_callback:
+                        progress_callback(f"Traitement du produit {done}/{total_products}", done, total_products)
                     
-                    except AIProviderError as e:
-                        error_msg = f"Erreur IA pour {field_name} ({handle}): {str(e)}"
-                        logger.error(error_msg)
-                        errors.append(error_msg)
-                        if log_callback:
-                            log_callback(f"❌ {error_msg}")
+                    values = results.get(handle)
+                    if not values:
                         continue
                     
-                    except Exception as e:
-                        error_msg = f"Erreur inattendue pour {field_name} ({handle}): {str(e)}"
-                        logger.error(error_msg, exc_info=True)
-                        errors.append(error_msg)
+                    # Mettre à jour toutes les lignes de ce produit
+                    for field_name, optimized_value in values.items():
+                        df.loc[rows_by_handle[handle], field_name] = optimized_value
                         if log_callback:
-                            log_callback(f"❌ {error_msg}")
-                        continue
-                
-                if product_updated:
+                            log_callback(f"✅ '{field_name}' optimisé: {optimized_value[:50]}...")
+                    
                     processed_count += 1
                     if log_callback:
-                        log_callback(f"✅ Produit '{context.get('title', handle)}' optimisé")
+                        log_callback(f"✅ Produit '{product.get('title') or handle}' optimisé")
             
             # Générer le chemin de sortie si non spécifié
             if not output_path:
@@ -0,0 +1,627 @@
+"""
+Service de tâches de fond (scraping, traitements IA) indépendant de la boucle Tk.
+
+Les tâches sont enregistrées dans une base SQLite (database/jobs.db) et exécutées
+chacune dans un processus worker (python -m utils.job_service --run <id>) :
+- elles survivent à la fermeture de la fenêtre qui les a lancées ;
+- plusieurs tâches tournent en parallèle (un fournisseur par worker) ;
+- elles ne partagent pas le GIL avec l'interface.
+
+Le worker écrit sa progression et ses logs dans la base (par lots), l'interface
+les lit périodiquement (JobSubscription) au lieu de recevoir un after(0, ...)
+par ligne de log. Une tâche interrompue (application quittée, worker tué) est
+remise en file au démarrage suivant du service, avec resume=True.
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import logging
+import argparse
+import threading
+import subprocess
+from typing import Dict, List, Optional, Any, Callable
+
+from utils.app_config import get_config, get_jobs_db_path
+
+logger = logging.getLogger(__name__)
+
+# Statuts d'une tâche
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_COMPLETED = 'completed'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+FINISHED_STATUSES = (JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED)
+
+# Nombre de workers simultanés par défaut (clé app_config.json: max_concurrent_jobs)
+DEFAULT_MAX_CONCURRENT_JOBS = 3
+
+# Intervalle d'écriture des logs en base et de lecture de l'annulation (secondes)
+LOG_FLUSH_INTERVAL = 0.5
+CANCEL_CHECK_INTERVAL = 1.0
+
+# Intervalle de la boucle du planificateur (secondes)
+SCHEDULER_INTERVAL = 1.0
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class JobStore:
+    """Accès à la base des tâches (une connexion par thread/processus)."""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or get_jobs_db_path()
+        self.conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self._lock = threading.Lock()
+        self._init_db()
+
+    def _init_db(self):
+        """Crée les tables des tâches et de leurs logs."""
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                label TEXT,
+                params_json TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued',
+                progress_message TEXT,
+                progress_current INTEGER DEFAULT 0,
+                progress_total INTEGER DEFAULT 0,
+                result_json TEXT,
+                error TEXT,
+                cancel_requested INTEGER DEFAULT 0,
+                pid INTEGER,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                started_at TIMESTAMP,
+                finished_at TIMESTAMP
+            )
+        ''')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS job_logs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id INTEGER NOT NULL,
+                message TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (job_id) REFERENCES jobs(id) ON DELETE CASCADE
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_job_logs_job ON job_logs(job_id, id)')
+        self.conn.commit()
+
+    def _execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        """Exécute une écriture et la valide."""
+        with self._lock:
+            cursor = self.conn.execute(sql, params)
+            self.conn.commit()
+            return cursor
+
+    def create_job(self, kind: str, params: Dict[str, Any], label: Optional[str] = None) -> int:
+        """
+        Ajoute une tâche en file d'attente.
+
+        Args:
+            kind: Type de tâche (voir JOB_HANDLERS)
+            params: Paramètres JSON de la tâche
+            label: Libellé affiché
+
+        Returns:
+            ID de la tâche
+        """
+        cursor = self._execute(
+            'INSERT INTO jobs (kind, label, params_json) VALUES (?, ?, ?)',
+            (kind, label or kind, json.dumps(params, ensure_ascii=False))
+        )
+        return cursor.lastrowid
+
+    def get_job(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """Récupère une tâche (params et result décodés)."""
+        with self._lock:
+            row = self.conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._decode(row) if row else None
+
+    def list_jobs(self, statuses: Optional[List[str]] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        Liste les tâches, les plus récentes en premier.
+
+        Args:
+            statuses: Statuts à inclure (None = tous)
+            limit: Nombre maximum de tâches
+        """
+        sql = 'SELECT * FROM jobs'
+        params: tuple = ()
+        if statuses:
+            sql += f" WHERE status IN ({','.join('?' * len(statuses))})"
+            params = tuple(statuses)
+        with self._lock:
+            rows = self.conn.execute(sql + ' ORDER BY id DESC LIMIT ?', params + (limit,)).fetchall()
+        return [self._decode(row) for row in rows]
+
+    def claim_job(self, job_id: int, pid: Optional[int] = None) -> bool:
+        """
+        Passe une tâche en file à l'état running.
+
+        Returns:
+            False si la tâche n'était plus en file
+        """
+        cursor = self._execute('''
+            UPDATE jobs SET status = ?, pid = ?, started_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND status = ?
+        ''', (JOB_RUNNING, pid, job_id, JOB_QUEUED))
+        return cursor.rowcount == 1
+
+    def set_pid(self, job_id: int, pid: int):
+        """Enregistre le processus qui exécute la tâche."""
+        self._execute('UPDATE jobs SET pid = ? WHERE id = ?', (pid, job_id))
+
+    def update_progress(self, job_id: int, message: str, current: int, total: int):
+        """Met à jour la progression d'une tâche."""
+        self._execute('''
+            UPDATE jobs SET progress_message = ?, progress_current = ?, progress_total = ?
+            WHERE id = ?
+        ''', (message, current, total, job_id))
+
+    def add_logs(self, job_id: int, messages: List[str]):
+        """Ajoute des lignes de log (une seule transaction)."""
+        if not messages:
+            return
+        with self._lock:
+            self.conn.executemany(
+                'INSERT INTO job_logs (job_id, message) VALUES (?, ?)',
+                [(job_id, message) for message in messages]
+            )
+            self.conn.commit()
+
+    def get_logs(self, job_id: int, after_id: int = 0) -> List[Dict[str, Any]]:
+        """
+        Récupère les logs d'une tâche postérieurs à after_id.
+
+        Returns:
+            Liste de {'id', 'message'}
+        """
+        with self._lock:
+            rows = self.conn.execute(
+                'SELECT id, message FROM job_logs WHERE job_id = ? AND id > ? ORDER BY id',
+                (job_id, after_id)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def finish_job(self, job_id: int, status: str, result: Optional[Dict[str, Any]] = None,
+                   error: Optional[str] = None):
+        """Termine une tâche (completed, failed ou cancelled)."""
+        self._execute('''
+            UPDATE jobs SET status = ?, result_json = ?, error = ?, finished_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (status, json.dumps(result, ensure_ascii=False) if result is not None else None, error, job_id))
+
+    def request_cancel(self, job_id: int):
+        """Demande l'annulation d'une tâche (une tâche en file est annulée directement)."""
+        self._execute('UPDATE jobs SET cancel_requested = 1 WHERE id = ?', (job_id,))
+        self._execute('''
+            UPDATE jobs SET status = ?, finished_at = CURRENT_TIMESTAMP WHERE id = ? AND status = ?
+        ''', (JOB_CANCELLED, job_id, JOB_QUEUED))
+
+    def is_cancel_requested(self, job_id: int) -> bool:
+        """Indique si l'annulation d'une tâche a été demandée."""
+        with self._lock:
+            row = self.conn.execute('SELECT cancel_requested FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return bool(row and row['cancel_requested'])
+
+    def requeue_job(self, job_id: int, params: Dict[str, Any]):
+        """Remet une tâche interrompue en file avec de nouveaux paramètres."""
+        self._execute('''
+            UPDATE jobs SET status = ?, params_json = ?, pid = NULL, started_at = NULL
+            WHERE id = ?
+        ''', (JOB_QUEUED, json.dumps(params, ensure_ascii=False), job_id))
+
+    @staticmethod
+    def _decode(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job['params'] = json.loads(job.pop('params_json') or '{}')
+        job['result'] = json.loads(job.pop('result_json')) if job.get('result_json') else None
+        return job
+
+    def close(self):
+        """Ferme la connexion."""
+        self.conn.close()
+
+
+class JobContext:
+    """Progression, logs et annulation d'une tâche en cours, vus par son handler."""
+
+    def __init__(self, store: JobStore, job_id: int):
+        self.store = store
+        self.job_id = job_id
+        self._pending_logs: List[str] = []
+        self._last_flush = 0.0
+        self._last_cancel_check = 0.0
+        self._cancelled = False
+        self._lock = threading.Lock()
+
+    def log(self, message: str):
+        """Ajoute une ligne de log (écrite en base par lots)."""
+        with self._lock:
+            self._pending_logs.append(str(message))
+        if time.monotonic() - self._last_flush >= LOG_FLUSH_INTERVAL:
+            self.flush()
+
+    def progress(self, message: str, current: int = 0, total: int = 0):
+        """Met à jour la progression."""
+        self.flush()
+        self.store.update_progress(self.job_id, message, current, total)
+
+    def is_cancelled(self) -> bool:
+        """Annulation demandée (lue en base au plus une fois par seconde)."""
+        now = time.monotonic()
+        if not self._cancelled and now - self._last_cancel_check >= CANCEL_CHECK_INTERVAL:
+            self._last_cancel_check = now
+            self._cancelled = self.store.is_cancel_requested(self.job_id)
+        return self._cancelled
+
+    def flush(self):
+        """Écrit les logs en attente."""
+        with self._lock:
+            messages, self._pending_logs = self._pending_logs, []
+            self._last_flush = time.monotonic()
+        self.store.add_logs(self.job_id, messages)
+
+
+class _JobLogHandler(logging.Handler):
+    """Copie les logs du worker dans les logs de la tâche (comme les fenêtres le faisaient)."""
+
+    def __init__(self, context: JobContext):
+        super().__init__(level=logging.INFO)
+        self.context = context
+        self.setFormatter(logging.Formatter('%(message)s'))
+
+    def emit(self, record):
+        try:
+            self.context.log(self.format(record))
+        except Exception:
+            pass
+
+
+# ========== Handlers des types de tâche ==========
+
+JOB_HANDLERS: Dict[str, Callable[[Dict[str, Any], JobContext], Dict[str, Any]]] = {}
+
+
+def job_handler(kind: str):
+    """Enregistre la fonction qui exécute un type de tâche : handler(params, context) -> résultat."""
+    def decorator(func):
+        JOB_HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+@job_handler('scrape')
+def _run_scrape(params: Dict[str, Any], context: JobContext) -> Dict[str, Any]:
+    """Scraping d'un fournisseur (mêmes paramètres que ImportWindow)."""
+    from utils.scraper_registry import registry
+
+    scraper = registry.get(params['scraper'])
+    if scraper is None:
+        raise ValueError(f"Scraper inconnu: {params['scraper']}")
+
+    success, output_file, error = scraper.scrape(
+        params.get('categories') or [],
+        params.get('subcategories'),
+        params.get('options') or {},
+        context.progress,
+        context.log,
+        context.is_cancelled
+    )
+    return {'success': success, 'output_file': output_file, 'error': error}
+
+
+@job_handler('ai_process_csv')
+def _run_ai_process_csv(params: Dict[str, Any], context: JobContext) -> Dict[str, Any]:
+    """Traitement IA d'un CSV (mêmes paramètres que AIEditorWindow)."""
+    from apps.ai_editor.db import AIPromptsDB
+    from apps.ai_editor.processor import CSVAIProcessor
+
+    db = AIPromptsDB(params['db_path']) if params.get('db_path') else AIPromptsDB()
+    try:
+        success, output_path, changes_dict, processing_result_id = CSVAIProcessor(db).process_csv(
+            params['csv_path'],
+            params['prompt_set_id'],
+            params['provider'],
+            params['model'],
+            params['selected_fields'],
+            set(params['handles']) if params.get('handles') else None,
+            progress_callback=context.progress,
+            log_callback=context.log,
+            cancel_check=context.is_cancelled,
+            enable_search=params.get('enable_search', False),
+            csv_import_id=params.get('csv_import_id'),
+            resume=params.get('resume', False),
+            deferred=params.get('deferred', False)
+        )
+    finally:
+        db.close()
+    return {
+        'success': success,
+        'output_path': output_path,
+        'changes': changes_dict,
+        'processing_result_id': processing_result_id
+    }
+
+
+@job_handler('mine_type_rules')
+def _run_mine_type_rules(params: Dict[str, Any], context: JobContext) -> Dict[str, Any]:
+    """Minage des règles Type → Catégorie depuis le cache de catégorisation."""
+    from apps.ai_editor.db import AIPromptsDB
+    from apps.ai_editor.rule_miner import run_rule_mining
+
+    db = AIPromptsDB(params['db_path']) if params.get('db_path') else AIPromptsDB()
+    try:
+        return run_rule_mining(db, apply=params.get('apply', True), log_callback=context.log)
+    finally:
+        db.close()
+
+
+def run_job(job_id: int, db_path: Optional[str] = None, capture_logs: bool = True) -> str:
+    """
+    Exécute une tâche (dans le processus worker) et enregistre son résultat.
+
+    Args:
+        job_id: ID de la tâche
+        db_path: Base des tâches (défaut: get_jobs_db_path())
+        capture_logs: Copier tous les logs du processus dans ceux de la tâche
+                      (désactivé quand la tâche tourne dans un thread de l'interface)
+
+    Returns:
+        Statut final de la tâche
+    """
+    store = JobStore(db_path)
+    try:
+        job = store.get_job(job_id)
+        if job is None:
+            logger.error(f"Tâche {job_id} introuvable")
+            return JOB_FAILED
+        if job['status'] == JOB_QUEUED:
+            store.claim_job(job_id, os.getpid())
+        else:
+            store.set_pid(job_id, os.getpid())
+
+        context = JobContext(store, job_id)
+        log_handler = _JobLogHandler(context)
+        root_logger = logging.getLogger()
+        if capture_logs:
+            root_logger.addHandler(log_handler)
+
+        try:
+            handler = JOB_HANDLERS.get(job['kind'])
+            if handler is None:
+                raise ValueError(f"Type de tâche inconnu: {job['kind']}")
+            result = handler(job['params'], context)
+            if context.is_cancelled() or store.is_cancel_requested(job_id):
+                status, error = JOB_CANCELLED, "Annulation demandée par l'utilisateur"
+            elif result.get('success', True):
+                status, error = JOB_COMPLETED, None
+            else:
+                status, error = JOB_FAILED, result.get('error') or "Échec du traitement"
+        except Exception as e:
+            logger.error(f"Erreur de la tâche {job_id}: {e}", exc_info=True)
+            result, status, error = None, JOB_FAILED, str(e)
+        finally:
+            root_logger.removeHandler(log_handler)
+            context.flush()
+
+        store.finish_job(job_id, status, result, error)
+        return status
+    finally:
+        store.close()
+
+
+# ========== Service (côté interface) ==========
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    """Indique si un processus existe encore."""
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobService:
+    """Planificateur des tâches : lance les workers et suit leur fin."""
+
+    def __init__(self, db_path: Optional[str] = None, max_workers: Optional[int] = None,
+                 in_process: Optional[bool] = None):
+        """
+        Args:
+            db_path: Base des tâches (défaut: get_jobs_db_path())
+            max_workers: Tâches simultanées (défaut: max_concurrent_jobs ou 3)
+            in_process: Exécuter les tâches dans des threads de ce processus
+                        (application packagée : pas d'interpréteur pour lancer un worker)
+        """
+        self.db_path = db_path or get_jobs_db_path()
+        self.store = JobStore(self.db_path)
+        self.max_workers = max_workers or int(get_config('max_concurrent_jobs', DEFAULT_MAX_CONCURRENT_JOBS))
+        self.in_process = getattr(sys, 'frozen', False) if in_process is None else in_process
+        self._workers: Dict[int, Any] = {}  # job_id -> Popen ou Thread
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, kind: str, params: Dict[str, Any], label: Optional[str] = None) -> int:
+        """
+        Ajoute une tâche et la démarre dès qu'un worker est libre.
+
+        Returns:
+            ID de la tâche
+        """
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f"Type de tâche inconnu: {kind}")
+        job_id = self.store.create_job(kind, params, label)
+        logger.info(f"📋 Tâche {job_id} en file: {label or kind}")
+        self.run_pending()
+        return job_id
+
+    def cancel(self, job_id: int):
+        """Demande l'annulation d'une tâche (le worker s'arrête au prochain contrôle)."""
+        self.store.request_cancel(job_id)
+
+    def subscribe(self, job_id: int) -> 'JobSubscription':
+        """Crée un abonnement à la progression d'une tâche."""
+        return JobSubscription(self.store, job_id)
+
+    def start(self):
+        """Reprend les tâches interrompues et démarre la boucle du planificateur."""
+        if self._thread is not None:
+            return
+        self.recover_interrupted()
+        self._thread = threading.Thread(target=self._loop, name='job-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Arrête le planificateur (les workers en cours continuent)."""
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.wait(SCHEDULER_INTERVAL):
+            try:
+                self.run_pending()
+            except Exception as e:
+                logger.error(f"Erreur du planificateur de tâches: {e}", exc_info=True)
+
+    def recover_interrupted(self) -> List[int]:
+        """
+        Remet en file les tâches running dont le worker n'existe plus.
+
+        Returns:
+            IDs des tâches remises en file
+        """
+        recovered = []
+        for job in self.store.list_jobs([JOB_RUNNING], limit=1000):
+            if job['id'] in self._workers or _pid_alive(job['pid']):
+                continue
+            self.store.requeue_job(job['id'], {**job['params'], 'resume': True})
+            recovered.append(job['id'])
+            logger.info(f"♻️ Tâche {job['id']} interrompue remise en file")
+        return recovered
+
+    def run_pending(self):
+        """Suit les workers terminés et démarre les tâches en file (une passe)."""
+        with self._lock:
+            for job_id, worker in list(self._workers.items()):
+                alive = worker.is_alive() if isinstance(worker, threading.Thread) else worker.poll() is None
+                if alive:
+                    continue
+                del self._workers[job_id]
+                job = self.store.get_job(job_id)
+                if job and job['status'] == JOB_RUNNING:
+                    # Worker arrêté sans enregistrer de résultat (plantage, kill)
+                    code = getattr(worker, 'returncode', None)
+                    self.store.finish_job(job_id, JOB_FAILED, error=f"Worker arrêté (code {code})")
+
+            running = len(self._workers)
+            for job in reversed(self.store.list_jobs([JOB_QUEUED], limit=1000)):
+                if running >= self.max_workers:
+                    break
+                if not self.store.claim_job(job['id']):
+                    continue
+                self._workers[job['id']] = self._launch(job['id'])
+                running += 1
+
+    def _launch(self, job_id: int):
+        """Démarre le worker d'une tâche."""
+        if self.in_process:
+            thread = threading.Thread(target=run_job, args=(job_id, self.db_path, False),
+                                      name=f'job-{job_id}', daemon=True)
+            thread.start()
+            return thread
+
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'utils.job_service', '--run', str(job_id), '--db', self.db_path],
+            cwd=PROJECT_DIR,
+            stdin=subprocess.DEVNULL,
+            start_new_session=True  # Survit à la fermeture de l'interface
+        )
+        self.store.set_pid(job_id, process.pid)
+        logger.info(f"🚀 Tâche {job_id} démarrée (PID {process.pid})")
+        return process
+
+
+class JobSubscription:
+    """Lecture incrémentale de la progression et des logs d'une tâche (thread de l'interface)."""
+
+    def __init__(self, store: JobStore, job_id: int):
+        self.store = store
+        self.job_id = job_id
+        self.last_log_id = 0
+
+    def poll(self) -> Dict[str, Any]:
+        """
+        Lit l'état de la tâche et les nouveaux logs.
+
+        Returns:
+            Dict {'job': tâche, 'logs': nouvelles lignes, 'finished': bool}
+        """
+        logs = self.store.get_logs(self.job_id, self.last_log_id)
+        if logs:
+            self.last_log_id = logs[-1]['id']
+        job = self.store.get_job(self.job_id)
+        return {
+            'job': job,
+            'logs': [entry['message'] for entry in logs],
+            'finished': job is None or job['status'] in FINISHED_STATUSES
+        }
+
+    def attach(self, widget, on_update: Callable[[Dict[str, Any]], None], interval_ms: int = 500):
+        """
+        Appelle on_update(état) dans la boucle Tk jusqu'à la fin de la tâche
+        ou la destruction du widget.
+
+        Args:
+            widget: Widget Tk qui planifie la lecture (after)
+            on_update: Callback recevant le résultat de poll()
+            interval_ms: Intervalle de lecture
+        """
+        def tick():
+            try:
+                if not widget.winfo_exists():
+                    return
+            except Exception:
+                return
+            state = self.poll()
+            on_update(state)
+            if not state['finished']:
+                widget.after(interval_ms, tick)
+        widget.after(0, tick)
+
+
+_service: Optional[JobService] = None
+_service_lock = threading.Lock()
+
+
+def get_job_service() -> JobService:
+    """Retourne le service de tâches de l'application (démarré au premier appel)."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = JobService()
+            _service.start()
+        return _service
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Worker du service de tâches de fond')
+    parser.add_argument('--run', type=int, required=True, help='ID de la tâche à exécuter')
+    parser.add_argument('--db', help='Base des tâches (défaut: database/jobs.db)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    final_status = run_job(args.run, args.db)
+    sys.exit(0 if final_status == JOB_COMPLETED else 1)
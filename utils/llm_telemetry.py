@@ -0,0 +1,566 @@
+"""
+Télémétrie des appels LLM : latence, tokens, coût, cache et issue de chaque appel.
+
+Chaque appel à generate()/generate_stream() d'un provider est mesuré et
+enregistré dans la table llm_calls (base de l'éditeur IA) : provider, modèle,
+agent, taille du batch, tokens d'entrée/sortie/en cache, latence, tentatives,
+coût estimé et issue (ok, error, quota, cancelled).
+
+L'agent et la taille du batch sont fournis par l'appelant via llm_call_context() ;
+les appels d'un même lot de produits (SEO, analyse produit, taxonomie, relances)
+partagent l'identifiant de llm_work_unit(), pour que chaque produit ne soit compté
+qu'une fois dans les statistiques ;
+les tokens sont remontés par les providers (note_usage) depuis l'objet usage
+de chaque réponse. Les enregistrements sont écrits par lots (FLUSH_SIZE ou
+FLUSH_INTERVAL) pour ne pas ajouter une écriture SQLite par appel.
+
+Les statistiques (débit, p50/p95, coût pour 100 produits, projection du quota)
+servent à régler la taille des batches et la concurrence.
+"""
+
+import json
+import time
+import atexit
+import sqlite3
+import logging
+import functools
+import threading
+import inspect
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Any, Iterator
+
+logger = logging.getLogger(__name__)
+
+# Issues possibles d'un appel
+OUTCOME_OK = 'ok'
+OUTCOME_ERROR = 'error'
+OUTCOME_QUOTA = 'quota'
+OUTCOME_CANCELLED = 'cancelled'
+
+# Écriture en base par lots : nombre d'appels ou délai (secondes) depuis la dernière écriture
+FLUSH_SIZE = 20
+FLUSH_INTERVAL = 5.0
+
+# Fenêtre utilisée pour estimer le rythme de consommation du quota (secondes)
+QUOTA_RATE_WINDOW = 3600
+
+# Appels en cours et contexte (agent, batch) du thread courant
+_local = threading.local()
+
+# Lot de produits en cours (ContextVar : transmis aux tâches lancées avec contextvars.copy_context())
+_work_unit: ContextVar[Optional[str]] = ContextVar('llm_work_unit', default=None)
+
+# Destination des enregistrements et appels en attente d'écriture
+_sink_lock = threading.Lock()
+_sink_path: Optional[str] = None
+_pending: List[Dict[str, Any]] = []
+_last_flush = time.monotonic()
+
+
+class LLMCallStore:
+    """Accès à la table llm_calls (une connexion par instance)."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self._lock = threading.Lock()
+        self._init_db()
+
+    def _init_db(self):
+        """Crée la table des appels si nécessaire."""
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS llm_calls (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                provider TEXT NOT NULL,
+                model TEXT,
+                agent TEXT,
+                batch_size INTEGER DEFAULT 1,
+                prompt_tokens INTEGER DEFAULT 0,
+                completion_tokens INTEGER DEFAULT 0,
+                cached_tokens INTEGER DEFAULT 0,
+                latency_ms INTEGER NOT NULL,
+                retries INTEGER DEFAULT 0,
+                cache_hit INTEGER DEFAULT 0,
+                streamed INTEGER DEFAULT 0,
+                outcome TEXT NOT NULL,
+                error TEXT,
+                cost_usd REAL,
+                started_at REAL NOT NULL,
+                work_id TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        columns = {row['name'] for row in self.conn.execute('PRAGMA table_info(llm_calls)')}
+        if 'work_id' not in columns:
+            self.conn.execute('ALTER TABLE llm_calls ADD COLUMN work_id TEXT')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_calls_started ON llm_calls(started_at)')
+        self.conn.commit()
+
+    def insert_calls(self, calls: List[Dict[str, Any]]):
+        """Enregistre un lot d'appels."""
+        columns = ('provider', 'model', 'agent', 'batch_size', 'prompt_tokens', 'completion_tokens',
+                   'cached_tokens', 'latency_ms', 'retries', 'cache_hit', 'streamed', 'outcome',
+                   'error', 'cost_usd', 'started_at', 'work_id')
+        with self._lock:
+            self.conn.executemany(
+                f"INSERT INTO llm_calls ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                [tuple(call.get(column) for column in columns) for call in calls]
+            )
+            self.conn.commit()
+
+    def get_calls(self, since: float = 0.0, provider: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Récupère les appels commencés après une date.
+
+        Args:
+            since: Timestamp (epoch) de début de la fenêtre
+            provider: Filtre sur le provider (None = tous)
+
+        Returns:
+            Appels triés par date de début
+        """
+        sql = 'SELECT * FROM llm_calls WHERE started_at >= ?'
+        params: tuple = (since,)
+        if provider:
+            sql += ' AND provider = ?'
+            params += (provider,)
+        with self._lock:
+            rows = self.conn.execute(sql + ' ORDER BY started_at', params).fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self):
+        """Ferme la connexion."""
+        with self._lock:
+            self.conn.close()
+
+
+def configure(db_path: Optional[str]):
+    """
+    Définit la base où sont écrits les appels (None = télémétrie désactivée).
+
+    Args:
+        db_path: Chemin de la base SQLite (celle de l'éditeur IA)
+    """
+    global _sink_path
+    flush()
+    with _sink_lock:
+        _sink_path = db_path
+    if db_path:
+        # Crée la table dès la configuration : le tableau de bord peut la lire sans appel préalable
+        LLMCallStore(db_path).close()
+
+
+def flush():
+    """Écrit en base les appels en attente."""
+    global _pending, _last_flush
+    with _sink_lock:
+        calls, _pending = _pending, []
+        _last_flush = time.monotonic()
+        db_path = _sink_path
+        if not calls or not db_path:
+            return
+        try:
+            store = LLMCallStore(db_path)
+            try:
+                store.insert_calls(calls)
+            finally:
+                store.close()
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Télémétrie LLM non enregistrée ({len(calls)} appels): {e}")
+
+
+atexit.register(flush)
+
+
+def _record(call: Dict[str, Any]):
+    """Ajoute un appel terminé au lot en attente, et écrit le lot s'il est plein."""
+    with _sink_lock:
+        if not _sink_path:
+            return
+        _pending.append(call)
+        due = len(_pending) >= FLUSH_SIZE or time.monotonic() - _last_flush >= FLUSH_INTERVAL
+    if due:
+        flush()
+
+
+@contextmanager
+def llm_call_context(agent: str, batch_size: int = 1):
+    """
+    Associe les appels LLM du bloc à un agent et à une taille de batch.
+
+    Args:
+        agent: Nom de l'agent appelant
+        batch_size: Nombre de produits envoyés dans la requête
+    """
+    previous = getattr(_local, 'context', None)
+    _local.context = {'agent': agent, 'batch_size': batch_size}
+    try:
+        yield
+    finally:
+        _local.context = previous
+
+
+@contextmanager
+def llm_work_unit(work_id: Optional[str] = None):
+    """
+    Regroupe les appels LLM du bloc sous un même lot de produits (ex: un batch de
+    process_batch) : le lot compte pour sa plus grande taille de batch, quel que
+    soit le nombre d'agents et de relances.
+
+    Args:
+        work_id: Identifiant du lot (généré si absent)
+    """
+    token = _work_unit.set(work_id or uuid.uuid4().hex)
+    try:
+        yield
+    finally:
+        _work_unit.reset(token)
+
+
+def _active_calls() -> List[Dict[str, Any]]:
+    """Pile des appels en cours dans le thread courant."""
+    if not hasattr(_local, 'calls'):
+        _local.calls = []
+    return _local.calls
+
+
+def note_usage(prompt_tokens: int = 0, completion_tokens: int = 0, cached_tokens: int = 0):
+    """
+    Ajoute la consommation d'une réponse à l'appel en cours (plusieurs requêtes
+    d'un même appel, ex: recherche Internet puis réponse finale, sont cumulées).
+
+    Args:
+        prompt_tokens: Tokens d'entrée (cache compris)
+        completion_tokens: Tokens de sortie
+        cached_tokens: Tokens d'entrée servis par le cache de prompt
+    """
+    calls = _active_calls()
+    if not calls:
+        return
+    call = calls[-1]
+    call['prompt_tokens'] += int(prompt_tokens or 0)
+    call['completion_tokens'] += int(completion_tokens or 0)
+    call['cached_tokens'] += int(cached_tokens or 0)
+
+
+def current_usage() -> Dict[str, int]:
+    """Consommation notée jusqu'ici pour l'appel en cours (vide hors d'un appel mesuré)."""
+    calls = _active_calls()
+    if not calls:
+        return {}
+    return {key: calls[-1][key] for key in ('prompt_tokens', 'completion_tokens', 'cached_tokens')}
+
+
+def note_retry():
+    """Compte une nouvelle tentative pour l'appel en cours."""
+    calls = _active_calls()
+    if calls:
+        calls[-1]['retries'] += 1
+
+
+def _start_call(provider, streamed: bool) -> Optional[Dict[str, Any]]:
+    """Ouvre la mesure d'un appel (None si le provider est déjà en train d'être mesuré)."""
+    calls = _active_calls()
+    if any(call['_provider'] is provider for call in calls):
+        # generate_stream() par défaut ou recherche Internet : appel déjà mesuré
+        return None
+    context = getattr(_local, 'context', None) or {}
+    call = {
+        '_provider': provider,
+        '_clock': time.monotonic(),
+        'provider': getattr(provider, 'telemetry_name', type(provider).__name__),
+        'model': getattr(provider, 'model', None),
+        'agent': context.get('agent'),
+        'batch_size': context.get('batch_size', 1),
+        'prompt_tokens': 0,
+        'completion_tokens': 0,
+        'cached_tokens': 0,
+        'retries': 0,
+        'streamed': int(streamed),
+        'started_at': time.time(),
+        'work_id': _work_unit.get()
+    }
+    calls.append(call)
+    return call
+
+
+def _finish_call(call: Optional[Dict[str, Any]], outcome: str, error: Optional[BaseException] = None):
+    """Clôt la mesure d'un appel et l'ajoute au lot à écrire."""
+    if call is None:
+        return
+    calls = _active_calls()
+    calls[:] = [active for active in calls if active is not call]
+    provider = call.pop('_provider')
+    call['latency_ms'] = int((time.monotonic() - call.pop('_clock')) * 1000)
+    call['cache_hit'] = int(call['cached_tokens'] > 0)
+    call['outcome'] = outcome
+    call['error'] = str(error)[:500] if error else None
+    pricing = (getattr(provider, 'config', None) or {}).get('telemetry', {}).get('pricing_per_million', {})
+    call['cost_usd'] = estimate_cost(call['model'], call['prompt_tokens'], call['completion_tokens'],
+                                     call['cached_tokens'], pricing)
+    _record(call)
+
+
+def _outcome_for(error: BaseException) -> str:
+    """Issue d'un appel terminé par une exception."""
+    from utils.ai_providers import AIQuotaError
+    if isinstance(error, GeneratorExit):
+        return OUTCOME_CANCELLED
+    return OUTCOME_QUOTA if isinstance(error, AIQuotaError) else OUTCOME_ERROR
+
+
+def tracked_call(method):
+    """
+    Décorateur des méthodes generate/generate_stream des providers : mesure
+    l'appel (latence, issue) et l'enregistre dans llm_calls.
+    """
+    if inspect.isgeneratorfunction(method):
+        @functools.wraps(method)
+        def stream_wrapper(self, *args, **kwargs) -> Iterator[str]:
+            call = _start_call(self, streamed=True)
+            try:
+                yield from method(self, *args, **kwargs)
+            except BaseException as e:
+                _finish_call(call, _outcome_for(e), None if isinstance(e, GeneratorExit) else e)
+                raise
+            _finish_call(call, OUTCOME_OK)
+        return stream_wrapper
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        call = _start_call(self, streamed=False)
+        try:
+            result = method(self, *args, **kwargs)
+        except BaseException as e:
+            _finish_call(call, _outcome_for(e), e)
+            raise
+        _finish_call(call, OUTCOME_OK)
+        return result
+    return wrapper
+
+
+def _model_pricing(model: Optional[str], pricing: Dict[str, Dict[str, float]]) -> Optional[Dict[str, float]]:
+    """Tarif du modèle : entrée de pricing au plus long préfixe commun (ex: gpt-4o-mini avant gpt-4o)."""
+    if not model:
+        return None
+    matches = [prefix for prefix in pricing if model.startswith(prefix)]
+    return pricing[max(matches, key=len)] if matches else None
+
+
+def estimate_cost(model: Optional[str], prompt_tokens: int, completion_tokens: int, cached_tokens: int,
+                  pricing: Dict[str, Dict[str, float]]) -> Optional[float]:
+    """
+    Estime le coût d'un appel en USD.
+
+    Args:
+        model: Modèle utilisé
+        prompt_tokens: Tokens d'entrée (cache compris)
+        completion_tokens: Tokens de sortie
+        cached_tokens: Tokens d'entrée servis par le cache
+        pricing: Tarifs par million de tokens {préfixe modèle: {input, cached_input, output}}
+
+    Returns:
+        Coût en USD, ou None si le modèle n'a pas de tarif
+    """
+    price = _model_pricing(model, pricing)
+    if not price:
+        return None
+    input_price = price.get('input', 0.0)
+    cached_price = price.get('cached_input', input_price)
+    uncached = max(0, prompt_tokens - cached_tokens)
+    cost = uncached * input_price + cached_tokens * cached_price + completion_tokens * price.get('output', 0.0)
+    return round(cost / 1_000_000, 6)
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    """Percentile (interpolation linéaire) d'une liste de valeurs."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * percent / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def count_products(calls: List[Dict[str, Any]]) -> int:
+    """
+    Nombre de produits traités par des appels : un lot (work_id) compte pour sa plus
+    grande taille de batch, un appel hors lot pour sa propre taille de batch.
+
+    Args:
+        calls: Appels (lignes de llm_calls)
+
+    Returns:
+        Nombre de produits
+    """
+    units: Dict[str, int] = {}
+    products = 0
+    for call in calls:
+        work_id = call.get('work_id')
+        if work_id:
+            units[work_id] = max(units.get(work_id, 0), call['batch_size'] or 0)
+        else:
+            products += call['batch_size'] or 0
+    return products + sum(units.values())
+
+
+def summarize_calls(calls: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Agrège une liste d'appels pour le tableau de bord.
+
+    Args:
+        calls: Appels (lignes de llm_calls)
+
+    Returns:
+        Statistiques : appels, produits, erreurs, tentatives, p50/p95 (ms), tokens,
+        taux de cache, coût, coût pour 100 produits, débit (produits/min)
+    """
+    ok_calls = [call for call in calls if call['outcome'] == OUTCOME_OK]
+    products = count_products(ok_calls)
+    latencies = [call['latency_ms'] for call in ok_calls]
+    costs = [call['cost_usd'] for call in calls if call['cost_usd'] is not None]
+    cost = sum(costs) if costs else None
+
+    throughput = 0.0
+    if ok_calls:
+        start = min(call['started_at'] for call in ok_calls)
+        end = max(call['started_at'] + call['latency_ms'] / 1000 for call in ok_calls)
+        throughput = products / max(end - start, 1.0) * 60
+
+    return {
+        'calls': len(calls),
+        'products': products,
+        'errors': sum(1 for call in calls if call['outcome'] == OUTCOME_ERROR),
+        'quota_errors': sum(1 for call in calls if call['outcome'] == OUTCOME_QUOTA),
+        'retries': sum(call['retries'] or 0 for call in calls),
+        'p50_ms': round(_percentile(latencies, 50)),
+        'p95_ms': round(_percentile(latencies, 95)),
+        'prompt_tokens': sum(call['prompt_tokens'] or 0 for call in calls),
+        'completion_tokens': sum(call['completion_tokens'] or 0 for call in calls),
+        'cache_hit_rate': sum(call['cache_hit'] or 0 for call in ok_calls) / len(ok_calls) if ok_calls else 0.0,
+        'cost_usd': cost,
+        'cost_per_100_products': cost / products * 100 if cost is not None and products else None,
+        'products_per_minute': throughput
+    }
+
+
+def summarize_by(calls: List[Dict[str, Any]], *keys: str) -> Dict[tuple, Dict[str, Any]]:
+    """
+    Agrège les appels par groupe (ex: provider et modèle, agent, taille de batch).
+
+    Args:
+        calls: Appels (lignes de llm_calls)
+        *keys: Colonnes de regroupement
+
+    Returns:
+        {valeurs des colonnes: statistiques de summarize_calls()}
+    """
+    groups: Dict[tuple, List[Dict[str, Any]]] = {}
+    for call in calls:
+        groups.setdefault(tuple(call[key] for key in keys), []).append(call)
+    return {group: summarize_calls(group_calls) for group, group_calls in sorted(groups.items(), key=str)}
+
+
+def project_quota(calls: List[Dict[str, Any]], quota: Dict[str, int],
+                  now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """
+    Projette l'épuisement du quota journalier d'un provider au rythme de la dernière heure.
+
+    Args:
+        calls: Appels du provider depuis au moins minuit
+        quota: Quota journalier {'tokens_per_day': int, 'requests_per_day': int} (0 = non défini)
+        now: Timestamp de référence (tests)
+
+    Returns:
+        Par limite définie : consommé, restant, rythme horaire et heures avant épuisement
+        (None si le rythme est nul), ou None si aucun quota n'est configuré
+    """
+    now = now or time.time()
+    midnight = datetime.fromtimestamp(now).replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+    today = [call for call in calls if call['started_at'] >= midnight]
+    recent = [call for call in today if call['started_at'] >= now - QUOTA_RATE_WINDOW]
+    window_hours = min(QUOTA_RATE_WINDOW, now - midnight) / 3600 or 1.0
+
+    measures = {
+        'tokens_per_day': lambda selection: sum((c['prompt_tokens'] or 0) + (c['completion_tokens'] or 0)
+                                                for c in selection),
+        'requests_per_day': len
+    }
+    projection = {}
+    for limit_key, measure in measures.items():
+        limit = int(quota.get(limit_key) or 0)
+        if limit <= 0:
+            continue
+        used = measure(today)
+        rate = measure(recent) / window_hours
+        remaining = max(0, limit - used)
+        projection[limit_key] = {
+            'limit': limit,
+            'used': used,
+            'remaining': remaining,
+            'per_hour': rate,
+            'hours_left': remaining / rate if rate > 0 else None
+        }
+    return projection or None
+
+
+def load_telemetry_config() -> Dict[str, Any]:
+    """Section telemetry de ai_config.json (tarifs et quotas)."""
+    config_path = Path(__file__).parent.parent / "ai_config.json"
+    try:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('telemetry', {})
+    except Exception as e:
+        logger.warning(f"Impossible de charger la section telemetry de ai_config.json: {e}")
+        return {}
+
+
+def build_dashboard(db_path: str, since_hours: float = 24.0, config: Optional[Dict[str, Any]] = None,
+                    now: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Calcule les données du tableau de bord de télémétrie.
+
+    Args:
+        db_path: Base contenant la table llm_calls
+        since_hours: Fenêtre d'analyse (heures)
+        config: Section telemetry de ai_config.json (None = lue depuis le fichier)
+        now: Timestamp de référence (tests)
+
+    Returns:
+        Dictionnaire avec 'overall', 'by_model', 'by_agent', 'by_batch_size'
+        (statistiques de summarize_calls) et 'quotas' (projection par provider)
+    """
+    now = now or time.time()
+    config = load_telemetry_config() if config is None else config
+    flush()
+
+    since = now - since_hours * 3600
+    midnight = datetime.fromtimestamp(now).replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+    store = LLMCallStore(db_path)
+    try:
+        calls = store.get_calls(min(since, midnight))
+    finally:
+        store.close()
+    window = [call for call in calls if call['started_at'] >= since]
+
+    quotas = {}
+    for provider, quota in config.get('quotas', {}).items():
+        projection = project_quota([call for call in calls if call['provider'] == provider], quota, now)
+        if projection:
+            quotas[provider] = projection
+
+    return {
+        'since_hours': since_hours,
+        'overall': summarize_calls(window),
+        'by_model': summarize_by(window, 'provider', 'model'),
+        'by_agent': summarize_by(window, 'agent'),
+        'by_batch_size': summarize_by(window, 'batch_size'),
+        'quotas': quotas
+    }
@@ -0,0 +1,402 @@
+"""
+Transport enregistrement/rejeu des appels LLM, pour des benchmarks déterministes hors ligne.
+
+Le transport s'intercale sous generate()/generate_stream() de chaque provider
+(décorateur transport_call, placé sous tracked_call : la télémétrie mesure donc
+aussi les appels rejoués). Trois modes :
+- record : l'appel part au fournisseur ; requête, réponse, latence mesurée et
+  tokens consommés sont ajoutés à une cassette (JSON lines) ;
+- replay : la réponse est lue dans la cassette, sans réseau ni clé d'API, avec
+  la latence enregistrée multipliée par latency_scale (0 = instantané) ;
+- synthetic : réponse générée conforme au schéma JSON demandé (un objet par
+  handle du prompt, première catégorie candidate proposée), sans cassette.
+
+Une requête est identifiée par le provider, le modèle et tous les paramètres
+de l'appel : le même pipeline rejoue exactement les mêmes réponses. Une requête
+enregistrée plusieurs fois (relances) est rejouée dans l'ordre d'enregistrement.
+
+Activation : configure() (commande de benchmark), ou variables d'environnement
+LLM_TRANSPORT_MODE, LLM_TRANSPORT_CASSETTE et LLM_TRANSPORT_LATENCY pour les
+scripts existants (ex: test_claude_models.py) sans modification.
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import functools
+import threading
+import inspect
+from typing import Dict, List, Optional, Any, Iterator, Callable
+
+from utils import llm_telemetry
+
+logger = logging.getLogger(__name__)
+
+MODE_RECORD = 'record'
+MODE_REPLAY = 'replay'
+MODE_SYNTHETIC = 'synthetic'
+MODES = (MODE_RECORD, MODE_REPLAY, MODE_SYNTHETIC)
+
+# Taille des fragments d'une réponse rejouée en streaming (caractères)
+STREAM_CHUNK_CHARS = 64
+
+# Estimation grossière des tokens d'une réponse synthétique
+CHARS_PER_TOKEN = 4
+
+# Paramètres d'un appel qui identifient la requête
+REQUEST_FIELDS = ('prompt', 'context', 'max_tokens', 'cache_prefix', 'response_schema')
+
+
+class CassetteMissError(RuntimeError):
+    """Requête absente de la cassette en mode replay."""
+
+
+class LLMTransport:
+    """Enregistre ou rejoue les appels LLM (une instance active par processus)."""
+
+    def __init__(self, mode: str, cassette_path: Optional[str] = None, latency_scale: float = 1.0,
+                 synthetic_latency_ms: int = 0):
+        """
+        Args:
+            mode: MODE_RECORD, MODE_REPLAY ou MODE_SYNTHETIC
+            cassette_path: Fichier JSON lines des appels (requis en record et replay)
+            latency_scale: Multiplicateur de la latence enregistrée en replay (0 = aucune attente)
+            synthetic_latency_ms: Latence simulée de chaque appel synthétique
+        """
+        if mode not in MODES:
+            raise ValueError(f"Mode de transport inconnu: {mode}")
+        if mode != MODE_SYNTHETIC and not cassette_path:
+            raise ValueError(f"Le mode {mode} nécessite une cassette")
+        self.mode = mode
+        self.cassette_path = cassette_path
+        self.latency_scale = max(0.0, latency_scale)
+        self.synthetic_latency_ms = max(0, synthetic_latency_ms)
+        self._lock = threading.Lock()
+        self._entries: Dict[str, List[Dict[str, Any]]] = {}
+        self._served: Dict[str, int] = {}
+        self.stats = {'recorded': 0, 'replayed': 0, 'synthetic': 0}
+
+        if mode == MODE_REPLAY:
+            self._load()
+
+    def _load(self):
+        """Charge la cassette (entrées regroupées par clé, dans l'ordre d'enregistrement)."""
+        if not os.path.isfile(self.cassette_path):
+            raise FileNotFoundError(f"Cassette introuvable: {self.cassette_path}")
+        with open(self.cassette_path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries.setdefault(entry['key'], []).append(entry)
+        logger.info(f"📼 Cassette chargée: {sum(len(e) for e in self._entries.values())} appel(s) ({self.cassette_path})")
+
+    def _save(self, entry: Dict[str, Any]):
+        """Ajoute un appel à la cassette."""
+        with self._lock:
+            directory = os.path.dirname(self.cassette_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.cassette_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            self.stats['recorded'] += 1
+
+    def _lookup(self, provider, key: str) -> Dict[str, Any]:
+        """Prochaine réponse enregistrée pour une requête (la dernière est réutilisée au-delà)."""
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                raise CassetteMissError(
+                    f"Appel {getattr(provider, 'telemetry_name', type(provider).__name__)}/"
+                    f"{getattr(provider, 'model', None)} absent de la cassette {self.cassette_path} "
+                    f"(réenregistrez-la en mode record)"
+                )
+            index = self._served.get(key, 0)
+            self._served[key] = index + 1
+            self.stats['replayed'] += 1
+            return entries[min(index, len(entries) - 1)]
+
+    def _entry(self, provider, key: str, response: str, latency_ms: int, first_chunk_ms: Optional[int],
+               streamed: bool) -> Dict[str, Any]:
+        return {
+            'key': key,
+            'provider': getattr(provider, 'telemetry_name', type(provider).__name__),
+            'model': getattr(provider, 'model', None),
+            'streamed': streamed,
+            'latency_ms': latency_ms,
+            'first_chunk_ms': first_chunk_ms,
+            'usage': llm_telemetry.current_usage(),
+            'response': response
+        }
+
+    def _synthetic_entry(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Réponse synthétique et consommation estimée d'une requête."""
+        with self._lock:
+            self.stats['synthetic'] += 1
+        prompt = f"{request.get('cache_prefix') or ''}\n{request['prompt']}"
+        response = synthesize_response(request['prompt'], request.get('response_schema'))
+        return {
+            'latency_ms': self.synthetic_latency_ms,
+            'first_chunk_ms': 0,
+            'usage': {'prompt_tokens': len(prompt) // CHARS_PER_TOKEN,
+                      'completion_tokens': len(response) // CHARS_PER_TOKEN},
+            'response': response
+        }
+
+    def _served_entry(self, provider, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Réponse servie sans appel (replay ou synthetic), consommation reportée à la télémétrie."""
+        if self.mode == MODE_SYNTHETIC:
+            entry = self._synthetic_entry(request)
+        else:
+            entry = self._lookup(provider, request_key(provider, request))
+        llm_telemetry.note_usage(**(entry.get('usage') or {}))
+        return entry
+
+    def _delay(self, entry: Dict[str, Any]) -> float:
+        """Latence simulée d'une réponse servie (secondes)."""
+        if self.mode == MODE_SYNTHETIC:
+            return entry['latency_ms'] / 1000
+        return entry['latency_ms'] * self.latency_scale / 1000
+
+    def call(self, provider, request: Dict[str, Any], invoke: Callable[[], str]) -> str:
+        """Appel non streamé."""
+        if self.mode == MODE_RECORD:
+            started = time.monotonic()
+            response = invoke()
+            latency_ms = int((time.monotonic() - started) * 1000)
+            self._save(self._entry(provider, request_key(provider, request), response, latency_ms, None, False))
+            return response
+
+        entry = self._served_entry(provider, request)
+        delay = self._delay(entry)
+        if delay:
+            time.sleep(delay)
+        return entry['response']
+
+    def stream(self, provider, request: Dict[str, Any], invoke: Callable[[], Iterator[str]]) -> Iterator[str]:
+        """Appel streamé : la réponse rejouée est découpée en fragments."""
+        if self.mode == MODE_RECORD:
+            started = time.monotonic()
+            first_chunk_ms = None
+            chunks = []
+            for chunk in invoke():
+                if first_chunk_ms is None:
+                    first_chunk_ms = int((time.monotonic() - started) * 1000)
+                chunks.append(chunk)
+                yield chunk
+            latency_ms = int((time.monotonic() - started) * 1000)
+            self._save(self._entry(provider, request_key(provider, request), ''.join(chunks),
+                                   latency_ms, first_chunk_ms, True))
+            return
+
+        entry = self._served_entry(provider, request)
+        response = entry['response']
+        chunks = [response[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(response), STREAM_CHUNK_CHARS)] or ['']
+        delay = self._delay(entry)
+        first_delay = delay * (entry.get('first_chunk_ms') or 0) / entry['latency_ms'] if entry['latency_ms'] else 0
+        if first_delay:
+            time.sleep(first_delay)
+        chunk_delay = (delay - first_delay) / len(chunks)
+        for chunk in chunks:
+            yield chunk
+            if chunk_delay:
+                time.sleep(chunk_delay)
+
+
+_transport: Optional[LLMTransport] = None
+
+# Providers dont un appel est déjà intercepté dans le thread courant
+_local = threading.local()
+
+
+def configure(mode: Optional[str], cassette_path: Optional[str] = None, latency_scale: float = 1.0,
+              synthetic_latency_ms: int = 0) -> Optional[LLMTransport]:
+    """
+    Active le transport pour tous les providers du processus (mode None = appels directs).
+
+    Args:
+        mode: MODE_RECORD, MODE_REPLAY, MODE_SYNTHETIC ou None
+        cassette_path: Fichier de la cassette (record, replay)
+        latency_scale: Multiplicateur de la latence enregistrée (replay)
+        synthetic_latency_ms: Latence de chaque appel synthétique
+
+    Returns:
+        Transport actif (None si désactivé)
+    """
+    global _transport
+    _transport = LLMTransport(mode, cassette_path, latency_scale, synthetic_latency_ms) if mode else None
+    if _transport:
+        logger.info(f"📼 Transport LLM: {mode}" + (f" ({cassette_path})" if cassette_path else ""))
+    return _transport
+
+
+def get_transport() -> Optional[LLMTransport]:
+    """Transport actif, ou None."""
+    return _transport
+
+
+def configure_from_env():
+    """Active le transport depuis LLM_TRANSPORT_MODE / LLM_TRANSPORT_CASSETTE / LLM_TRANSPORT_LATENCY."""
+    mode = os.getenv('LLM_TRANSPORT_MODE')
+    if mode:
+        configure(mode, os.getenv('LLM_TRANSPORT_CASSETTE'), float(os.getenv('LLM_TRANSPORT_LATENCY', '1.0')))
+
+
+def request_key(provider, request: Dict[str, Any]) -> str:
+    """
+    Clé d'une requête : provider, modèle et paramètres de l'appel.
+
+    Args:
+        provider: Instance du provider
+        request: Paramètres de l'appel (REQUEST_FIELDS)
+
+    Returns:
+        Empreinte SHA-256
+    """
+    payload = {
+        'provider': getattr(provider, 'telemetry_name', type(provider).__name__),
+        'model': getattr(provider, 'model', None),
+        **{field: request.get(field) for field in REQUEST_FIELDS}
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8')).hexdigest()
+
+
+def _intercepting(provider) -> bool:
+    return any(active is provider for active in getattr(_local, 'providers', []))
+
+
+def transport_call(method):
+    """
+    Décorateur des méthodes generate/generate_stream des providers : appel direct
+    si aucun transport n'est actif, sinon enregistrement ou rejeu.
+
+    Les appels imbriqués d'un même provider (generate_stream() qui retombe sur
+    generate()) ne sont interceptés qu'une fois.
+    """
+    signature = inspect.signature(method)
+
+    def bind(self, args, kwargs) -> Dict[str, Any]:
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        return {field: bound.arguments.get(field) for field in REQUEST_FIELDS}
+
+    if inspect.isgeneratorfunction(method):
+        @functools.wraps(method)
+        def stream_wrapper(self, *args, **kwargs) -> Iterator[str]:
+            transport = _transport
+            if transport is None or _intercepting(self):
+                yield from method(self, *args, **kwargs)
+                return
+            providers = _local.__dict__.setdefault('providers', [])
+            providers.append(self)
+            try:
+                yield from transport.stream(self, bind(self, args, kwargs), lambda: method(self, *args, **kwargs))
+            finally:
+                providers.remove(self)
+        return stream_wrapper
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        transport = _transport
+        if transport is None or _intercepting(self):
+            return method(self, *args, **kwargs)
+        providers = _local.__dict__.setdefault('providers', [])
+        providers.append(self)
+        try:
+            return transport.call(self, bind(self, args, kwargs), lambda: method(self, *args, **kwargs))
+        finally:
+            providers.remove(self)
+    return wrapper
+
+
+# ========== Réponses synthétiques ==========
+
+# Valeurs des champs texte selon leur nom (longueurs compatibles avec le contrôle qualité SEO)
+SYNTHETIC_TEXTS = {
+    'seo_title': "{name} - produit de démonstration",
+    'seo_description': "{name} : description synthétique générée pour le benchmark du pipeline, sans appel IA.",
+    'title': "{name} de démonstration",
+    'body_html': "<p>" + "Contenu synthétique de {name} généré pour mesurer le pipeline sans appel IA. " * 6 + "</p>",
+    'tags': "{name}, benchmark, synthétique, démonstration",
+    'image_alt_text': "Photo de {name}",
+    'type': "PRODUITS",
+    'rationale': "réponse synthétique"
+}
+
+HANDLE_PATTERN = re.compile(r'(?:Handle: |handle=)([^\s|]+)')
+CANDIDATE_PATTERN = re.compile(r'^\s*1\. (.+)$', re.M)
+
+
+def synthesize_response(prompt: str, response_schema: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Génère une réponse valide pour le schéma demandé.
+
+    Les tableaux d'objets ayant une propriété 'handle' reçoivent un objet par handle
+    trouvé dans le prompt ; les champs de catégorie reprennent la première catégorie
+    candidate de la section du produit.
+
+    Args:
+        prompt: Partie variable du prompt
+        response_schema: Schéma JSON de la réponse (None = {"products": [...]} ou texte)
+
+    Returns:
+        Réponse JSON (ou texte sans schéma ni produit)
+    """
+    matches = list(HANDLE_PATTERN.finditer(prompt))
+    handles = list(dict.fromkeys(match.group(1) for match in matches))
+    sections = {}
+    for index, match in enumerate(matches):
+        end = matches[index + 1].start() if index + 1 < len(matches) else len(prompt)
+        sections.setdefault(match.group(1), prompt[match.start():end])
+
+    if response_schema is None:
+        if not handles:
+            return "Réponse synthétique."
+        return json.dumps({'products': [{'handle': h} for h in handles]}, ensure_ascii=False)
+
+    default_section = prompt if not handles else sections[handles[0]]
+    value = _synthesize(response_schema, 'reponse', handles[0] if handles else 'produit',
+                        handles, sections, default_section)
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _synthesize(schema: Dict[str, Any], name: str, handle: str, handles: List[str],
+                sections: Dict[str, str], section: str) -> Any:
+    """Valeur synthétique d'un nœud de schéma JSON."""
+    schema_type = schema.get('type')
+    if 'enum' in schema:
+        return schema['enum'][0]
+    if schema_type == 'object':
+        return {
+            prop: _synthesize(prop_schema, prop, handle, handles, sections, section)
+            for prop, prop_schema in schema.get('properties', {}).items()
+        }
+    if schema_type == 'array':
+        items = schema.get('items', {})
+        if items.get('type') == 'object' and 'handle' in items.get('properties', {}):
+            return [
+                _synthesize(items, name, h, handles, sections, sections.get(h, section))
+                for h in (handles or [handle])
+            ]
+        words = [word for word in re.split(r'[-_\s]+', handle) if word and not word.isdigit()] or ['produit']
+        return [_synthesize(items, word, word, handles, sections, section) for word in words]
+    if schema_type == 'number':
+        return 0.9
+    if schema_type == 'integer':
+        return 1
+    if schema_type == 'boolean':
+        return True
+
+    # Chaîne
+    if name == 'handle':
+        return handle
+    if 'category' in name:
+        candidate = CANDIDATE_PATTERN.search(section)
+        return candidate.group(1).strip() if candidate else "Maison et jardin"
+    label = handle.replace('-', ' ').capitalize()
+    return SYNTHETIC_TEXTS.get(name, "{name}").format(name=label)
+
+
+configure_from_env()
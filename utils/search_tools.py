@@ -2,11 +2,27 @@
 Tools de recherche Internet pour les agents IA.
 """
 
+import time
 import logging
-from typing import Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, List, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Durée de validité d'un résultat de recherche en cache (secondes)
+SEARCH_CACHE_TTL = 6 * 3600
+
+# Nombre maximum de résultats conservés (les plus anciens sont retirés)
+SEARCH_CACHE_MAX_ENTRIES = 500
+
+# Recherches Perplexity exécutées en parallèle pour un même appel de l'IA
+MAX_CONCURRENT_SEARCHES = 4
+
+# Cache partagé par toutes les instances : (modèle, max_tokens, requête normalisée) → (expiration, résultat)
+_search_cache: Dict[Tuple[str, int, str], Tuple[float, str]] = {}
+_search_cache_lock = threading.Lock()
+
 
 class SearchToolError(Exception):
     """Exception pour les erreurs des tools de recherche."""
@@ -43,6 +59,25 @@ def _is_quota_error(error_message: str) -> bool:
     return any(keyword in error_lower for keyword in quota_keywords)
 
 
+def normalize_query(query: str) -> str:
+    """
+    Normalise une requête de recherche pour le cache (casse, espaces, ponctuation finale).
+    
+    Args:
+        query: Requête telle que formulée par l'IA
+        
+    Returns:
+        Requête normalisée
+    """
+    return ' '.join(str(query or '').lower().split()).strip(' ?.!;,')
+
+
+def clear_search_cache():
+    """Vide le cache des résultats de recherche."""
+    with _search_cache_lock:
+        _search_cache.clear()
+
+
 class PerplexitySearchTool:
     """
     Tool de recherche Internet via Perplexity AI.
@@ -61,14 +96,17 @@ class PerplexitySearchTool:
     
     DEFAULT_MODEL = "sonar"
     
-    def __init__(self, api_key: str, model: str = None):
+    def __init__(self, api_key: str, model: str = None, cache_ttl: float = SEARCH_CACHE_TTL):
         """
         Initialise le tool de recherche Perplexity.
         
         Args:
             api_key: Clé API Perplexity
             model: Modèle à utiliser (défaut: sonar)
+            cache_ttl: Durée de validité des résultats en cache en secondes (0 = pas de cache)
         """
+        self.cache_ttl = cache_ttl
+
         try:
             from openai import OpenAI
             self.OpenAI = OpenAI
@@ -149,6 +187,53 @@ class PerplexitySearchTool:
         Raises:
             SearchToolError: Si la recherche échoue
         """
+        cache_key = (self.model, max_tokens, normalize_query(query))
+        if self.cache_ttl > 0:
+            with _search_cache_lock:
+                cached = _search_cache.get(cache_key)
+            if cached and cached[0] > time.monotonic():
+                logger.info(f"♻️ Recherche Perplexity en cache: {query}")
+                return cached[1]
+        
+        result = self._search_api(query, max_tokens)
+        
+        if self.cache_ttl > 0 and result:
+            with _search_cache_lock:
+                _search_cache[cache_key] = (time.monotonic() + self.cache_ttl, result)
+                while len(_search_cache) > SEARCH_CACHE_MAX_ENTRIES:
+                    _search_cache.pop(next(iter(_search_cache)))
+        return result
+    
+    def search_many(self, queries: List[str], max_tokens: int = 800) -> List[str]:
+        """
+        Effectue plusieurs recherches en parallèle (requêtes identiques exécutées une seule fois).
+        
+        Args:
+            queries: Requêtes demandées par l'IA, dans l'ordre des tool calls
+            max_tokens: Nombre maximum de tokens par réponse
+            
+        Returns:
+            Résultats dans le même ordre que les requêtes
+            
+        Raises:
+            SearchToolError: Si une recherche échoue
+        """
+        unique: Dict[str, str] = {}
+        for query in queries:
+            unique.setdefault(normalize_query(query), query)
+        
+        if len(unique) <= 1:
+            results = {key: self.search(query, max_tokens) for key, query in unique.items()}
+        else:
+            workers = min(len(unique), MAX_CONCURRENT_SEARCHES)
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='perplexity') as executor:
+                futures = {key: executor.submit(self.search, query, max_tokens) for key, query in unique.items()}
+                results = {key: future.result() for key, future in futures.items()}
+        
+        return [results[normalize_query(query)] for query in queries]
+    
+    def _search_api(self, query: str, max_tokens: int) -> str:
+        """Appel à l'API Perplexity (sans cache, voir search)."""
         try:
             logger.info(f"🔍 Recherche Perplexity: {query}")
             